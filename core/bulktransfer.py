@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the bulk data channel used alongside the rpyc module server.
+
+Pulling numpy arrays through rpyc either means one network round trip per element access (netref)
+or a full pickle of the array. This channel instead transfers arrays as raw binary frames with a
+small dtype/shape header over a plain TCP (or SSL) socket and receives them directly into the
+memory of the destination array.
+
+Only calls of public methods of shared modules are served. Results can be numpy arrays or nested
+tuples, lists and dicts containing arrays and plain scalars. Other results are pickled (as rpyc
+does with allow_pickle). Arguments must be plain scalars, tuples, lists or dicts.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import json
+import logging
+import pickle
+import socket
+import socketserver
+import ssl
+import struct
+import threading
+import zlib
+import numpy
+
+from .interface import remote_declarations
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'QBT1'
+# magic, length of the JSON header in bytes
+_PREFIX = struct.Struct('<4sI')
+# compressed payloads are not worth it below this size
+MIN_COMPRESS_BYTES = 65536
+
+
+class BulkTransferError(Exception):
+    """ The remote call raised an exception or the data could not be transferred. """
+    pass
+
+
+class UnsupportedResult(BulkTransferError):
+    """ The value can not be represented by plain scalars, containers and arrays. """
+    pass
+
+
+class UnsupportedArguments(UnsupportedResult):
+    """ The call arguments can not be sent over the bulk channel. The call was not sent. """
+    pass
+
+
+def returned_array_methods(obj):
+    """ Names of all methods of an object that are declared as array-returning in one of its
+    (interface) base classes via core.interface.returns_array.
+
+    @param object obj: module instance
+
+    @return list: method names
+    """
+    declarations = remote_declarations(type(obj))
+    return sorted(name for name, flags in declarations.items()
+                  if flags.get('returns_array', False))
+
+
+def _encode(value, arrays):
+    """ Replace arrays in a result by placeholders and collect them. """
+    if isinstance(value, numpy.ndarray):
+        if value.dtype.hasobject or value.dtype.fields is not None:
+            raise UnsupportedResult('Arrays of dtype {0} can not be transferred.'
+                                    ''.format(value.dtype))
+        arrays.append(numpy.ascontiguousarray(value))
+        return {'__ndarray__': len(arrays) - 1}
+    if isinstance(value, numpy.generic):
+        return value.item()
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, tuple):
+        return {'__tuple__': [_encode(item, arrays) for item in value]}
+    if isinstance(value, list):
+        return [_encode(item, arrays) for item in value]
+    if isinstance(value, dict):
+        if not all(isinstance(key, str) for key in value):
+            raise UnsupportedResult('Only dicts with str keys can be transferred.')
+        if '__ndarray__' in value or '__tuple__' in value:
+            raise UnsupportedResult('Dict keys collide with transfer placeholders.')
+        return {key: _encode(item, arrays) for key, item in value.items()}
+    raise UnsupportedResult('Objects of type {0} can not be transferred.'.format(type(value)))
+
+
+def _decode(value, arrays):
+    """ Rebuild a result from its encoded form and the received arrays. """
+    if isinstance(value, list):
+        return [_decode(item, arrays) for item in value]
+    if isinstance(value, dict):
+        if '__ndarray__' in value:
+            return arrays[value['__ndarray__']]
+        if '__tuple__' in value:
+            return tuple(_decode(item, arrays) for item in value['__tuple__'])
+        return {key: _decode(item, arrays) for key, item in value.items()}
+    return value
+
+
+def _byte_view(arr):
+    """ Flat uint8 view on the memory of a C-contiguous array. """
+    return arr.reshape(-1).view(numpy.uint8)
+
+
+def _recv_exactly(sock, buffer):
+    """ Fill a writable buffer from the socket without intermediate copies. """
+    view = memoryview(buffer).cast('B')
+    received = 0
+    while received < len(view):
+        n = sock.recv_into(view[received:], len(view) - received)
+        if n == 0:
+            raise ConnectionError('Bulk transfer connection closed by peer.')
+        received += n
+
+
+def _recv_bytes(sock, size):
+    buffer = bytearray(size)
+    _recv_exactly(sock, buffer)
+    return buffer
+
+
+def send_message(sock, header, arrays=(), compress_level=0):
+    """ Send a JSON header followed by the raw data of all arrays.
+
+    @param socket sock: connected socket
+    @param dict header: JSON serializable header. Array frame descriptions are added to it.
+    @param list arrays: C-contiguous numpy arrays to send after the header
+    @param int compress_level: zlib compression level for large arrays, 0 disables compression
+    """
+    payloads = list()
+    frames = list()
+    for arr in arrays:
+        payload = memoryview(_byte_view(arr)) if arr.nbytes > 0 else b''
+        compressed_size = None
+        if compress_level > 0 and arr.nbytes >= MIN_COMPRESS_BYTES:
+            compressed = zlib.compress(payload, compress_level)
+            if len(compressed) < arr.nbytes:
+                payload = compressed
+                compressed_size = len(compressed)
+        payloads.append(payload)
+        frames.append({'dtype': arr.dtype.str,
+                       'shape': list(arr.shape),
+                       'compressed_size': compressed_size})
+    header = dict(header, frames=frames)
+    header_bytes = json.dumps(header).encode('utf-8')
+    sock.sendall(_PREFIX.pack(MAGIC, len(header_bytes)) + header_bytes)
+    for payload in payloads:
+        if len(payload) > 0:
+            sock.sendall(payload)
+
+
+def recv_message(sock, out=None):
+    """ Receive a message sent by send_message.
+
+    @param socket sock: connected socket
+    @param list out: optional list of preallocated arrays. If dtype and shape of a received frame
+                     match the array at the same position, the data is received directly into it.
+
+    @return (dict, list): JSON header and list of received arrays
+    """
+    magic, header_size = _PREFIX.unpack(bytes(_recv_bytes(sock, _PREFIX.size)))
+    if magic != MAGIC:
+        raise BulkTransferError('Invalid bulk transfer frame received.')
+    header = json.loads(_recv_bytes(sock, header_size).decode('utf-8'))
+    arrays = list()
+    for ii, frame in enumerate(header.pop('frames', list())):
+        dtype = numpy.dtype(frame['dtype'])
+        shape = tuple(frame['shape'])
+        target = None
+        if out is not None and ii < len(out) and out[ii] is not None:
+            candidate = out[ii]
+            if (candidate.dtype == dtype and candidate.shape == shape
+                    and candidate.flags['C_CONTIGUOUS'] and candidate.flags['WRITEABLE']):
+                target = candidate
+        if target is None:
+            target = numpy.empty(shape, dtype=dtype)
+        if frame['compressed_size'] is None:
+            if target.nbytes > 0:
+                _recv_exactly(sock, _byte_view(target))
+        else:
+            raw = zlib.decompress(_recv_bytes(sock, frame['compressed_size']))
+            _byte_view(target)[...] = numpy.frombuffer(raw, dtype=numpy.uint8)
+        arrays.append(target)
+    return header, arrays
+
+
+class BulkTransferServer:
+    """ Serves method calls of shared modules whose results are sent as binary array frames.
+    """
+
+    def __init__(self, modules, host, port, authenticator=None):
+        """
+          @param DictTableModel modules: shared modules (name -> module)
+          @param str host: interface to bind to
+          @param int port: port to listen on
+          @param callable authenticator: optional callable wrapping an accepted socket,
+                                         e.g. core.remote.SSLAuthenticator
+        """
+        self.modules = modules
+        self.authenticator = authenticator
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                sock = self.request
+                if server.authenticator is not None:
+                    try:
+                        sock, _ = server.authenticator(sock)
+                    except Exception:
+                        logger.exception('Bulk transfer client authentication failed.')
+                        return
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                while True:
+                    try:
+                        request, _ = recv_message(sock)
+                    except (ConnectionError, OSError):
+                        return
+                    server._handle_request(sock, request)
+
+        self._server = socketserver.ThreadingTCPServer((host, port), Handler, bind_and_activate=False)
+        self._server.daemon_threads = True
+        self._server.allow_reuse_address = True
+        self._server.server_bind()
+        self._server.server_activate()
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        """ Serve requests in a background thread. """
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name='bulk-transfer-server',
+                                        daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """ Stop serving and close the listening socket. """
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handle_request(self, sock, request):
+        op = request.get('op')
+        try:
+            if op == 'describe':
+                module = self._get_module(request['module'])
+                send_message(sock, {'status': 'ok', 'methods': returned_array_methods(module)})
+                return
+            if op != 'call':
+                raise BulkTransferError('Unknown bulk transfer operation "{0}".'.format(op))
+            method_name = str(request['method'])
+            if method_name.startswith('_'):
+                raise BulkTransferError('Private methods can not be called remotely.')
+            method = getattr(self._get_module(request['module']), method_name)
+            args = _decode(request.get('args', list()), list())
+            kwargs = _decode(request.get('kwargs', dict()), list())
+            result = method(*args, **kwargs)
+        except Exception as e:
+            logger.exception('Error during bulk transfer request {0}.'.format(request))
+            send_message(sock, {'status': 'error', 'message': repr(e)})
+            return
+
+        arrays = list()
+        try:
+            encoded = _encode(result, arrays)
+        except UnsupportedResult:
+            pickled = numpy.frombuffer(pickle.dumps(result, pickle.HIGHEST_PROTOCOL),
+                                       dtype=numpy.uint8)
+            send_message(sock, {'status': 'pickle'}, [pickled])
+            return
+        send_message(sock,
+                     {'status': 'ok', 'result': encoded},
+                     arrays,
+                     compress_level=int(request.get('compress', 0)))
+
+    def _get_module(self, name):
+        if name not in self.modules.storage:
+            raise BulkTransferError('Module "{0}" is not shared.'.format(name))
+        return self.modules.storage[name]
+
+
+class BulkTransferClient:
+    """ Persistent connection to a BulkTransferServer. Thread-safe, calls are serialized.
+    """
+
+    def __init__(self, host, port, certfile=None, keyfile=None, cacertsfile=None,
+                 compress_level=0):
+        """
+          @param str host: server host name
+          @param int port: server bulk transfer port
+          @param str certfile: client certificate file for SSL, None for unencrypted connections
+          @param str keyfile: client key file for SSL
+          @param str cacertsfile: CA certificates to verify the server with
+          @param int compress_level: zlib compression level requested for large arrays
+        """
+        self.compress_level = int(compress_level)
+        self._lock = threading.Lock()
+        sock = socket.create_connection((host, port))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if certfile is not None and keyfile is not None:
+            context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH, cafile=cacertsfile)
+            context.check_hostname = False
+            context.load_cert_chain(certfile=certfile, keyfile=keyfile)
+            sock = context.wrap_socket(sock)
+        self._sock = sock
+
+    def close(self):
+        with self._lock:
+            self._sock.close()
+
+    def describe(self, module):
+        """ Names of the array-returning methods of a shared module.
+
+        @param str module: name of the shared module
+
+        @return list: method names
+        """
+        return self._request({'op': 'describe', 'module': module})[0]['methods']
+
+    def call(self, module, method, *args, out=None, **kwargs):
+        """ Call a method of a shared module and receive its result over the bulk channel.
+
+        @param str module: name of the shared module
+        @param str method: name of the method to call
+        @param args: positional arguments (plain scalars, tuples, lists or dicts)
+        @param list out: optional preallocated arrays to receive the result arrays into
+        @param kwargs: keyword arguments
+
+        @return: result of the method call
+
+        Raises UnsupportedArguments without contacting the server if the arguments can not be
+        sent over the bulk channel.
+        """
+        arrays = list()
+        try:
+            request = {'op': 'call',
+                       'module': module,
+                       'method': method,
+                       'args': _encode(list(args), arrays),
+                       'kwargs': _encode(kwargs, arrays),
+                       'compress': self.compress_level}
+        except UnsupportedResult as e:
+            raise UnsupportedArguments(str(e))
+        if arrays:
+            raise UnsupportedArguments('Array arguments can not be sent over the bulk channel.')
+        header, arrays = self._request(request, out=out)
+        if header['status'] == 'pickle':
+            return pickle.loads(arrays[0].tobytes())
+        return _decode(header['result'], arrays)
+
+    def _request(self, request, out=None):
+        with self._lock:
+            send_message(self._sock, request)
+            header, arrays = recv_message(self._sock, out=out)
+        if header['status'] not in ('ok', 'pickle'):
+            raise BulkTransferError(header.get('message', 'Unknown bulk transfer error.'))
+        return header, arrays
@@ -39,6 +39,18 @@ import ruamel.yaml as yaml
 from io import BytesIO
 
 
+class RawArrayReference:
+    """
+    Placeholder for a numpy array stored as raw .npy file. The file name is
+    relative to the directory of the YAML file referencing it.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+
+    def __repr__(self):
+        return '{0}({1!r})'.format(self.__class__.__name__, self.filename)
+
+
 def ordered_load(stream, Loader=yaml.Loader):
     """
     Loads a YAML formatted data from stream and puts it into an OrderedDict
@@ -80,6 +92,20 @@ def ordered_load(stream, Loader=yaml.Loader):
         arrays = numpy.load(filename)
         return arrays['array']
 
+    def construct_raw_ndarray(loader, node):
+        """
+        The constructor for a numpy array that is saved as raw .npy file next
+        to the config file. The array is memory-mapped copy-on-write, so the
+        data is only read from disk once it is actually accessed.
+        """
+        filename = loader.construct_yaml_str(node)
+        if not os.path.isabs(filename):
+            try:
+                filename = os.path.join(os.path.dirname(stream.name), filename)
+            except AttributeError:
+                pass
+        return numpy.load(filename, mmap_mode='c', allow_pickle=False)
+
     def construct_frozenset(loader, node):
         """
         The frozenset constructor.
@@ -120,6 +146,9 @@ def ordered_load(stream, Loader=yaml.Loader):
     OrderedLoader.add_constructor(
             '!extndarray',
             construct_external_ndarray)
+    OrderedLoader.add_constructor(
+            '!npyarray',
+            construct_raw_ndarray)
     OrderedLoader.add_constructor(
         '!frozenset',
         construct_frozenset)
@@ -136,13 +165,19 @@ def ordered_load(stream, Loader=yaml.Loader):
         return OrderedDict()
 
 
-def ordered_dump(data, stream=None, Dumper=yaml.Dumper, **kwds):
+def ordered_dump(data, stream=None, Dumper=yaml.Dumper, filename=None, array_files=None,
+                 **kwds):
     """
     dumps (OrderedDict) data in YAML format
 
     @param OrderedDict data: the data
     @param Stream stream: where the data in YAML is dumped
     @param Dumper Dumper: The dumper that is used as a base class
+    @param str filename: optional, name of the file the data ends up in. External .npz files
+                         of arrays are named after it. Defaults to the name of the stream.
+    @param list array_files: optional, if given the external .npz files are only written to
+                             temporary files and (temporary name, final name) of each is
+                             appended to it. The caller renames them once the dump succeeded.
     """
     class OrderedDumper(Dumper):
         """
@@ -176,6 +211,15 @@ def ordered_dump(data, stream=None, Dumper=yaml.Dumper, **kwds):
         """
         return dumper.represent_float(numpy.asscalar(float_data))
 
+    def represent_raw_ndarray(dumper, array_ref):
+        """
+        Representer for numpy ndarrays that have already been written to a raw
+        .npy file (see core.statusstorage)
+        """
+        node = dumper.represent_str(array_ref.filename)
+        node.tag = '!npyarray'
+        return node
+
     def represent_frozenset(dumper, set_data):
         """
         Representer for frozenset
@@ -188,17 +232,27 @@ def ordered_dump(data, stream=None, Dumper=yaml.Dumper, **kwds):
         """
         Representer for numpy ndarrays
         """
+        tmp_path = None
         try:
-            filename = os.path.splitext(os.path.basename(stream.name))[0]
-            configdir = os.path.dirname(stream.name)
+            final_name = stream.name if filename is None else filename
             newpath = '{0}-{1:06}.npz'.format(
-                os.path.join(configdir, filename),
+                os.path.join(os.path.dirname(final_name),
+                             os.path.splitext(os.path.basename(final_name))[0]),
                 dumper.external_ndarray_counter)
-            numpy.savez_compressed(newpath, array=array_data)
+            tmp_path = '{0}.tmp'.format(newpath)
+            # numpy would append .npz to the temporary name
+            with open(tmp_path, 'wb') as f:
+                numpy.savez_compressed(f, array=array_data)
+            if array_files is None:
+                os.replace(tmp_path, newpath)
+            else:
+                array_files.append((tmp_path, newpath))
             node = dumper.represent_str(newpath)
             node.tag = '!extndarray'
             dumper.external_ndarray_counter += 1
         except:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
             with BytesIO() as f:
                 numpy.savez_compressed(f, array=array_data)
                 compressed_string = f.getvalue()
@@ -222,6 +276,7 @@ def ordered_dump(data, stream=None, Dumper=yaml.Dumper, **kwds):
     # OrderedDumper.add_representer(numpy.float128, represent_float)
     OrderedDumper.add_representer(numpy.ndarray, represent_ndarray)
     OrderedDumper.add_representer(frozenset, represent_frozenset)
+    OrderedDumper.add_representer(RawArrayReference, represent_raw_ndarray)
 
     # dump data
     return yaml.dump(data, stream, OrderedDumper, **kwds)
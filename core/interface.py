@@ -164,3 +164,86 @@ def interface_method(func):
     @return InterfaceMethod: Instance of InterfaceMethod to replace the decorated callable
     """
     return InterfaceMethod(default_callable=func)
+
+
+# interface class -> {method name: dict of remote access flags}, filled by the decorators
+# returns_array and remote_cache. The flags are kept per class, since InterfaceMethod objects
+# of the same name are shared between interfaces.
+_remote_declarations = dict()
+
+
+class _RemoteDeclaration:
+    """
+    Placeholder returned by the decorators returns_array and remote_cache. When the class body is
+    executed, it records its flags for the owning class and puts the decorated method back in its
+    place.
+    """
+    def __init__(self, method):
+        self.method = method
+        self.flags = dict()
+
+    def __set_name__(self, owner, name):
+        _remote_declarations.setdefault(owner, dict())[name] = self.flags
+        setattr(owner, name, self.method)
+
+    # Makes this object compatible with abc.abstractmethod
+    @property
+    def __isabstractmethod__(self):
+        return getattr(self.method, '__isabstractmethod__', False)
+
+
+def _declare_remote(func, **flags):
+    declaration = func if isinstance(func, _RemoteDeclaration) else _RemoteDeclaration(func)
+    declaration.flags.update(flags)
+    return declaration
+
+
+def remote_declarations(cls):
+    """
+    Remote access flags of all methods of a class declared with returns_array or remote_cache in
+    the class itself or one of its (interface) base classes.
+
+    @param type cls: module or interface class
+    @return dict: method name -> dict with the keys 'returns_array' or 'remote_cache_ttl' and
+                  'remote_cache_by_value'
+    """
+    declarations = dict()
+    for base in reversed(cls.__mro__):
+        for name, flags in _remote_declarations.get(base, dict()).items():
+            declarations.setdefault(name, dict()).update(flags)
+    return declarations
+
+
+def returns_array(func):
+    """
+    Decorator to declare an interface method as returning numpy array data (or a tuple/dict
+    containing arrays and plain scalars).
+    Proxies of remote modules fetch the results of these methods over the binary bulk transfer
+    channel (see core.bulktransfer) instead of through rpyc, if the module server provides one.
+    Can be combined with (abstract_)interface_method and abc.abstractmethod. The declaration only
+    applies to the interface class it is used in (see remote_declarations).
+
+    @param callable func: The interface method to be decorated
+    @return: The decorated interface method
+    """
+    return _declare_remote(func, returns_array=True)
+
+
+def remote_cache(ttl=None, by_value=True):
+    """
+    Decorator factory to declare an interface method as read-mostly (e.g. hardware constraints).
+    Proxies of remote modules cache the results of these methods on the client side instead of
+    doing a network round trip for every call.
+
+    Cache entries with finite ttl are also discarded as soon as any other (uncached) method of the
+    module is called through the same proxy. Entries with ttl=None live until the connection is
+    closed or the cache is invalidated explicitly.
+
+    @param float ttl: time in seconds a cached result stays valid, None for constant results
+    @param bool by_value: cache a local copy (pickle) of the result instead of a reference to the
+                          remote object, so attribute access on the result is local as well
+    @return: Decorator
+    """
+    def decorator(func):
+        return _declare_remote(func, remote_cache_ttl=ttl, remote_cache_by_value=by_value)
+    return decorator
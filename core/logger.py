@@ -29,6 +29,8 @@ import logging
 import logging.handlers
 import os
 import sys
+import threading
+import time
 import traceback
 import functools
 from qtpy import QtCore
@@ -46,6 +48,8 @@ class QtLogFormatter(logging.Formatter):
         - exception: dictionary with keys:
           - message: the message
           - traceback: a traceback
+      Optional for progress records (see RateLimitedLogger.progress):
+        - progress: dictionary with keys key, current and total
     """
 
     def format(self, record):
@@ -71,6 +75,9 @@ class QtLogFormatter(logging.Formatter):
                     'traceback': traceback.format_exception(
                         *record.exc_info)[:-1]
                     }
+        progress = getattr(record, 'progress', None)
+        if progress is not None:
+            entry['progress'] = progress
 
         return entry
 
@@ -78,39 +85,263 @@ class QtLogFormatter(logging.Formatter):
 class QtLogHandler(QtCore.QObject, logging.Handler):
     """Log handler for displaying log records in a QT gui.
 
-      For each log record the Qt signal sigLoggedMessage is emitted
-      with a dictionary as parameter. The keys of this dictionary are:
+      Log records are collected and handed to the GUI in batches, at most once
+      per batch_interval. Consecutive identical messages within a batch are
+      merged into one entry with a count. Of several progress records with the
+      same key only the latest one is kept.
+
+      For each batch the Qt signal sigLoggedMessages is emitted with a list of
+      entries, for each entry the signal sigLoggedMessage is emitted with a
+      dictionary as parameter. The keys of this dictionary are:
         - name: logger name
         - message: the message
         - timestamp: the creation time of the log record
         - level: log level
+        - count: number of identical consecutive messages merged into this entry
       Optional if an exception is logged:
         - exception: dictionary with keys:
           - message: the message
           - traceback: a traceback
+      Optional for progress records:
+        - progress: dictionary with keys key, current and total
 
       @param object parent: parent of QObject, defaults to None
       @param int level: log level, defaults to NOTSET
+      @param float batch_interval: time in s log records are collected before they are emitted
     """
 
     sigLoggedMessage = QtCore.Signal(object)
     """signal emitted for each log record"""
+    sigLoggedMessages = QtCore.Signal(object)
+    """signal emitted for each batch of log records"""
+    _sigScheduleFlush = QtCore.Signal()
 
-    def __init__(self, parent=None, level=0):
+    def __init__(self, parent=None, level=0, batch_interval=0.05):
         QtCore.QObject.__init__(self, parent)
         logging.Handler.__init__(self, level)
         self.setFormatter(QtLogFormatter())
+        self.batch_interval = batch_interval
+        self._batch = list()
+        self._batch_lock = threading.Lock()
+        self._flush_scheduled = False
+        self._sigScheduleFlush.connect(self._schedule_flush, QtCore.Qt.QueuedConnection)
 
     def emit(self, record):
         """Emit function of handler.
 
-          Formats the log record and emits :sigLoggedMessage:
+          Formats the log record and schedules emission of :sigLoggedMessages:
 
           @param object record: :logging.LogRecord:
         """
         record = self.format(record)
-        if record:
-            self.sigLoggedMessage.emit(record)
+        if not record:
+            return
+        record['count'] = 1
+        with self._batch_lock:
+            self._batch.append(record)
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+        if QtCore.QCoreApplication.instance() is None:
+            # no event loop (yet) to schedule the batch
+            self.flush_batch()
+        else:
+            self._sigScheduleFlush.emit()
+
+    @QtCore.Slot()
+    def _schedule_flush(self):
+        QtCore.QTimer.singleShot(int(round(self.batch_interval * 1000)), self.flush_batch)
+
+    @QtCore.Slot()
+    def flush_batch(self):
+        """ Emit all collected log records now. """
+        with self._batch_lock:
+            batch = self._batch
+            self._batch = list()
+            self._flush_scheduled = False
+        entries = list()
+        progress_index = dict()
+        for entry in batch:
+            progress = entry.get('progress')
+            if progress is not None:
+                if progress['key'] in progress_index:
+                    entries[progress_index[progress['key']]] = entry
+                    continue
+                progress_index[progress['key']] = len(entries)
+            elif entries and 'exception' not in entry and 'progress' not in entries[-1]:
+                last = entries[-1]
+                if (last['name'] == entry['name'] and last['level'] == entry['level']
+                        and last['message'] == entry['message'] and 'exception' not in last):
+                    last['count'] += 1
+                    last['timestamp'] = entry['timestamp']
+                    continue
+            entries.append(entry)
+        if not entries:
+            return
+        for entry in entries:
+            self.sigLoggedMessage.emit(entry)
+        self.sigLoggedMessages.emit(entries)
+
+
+class ProgressFilter(logging.Filter):
+    """ Log filter letting through progress records (see RateLimitedLogger.progress) of the same
+    key at most once per interval, but always the first and the final one.
+
+      @param float interval: minimum time in s between two progress records of the same key
+    """
+    def __init__(self, interval=10.0):
+        super().__init__()
+        self.interval = interval
+        self._last_time = dict()
+
+    def filter(self, record):
+        progress = getattr(record, 'progress', None)
+        if progress is None:
+            return True
+        now = time.monotonic()
+        key = progress['key']
+        if progress['current'] >= progress['total']:
+            self._last_time.pop(key, None)
+            return True
+        if key in self._last_time and now - self._last_time[key] < self.interval:
+            return False
+        self._last_time[key] = now
+        return True
+
+
+class RateLimitedLogger:
+    """ Wrapper around a logger for messages issued from hot loops.
+
+    Messages are rate limited per call site (or per explicitly given key): within interval
+    seconds after a message has been logged, further messages from the same site are
+    suppressed and only counted. The next message that passes reports the number of
+    suppressed messages, identical ones are coalesced into a repetition count.
+
+    Suppressed messages are only reported by a later message of the same site, so callers
+    must call flush() when their measurement or scan stops. Otherwise the count of the
+    messages suppressed last is lost.
+
+    Progress (e.g. of a scan) should be reported with progress(). These records update a
+    single entry in the GUI log instead of appending a new line each time.
+
+    Usage in a module:
+        self._limited_log = RateLimitedLogger(self.log, interval=1)
+        for ii in range(n):
+            self._limited_log.progress('scan', ii + 1, n, 'Scanning point')
+            self._limited_log.warning('Value out of range')
+        self._limited_log.flush()
+    """
+
+    def __init__(self, logger, interval=1.0, progress_interval=0.2):
+        """
+          @param logging.Logger logger: the logger to write to
+          @param float interval: default minimum time in s between messages of a call site
+          @param float progress_interval: minimum time in s between two progress records
+        """
+        self.logger = logger
+        self.interval = interval
+        self.progress_interval = progress_interval
+        self._lock = threading.Lock()
+        # key -> dict(last_time, level, message, suppressed, identical)
+        self._sites = dict()
+        self._last_progress = dict()
+
+    def debug(self, msg, *args, key=None, interval=None):
+        self._log(logging.DEBUG, msg, args, key, interval)
+
+    def info(self, msg, *args, key=None, interval=None):
+        self._log(logging.INFO, msg, args, key, interval)
+
+    def warning(self, msg, *args, key=None, interval=None):
+        self._log(logging.WARNING, msg, args, key, interval)
+
+    def error(self, msg, *args, key=None, interval=None):
+        self._log(logging.ERROR, msg, args, key, interval)
+
+    def log(self, level, msg, *args, key=None, interval=None):
+        """ Log a rate limited message.
+
+          @param int level: log level
+          @param str msg: message, formatted with args like in logging
+          @param key: hashable identifier of the rate limit. Defaults to the call site.
+          @param float interval: minimum time in s between two messages of this key
+        """
+        self._log(level, msg, args, key, interval)
+
+    def _log(self, level, msg, args, key, interval):
+        if not self.logger.isEnabledFor(level):
+            return
+        if key is None:
+            frame = sys._getframe(2)
+            key = (frame.f_code.co_filename, frame.f_lineno)
+        if interval is None:
+            interval = self.interval
+        message = msg % args if args else msg
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.get(key)
+            if site is not None and now - site['last_time'] < interval:
+                site['identical'] = site['identical'] and message == site['message']
+                site['suppressed'] += 1
+                site['level'] = max(site['level'], level)
+                site['message'] = message
+                return
+            suppressed = 0 if site is None else site['suppressed']
+            identical = site is not None and site['identical'] and message == site['message']
+            self._sites[key] = {'last_time': now, 'level': level, 'message': message,
+                                'suppressed': 0, 'identical': True}
+        self.logger.log(level, self._annotate(message, suppressed, identical))
+
+    @staticmethod
+    def _annotate(message, suppressed, identical):
+        if suppressed == 0:
+            return message
+        if identical:
+            return '{0} [repeated {1:d} times]'.format(message, suppressed + 1)
+        return '{0} [{1:d} similar messages suppressed]'.format(message, suppressed)
+
+    def flush(self):
+        """ Log the last suppressed message of every call site together with its count.
+
+        Call this when the measurement or scan using this logger stops.
+        """
+        with self._lock:
+            pending = [site for site in self._sites.values() if site['suppressed'] > 0]
+            self._sites.clear()
+            self._last_progress.clear()
+        for site in pending:
+            if site['identical']:
+                message = '{0} [repeated {1:d} times]'.format(site['message'],
+                                                              site['suppressed'])
+            else:
+                message = self._annotate(site['message'], site['suppressed'] - 1, False)
+            self.logger.log(site['level'], message)
+
+    def progress(self, key, current, total, msg='', level=logging.INFO):
+        """ Report progress. Updates one entry in the GUI log instead of adding new lines.
+
+          @param str key: identifier of the progress (e.g. name of the measurement)
+          @param int current: number of finished steps
+          @param int total: total number of steps
+          @param str msg: message shown in front of the progress
+          @param int level: log level
+        """
+        if not self.logger.isEnabledFor(level):
+            return
+        now = time.monotonic()
+        finished = current >= total
+        with self._lock:
+            last = self._last_progress.get(key)
+            if not finished and last is not None and now - last < self.progress_interval:
+                return
+            if finished:
+                self._last_progress.pop(key, None)
+            else:
+                self._last_progress[key] = now
+        percent = 100 * current / total if total else 100
+        self.logger.log(level,
+                        '{0} {1}/{2} ({3:.1f}% finished)'.format(msg, current, total, percent),
+                        extra={'progress': {'key': key, 'current': current, 'total': total}})
 
 
 def initialize_logger(path=''):
@@ -139,6 +370,7 @@ def initialize_logger(path=''):
         datefmt="%Y-%m-%d %H:%M:%S"))
     rotating_file_handler.doRollover()
     rotating_file_handler.setLevel(logging.DEBUG)
+    rotating_file_handler.addFilter(ProgressFilter())
     logger.addHandler(rotating_file_handler)
 
     # add Qt log handler
@@ -37,10 +37,12 @@ from qtpy import QtCore
 from . import config
 
 from .util.mutex import Mutex  # Mutex provides access serialization between threads
+from .util.profiling import profiler
 from .util.modules import toposort, is_base
 from collections import OrderedDict
 from .logger import register_exception_handler
 from .threadmanager import ThreadManager
+from .statusstorage import StatusVariableStorage
 
 # try to import RemoteObjectManager. Might fail if rpyc is not installed.
 try:
@@ -106,6 +108,8 @@ class Manager(QtCore.QObject):
         self.baseDir = None
         self.alreadyQuit = False
         self.remote_server = False
+        self.status_storage = StatusVariableStorage()
+        self._status_checkpoint_timer = None
 
         try:
             # Initialize parent class QObject
@@ -136,6 +140,29 @@ class Manager(QtCore.QObject):
             self.configDir = os.path.dirname(config_file)
             self.readConfig(config_file)
 
+            # Status variable storage format and periodic checkpoints of active modules
+            self._status_checkpoint_timer = QtCore.QTimer()
+            self._status_checkpoint_timer.timeout.connect(self.checkpointStatusVariables)
+            status_config = self.tree['global'].get('status_variables', dict())
+            if not isinstance(status_config, dict):
+                logger.error('"status_variables" entry in "global" section of configuration '
+                             'file is not a dictionary.')
+                status_config = dict()
+            self.status_storage.binary = status_config.get('format', 'binary') != 'yaml'
+            self.status_storage.write_delay = float(status_config.get('write_delay', 1.0))
+            checkpoint_interval = float(status_config.get('checkpoint_interval', 0))
+            if checkpoint_interval > 0:
+                self._status_checkpoint_timer.start(int(checkpoint_interval * 1000))
+
+            # Profiling of instrumented measurement loops and hardware calls
+            profiling_config = self.tree['global'].get('profiling', dict())
+            if not isinstance(profiling_config, dict):
+                logger.error('"profiling" entry in "global" section of configuration '
+                             'file is not a dictionary.')
+                profiling_config = dict()
+            profiler.size = int(profiling_config.get('samples', 1000))
+            profiler.enable(profiling_config.get('enabled', False))
+
             # check first if remote support is enabled and if so create RemoteObjectManager
             if RemoteObjectManager is None:
                 logger.error('Remote modules disabled. Rpyc not installed.')
@@ -167,8 +194,10 @@ class Manager(QtCore.QObject):
                             if (cacertfile is not None) and not os.path.isabs(cacertfile):
                                 cacertfile = os.path.abspath(os.path.join(self.configDir,
                                                                           cacertfile))
+                            bulk_port = self.tree['global']['module_server'].get('bulk_port',
+                                                                                 None)
                             self.rm.createServer(server_address, server_port, certfile, keyfile,
-                                                 cacertfile)
+                                                 cacertfile, bulk_port)
                             # successfully started remote server
                             logger.info('Started server rpyc://{0}:{1}'.format(server_address,
                                                                                server_port))
@@ -758,11 +787,15 @@ class Manager(QtCore.QObject):
                     certfile = defined_module.get('certfile', None)
                     keyfile = defined_module.get('keyfile', None)
                     cacertsfile = defined_module.get('cacerts', None)
+                    bulk_compression = defined_module.get('bulk_compression', 0)
+                    cache_config = defined_module.get('remote_cache', None)
                     instance = self.rm.getRemoteModuleUrl(
                         defined_module['remote'],
                         certfile=certfile,
                         keyfile=keyfile,
-                        cacertsfile=cacertsfile)
+                        cacertsfile=cacertsfile,
+                        bulk_compression=bulk_compression,
+                        cache_config=cache_config)
                     logger.info('Remote module {0} loaded as {1}.{2}.'
                                 ''.format(defined_module['remote'], base, key))
                     with self.lock:
@@ -1265,6 +1298,20 @@ class Manager(QtCore.QObject):
 
         logger.info('Start all modules finished.')
 
+    def getStatusFileName(self, base, module, classname=None):
+        """ Get the path of the status variable file of a module.
+
+          @param str base: the module category
+          @param str module: the unique module name
+          @param str classname: class name of the module. Taken from the loaded module if None.
+
+          @return str: path of the status variable file
+        """
+        if classname is None:
+            classname = self.tree['loaded'][base][module].__class__.__name__
+        return os.path.join(self.getStatusDir(),
+                            'status-{0}_{1}_{2}.cfg'.format(classname, base, module))
+
     def getStatusDir(self):
         """ Get the directory where the app state is saved, create it if necessary.
 
@@ -1285,11 +1332,8 @@ class Manager(QtCore.QObject):
         """
         if len(variables) > 0:
             try:
-                statusdir = self.getStatusDir()
-                classname = self.tree['loaded'][base][module].__class__.__name__
-                filename = os.path.join(statusdir,
-                                        'status-{0}_{1}_{2}.cfg'.format(classname, base, module))
-                config.save(filename, variables)
+                # written asynchronously. Loading the same file waits for the write to finish.
+                self.status_storage.save(self.getStatusFileName(base, module), variables, delay=0)
             except:
                 print(variables)
                 logger.exception('Failed to save status variables of module '
@@ -1304,29 +1348,39 @@ class Manager(QtCore.QObject):
           @return dict: dictionary of satus variable names and values
         """
         try:
-            statusdir = self.getStatusDir()
-            classname = self.tree['loaded'][base][module].__class__.__name__
-            filename = os.path.join(
-                statusdir, 'status-{0}_{1}_{2}.cfg'.format(classname, base, module))
-            if os.path.isfile(filename):
-                variables = config.load(filename)
-            else:
-                variables = OrderedDict()
+            variables = self.status_storage.load(self.getStatusFileName(base, module))
         except:
             logger.exception('Failed to load status variables.')
             variables = OrderedDict()
         return variables
 
+    @QtCore.Slot()
+    def checkpointStatusVariables(self):
+        """ Save the status variables of all active local modules without deactivating them.
+
+        Called periodically if "checkpoint_interval" is configured in the "status_variables"
+        entry of the "global" configuration section. Writes are debounced by "write_delay" and
+        happen in the background.
+        """
+        for base in ('hardware', 'logic', 'gui'):
+            for name, module in list(self.tree['loaded'][base].items()):
+                if self.isModuleDefined(base, name) and 'remote' in self.tree['defined'][base][name]:
+                    continue
+                try:
+                    if module.module_state() not in ('idle', 'running', 'locked'):
+                        continue
+                    variables = module.collect_status_variables()
+                    if len(variables) > 0:
+                        self.status_storage.save(self.getStatusFileName(base, name), variables)
+                except:
+                    logger.exception('Failed to checkpoint status variables of module '
+                                     '{0}.{1}.'.format(base, name))
+
     @QtCore.Slot(str, str)
     def removeStatusFile(self, base, module):
         try:
-            statusdir = self.getStatusDir()
-            classname = self.tree['defined'][base][
-                module]['module.Class'].split('.')[-1]
-            filename = os.path.join(
-                statusdir, 'status-{0}_{1}_{2}.cfg'.format(classname, base, module))
-            if os.path.isfile(filename):
-                os.remove(filename)
+            classname = self.tree['defined'][base][module]['module.Class'].split('.')[-1]
+            self.status_storage.remove(self.getStatusFileName(base, module, classname))
         except:
             logger.exception('Failed to remove module status file.')
 
@@ -1356,6 +1410,8 @@ class Manager(QtCore.QObject):
     @QtCore.Slot(bool)
     def realQuit(self, restart=False):
         """ Stop all modules, no questions asked. """
+        if self._status_checkpoint_timer is not None:
+            self._status_checkpoint_timer.stop()
         deps = self.getAllRecursiveModuleDependencies(self.tree['loaded'])
         sorteddeps = toposort(deps)
         for b, mods in self.tree['loaded'].items():
@@ -1375,6 +1431,8 @@ class Manager(QtCore.QObject):
                 logger.info('Deactivating module {0}.{1}'.format(base, module))
                 self.deactivateModule(base, module)
             QtCore.QCoreApplication.processEvents()
+        if not self.status_storage.shutdown(timeout=60):
+            logger.error('Timeout while writing status variables to disk.')
         self.sigManagerQuit.emit(self, bool(restart))
 
     @QtCore.Slot(object)
@@ -233,14 +233,27 @@ class BaseMixin(metaclass=ModuleMeta):
             raise e
         finally:
             # save status vars even if deactivation failed
-            for vname, var in self._stat_vars.items():
-                if hasattr(self, var.var_name):
-                    value = getattr(self, var.var_name)
-                    if not isinstance(value, StatusVar):
-                        if var.representer_function is None:
-                            self._statusVariables[var.name] = value
-                        else:
-                            self._statusVariables[var.name] = var.representer_function(self, value)
+            self._statusVariables = self.collect_status_variables()
+
+    def collect_status_variables(self):
+        """ Collect the current values of all status variables as they would be saved on
+            deactivation. Used by the manager to checkpoint the state of running modules.
+
+            Values are read without locking. Representer functions should therefore not modify
+            the module.
+
+            @return OrderedDict: status variable names and (represented) values
+        """
+        variables = OrderedDict(self._statusVariables)
+        for vname, var in self._stat_vars.items():
+            if hasattr(self, var.var_name):
+                value = getattr(self, var.var_name)
+                if not isinstance(value, StatusVar):
+                    if var.representer_function is None:
+                        variables[var.name] = value
+                    else:
+                        variables[var.name] = var.representer_function(self, value)
+        return variables
 
     @property
     def log(self):
@@ -25,9 +25,18 @@ logger = logging.getLogger(__name__)
 
 from qtpy.QtCore import QObject
 from urllib.parse import urlparse
+from collections import OrderedDict
+import functools
+import pickle
 import ssl
+import threading
+import time
 from .util.models import DictTableModel, ListTableModel
+from .bulktransfer import BulkTransferServer, BulkTransferClient, UnsupportedArguments
+from .interface import remote_declarations
+from .util.profiling import profiler
 import rpyc
+import rpyc.utils.classic
 from rpyc.utils.server import ThreadedServer
 rpyc.core.protocol.DEFAULT_CONFIG['allow_pickle'] = True
 import os
@@ -69,6 +78,7 @@ class RemoteObjectManager(QObject):
         self.tm = manager.tm
         self.manager = manager
         self.server = None
+        self.bulk_server = None
         self.remoteModules = ListTableModel()
         self.remoteModules.headers[0] = 'Remote Modules'
         self.sharedModules = DictTableModel()
@@ -82,6 +92,7 @@ class RemoteObjectManager(QObject):
             """
             modules = self.sharedModules
             _manager = self.manager
+            _remote_object_manager = self
 
             @classmethod
             def get_service_name(cls):
@@ -121,13 +132,86 @@ class RemoteObjectManager(QObject):
                     else:
                         logger.error('Client requested a module that is not shared.')
                         return None
+
+            def exposed_getCachedMethods(self, name):
+                """ Read-mostly methods of a shared module declared with
+                    core.interface.remote_cache.
+
+                  @param str name: unique module name
+
+                  @return tuple: (method name, ttl, by_value) for each cached method
+                """
+                module = self.modules.storage[str(name)]
+                declarations = remote_declarations(type(module))
+                return tuple((method, flags['remote_cache_ttl'], flags['remote_cache_by_value'])
+                             for method, flags in declarations.items()
+                             if 'remote_cache_ttl' in flags)
+
+            def exposed_batchCall(self, name, pickled_calls):
+                """ Execute several method calls of a shared module in one round trip.
+
+                  @param str name: unique module name
+                  @param bytes pickled_calls: pickled list of (method, args, kwargs)
+
+                  @return bytes: pickled list of (success, pickled result or exception)
+                """
+                module = self.modules.storage[str(name)]
+                results = list()
+                for method, args, kwargs in pickle.loads(bytes(pickled_calls)):
+                    try:
+                        if method.startswith('_'):
+                            raise AttributeError('Private methods can not be called remotely.')
+                        value = getattr(module, method)(*args, **kwargs)
+                        results.append((True, pickle.dumps(value, pickle.HIGHEST_PROTOCOL)))
+                    except Exception as e:
+                        try:
+                            payload = pickle.dumps(e, pickle.HIGHEST_PROTOCOL)
+                        except Exception:
+                            payload = pickle.dumps(RuntimeError(repr(e)))
+                        results.append((False, payload))
+                return pickle.dumps(results, pickle.HIGHEST_PROTOCOL)
+
+            def exposed_getProfilingData(self, name=None, bins=0):
+                """ Profiling statistics of the modules of this qudi instance.
+                    See core.util.profiling.
+
+                  @param str name: only return statistics of this module, None for all
+                  @param int bins: if > 0 include histograms with this many bins
+
+                  @return bytes: pickled dict module -> section -> kind -> statistics
+                """
+                return pickle.dumps(profiler.snapshot(None if name is None else str(name),
+                                                      bins=int(bins)),
+                                    pickle.HIGHEST_PROTOCOL)
+
+            def exposed_getBulkTransferPort(self):
+                """ Port of the bulk transfer channel for array data.
+
+                  @return int: port number or None if no bulk transfer server is running
+                """
+                if self._remote_object_manager.bulk_server is None:
+                    return None
+                return self._remote_object_manager.bulk_server.port
         return RemoteModuleService
 
-    def createServer(self, hostname, port, certfile=None, keyfile=None, cacertfile=None):
+    def createServer(self, hostname, port, certfile=None, keyfile=None, cacertfile=None,
+                     bulk_port=None):
         """ Start the rpyc modules server on a given port.
 
           @param int port: port where the server should be running
+          @param int bulk_port: port of the bulk transfer channel for array data. None disables it.
         """
+        if bulk_port is not None:
+            authenticator = None
+            if certfile is not None and keyfile is not None:
+                authenticator = SSLAuthenticator(server_key_file=keyfile,
+                                                 server_cert_file=certfile,
+                                                 ca_certs=cacertfile)
+            self.bulk_server = BulkTransferServer(self.sharedModules, hostname, bulk_port,
+                                                  authenticator=authenticator)
+            self.bulk_server.start()
+            logger.info('Started bulk transfer server at {0} on port {1}'
+                        ''.format(hostname, self.bulk_server.port))
         thread = self.tm.newThread('rpyc-server')
         if certfile is not None and keyfile is not None:
             self.server = RPyCServer(
@@ -153,6 +237,9 @@ class RemoteObjectManager(QObject):
         if self.server is not None:
             self.server.close()
             self.server = None
+        if self.bulk_server is not None:
+            self.bulk_server.close()
+            self.bulk_server = None
 
     def shareModule(self, name, obj):
         """ Add a module to the list of modules that can be accessed remotely.
@@ -174,22 +261,27 @@ class RemoteObjectManager(QObject):
             logger.error('Module {0} was not shared.'.format(name))
         self.sharedModules.pop(name)
 
-    def getRemoteModuleUrl(self, url, certfile=None, keyfile=None, cacertsfile=None):
+    def getRemoteModuleUrl(self, url, certfile=None, keyfile=None, cacertsfile=None,
+                           bulk_compression=0, cache_config=None):
         """ Get a remote module via its URL.
 
           @param str url: URL pointing to a module hosted b a remote server
           @param str certfile: filename of certificate or None if SSL is not used
           @param str keyfile: filename of key or None if SSL is not used
           @param str cacertsfile: filename of cacerts of None if SSL is not used
+          @param int bulk_compression: zlib level for array transfers, 0 disables compression
+          @param dict cache_config: method name -> cache ttl in s (None: constant, 0: no caching)
+                                    overriding the remote_cache declarations of the module
 
           @return object: remote module
         """
         parsed = urlparse(url)
         name = parsed.path.replace('/', '')
         return self.getRemoteModule(parsed.hostname, parsed.port, name, certfile, keyfile,
-                                    cacertsfile)
+                                    cacertsfile, bulk_compression, cache_config)
 
-    def getRemoteModule(self, host, port, name, certfile=None, keyfile=None, cacertsfile=None):
+    def getRemoteModule(self, host, port, name, certfile=None, keyfile=None, cacertsfile=None,
+                        bulk_compression=0, cache_config=None):
         """ Get a remote module via its host, port and name.
 
           @param str host: host that the remote module server is running on
@@ -198,14 +290,26 @@ class RemoteObjectManager(QObject):
           @param str certfile: filename of certificate or None if SSL is not used
           @param str keyfile: filename of key or None if SSL is not used
           @param str cacertsfile: filename of cacerts of None if SSL is not used
+          @param int bulk_compression: zlib level for array transfers, 0 disables compression
+          @param dict cache_config: method name -> cache ttl in s (None: constant, 0: no caching)
+                                    overriding the remote_cache declarations of the module
 
           @return object: remote module
         """
         module = RemoteModule(host, port, name, certfile=certfile, keyfile=keyfile,
-                              cacertsfile=cacertsfile)
+                              cacertsfile=cacertsfile, bulk_compression=bulk_compression,
+                              cache_config=cache_config)
         self.remoteModules.append(module)
         return module.module
 
+    def getCallStatistics(self):
+        """ Call counts and latencies of all remote modules used by this qudi instance.
+
+          @return dict: module name -> method name -> dict of counters and latencies in seconds
+        """
+        return {module.name: module.module.get_call_statistics()
+                for module in self.remoteModules.storage if module.module is not None}
+
 
 class RPyCServer(QObject):
     """ Contains a RPyC server that serves modules to remote computers. Runs in a QThread.
@@ -255,7 +359,8 @@ class RPyCServer(QObject):
 class RemoteModule:
     """ This class represents a module on a remote computer and holds a reference to it.
     """
-    def __init__(self, host, port, name, certfile=None, keyfile=None, cacertsfile=None):
+    def __init__(self, host, port, name, certfile=None, keyfile=None, cacertsfile=None,
+                 bulk_compression=0, cache_config=None):
         if certfile is not None and keyfile is not None:
             if not os.path.exists(certfile):
                 raise Exception('SSL certificate {0} does not exist.'.format(certfile))
@@ -273,5 +378,420 @@ class RemoteModule:
                 cert_reqs=ssl.CERT_REQUIRED)
         else:
             self.connection = rpyc.connect(host, port, config={'allow_all_attrs': True})
-        self.module = self.connection.root.getModule(name)
         self.name = name
+        self.bulk_client = None
+        remote_module = self.connection.root.getModule(name)
+
+        # Use the bulk transfer channel for array-returning methods if the server provides one
+        bulk_methods = list()
+        try:
+            bulk_port = self.connection.root.getBulkTransferPort()
+        except AttributeError:
+            # server of an older qudi version
+            bulk_port = None
+        if bulk_port is not None:
+            try:
+                self.bulk_client = BulkTransferClient(host,
+                                                      bulk_port,
+                                                      certfile=certfile,
+                                                      keyfile=keyfile,
+                                                      cacertsfile=cacertsfile,
+                                                      compress_level=bulk_compression)
+                bulk_methods = self.bulk_client.describe(name)
+            except Exception:
+                logger.exception('Could not connect to bulk transfer channel of remote module '
+                                 '{0}. Falling back to rpyc.'.format(name))
+                self.bulk_client = None
+        if remote_module is None:
+            self.module = None
+            return
+
+        # Read-mostly methods declared with core.interface.remote_cache, updated by the config
+        try:
+            cached_methods = {method: (ttl, by_value)
+                              for method, ttl, by_value
+                              in self.connection.root.getCachedMethods(name)}
+            batch_call = self.connection.root.batchCall
+        except AttributeError:
+            # server of an older qudi version
+            cached_methods = dict()
+            batch_call = None
+        try:
+            profiling_data = self.connection.root.getProfilingData
+        except AttributeError:
+            profiling_data = None
+        if cache_config is not None:
+            for method, ttl in cache_config.items():
+                if ttl == 0:
+                    cached_methods.pop(method, None)
+                else:
+                    cached_methods[method] = (ttl, True)
+        self.module = RemoteModuleProxy(remote_module,
+                                        name,
+                                        bulk_client=self.bulk_client,
+                                        bulk_methods=bulk_methods,
+                                        cached_methods=cached_methods,
+                                        batch_call=batch_call,
+                                        profiling_data=profiling_data)
+
+
+class RemoteCallStatistics:
+    """ Call counts and latencies of the methods called through a remote module proxy.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = OrderedDict()
+
+    def record(self, method, latency=0.0, cache_hit=False, batched=False):
+        """ Add a call to the statistics.
+
+          @param str method: name of the called method
+          @param float latency: duration of the network round trip in seconds
+          @param bool cache_hit: the result was served from the client side cache
+          @param bool batched: the call was sent as part of a batch
+        """
+        with self._lock:
+            stats = self._stats.setdefault(
+                method,
+                {'calls': 0, 'cache_hits': 0, 'batched_calls': 0, 'remote_calls': 0,
+                 'total_latency': 0.0, 'max_latency': 0.0})
+            stats['calls'] += 1
+            if cache_hit:
+                stats['cache_hits'] += 1
+            elif batched:
+                stats['batched_calls'] += 1
+            else:
+                stats['remote_calls'] += 1
+                stats['total_latency'] += latency
+                stats['max_latency'] = max(stats['max_latency'], latency)
+
+    def as_dict(self):
+        """ Copy of the statistics including the mean round trip latency per method.
+
+          @return OrderedDict: method name -> dict of counters and latencies in seconds
+        """
+        with self._lock:
+            result = OrderedDict()
+            for method, stats in self._stats.items():
+                result[method] = dict(stats)
+                result[method]['mean_latency'] = (stats['total_latency'] / stats['remote_calls']
+                                                  if stats['remote_calls'] else 0.0)
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+class RemoteModuleProxy:
+    """ Local stand-in for the rpyc reference to a remote module.
+
+    All attribute access is forwarded to the remote module. On top of that the proxy
+      - calls methods declared with core.interface.returns_array over the bulk transfer channel,
+      - caches results of methods declared with core.interface.remote_cache,
+      - offers asynchronous calls (call_async) and batches of calls sent in one round trip (batch),
+      - counts calls and round trip latencies per method (get_call_statistics).
+    """
+    def __init__(self, module, name, bulk_client=None, bulk_methods=(), cached_methods=None,
+                 batch_call=None, profiling_data=None):
+        """
+          @param module: rpyc reference to the remote module
+          @param str name: name of the module on the remote server
+          @param BulkTransferClient bulk_client: bulk transfer connection or None
+          @param list bulk_methods: names of methods to call over the bulk transfer channel
+          @param dict cached_methods: method name -> (ttl, by_value) of read-mostly methods
+          @param callable batch_call: batchCall of the remote module service or None
+          @param callable profiling_data: getProfilingData of the remote module service or None
+        """
+        object.__setattr__(self, '_proxy_module', module)
+        object.__setattr__(self, '_proxy_name', name)
+        object.__setattr__(self, '_proxy_bulk_client', bulk_client)
+        object.__setattr__(self, '_proxy_bulk_methods',
+                           frozenset(bulk_methods) if bulk_client is not None else frozenset())
+        object.__setattr__(self, '_proxy_cached_methods',
+                           dict() if cached_methods is None else dict(cached_methods))
+        object.__setattr__(self, '_proxy_batch_call', batch_call)
+        object.__setattr__(self, '_proxy_profiling_data', profiling_data)
+        object.__setattr__(self, '_proxy_cache', dict())
+        object.__setattr__(self, '_proxy_cache_lock', threading.Lock())
+        object.__setattr__(self, '_proxy_statistics', RemoteCallStatistics())
+
+    @property
+    def __class__(self):
+        # make isinstance and interface checks of connectors see the remote class
+        return self._proxy_module.__class__
+
+    def __getattr__(self, name):
+        if name in self._proxy_bulk_methods or (
+                not name.startswith('_')
+                and callable(getattr(type(self._proxy_module), name, None))):
+            # rpyc creates the methods of the remote class locally on the netref class, so this
+            # check does not need a round trip
+            return functools.partial(self._proxy_call, name)
+        return getattr(self._proxy_module, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._proxy_module, name, value)
+
+    def __delattr__(self, name):
+        delattr(self._proxy_module, name)
+
+    def __dir__(self):
+        return dir(self._proxy_module)
+
+    def __repr__(self):
+        return repr(self._proxy_module)
+
+    def __str__(self):
+        return str(self._proxy_module)
+
+    def fetch_into(self, out, method, *args, **kwargs):
+        """ Call an array-returning method and receive the result arrays directly into
+        preallocated arrays (if dtype and shape match, otherwise new arrays are returned).
+
+          @param list out: preallocated arrays in the order they appear in the result
+          @param str method: name of the remote method
+          @param args: positional arguments of the remote method
+          @param kwargs: keyword arguments of the remote method
+
+          @return: result of the remote method
+        """
+        if method not in self._proxy_bulk_methods:
+            return self._proxy_call(method, *args, **kwargs)
+        self._proxy_invalidate_cache(constant=False)
+        start = time.perf_counter()
+        result = self._proxy_bulk_call(method, out, *args, **kwargs)
+        self._proxy_statistics.record(method, time.perf_counter() - start)
+        return result
+
+    def call_async(self, method, *args, **kwargs):
+        """ Call a remote method without waiting for the result. Several asynchronous calls are
+        pipelined on the connection.
+
+          @param str method: name of the remote method
+          @param args: positional arguments of the remote method
+          @param kwargs: keyword arguments of the remote method
+
+          @return rpyc.AsyncResult: result handle (see rpyc documentation)
+        """
+        self._proxy_invalidate_cache(constant=False)
+        start = time.perf_counter()
+        async_result = rpyc.async_(getattr(self._proxy_module, method))(*args, **kwargs)
+        async_result.add_callback(
+            lambda res: self._proxy_statistics.record(method, time.perf_counter() - start))
+        return async_result
+
+    def batch(self):
+        """ Collect several calls and send them in a single round trip.
+
+        Usage:
+            with module.batch() as batch:
+                constraints = batch.get_constraints()
+                status = batch.get_status()
+            print(constraints.value, status.value)
+
+          @return RemoteCallBatch: batch to add calls to. Executed when leaving the with-block.
+        """
+        return RemoteCallBatch(self)
+
+    def get_call_statistics(self):
+        """ Call counts, cache hits and round trip latencies per method.
+
+          @return OrderedDict: method name -> dict of counters and latencies in seconds
+        """
+        return self._proxy_statistics.as_dict()
+
+    def reset_call_statistics(self):
+        self._proxy_statistics.reset()
+
+    def invalidate_cache(self):
+        """ Discard all cached results. """
+        self._proxy_invalidate_cache(constant=True)
+
+    def get_profiling_data(self, bins=0):
+        """ Profiling statistics of the remote module collected on the server.
+            See core.util.profiling.
+
+          @param int bins: if > 0 include histograms with this many bins
+
+          @return dict: section -> kind -> statistics
+        """
+        if self._proxy_profiling_data is None:
+            raise NotImplementedError('The remote qudi instance does not provide profiling data.')
+        data = pickle.loads(bytes(self._proxy_profiling_data(self._proxy_name, bins)))
+        return data.get(self._proxy_name, OrderedDict())
+
+    def _proxy_call(self, method, *args, **kwargs):
+        key = self._proxy_cache_key(method, args, kwargs)
+        if key is not None:
+            found, result = self._proxy_cache_lookup(key)
+            if found:
+                self._proxy_statistics.record(method, cache_hit=True)
+                return result
+        elif method not in self._proxy_cached_methods:
+            # the call might change the state of the module
+            self._proxy_invalidate_cache(constant=False)
+
+        start = time.perf_counter()
+        if method in self._proxy_bulk_methods:
+            result = self._proxy_bulk_call(method, None, *args, **kwargs)
+        else:
+            result = getattr(self._proxy_module, method)(*args, **kwargs)
+        self._proxy_statistics.record(method, time.perf_counter() - start)
+
+        if key is not None:
+            result = self._proxy_cache_store(key, result)
+        return result
+
+    def _proxy_bulk_call(self, method, out, *args, **kwargs):
+        try:
+            return self._proxy_bulk_client.call(self._proxy_name, method, *args, out=out, **kwargs)
+        except UnsupportedArguments:
+            # the call has not been sent. Use rpyc instead.
+            return getattr(self._proxy_module, method)(*args, **kwargs)
+
+    def _proxy_cache_key(self, method, args, kwargs):
+        """ Cache key of a call or None if the call is not cacheable. """
+        if method not in self._proxy_cached_methods:
+            return None
+        key = (method, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def _proxy_cache_lookup(self, key):
+        with self._proxy_cache_lock:
+            if key in self._proxy_cache:
+                expiry, result = self._proxy_cache[key]
+                if expiry is None or expiry > time.monotonic():
+                    return True, result
+                del self._proxy_cache[key]
+        return False, None
+
+    def _proxy_cache_store(self, key, result):
+        ttl, by_value = self._proxy_cached_methods[key[0]]
+        if by_value:
+            try:
+                result = rpyc.utils.classic.obtain(result)
+            except Exception:
+                # not picklable, cache the reference instead
+                pass
+        expiry = None if ttl is None else time.monotonic() + ttl
+        with self._proxy_cache_lock:
+            self._proxy_cache[key] = (expiry, result)
+        return result
+
+    def _proxy_invalidate_cache(self, constant=False):
+        """ Discard cached results with finite ttl (and constant ones if constant is True). """
+        with self._proxy_cache_lock:
+            if constant:
+                self._proxy_cache.clear()
+                return
+            for key in [key for key, (expiry, _) in self._proxy_cache.items()
+                        if expiry is not None]:
+                del self._proxy_cache[key]
+
+    def _proxy_execute_batch(self, calls):
+        """ Execute a list of (method, args, kwargs) in one round trip.
+
+          @return list: (success, result or exception) for each call
+        """
+        if self._proxy_batch_call is None:
+            results = list()
+            for method, args, kwargs in calls:
+                try:
+                    results.append((True, getattr(self._proxy_module, method)(*args, **kwargs)))
+                except Exception as e:
+                    results.append((False, e))
+            return results
+        start = time.perf_counter()
+        response = self._proxy_batch_call(self._proxy_name,
+                                          pickle.dumps(calls, pickle.HIGHEST_PROTOCOL))
+        self._proxy_statistics.record('<batch>', time.perf_counter() - start)
+        return [(success, pickle.loads(payload))
+                for success, payload in pickle.loads(response)]
+
+
+class RemoteCallBatch:
+    """ Calls of a remote module collected to be sent in one round trip. Attribute access returns
+    callables adding a call to the batch, each returning a BatchedCallResult.
+    """
+    def __init__(self, proxy):
+        self._proxy = proxy
+        self._calls = list()
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return functools.partial(self.call, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.execute()
+
+    def call(self, method, *args, **kwargs):
+        """ Add a call to the batch.
+
+          @param str method: name of the remote method
+          @param args: positional arguments (must be picklable)
+          @param kwargs: keyword arguments (must be picklable)
+
+          @return BatchedCallResult: result available after execution of the batch
+        """
+        result = BatchedCallResult(method)
+        self._calls.append((method, args, kwargs, result))
+        return result
+
+    def execute(self):
+        """ Send all collected calls. Cached results are served locally. """
+        proxy = self._proxy
+        calls, self._calls = self._calls, list()
+        pending = list()
+        for method, args, kwargs, result in calls:
+            key = proxy._proxy_cache_key(method, args, kwargs)
+            if key is not None:
+                found, value = proxy._proxy_cache_lookup(key)
+                if found:
+                    proxy._proxy_statistics.record(method, cache_hit=True)
+                    result._set(True, value)
+                    continue
+            elif method not in proxy._proxy_cached_methods:
+                proxy._proxy_invalidate_cache(constant=False)
+            pending.append((method, args, kwargs, result, key))
+        if not pending:
+            return
+        responses = proxy._proxy_execute_batch([call[:3] for call in pending])
+        for (method, args, kwargs, result, key), (success, value) in zip(pending, responses):
+            proxy._proxy_statistics.record(method, batched=True)
+            if success and key is not None:
+                value = proxy._proxy_cache_store(key, value)
+            result._set(success, value)
+
+
+class BatchedCallResult:
+    """ Result of a call in a RemoteCallBatch. """
+    def __init__(self, method):
+        self.method = method
+        self.ready = False
+        self._success = False
+        self._value = None
+
+    def _set(self, success, value):
+        self._success = success
+        self._value = value
+        self.ready = True
+
+    @property
+    def value(self):
+        """ Return value of the call. Raises the exception of the remote call if it failed. """
+        if not self.ready:
+            raise RuntimeError('Batch containing the call of {0} has not been executed yet.'
+                               ''.format(self.method))
+        if not self._success:
+            raise self._value
+        return self._value
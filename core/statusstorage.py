@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the storage backend for module status variables.
+
+Status variables are written on a background thread so module deactivation and application
+shutdown do not wait for disk I/O. Every write goes to a temporary file first which is then
+renamed over the target, so a crash in the middle of a write never leaves a corrupted status
+file behind.
+
+In binary mode numpy arrays are not serialized into the YAML status file. They are stored as raw
+.npy files in a directory next to it and memory-mapped (copy-on-write) on load, so large arrays
+cost neither compression on save nor a full read on activation.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+import numpy
+import ruamel.yaml as yaml
+from collections import OrderedDict
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+
+class StatusVariableStorage:
+    """ Asynchronous, atomic storage of status variable dictionaries.
+
+    Each status file is identified by its file name. Saving takes a snapshot of the variables
+    (arrays are copied) and queues it for the writer thread. Several saves of the same file
+    that arrive before the write is due are coalesced into a single write of the latest
+    snapshot.
+    """
+
+    def __init__(self, binary=True, write_delay=0.0):
+        """
+            @param bool binary: store numpy arrays as raw memory-mappable .npy files instead of
+                                embedding them in the YAML status file
+            @param float write_delay: default delay in seconds used to debounce checkpoint writes
+        """
+        self.binary = bool(binary)
+        self.write_delay = max(0.0, float(write_delay))
+
+        self._condition = threading.Condition()
+        # file name -> [due time, variables snapshot]
+        self._pending = OrderedDict()
+        self._writing = None
+        self._stop_requested = False
+        self._thread = threading.Thread(target=self._writer_loop,
+                                        name='status-variable-writer',
+                                        daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def array_dir(filename):
+        """ Directory holding the raw array files belonging to a status file.
+
+            @param str filename: path of the status file
+
+            @return str: path of the array directory
+        """
+        return '{0}-arrays'.format(os.path.splitext(filename)[0])
+
+    def save(self, filename, variables, delay=None):
+        """ Queue a status variable dictionary for writing.
+
+            @param str filename: path of the status file
+            @param dict variables: status variable names and values
+            @param float delay: seconds to wait before writing. If a write of the same file is
+                                already pending, its due time is kept and only the data is
+                                replaced. None uses the configured write_delay, 0 writes as
+                                soon as possible.
+        """
+        if delay is None:
+            delay = self.write_delay
+        snapshot = _snapshot(variables)
+        with self._condition:
+            if self._stop_requested:
+                raise RuntimeError('Status variable storage has already been shut down.')
+            due = time.monotonic() + max(0.0, delay)
+            if filename in self._pending:
+                due = min(due, self._pending[filename][0])
+            self._pending[filename] = [due, snapshot]
+            self._condition.notify_all()
+
+    def load(self, filename):
+        """ Load a status file. Pending writes of this file are completed first.
+
+            @param str filename: path of the status file
+
+            @return OrderedDict: status variable names and values
+        """
+        self.flush(filename)
+        if not os.path.isfile(filename):
+            return OrderedDict()
+        return config.load(filename)
+
+    def remove(self, filename):
+        """ Discard pending writes and delete a status file together with its arrays.
+
+            @param str filename: path of the status file
+        """
+        with self._condition:
+            self._pending.pop(filename, None)
+            while self._writing == filename:
+                self._condition.wait()
+        if os.path.isfile(filename):
+            os.remove(filename)
+        shutil.rmtree(self.array_dir(filename), ignore_errors=True)
+
+    def flush(self, filename=None, timeout=None):
+        """ Write pending data immediately and wait until it is on disk.
+
+            @param str filename: only flush this status file. None flushes everything.
+            @param float timeout: maximum time to wait in seconds. None waits forever.
+
+            @return bool: True if all requested writes have finished
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            now = time.monotonic()
+            for name, job in self._pending.items():
+                if filename is None or name == filename:
+                    job[0] = now
+            self._condition.notify_all()
+            while self._is_busy(filename):
+                if deadline is None:
+                    self._condition.wait()
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._condition.wait(remaining)
+        return True
+
+    def shutdown(self, timeout=None):
+        """ Flush all pending writes and stop the writer thread.
+
+            @param float timeout: maximum time to wait in seconds. None waits forever.
+
+            @return bool: True if all pending writes have finished
+        """
+        success = self.flush(timeout=timeout)
+        with self._condition:
+            self._stop_requested = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+        return success
+
+    def _is_busy(self, filename):
+        if filename is None:
+            return bool(self._pending) or self._writing is not None
+        return filename in self._pending or self._writing == filename
+
+    def _writer_loop(self):
+        while True:
+            with self._condition:
+                while True:
+                    if self._pending:
+                        name, (due, snapshot) = min(self._pending.items(),
+                                                    key=lambda item: item[1][0])
+                        wait_time = due - time.monotonic()
+                        if wait_time <= 0:
+                            del self._pending[name]
+                            self._writing = name
+                            break
+                        self._condition.wait(wait_time)
+                    elif self._stop_requested:
+                        return
+                    else:
+                        self._condition.wait()
+            try:
+                self._write(name, snapshot)
+            except:
+                logger.exception('Failed to save status variables to "{0}".'.format(name))
+            finally:
+                with self._condition:
+                    self._writing = None
+                    self._condition.notify_all()
+
+    def _write(self, filename, variables):
+        tmp_filename = '{0}.tmp'.format(filename)
+        # (temporary name, final name) of the .npz files written by the YAML dumper
+        npz_files = list()
+        if self.binary:
+            array_dir = self.array_dir(filename)
+            written = set()
+        try:
+            if self.binary:
+                variables = self._externalize_arrays(variables, array_dir, '', written)
+            with open(tmp_filename, 'w') as f:
+                config.ordered_dump(variables,
+                                    stream=f,
+                                    Dumper=yaml.SafeDumper,
+                                    filename=filename,
+                                    array_files=npz_files,
+                                    default_flow_style=False)
+                f.flush()
+                os.fsync(f.fileno())
+            for tmp_path, final_path in npz_files:
+                os.replace(tmp_path, final_path)
+            os.replace(tmp_filename, filename)
+        except:
+            # keep the previous status file and its arrays untouched
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
+            for tmp_path, _ in npz_files:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            if self.binary:
+                for name in written:
+                    os.remove(os.path.join(array_dir, name))
+            raise
+        if self.binary:
+            self._remove_stale_arrays(array_dir, written)
+
+    def _externalize_arrays(self, value, array_dir, path, written):
+        """ Replace all numpy arrays in a (nested) status variable by references to raw .npy
+        files.
+        """
+        if isinstance(value, numpy.ndarray):
+            if value.dtype.hasobject:
+                # object arrays can not be stored without pickle. Leave them to the YAML dumper.
+                return value
+            os.makedirs(array_dir, exist_ok=True)
+            # A fresh name for every write. Files of the previous generation may still be
+            # memory-mapped by a running module (and can not be replaced on Windows).
+            name = '{0}-{1}.npy'.format(re.sub(r'[^\w.-]', '_', path) or 'array',
+                                        uuid.uuid4().hex[:12])
+            final_path = os.path.join(array_dir, name)
+            tmp_path = '{0}.tmp'.format(final_path)
+            try:
+                with open(tmp_path, 'wb') as f:
+                    numpy.save(f, value, allow_pickle=False)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, final_path)
+            except:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            written.add(name)
+            return config.RawArrayReference(
+                '{0}/{1}'.format(os.path.basename(array_dir), name))
+        if isinstance(value, dict):
+            converted = OrderedDict() if isinstance(value, OrderedDict) else dict()
+            for key, item in value.items():
+                item_path = '{0}.{1}'.format(path, key) if path else str(key)
+                converted[key] = self._externalize_arrays(item, array_dir, item_path, written)
+            return converted
+        if isinstance(value, list) or type(value) is tuple:
+            converted = [self._externalize_arrays(item, array_dir, '{0}.{1}'.format(path, ii),
+                                                  written)
+                         for ii, item in enumerate(value)]
+            return converted if isinstance(value, list) else tuple(converted)
+        return value
+
+    @staticmethod
+    def _remove_stale_arrays(array_dir, keep):
+        if not os.path.isdir(array_dir):
+            return
+        for name in os.listdir(array_dir):
+            if name in keep:
+                continue
+            try:
+                os.remove(os.path.join(array_dir, name))
+            except OSError:
+                # still memory-mapped somewhere. Will be cleaned up after the next write.
+                pass
+
+
+def _snapshot(value):
+    """ Copy a status variable so it can be written from another thread while the module
+    keeps modifying the original. Arrays and containers are copied, everything else is
+    assumed to be immutable.
+    """
+    if isinstance(value, numpy.ndarray):
+        return numpy.array(value, copy=True)
+    if isinstance(value, dict):
+        converted = OrderedDict() if isinstance(value, OrderedDict) else dict()
+        for key, item in value.items():
+            converted[key] = _snapshot(item)
+        return converted
+    if isinstance(value, list):
+        return [_snapshot(item) for item in value]
+    if type(value) is tuple:
+        return tuple(_snapshot(item) for item in value)
+    return value
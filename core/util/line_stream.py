@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains a ring buffer which streams the lines of a scan from an acquisition thread
+to the thread processing them.
+
+The acquisition thread (usually inside the hardware module) writes every completed line into
+the next free slot of a preallocated ring buffer and continues with the next line right away,
+while the consumer takes the finished lines out in the order they were measured. The ring only
+blocks the acquisition when the consumer falls behind by more than the number of slots.
+Optionally a callback is called from the acquisition thread for every completed line.
+
+Usage:
+
+    stream = self._spm.start_line_stream(scan_arr, time_forward, time_back)
+    for line_index, line in stream:
+        image[line_index] = line[0]
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import logging
+import queue
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# marks the end of the stream in the queue of completed lines
+_FINISHED = object()
+
+
+class LineStream:
+    """ Ring buffer of completed scan lines with a queue of their slots.
+    """
+
+    def __init__(self, num_lines, buffer_lines=8, callback=None, log=None):
+        """
+          @param int num_lines: number of lines of the whole frame
+          @param int buffer_lines: number of slots of the ring buffer
+          @param callable callback: optional, called as callback(line_index, line) from the
+                                    acquisition thread for every completed line, before the
+                                    acquisition continues. The line is a view into the ring
+                                    buffer and must not be kept. Anything the callback
+                                    accesses has to be thread-safe. If it raises, the
+                                    acquisition ends after this line.
+          @param logging.Logger log: optional, logger of the module running the stream
+        """
+        self.num_lines = num_lines
+        self.buffer_lines = buffer_lines
+        self.callback = callback
+        self.lines_done = 0
+        self.log = logger if log is None else log
+
+        # allocated with the shape of the first line
+        self._ring = None
+        self._free_slots = threading.Semaphore(buffer_lines)
+        self._completed = queue.Queue()
+        self._stop_event = threading.Event()
+        self._finished = False
+        self._error = None
+        self.thread = None
+
+    @property
+    def stopped(self):
+        """ True if the consumer requested to stop the acquisition. """
+        return self._stop_event.is_set()
+
+    @property
+    def finished(self):
+        """ True if the acquisition has ended, the queue may still hold lines. """
+        return self._finished
+
+    def start(self, target, *args):
+        """ Run the acquisition in a background thread.
+
+          @param callable target: acquisition function, called as target(*args). It has to
+                                  call put_line for every line and finish at the end.
+        """
+        self.thread = threading.Thread(target=target, args=args, name='line-stream',
+                                       daemon=True)
+        self.thread.start()
+
+    def put_line(self, line_index, line):
+        """ Store a completed line (acquisition side).
+
+        Blocks while all slots of the ring buffer wait to be taken out by the consumer.
+
+          @param int line_index: index of the line in the frame
+          @param numpy.ndarray line: line data, shape (signals, points)
+
+          @return bool: False if the stream was stopped and the acquisition should end
+        """
+        line = np.asarray(line, dtype=float)
+        if line.ndim == 1:
+            line = line[np.newaxis, :]
+        while not self._free_slots.acquire(timeout=0.1):
+            if self.stopped:
+                return False
+        if self.stopped:
+            self._free_slots.release()
+            return False
+        if self._ring is None or self._ring.shape[1:] != line.shape:
+            self._ring = np.zeros((self.buffer_lines, ) + line.shape)
+        slot = self.lines_done % self.buffer_lines
+        self._ring[slot] = line
+        self.lines_done += 1
+        if self.callback is not None:
+            try:
+                self.callback(line_index, self._ring[slot])
+            except Exception:
+                self.log.exception('Error in the callback of the line stream, the '
+                                   'acquisition is stopped.')
+                self._stop_event.set()
+        self._completed.put((line_index, slot))
+        return not self.stopped
+
+    def finish(self, error=None):
+        """ Mark the end of the acquisition (acquisition side).
+
+          @param Exception error: optional, error which ended the acquisition. It is raised
+                                  to the consumer after the remaining lines.
+        """
+        self._error = error
+        self._finished = True
+        self._completed.put(_FINISHED)
+
+    def get_line(self, timeout=None):
+        """ Take the next completed line out of the ring buffer (consumer side).
+
+          @param float timeout: optional, maximum time to wait for the next line in seconds
+
+          @return tuple: (line_index, line) with a copy of the line data, shape
+                         (signals, points), or None if the stream has ended
+        """
+        try:
+            item = self._completed.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError('No scan line completed within {0} s.'.format(timeout))
+        if item is _FINISHED:
+            # keep the marker for further calls
+            self._completed.put(_FINISHED)
+            if self._error is not None:
+                raise self._error
+            return None
+        line_index, slot = item
+        line = self._ring[slot].copy()
+        self._free_slots.release()
+        return line_index, line
+
+    def __iter__(self):
+        while True:
+            item = self.get_line()
+            if item is None:
+                return
+            yield item
+
+    def stop(self, wait=True):
+        """ Ask the acquisition to end after the current line (consumer side).
+
+          @param bool wait: wait for the acquisition thread to end
+        """
+        self._stop_event.set()
+        if wait and self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+
+
+def acquire_lines(scanner, stream, lines, time_forward, time_back):
+    """ Acquire lines one after the other with configure_line, scan_line and get_measurements.
+
+    Generic acquisition for scanners without a native stream. The next line is configured in
+    the hardware right after the current one was read out, before the line is handed to the
+    stream, and the callback of the stream runs before the next line is started. The consumer
+    processes line N while line N+1 is measured.
+
+      @param ScannerInterface scanner: configured scanner
+      @param LineStream stream: stream receiving the lines
+      @param list lines: line coordinates [corr0_start, corr0_stop, corr1_start, corr1_stop]
+      @param float time_forward: time of the forward movement of every line in s
+      @param float time_back: time of the back movement of every line in s
+    """
+    error = None
+    try:
+        if len(lines) > 0:
+            _configure_line(scanner, lines[0], time_forward, time_back)
+        for line_index in range(len(lines)):
+            if stream.stopped:
+                break
+            scanner.scan_line()
+            line = scanner.get_measurements(reshape=True)
+            # stage the next line while the current one is handed over
+            if line_index + 1 < len(lines):
+                _configure_line(scanner, lines[line_index + 1], time_forward, time_back)
+            if not stream.put_line(line_index, line):
+                break
+    except Exception as e:
+        stream.log.exception('Line acquisition failed.')
+        error = e
+    stream.finish(error)
+
+
+def _configure_line(scanner, coords, time_forward, time_back):
+    scanner.configure_line(coords[0], coords[1], coords[2], coords[3], time_forward, time_back)
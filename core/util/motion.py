@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains a helper to wait for the end of a movement of a motor or magnet stage
+without blocking the calling thread.
+
+A MotionPoller belongs to one device. It polls the position and status of the device in a
+background thread, but only while somebody waits for a movement to finish. The poll interval
+adapts to the movement: far away from the target (estimated from the velocity measured between
+two polls) the device is polled rarely, close to the target it is polled often, so the end of a
+movement is detected quickly without flooding the device with requests.
+Completion is reported with a concurrent.futures.Future. Qudi modules usually attach a done
+callback which emits a queued signal, so the next step runs in the module thread.
+
+Usage:
+
+    future = self._magnet_device.get_motion_future(target=move_dict_abs)
+    future.add_done_callback(lambda f: self._sigMotionFinished.emit())
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+def is_moving(status):
+    """ Interpret the status dict returned by get_status of a motor or magnet device.
+
+      @param dict status: axis label -> status number (or tuple with the status number first)
+
+      @return bool: True if any axis reports a movement (status 1 or -1)
+    """
+    for value in status.values():
+        if isinstance(value, (tuple, list)):
+            value = value[0] if len(value) > 0 else 0
+        if value in (1, -1):
+            return True
+    return False
+
+
+def resolve_future(future, result=None, exception=None):
+    """ Set the result or exception of a future, unless it was cancelled or resolved before.
+
+      @param concurrent.futures.Future future: future to resolve
+      @param result: result of the future
+      @param Exception exception: optional, the future fails with this exception instead
+
+      @return bool: True if the future was resolved by this call
+    """
+    try:
+        if not future.set_running_or_notify_cancel():
+            return False
+    except RuntimeError:
+        # already running or finished, i.e. resolved by another thread
+        return False
+    if exception is None:
+        future.set_result(result)
+    else:
+        future.set_exception(exception)
+    return True
+
+
+class _MotionWatch:
+    """ One pending request for the end of a movement. """
+
+    def __init__(self, target, tolerance, timeout):
+        self.future = Future()
+        self.target = target
+        self.tolerance = tolerance
+        self.deadline = None if timeout is None else time.monotonic() + timeout
+        self.stable_polls = 0
+
+
+class MotionPoller:
+    """ Polls a motor or magnet device in a background thread while movements are awaited.
+
+    The device is only accessed from the poller thread while a future is pending, i.e. while
+    the module that started the movement waits for it to finish.
+    """
+
+    def __init__(self, device, min_interval=0.01, max_interval=1.0, settle_polls=2):
+        """
+          @param object device: motor or magnet device (MotorInterface or MagnetInterface)
+          @param float min_interval: shortest time between two polls in seconds
+          @param float max_interval: longest time between two polls in seconds
+          @param int settle_polls: number of polls with unchanged position after which a
+                                   device not reporting a movement is considered stopped,
+                                   even if the target was not reached
+        """
+        self._device = device
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.settle_polls = settle_polls
+
+        self._watches = list()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def of(cls, device):
+        """ Get the poller of a device, creating it on first use.
+
+          @param object device: motor or magnet device
+
+          @return MotionPoller: the poller of the device
+        """
+        poller = getattr(device, '_motion_poller', None)
+        if poller is None:
+            poller = cls(device)
+            device._motion_poller = poller
+        return poller
+
+    def watch(self, target=None, tolerance=None, timeout=None):
+        """ Get a future which is resolved when the current movement has finished.
+
+          @param dict target: optional, axis label -> absolute target position. If given the
+                              movement is finished when all axes are within the tolerance of
+                              the target.
+          @param float|dict tolerance: allowed deviation from the target, either for all axes
+                                       or per axis label. Defaults to pos_step of the device
+                                       constraints.
+          @param float timeout: optional, the future fails with a TimeoutError after this many
+                                seconds
+
+          @return concurrent.futures.Future: result is the position dict after the movement
+        """
+        if target is not None and not isinstance(tolerance, dict):
+            tolerance = self._tolerance_dict(target, tolerance)
+        watch = _MotionWatch(target, tolerance, timeout)
+        with self._lock:
+            self._watches.append(watch)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run,
+                                                name='motion-poller',
+                                                daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return watch.future
+
+    def cancel_all(self):
+        """ Cancel all pending futures, e.g. after a movement was aborted. """
+        with self._lock:
+            watches, self._watches = self._watches, list()
+        for watch in watches:
+            watch.future.cancel()
+        self._wake.set()
+
+    def _tolerance_dict(self, target, tolerance):
+        if tolerance is not None:
+            return {axis: tolerance for axis in target}
+        try:
+            constraints = self._device.get_constraints()
+        except:
+            logger.exception('Could not get the constraints of the moving device.')
+            constraints = dict()
+        return {axis: constraints.get(axis, dict()).get('pos_step') or 0.0 for axis in target}
+
+    def _run(self):
+        last_pos = None
+        last_time = None
+        interval = self.min_interval
+        while True:
+            with self._lock:
+                watches = [watch for watch in self._watches if not watch.future.done()]
+                self._watches = watches
+                if not watches:
+                    self._thread = None
+                    return
+            try:
+                pos = self._device.get_pos()
+                moving = is_moving(self._device.get_status())
+            except Exception as e:
+                for watch in watches:
+                    resolve_future(watch.future, exception=e)
+                continue
+            now = time.monotonic()
+
+            # speed of every axis since the last poll
+            speed = dict()
+            if last_pos is not None and now > last_time:
+                for axis, value in pos.items():
+                    if axis in last_pos:
+                        speed[axis] = abs(value - last_pos[axis]) / (now - last_time)
+            interval = self._update_watches(watches, pos, last_pos, moving, now, speed, interval)
+            last_pos, last_time = pos, now
+
+            self._wake.clear()
+            self._wake.wait(interval)
+
+    def _update_watches(self, watches, pos, last_pos, moving, now, speed, interval):
+        """ Resolve finished watches and return the time until the next poll. """
+        remaining_times = list()
+        for watch in watches:
+            if watch.future.done():
+                continue
+            unchanged = last_pos is not None and all(
+                pos.get(axis) == last_pos.get(axis) for axis in pos)
+            watch.stable_polls = watch.stable_polls + 1 if unchanged else 0
+
+            if watch.target is None:
+                at_target = unchanged
+                remaining = dict()
+            else:
+                remaining = {axis: abs(watch.target[axis] - pos[axis])
+                             for axis in watch.target if axis in pos}
+                at_target = all(remaining[axis] <= watch.tolerance.get(axis, 0.0)
+                                for axis in remaining)
+
+            if not moving and (at_target or watch.stable_polls >= self.settle_polls):
+                resolve_future(watch.future, pos)
+            elif watch.deadline is not None and now > watch.deadline:
+                resolve_future(watch.future, exception=TimeoutError(
+                    'Movement did not finish within the timeout.'))
+            else:
+                remaining_times.extend(remaining[axis] / speed[axis]
+                                       for axis in remaining if speed.get(axis))
+                if watch.deadline is not None:
+                    remaining_times.append(watch.deadline - now)
+
+        if remaining_times:
+            # poll again after half of the expected remaining move time
+            return min(max(0.5 * min(remaining_times), self.min_interval), self.max_interval)
+        # no velocity estimate available (yet), slowly back off
+        return min(max(1.5 * interval, self.min_interval), self.max_interval)
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains array based conversions between the magnetic field at an NV center and its
+ODMR resonance frequencies.
+
+The resonance frequencies are the transition frequencies from the ms=0 like eigenstate of the
+NV ground state spin Hamiltonian
+
+    H = D Sz^2 + E (Sx^2 - Sy^2) + gamma B (cos(theta) Sz + sin(theta) Sx)
+
+where theta is the angle between the field and the NV axis. The field is assumed to lie in the
+plane of the NV axis and the strain axis (x), which only matters for E != 0.
+Diagonalizing H for every pixel of a large scan is slow, so the frequencies are tabulated once
+on a (|B|, theta) grid (NVFieldTable) and interpolated bilinearly. The interpolation error is
+checked against the exact result at the centers of all grid cells when the table is created
+and available as NVFieldTable.max_error.
+
+Usage:
+
+    from core.util.nv_field import field_table
+
+    table = field_table(zero_field=2.87e9, e_field=0.0)
+    f_low, f_high = table.frequencies(b_field_map, theta=np.radians(30))
+    b_field_map = table.field_from_single_resonance(res_freq_map, theta=0.0)
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import functools
+import numpy as np
+from scipy.constants import physical_constants
+
+# gyromagnetic ratio of the NV electron spin in Hz/T (g = 2.0028)
+GYRO_NV = 2.0028 * physical_constants['Bohr magneton in Hz/T'][0]
+
+_SZ = np.diag([1.0, 0.0, -1.0])
+_SX = np.array([[0, 1, 0], [1, 0, 1], [0, 1, 0]]) / np.sqrt(2)
+_SXX_MINUS_SYY = np.array([[0.0, 0, 1], [0, 0, 0], [1, 0, 0]])
+
+
+def _fold_theta(theta):
+    """ Map an angle to [0, pi/2], the spectrum is symmetric under theta -> pi - theta. """
+    theta = np.mod(theta, np.pi)
+    return np.minimum(theta, np.pi - theta)
+
+
+def nv_frequencies(b_field, theta=0.0, zero_field=2.87e9, e_field=0.0, gyro=GYRO_NV):
+    """ Exact ODMR resonance frequencies by diagonalization of the spin Hamiltonian.
+
+      @param float|numpy.ndarray b_field: magnitude of the magnetic field in T
+      @param float|numpy.ndarray theta: angle between field and NV axis in rad
+      @param float zero_field: zero field splitting D in Hz
+      @param float e_field: strain/electric field splitting E in Hz
+      @param float gyro: gyromagnetic ratio in Hz/T
+
+      @return tuple(numpy.ndarray, numpy.ndarray): lower and upper resonance frequency in Hz,
+                                                   broadcast shape of b_field and theta
+    """
+    b_field, theta = np.broadcast_arrays(np.asarray(b_field, dtype=float),
+                                         np.asarray(theta, dtype=float))
+    shape = b_field.shape
+    b_field = b_field.ravel()
+    theta = theta.ravel()
+    hamiltonian = (zero_field * _SZ @ _SZ + e_field * _SXX_MINUS_SYY)[None, :, :] \
+        + (gyro * b_field * np.cos(theta))[:, None, None] * _SZ \
+        + (gyro * b_field * np.sin(theta))[:, None, None] * _SX
+    energies, states = np.linalg.eigh(hamiltonian)
+    # the ODMR transitions start at the state with the largest ms=0 amplitude
+    zero_state = np.argmax(states[:, 1, :] ** 2, axis=1)
+    transitions = np.abs(energies - energies[np.arange(len(energies)), zero_state][:, None])
+    transitions[np.arange(len(energies)), zero_state] = np.inf
+    transitions.sort(axis=1)
+    return transitions[:, 0].reshape(shape), transitions[:, 1].reshape(shape)
+
+
+def field_from_double_resonance(freq_low, freq_high, zero_field=2.87e9, e_field=0.0,
+                                gyro=GYRO_NV):
+    """ Magnitude and angle of the field from both resonance frequencies (closed form).
+
+    According to Balasubramanian et al., Nature 455, 648 (2008), extended to E != 0 for a field
+    in the plane of the NV axis and the strain axis, as assumed by nv_frequencies. The energy
+    of the ms=0 like state follows from the trace of H, the field from the sum of the principal
+    minors and the transverse field from the determinant det(H) = (gamma B sin(theta))^2 (E - D).
+
+      @param float|numpy.ndarray freq_low: lower resonance frequency in Hz
+      @param float|numpy.ndarray freq_high: upper resonance frequency in Hz
+      @param float zero_field: zero field splitting D in Hz
+      @param float e_field: strain/electric field splitting E in Hz
+      @param float gyro: gyromagnetic ratio in Hz/T
+
+      @return tuple(numpy.ndarray, numpy.ndarray): field in T and angle to the NV axis in rad.
+                                                   NaN where the frequencies are inconsistent.
+    """
+    f1 = np.asarray(freq_low, dtype=float)
+    f2 = np.asarray(freq_high, dtype=float)
+    d = zero_field
+    e2 = e_field ** 2
+    sum_sq = f1 ** 2 + f2 ** 2 - f1 * f2
+    # energy of the ms=0 like state, the energies of H add up to 2 D
+    energy_0 = (2 * d - f1 - f2) / 3
+    with np.errstate(invalid='ignore', divide='ignore'):
+        b_squared = (sum_sq - d ** 2) / 3 - e2
+        b_field = np.sqrt(b_squared) / gyro
+        determinant = energy_0 * (energy_0 + f1) * (energy_0 + f2)
+        sin_sq_theta = determinant / ((e_field - d) * b_squared)
+        theta = np.where((sin_sq_theta >= -1e-9) & (sin_sq_theta <= 1 + 1e-9),
+                         np.arcsin(np.sqrt(np.clip(sin_sq_theta, 0, 1))),
+                         np.nan)
+    return b_field, theta
+
+
+class NVFieldTable:
+    """ Interpolation table of the NV resonance frequencies versus |B| and theta.
+
+    Use field_table() to share tables with the same parameters between modules.
+    """
+
+    def __init__(self, zero_field=2.87e9, e_field=0.0, b_max=0.05, num_b=1001, num_theta=181,
+                 gyro=GYRO_NV):
+        """
+          @param float zero_field: zero field splitting D in Hz
+          @param float e_field: strain/electric field splitting E in Hz
+          @param float b_max: largest tabulated field in T
+          @param int num_b: number of field values, equally spaced from 0 to b_max
+          @param int num_theta: number of angles, equally spaced from 0 to pi/2
+          @param float gyro: gyromagnetic ratio in Hz/T
+        """
+        self.zero_field = zero_field
+        self.e_field = e_field
+        self.gyro = gyro
+        self.b_values = np.linspace(0, b_max, num_b)
+        self.theta_values = np.linspace(0, np.pi / 2, num_theta)
+        self._b_step = self.b_values[1] - self.b_values[0]
+        self._theta_step = self.theta_values[1] - self.theta_values[0]
+
+        grid_b, grid_theta = np.meshgrid(self.b_values, self.theta_values, indexing='ij')
+        self.freq_low, self.freq_high = nv_frequencies(grid_b, grid_theta, zero_field, e_field,
+                                                       gyro)
+
+        # interpolation error at the cell centers, where it is largest
+        center_b = self.b_values[:-1] + self._b_step / 2
+        center_theta = self.theta_values[:-1] + self._theta_step / 2
+        center_b, center_theta = np.meshgrid(center_b, center_theta, indexing='ij')
+        exact_low, exact_high = nv_frequencies(center_b, center_theta, zero_field, e_field,
+                                               gyro)
+        interp_low, interp_high = self.frequencies(center_b, center_theta)
+        self.max_error = float(max(np.max(np.abs(interp_low - exact_low)),
+                                   np.max(np.abs(interp_high - exact_high))))
+        """ Largest deviation of the interpolated from the exact frequencies in Hz. """
+
+    @property
+    def b_max(self):
+        return self.b_values[-1]
+
+    def _b_cell(self, b_field):
+        """ Grid index and fractional position of field values. """
+        pos_b = np.clip(np.asarray(b_field, dtype=float) / self._b_step,
+                        0, len(self.b_values) - 1)
+        index_b = np.minimum(pos_b.astype(int), len(self.b_values) - 2)
+        return index_b, pos_b - index_b
+
+    def _theta_cell(self, theta):
+        """ Grid index and fractional position of angles. """
+        pos_theta = _fold_theta(np.asarray(theta, dtype=float)) / self._theta_step
+        index_theta = np.minimum(pos_theta.astype(int), len(self.theta_values) - 2)
+        return index_theta, pos_theta - index_theta
+
+    def _interpolate(self, table, index_b, frac_b, index_theta, frac_theta):
+        low_b = (table[index_b, index_theta] * (1 - frac_theta)
+                 + table[index_b, index_theta + 1] * frac_theta)
+        high_b = (table[index_b + 1, index_theta] * (1 - frac_theta)
+                  + table[index_b + 1, index_theta + 1] * frac_theta)
+        return low_b + (high_b - low_b) * frac_b, (high_b - low_b) / self._b_step
+
+    def frequencies(self, b_field, theta=0.0):
+        """ Interpolated resonance frequencies. Fields above b_max are clipped to b_max.
+
+          @param float|numpy.ndarray b_field: magnitude of the magnetic field in T
+          @param float|numpy.ndarray theta: angle between field and NV axis in rad
+
+          @return tuple(numpy.ndarray, numpy.ndarray): lower and upper resonance frequency in Hz
+        """
+        b_field, theta = np.broadcast_arrays(b_field, theta)
+        cell = self._b_cell(b_field) + self._theta_cell(theta)
+        return (self._interpolate(self.freq_low, *cell)[0],
+                self._interpolate(self.freq_high, *cell)[0])
+
+    def field_from_single_resonance(self, res_freq, theta=0.0, upper=None, iterations=8):
+        """ Magnitude of the field from one resonance frequency at a known field angle.
+
+        If the resonance is not monotonic in the field, the solution with the smallest field
+        is returned.
+
+          @param float|numpy.ndarray res_freq: resonance frequency in Hz
+          @param float|numpy.ndarray theta: angle between field and NV axis in rad
+          @param bool upper: True if res_freq belongs to the upper, False if it belongs to the
+                             lower resonance. None decides by comparing with the zero field
+                             splitting.
+          @param int iterations: number of Newton steps on the interpolated table, only used
+                                 if theta is an array
+
+          @return numpy.ndarray: field in T, NaN if no field up to b_max gives res_freq
+        """
+        res_freq = np.asarray(res_freq, dtype=float)
+        if upper is None:
+            upper = res_freq >= self.zero_field
+        if np.ndim(theta) == 0:
+            if np.ndim(upper) == 0:
+                return self._invert_column(res_freq, theta, bool(upper))
+            return np.where(upper,
+                            self._invert_column(res_freq, theta, True),
+                            self._invert_column(res_freq, theta, False))
+
+        res_freq, theta = np.broadcast_arrays(res_freq, np.asarray(theta, dtype=float))
+        branch = np.broadcast_to(np.asarray(upper, dtype=int), res_freq.shape)
+        # both tables stacked along the first axis, select the branch by offsetting the index
+        tables = np.concatenate((self.freq_low, self.freq_high))
+        offset = branch * len(self.b_values)
+        theta_cell = self._theta_cell(theta)
+        # start at the low field, on axis approximation
+        b_field = np.clip(np.abs(res_freq - self.zero_field) / self.gyro, 0, self.b_max)
+        for _ in range(iterations):
+            index_b, frac_b = self._b_cell(b_field)
+            freq, slope = self._interpolate(tables, index_b + offset, frac_b, *theta_cell)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                step = np.where(slope != 0, (res_freq - freq) / slope, 0.0)
+            b_field = np.clip(b_field + step, 0, self.b_max)
+            if np.all(np.abs(step) < 1e-3 * self._b_step):
+                break
+
+        index_b, frac_b = self._b_cell(b_field)
+        freq = self._interpolate(tables, index_b + offset, frac_b, *theta_cell)[0]
+        converged = np.abs(freq - res_freq) <= max(10 * self.max_error, 1e3)
+        return np.where(converged, b_field, np.nan)
+
+    def _invert_column(self, res_freq, theta, upper):
+        """ Invert one branch at a fixed angle by interpolation on its monotonic low field part.
+        """
+        index_theta, frac_theta = self._theta_cell(theta)
+        table = self.freq_high if upper else self.freq_low
+        column = (table[:, index_theta] * (1 - frac_theta)
+                  + table[:, index_theta + 1] * frac_theta)
+        slope = np.sign(column[-1] - column[0]) if upper else np.sign(column[1] - column[0])
+        if slope == 0:
+            return np.full(res_freq.shape, np.nan)
+        changes = np.nonzero(np.diff(column) * slope <= 0)[0]
+        end = changes[0] + 1 if len(changes) > 0 else len(column)
+        return np.interp(res_freq * slope, column[:end] * slope, self.b_values[:end],
+                         left=np.nan, right=np.nan)
+
+
+@functools.lru_cache(maxsize=8)
+def field_table(zero_field=2.87e9, e_field=0.0, b_max=0.05, num_b=1001, num_theta=181):
+    """ Get a (cached) interpolation table of the NV resonance frequencies.
+
+      @param float zero_field: zero field splitting D in Hz
+      @param float e_field: strain/electric field splitting E in Hz
+      @param float b_max: largest tabulated field in T
+      @param int num_b: number of field values
+      @param int num_theta: number of angles
+
+      @return NVFieldTable: the table
+    """
+    return NVFieldTable(zero_field, e_field, b_max, num_b, num_theta)
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains helpers to order the points of a measurement by the time needed to move
+between them.
+
+The move time between two points is estimated from the velocity and acceleration of every axis
+(trapezoidal velocity profile). Axes can either move at the same time (the slowest axis
+determines the move time) or one after the other. Rotation axes can be marked as periodic.
+The visiting order is found with a nearest neighbour tour which is then improved with 2-opt
+moves, which is usually within a few percent of the optimum.
+
+Usage:
+
+    from core.util.path_planning import plan_path
+
+    order = plan_path(points, velocities=[1e-3, 0.1], accelerations=[1e-2, None],
+                      periods=[None, 2 * np.pi], start=current_position)
+    points = points[order]
+
+order_pathway reorders the pathways of the magnet alignments.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import logging
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def move_time(distance, velocity, acceleration=None):
+    """ Time needed to move a distance with a trapezoidal velocity profile.
+
+      @param float|numpy.ndarray distance: distance(s) to move
+      @param float velocity: maximum velocity
+      @param float acceleration: acceleration and deceleration, None or 0 for infinite
+
+      @return float|numpy.ndarray: move time(s)
+    """
+    distance = np.abs(distance)
+    if not acceleration:
+        return distance / velocity
+    # distance needed to reach the maximum velocity and to stop again
+    ramp_distance = velocity ** 2 / acceleration
+    return np.where(distance < ramp_distance,
+                    2 * np.sqrt(distance / acceleration),
+                    distance / velocity + velocity / acceleration)
+
+
+def travel_time_matrix(points, velocities, accelerations=None, periods=None, simultaneous=True,
+                       start=None):
+    """ Move times between all pairs of points.
+
+      @param numpy.ndarray points: positions, shape (number of points, number of axes)
+      @param list velocities: maximum velocity of each axis
+      @param list accelerations: acceleration of each axis, None for infinite
+      @param list periods: period of each axis (e.g. 2*pi for a rotation axis), None if the axis
+                           is not periodic
+      @param bool simultaneous: True if all axes move at the same time, False if they move one
+                                after the other
+      @param numpy.ndarray start: optional start position, added as the last row and column
+
+      @return numpy.ndarray: move times, shape (number of points, number of points) or one more
+                             in each dimension if start is given
+    """
+    points = np.asarray(points, dtype=float).reshape(len(points), -1)
+    if start is not None:
+        points = np.vstack((points, np.asarray(start, dtype=float)))
+    num_axes = points.shape[1]
+    if accelerations is None:
+        accelerations = [None] * num_axes
+    if periods is None:
+        periods = [None] * num_axes
+
+    times = np.zeros((len(points), len(points)))
+    for axis in range(num_axes):
+        distance = np.abs(points[:, axis, None] - points[None, :, axis])
+        if periods[axis]:
+            distance %= periods[axis]
+            distance = np.minimum(distance, periods[axis] - distance)
+        axis_time = move_time(distance, velocities[axis], accelerations[axis])
+        if simultaneous:
+            np.maximum(times, axis_time, out=times)
+        else:
+            times += axis_time
+    return times
+
+
+def path_time(order, times, start=True):
+    """ Total move time of a path.
+
+      @param numpy.ndarray order: indices of the points in the order of the visits
+      @param numpy.ndarray times: move time matrix as returned by travel_time_matrix
+      @param bool start: the last row of times belongs to the start position
+
+      @return float: total move time
+    """
+    order = np.asarray(order, dtype=int)
+    total = np.sum(times[order[:-1], order[1:]])
+    if start:
+        total += times[-1, order[0]]
+    return total
+
+
+def plan_path(points, velocities, accelerations=None, periods=None, simultaneous=True,
+              start=None, timeout=5.0):
+    """ Order points to minimize the total move time.
+
+      @param numpy.ndarray points: positions, shape (number of points, number of axes)
+      @param list velocities: maximum velocity of each axis
+      @param list accelerations: acceleration of each axis, None for infinite
+      @param list periods: period of each axis, None if the axis is not periodic
+      @param bool simultaneous: True if all axes move at the same time
+      @param numpy.ndarray start: current position. If None the path may start at any point.
+      @param float timeout: maximum time in seconds spent on 2-opt improvements
+
+      @return numpy.ndarray: indices of the points in the order of the visits
+    """
+    num_points = len(points)
+    if num_points < 2 or (num_points == 2 and start is None):
+        return np.arange(num_points)
+    times = travel_time_matrix(points, velocities, accelerations, periods, simultaneous, start)
+
+    order = _nearest_neighbour_tour(times, num_points, start is not None)
+    return _two_opt(order, times, start is not None, timeout)
+
+
+def order_pathway(pathway, back_map, constraints, start_pos=None):
+    """ Reorder a magnet alignment pathway to minimize the total travel time.
+
+      @param list pathway: pathway as created by the _create_2d_pathway methods of the magnet
+                           logics, one dict {axis: {'move_abs': ..., 'move_vel': ...}} per point
+      @param dict back_map: back map belonging to the pathway
+      @param dict constraints: hardware constraints of the magnet, one dict per axis
+      @param dict start_pos: optional, current position of the moved axes
+
+      @return tuple(list, dict): reordered pathway and back map. The back map entries keep their
+                                 matrix indices, so results land in the right cells.
+
+    Move times are estimated from the velocities of the pathway (or the maximum velocities of the
+    hardware) and the accelerations given in the constraints. Axes in rad covering a full turn
+    are treated as periodic.
+    """
+    if len(pathway) < 2:
+        return pathway, back_map
+    axes = [axis for axis in back_map[0] if axis != 'index']
+    points = np.array([[back_map[ii][axis] for axis in axes] for ii in range(len(pathway))])
+    velocities = []
+    accelerations = []
+    periods = []
+    for axis in axes:
+        axis_constr = constraints.get(axis, dict())
+        velocity = pathway[0].get(axis, dict()).get('move_vel') or axis_constr.get('vel_max')
+        velocities.append(velocity if velocity else 1.0)
+        accelerations.append(axis_constr.get('acc_max') or None)
+        full_range = (axis_constr.get('pos_max') or 0) - (axis_constr.get('pos_min') or 0)
+        if axis_constr.get('unit') == 'rad' and full_range >= 2 * np.pi * (1 - 1e-6):
+            periods.append(2 * np.pi)
+        else:
+            periods.append(None)
+    start = [start_pos[axis] for axis in axes] if start_pos is not None else None
+
+    order = plan_path(points, velocities, accelerations, periods, start=start)
+    times = travel_time_matrix(points, velocities, accelerations, periods, start=start)
+    logger.debug('Travel time of the alignment pathway reduced from {0:.1f}s to {1:.1f}s.'
+                 ''.format(path_time(np.arange(len(pathway)), times, start is not None),
+                           path_time(order, times, start is not None)))
+    return ([pathway[ii] for ii in order],
+            {new_index: back_map[ii] for new_index, ii in enumerate(order)})
+
+
+def _nearest_neighbour_tour(times, num_points, has_start):
+    visited = np.zeros(num_points, dtype=bool)
+    order = np.empty(num_points, dtype=int)
+    if has_start:
+        current = num_points
+    else:
+        current = 0
+        visited[0] = True
+        order[0] = 0
+    for ii in range(0 if has_start else 1, num_points):
+        candidates = np.where(visited, np.inf, times[current, :num_points])
+        current = int(np.argmin(candidates))
+        visited[current] = True
+        order[ii] = current
+    return order
+
+
+def _two_opt(order, times, has_start, timeout):
+    """ Improve an open path by reversing segments as long as that shortens it. """
+    deadline = time.monotonic() + timeout
+    # prepend the start position as a fixed first node
+    path = np.concatenate(([len(times) - 1], order)) if has_start else order.copy()
+    first = 0 if has_start else -1
+    improved = True
+    while improved and time.monotonic() < deadline:
+        improved = False
+        for ii in range(first, len(path) - 2):
+            # reverse path[ii + 1:jj + 1] for all jj > ii + 1
+            jj = np.arange(ii + 2, len(path))
+            node_next = path[ii + 1]
+            # the node after the reversed segment, the last segment has none
+            has_following = jj < len(path) - 1
+            following = path[np.minimum(jj + 1, len(path) - 1)]
+            old = np.where(has_following, times[path[jj], following], 0)
+            new = np.where(has_following, times[node_next, following], 0)
+            if ii >= 0:
+                # without a fixed start, reversing a prefix only changes its last edge
+                old = old + times[path[ii], node_next]
+                new = new + times[path[ii], path[jj]]
+            gain = old - new
+            best = int(np.argmax(gain))
+            if gain[best] > 1e-12 * (1 + old[best]):
+                path[ii + 1:jj[best] + 1] = path[ii + 1:jj[best] + 1][::-1]
+                improved = True
+            if time.monotonic() > deadline:
+                break
+    return path[1:] if has_start else path
@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains lightweight instrumentation of hot code paths in qudi modules.
+
+Measurement loops, hardware calls and queued signals can be timed with the decorator and
+context manager in this file. The samples are kept in fixed size rolling buffers per module,
+so the statistics always reflect the recent behaviour of a running measurement. Profiling is
+disabled by default. In that case the instrumented code only pays for a single attribute check.
+
+Usage in a module:
+
+    from core.util.profiling import profiler, profiled
+
+    class MyLogic(GenericLogic):
+
+        @profiled('loop')
+        def _loop_body(self):
+            with profiler.section(self._name, 'hw:get_counter', kind='latency'):
+                data = self._counter.get_counter()
+            profiler.queued(self._name, 'loop')
+            self.sigNextStep.emit()
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import functools
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+
+
+class RollingSamples:
+    """ Fixed size ring buffer of float samples with summary statistics. """
+
+    def __init__(self, size=1000):
+        """
+          @param int size: number of most recent samples kept
+        """
+        self._buffer = np.zeros(max(1, int(size)), dtype=np.float64)
+        self._index = 0
+        self._count = 0
+        self._total_count = 0
+        self._lock = threading.Lock()
+
+    def add(self, value):
+        """ Add a sample, overwriting the oldest one if the buffer is full.
+
+          @param float value: the sample
+        """
+        with self._lock:
+            self._buffer[self._index] = value
+            self._index = (self._index + 1) % self._buffer.size
+            if self._count < self._buffer.size:
+                self._count += 1
+            self._total_count += 1
+
+    def samples(self):
+        """ Get the buffered samples in chronological order.
+
+          @return numpy.ndarray: copy of the samples
+        """
+        with self._lock:
+            if self._count < self._buffer.size:
+                return self._buffer[:self._count].copy()
+            return np.roll(self._buffer, -self._index)
+
+    def statistics(self):
+        """ Summary statistics of the buffered samples.
+
+          @return dict: total_count (all samples ever added), count, mean, std, min, p50, p90,
+                        p99 and max of the buffered samples
+        """
+        samples = self.samples()
+        stats = OrderedDict()
+        stats['total_count'] = self._total_count
+        stats['count'] = samples.size
+        if samples.size == 0:
+            for key in ('mean', 'std', 'min', 'p50', 'p90', 'p99', 'max'):
+                stats[key] = np.nan
+            return stats
+        stats['mean'] = float(np.mean(samples))
+        stats['std'] = float(np.std(samples))
+        stats['min'] = float(np.min(samples))
+        stats['p50'], stats['p90'], stats['p99'] = (
+            float(v) for v in np.percentile(samples, (50, 90, 99)))
+        stats['max'] = float(np.max(samples))
+        return stats
+
+    def histogram(self, bins=30):
+        """ Histogram of the buffered samples.
+
+          @param int bins: number of bins
+
+          @return tuple(numpy.ndarray, numpy.ndarray): counts and bin edges
+        """
+        samples = self.samples()
+        if samples.size == 0:
+            return np.zeros(bins, dtype=int), np.linspace(0, 1, bins + 1)
+        return np.histogram(samples, bins=bins)
+
+    def clear(self):
+        with self._lock:
+            self._index = 0
+            self._count = 0
+            self._total_count = 0
+
+
+class _NullSection:
+    """ Context manager doing nothing, returned while profiling is disabled. """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SECTION = _NullSection()
+
+
+class _Section:
+    """ Context manager timing a code section. One instance per thread and section. """
+
+    def __init__(self, profiler, module, name, kind):
+        self._profiler = profiler
+        self._key = (module, name, kind)
+        self._period_key = (module, name, 'period')
+        self._start = 0.0
+        self._last_start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        if self._last_start is not None:
+            self._profiler.add_sample(self._period_key, self._start - self._last_start)
+        self._last_start = self._start
+        return self
+
+    def __exit__(self, *exc_info):
+        self._profiler.add_sample(self._key, time.perf_counter() - self._start)
+        return False
+
+
+class Profiler:
+    """ Registry of the rolling sample buffers of all instrumented code sections.
+
+    Samples are identified by (module name, section name, kind). Kinds used by qudi are:
+      - duration: run time of a section, e.g. one iteration of a measurement loop
+      - period: time between the starts of two runs of the same section
+      - latency: run time of a hardware call
+      - backlog: number of queued but not yet processed signals when a section starts
+    """
+
+    def __init__(self, size=1000):
+        self.enabled = False
+        self.size = size
+        self._series = OrderedDict()
+        self._pending = dict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def enable(self, enabled=True):
+        """ Switch profiling on or off.
+
+          @param bool enabled: True to collect samples
+        """
+        self.enabled = bool(enabled)
+
+    def section(self, module, name, kind='duration'):
+        """ Context manager timing a code section. Also records the period between two
+        consecutive runs of the section.
+
+          @param str module: name of the module the section belongs to
+          @param str name: name of the section
+          @param str kind: 'duration' for code sections, 'latency' for hardware calls
+
+          @return: context manager
+        """
+        if not self.enabled:
+            return _NULL_SECTION
+        try:
+            sections = self._local.sections
+        except AttributeError:
+            sections = self._local.sections = dict()
+        key = (module, name, kind)
+        section = sections.get(key)
+        if section is None:
+            section = sections[key] = _Section(self, module, name, kind)
+        return section
+
+    def record(self, module, name, kind, value):
+        """ Add a sample measured elsewhere.
+
+          @param str module: name of the module
+          @param str name: name of the section
+          @param str kind: kind of the sample
+          @param float value: the sample
+        """
+        if self.enabled:
+            self.add_sample((module, name, kind), value)
+
+    def queued(self, module, name):
+        """ Count a signal emitted to (asynchronously) start the section name. The number of
+        signals still pending when the section starts is recorded as its backlog.
+
+          @param str module: name of the module
+          @param str name: name of the section triggered by the signal
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            key = (module, name)
+            self._pending[key] = self._pending.get(key, 0) + 1
+
+    def dequeued(self, module, name):
+        """ Record the backlog of a section started by a signal counted with queued().
+
+          @param str module: name of the module
+          @param str name: name of the section
+        """
+        with self._lock:
+            pending = self._pending.get((module, name), 0)
+            if pending > 0:
+                self._pending[(module, name)] = pending - 1
+                pending -= 1
+        self.add_sample((module, name, 'backlog'), pending)
+
+    def add_sample(self, key, value):
+        series = self._series.get(key)
+        if series is None:
+            with self._lock:
+                series = self._series.get(key)
+                if series is None:
+                    series = self._series[key] = RollingSamples(self.size)
+        series.add(value)
+
+    def series(self, module=None):
+        """ Get the sample buffers.
+
+          @param str module: only return buffers of this module, None for all
+
+          @return dict: (module, section, kind) -> RollingSamples
+        """
+        with self._lock:
+            items = list(self._series.items())
+        return OrderedDict((key, series) for key, series in items
+                           if module is None or key[0] == module)
+
+    def snapshot(self, module=None, bins=0):
+        """ Summary statistics of all sample buffers, e.g. for display or remote access.
+
+          @param str module: only return statistics of this module, None for all
+          @param int bins: if > 0 include a histogram with this many bins
+
+          @return dict: module -> section -> kind -> statistics dict. Histograms are stored
+                        as lists under the keys 'histogram' and 'bin_edges'.
+        """
+        result = OrderedDict()
+        for (mod, name, kind), series in self.series(module).items():
+            stats = series.statistics()
+            if bins > 0:
+                counts, edges = series.histogram(bins)
+                stats['histogram'] = counts.tolist()
+                stats['bin_edges'] = edges.tolist()
+            result.setdefault(mod, OrderedDict()).setdefault(name, OrderedDict())[kind] = stats
+        return result
+
+    def dump(self, filename, module=None):
+        """ Save the buffered samples to a numpy .npz file. The array names are
+        'module:section:kind'.
+
+          @param str filename: path of the file
+          @param str module: only save samples of this module, None for all
+        """
+        arrays = OrderedDict(('{0}:{1}:{2}'.format(*key), series.samples())
+                             for key, series in self.series(module).items())
+        np.savez(filename, **arrays)
+
+    def reset(self, module=None):
+        """ Discard samples.
+
+          @param str module: only discard samples of this module, None for all
+        """
+        with self._lock:
+            if module is None:
+                self._series.clear()
+                self._pending.clear()
+            else:
+                for key in [key for key in self._series if key[0] == module]:
+                    del self._series[key]
+                for key in [key for key in self._pending if key[0] == module]:
+                    del self._pending[key]
+
+
+profiler = Profiler()
+""" The profiler used by all qudi modules. """
+
+
+def profiled(name=None, kind='duration', queued=False):
+    """ Decorator timing every call of a module method with the global profiler.
+
+    The module name is taken from the instance (qudi modules have a _name attribute).
+
+      @param str name: name of the section, defaults to the method name
+      @param str kind: kind of the samples, 'duration' or 'latency'
+      @param bool queued: the method is started by a signal counted with profiler.queued()
+                          and its backlog is recorded
+    """
+    def decorator(func):
+        section_name = func.__name__ if name is None else name
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if not profiler.enabled:
+                return func(self, *args, **kwargs)
+            module = getattr(self, '_name', type(self).__name__)
+            if queued:
+                profiler.dequeued(module, section_name)
+            with profiler.section(module, section_name, kind):
+                return func(self, *args, **kwargs)
+        return wrapper
+    return decorator
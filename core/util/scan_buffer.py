@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains a preallocated image buffer for line and point scans with several channels
+and scan directions.
+
+All images of a scan live in one contiguous array of shape
+(directions, channels, rows, columns). The per channel images handed out by image() are views
+into it, so code working on single images keeps working while complete lines or points of all
+channels are written with a single vectorized assignment.
+The buffer remembers which scan directions changed since the last display update and rate
+limits the update notifications, so a GUI redraws at a fixed frame rate no matter how fast
+pixels come in. Optionally the buffer is a memory-mapped .npy file. Completed lines are
+then flushed to disk while the scan is running and survive a crash of the application.
+
+Usage:
+
+    buffer = ScanImageBuffer(['counts', 'Height(Dac)'], num_rows, num_columns,
+                             directions=('fw', 'bw'), max_rate=10)
+    buffer.write_line('fw', row, line_data)
+    directions = buffer.take_dirty()
+    if directions:
+        sigDataUpdated.emit(directions)
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import json
+import os
+import threading
+import time
+import numpy as np
+
+
+class ScanImageBuffer:
+    """ Preallocated multi channel, multi direction scan images with change tracking.
+    """
+
+    def __init__(self, channels, num_rows, num_columns, directions=('fw', 'bw'), scale=None,
+                 max_rate=10.0, filename=None, dtype=np.float64):
+        """
+          @param list channels: names of the measured channels
+          @param int num_rows: number of scan lines
+          @param int num_columns: number of points per line
+          @param tuple directions: names of the scan directions
+          @param list scale: optional factor per channel applied to all written values
+          @param float max_rate: maximum rate of update notifications in Hz, 0 for no limit
+          @param str filename: optional path of a .npy file the buffer is memory-mapped to.
+                               The channel and direction names are written to a .json file
+                               with the same name.
+          @param dtype: data type of the images
+        """
+        self.channels = list(channels)
+        self.directions = list(directions)
+        self.filename = filename
+        self.max_rate = max_rate
+        shape = (len(self.directions), len(self.channels), num_rows, num_columns)
+        if filename is None:
+            self.data = np.zeros(shape, dtype=dtype)
+        else:
+            self.data = np.lib.format.open_memmap(filename, mode='w+', dtype=dtype, shape=shape)
+            with open('{0}.json'.format(os.path.splitext(filename)[0]), 'w') as f:
+                json.dump({'directions': self.directions, 'channels': self.channels}, f)
+
+        self._channel_index = {name: ii for ii, name in enumerate(self.channels)}
+        self._direction_index = {name: ii for ii, name in enumerate(self.directions)}
+        if scale is None:
+            self.scale = np.ones(len(self.channels))
+        else:
+            self.scale = np.asarray(scale, dtype=float)
+
+        self._lock = threading.Lock()
+        # scan directions changed since the last notification
+        self._dirty = set()
+        self._last_notification = 0.0
+        self.completed_rows = {direction: 0 for direction in self.directions}
+
+    @property
+    def shape(self):
+        """ (rows, columns) of every image. """
+        return self.data.shape[2:]
+
+    def image(self, direction, channel):
+        """ Image of one channel and direction (a view into the buffer).
+
+          @param str direction: name of the scan direction
+          @param str channel: name of the channel
+
+          @return numpy.ndarray: image, shape (rows, columns)
+        """
+        return self.data[self._direction_index[direction], self._channel_index[channel]]
+
+    def _channel_indices(self, channels):
+        if channels is None:
+            return slice(None), self.scale
+        indices = np.array([self._channel_index[name] for name in channels], dtype=int)
+        return indices, self.scale[indices]
+
+    def write_line(self, direction, row, values, channels=None, reverse=False):
+        """ Write one scan line of several channels.
+
+          @param str direction: name of the scan direction
+          @param int row: row index
+          @param numpy.ndarray values: line data, shape (channels, columns)
+          @param list channels: names of the channels in values, None for all channels
+          @param bool reverse: the line was scanned from the last to the first column
+        """
+        indices, scale = self._channel_indices(channels)
+        values = np.asarray(values)
+        if reverse:
+            values = values[:, ::-1]
+        self.data[self._direction_index[direction], indices, row] = values * scale[:, None]
+        self.mark_dirty(direction)
+
+    def write_point(self, direction, row, column, values, channels=None):
+        """ Write one point of several channels.
+
+          @param str direction: name of the scan direction
+          @param int row: row index
+          @param int column: column index
+          @param numpy.ndarray values: one value per channel
+          @param list channels: names of the channels in values, None for all channels
+        """
+        indices, scale = self._channel_indices(channels)
+        self.data[self._direction_index[direction], indices, row, column] = \
+            np.asarray(values) * scale
+        self.mark_dirty(direction)
+
+    def mark_dirty(self, direction):
+        """ Mark a scan direction as changed since the last display update.
+
+          @param str direction: name of the scan direction
+        """
+        with self._lock:
+            self._dirty.add(direction)
+
+    def take_dirty(self, force=False):
+        """ Get and reset the changed scan directions if a display update is due.
+
+          @param bool force: return the changed directions regardless of the rate limit
+
+          @return list: names of the changed scan directions. Empty if nothing changed or the
+                        next update is not due yet.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if not self._dirty:
+                return list()
+            if not force and self.max_rate > 0 \
+                    and now - self._last_notification < 1 / self.max_rate:
+                return list()
+            directions = [direction for direction in self.directions if direction in self._dirty]
+            self._dirty = set()
+            self._last_notification = now
+        return directions
+
+    def complete_line(self, direction, row):
+        """ Mark a row as finished. A memory-mapped buffer is flushed to disk.
+
+          @param str direction: name of the scan direction
+          @param int row: row index
+        """
+        self.completed_rows[direction] = max(self.completed_rows[direction], row + 1)
+        if self.filename is not None:
+            self.data.flush()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains an accumulator for histograms which are read from 32 bit counter
+registers, e.g. the time traces of the FastComTec cards.
+
+The device keeps a cumulative histogram of unsigned 32 bit values which silently wraps around
+at 2**32. Every poll the histogram is copied into a persistent read buffer (raw). A bin which
+is smaller than at the previous poll has wrapped around, which is counted in a persistent
+int64 offset. The int64 trace is the sum of offset and raw. It is returned in a new array, so
+callers may keep traces of earlier polls. Afterwards the read buffer and the buffer of the
+previous poll swap their roles, so raw and raw_pointer change with every update.
+
+A bin is only unwrapped correctly if it gains less than 2**32 counts between two polls.
+
+Usage:
+
+    accumulator = TraceAccumulator((number_of_gates, number_of_bins))
+    self.dll.LVGetDat(accumulator.raw_pointer, 0)
+    time_trace = accumulator.update()
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import ctypes
+import numpy as np
+
+WRAPAROUND = 2**32
+
+
+class TraceAccumulator:
+    """ Unwraps and accumulates a cumulative uint32 histogram into int64 traces. """
+
+    def __init__(self, shape):
+        """
+          @param tuple shape: shape of the histogram, (bins, ) or (gates, bins)
+        """
+        self.shape = tuple(int(n) for n in np.atleast_1d(shape))
+        self._buffers = [np.zeros(self.shape, dtype=np.uint32) for _ in range(2)]
+        self._pointers = [buffer.ctypes.data_as(ctypes.POINTER(ctypes.c_uint32))
+                          for buffer in self._buffers]
+        self._read_index = 0
+        self._offset = np.zeros(self.shape, dtype=np.int64)
+        self._wrapped = np.zeros(self.shape, dtype=bool)
+        self.wraps = 0
+
+    @property
+    def raw(self):
+        """ Read buffer for the next poll, uint32 array with the shape of the histogram. """
+        return self._buffers[self._read_index]
+
+    @property
+    def raw_pointer(self):
+        """ ctypes pointer to the read buffer for the next poll. """
+        return self._pointers[self._read_index]
+
+    @property
+    def _last(self):
+        return self._buffers[1 - self._read_index]
+
+    def reset(self):
+        """ Start a new accumulation, the device histogram was cleared. """
+        for buffer in self._buffers:
+            buffer[...] = 0
+        self._offset[...] = 0
+        self.wraps = 0
+
+    def hold(self):
+        """ Keep the accumulated trace while the device histogram is cleared, e.g. when a
+        gated measurement is paused and started again.
+        """
+        np.add(self._offset, self._last, out=self._offset)
+        self._last[...] = 0
+
+    def update(self):
+        """ Accumulate the histogram which was read into raw.
+
+          @return numpy.ndarray: new int64 trace with the shape of the histogram
+        """
+        np.less(self.raw, self._last, out=self._wrapped)
+        num_wrapped = int(np.count_nonzero(self._wrapped))
+        if num_wrapped > 0:
+            np.add(self._offset, WRAPAROUND, out=self._offset, where=self._wrapped)
+            self.wraps += num_wrapped
+        output = np.add(self._offset, self.raw, dtype=np.int64)
+        # this poll is the reference of the next one
+        self._read_index = 1 - self._read_index
+        return output
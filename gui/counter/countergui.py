@@ -192,6 +192,8 @@ class CounterGui(GUIBase):
         self._counting_logic.sigSavingStatusChanged.connect(self.update_saving_Action)
         self._counting_logic.sigCountingModeChanged.connect(self.update_counting_mode_ComboBox)
         self._counting_logic.sigCountStatusChanged.connect(self.update_count_status_Action)
+        self._counting_logic.sigLostSamplesChanged.connect(self.update_lost_samples_Label)
+        self.update_lost_samples_Label(self._counting_logic.get_lost_samples())
 
         # Throw a deprecation warning pop-up to encourage users to switch to
         # TimeSeriesGui/TimeSeriesReaderLogic
@@ -253,6 +255,7 @@ class CounterGui(GUIBase):
         self._counting_logic.sigSavingStatusChanged.disconnect()
         self._counting_logic.sigCountingModeChanged.disconnect()
         self._counting_logic.sigCountStatusChanged.disconnect()
+        self._counting_logic.sigLostSamplesChanged.disconnect()
         
         self.saveWindowGeometry(self._mw)
         self._mw.close()
@@ -508,6 +511,18 @@ class CounterGui(GUIBase):
             self._mw.start_counter_Action.setText('Start counter')
         return running
 
+    def update_lost_samples_Label(self, lost_samples):
+        """Show the number of samples the hardware lost because its buffer overflowed
+
+        @param int lost_samples: number of lost samples per channel
+        """
+        self._mw.lost_samples_Label.setText('{0:d}'.format(lost_samples))
+        if lost_samples > 0:
+            self._mw.lost_samples_Label.setStyleSheet('QLabel { color: red; }')
+        else:
+            self._mw.lost_samples_Label.setStyleSheet('')
+        return lost_samples
+
     # TODO:
     def update_counting_mode_ComboBox(self):
         self.log.warning('Not implemented yet')
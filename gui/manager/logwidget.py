@@ -289,6 +289,7 @@ class LogWidget(QtWidgets.QWidget):
     """
     sigDisplayEntry = QtCore.Signal(object)  # for thread-safetyness
     sigAddEntry = QtCore.Signal(object)  # for thread-safetyness
+    sigAddEntries = QtCore.Signal(object)  # for thread-safetyness
     sigScrollToAnchor = QtCore.Signal(object)  # for internal use.
 
     def __init__(self, manager=None, **kwargs):
@@ -306,6 +307,8 @@ class LogWidget(QtWidgets.QWidget):
         uic.loadUi(ui_file, self)
 
         self.logLength = 1000
+        # (logger name, progress key) -> row data of the last progress entry
+        self._progressRows = dict()
 
         # Set up data model and visibility filter
         self.model = LogModel()
@@ -345,6 +348,7 @@ class LogWidget(QtWidgets.QWidget):
         self.sigDisplayEntry.connect(self.displayEntry,
                                      QtCore.Qt.QueuedConnection)
         self.sigAddEntry.connect(self.addEntry, QtCore.Qt.QueuedConnection)
+        self.sigAddEntries.connect(self.addEntries, QtCore.Qt.QueuedConnection)
         self.filterTree.itemChanged.connect(self.setCheckStates)
 
     def setManager(self, manager):
@@ -373,27 +377,82 @@ class LogWidget(QtWidgets.QWidget):
 
           @param dict entry: log entry in dict format
         """
+        self.addEntries([entry])
+
+    def addEntries(self, entries):
+        """Add several log entries to the log view at once.
+
+          Entries carrying progress information replace the row of the
+          previous progress entry with the same key instead of adding a row.
+
+          @param list entries: log entries in dict format
+        """
         # All incoming messages begin here
         # for thread-safetyness:
         isGuiThread = QtCore.QThread.currentThread(
         ) == QtCore.QCoreApplication.instance().thread()
         if not isGuiThread:
-            self.sigAddEntry.emit(entry)
+            self.sigAddEntries.emit(entries)
+            return
+        newRows = list()
+        for entry in entries:
+            text = entry['message']
+            if entry.get('count', 1) > 1:
+                text += ' (x{0:d})'.format(entry['count'])
+            if entry.get('exception') is not None:
+                if 'reasons' in entry['exception']:
+                    text += '\n' + entry['exception']['reasons']
+                if 'message' in entry['exception']:
+                    text += '\n' + entry['exception']['message']
+                for line in entry['exception']['traceback']:
+                    text += '\n' + str(line)
+            logEntry = [entry['name'], entry['timestamp'], entry['level'], text]
+            progress = entry.get('progress')
+            if progress is not None:
+                key = (entry['name'], progress['key'])
+                oldEntry = self._progressRows.get(key)
+                updated = False
+                if oldEntry is not None and any(r is oldEntry for r in newRows):
+                    oldEntry[:] = logEntry
+                    updated = True
+                elif oldEntry is not None:
+                    row = self._rowOf(oldEntry)
+                    if row is not None:
+                        oldEntry[:] = logEntry
+                        self.model.dataChanged.emit(self.model.index(row, 0),
+                                                    self.model.index(row, 3))
+                        updated = True
+                # a finished entry releases the key, so that the next run
+                # with the same key starts a new row
+                if progress['current'] >= progress['total']:
+                    self._progressRows.pop(key, None)
+                elif not updated:
+                    self._progressRows[key] = logEntry
+                if updated:
+                    continue
+            newRows.append(logEntry)
+        if len(newRows) == 0:
             return
+        self.model.addRows(self.model.rowCount(), newRows)
         if self.model.rowCount() > self.logLength:
             self.model.removeRows(0, self.model.rowCount() - self.logLength)
-        text = entry['message']
-        if entry.get('exception') is not None:
-            if 'reasons' in entry['exception']:
-                text += '\n' + entry['exception']['reasons']
-            if 'message' in entry['exception']:
-                text += '\n' + entry['exception']['message']
-            for line in entry['exception']['traceback']:
-                text += '\n' + str(line)
-        logEntry = [entry['name'], entry['timestamp'], entry['level'], text]
-        self.model.addRow(self.model.rowCount(), logEntry)
         self.output.scrollToBottom()
 
+    def _rowOf(self, logEntry):
+        """ Find the row of a log entry still held by the model.
+
+          Progress entries are usually among the last rows, so search from
+          the end.
+
+          @param list logEntry: log entry in list format
+
+          @return int: row of the entry or None if it has been discarded
+        """
+        for row in range(self.model.rowCount() - 1, -1, -1):
+            if self.model.entries[row] is logEntry:
+                return row
+        return None
+
     def displayEntry(self, entry):
         """ Scroll to entry in QTableView.
 
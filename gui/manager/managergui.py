@@ -145,7 +145,7 @@ class ManagerGui(GUIBase):
         self._mw.logwidget.setManager(self._manager)
         for loghandler in logging.getLogger().handlers:
             if isinstance(loghandler, core.logger.QtLogHandler):
-                loghandler.sigLoggedMessage.connect(self.handleLogEntry)
+                loghandler.sigLoggedMessages.connect(self.handleLogEntries)
         # Module widgets
         self.sigStartModule.connect(self._manager.startModule)
         self.sigReloadModule.connect(self._manager.restartModuleRecursive)
@@ -184,6 +184,7 @@ class ManagerGui(GUIBase):
         self._mw.configDisplayDockWidget.hide()
         self._mw.remoteDockWidget.hide()
         self._mw.threadDockWidget.hide()
+        self._mw.profilingDockWidget.hide()
         self._mw.show()
 
     def on_deactivate(self):
@@ -240,24 +241,28 @@ class ManagerGui(GUIBase):
         self._mw.consoleDockWidget.setVisible(True)
         self._mw.remoteDockWidget.setVisible(False)
         self._mw.threadDockWidget.setVisible(False)
+        self._mw.profilingDockWidget.setVisible(False)
         self._mw.logDockWidget.setVisible(True)
 
         self._mw.actionConfigurationView.setChecked(False)
         self._mw.actionConsoleView.setChecked(True)
         self._mw.actionRemoteView.setChecked(False)
         self._mw.actionThreadsView.setChecked(False)
+        self._mw.actionProfilingView.setChecked(False)
         self._mw.actionLogView.setChecked(True)
 
         self._mw.configDisplayDockWidget.setFloating(False)
         self._mw.consoleDockWidget.setFloating(False)
         self._mw.remoteDockWidget.setFloating(False)
         self._mw.threadDockWidget.setFloating(False)
+        self._mw.profilingDockWidget.setFloating(False)
         self._mw.logDockWidget.setFloating(False)
 
         self._mw.addDockWidget(QtCore.Qt.DockWidgetArea(8), self._mw.configDisplayDockWidget)
         self._mw.addDockWidget(QtCore.Qt.DockWidgetArea(2), self._mw.consoleDockWidget)
         self._mw.addDockWidget(QtCore.Qt.DockWidgetArea(8), self._mw.remoteDockWidget)
         self._mw.addDockWidget(QtCore.Qt.DockWidgetArea(8), self._mw.threadDockWidget)
+        self._mw.addDockWidget(QtCore.Qt.DockWidgetArea(8), self._mw.profilingDockWidget)
         self._mw.addDockWidget(QtCore.Qt.DockWidgetArea(8), self._mw.logDockWidget)
 
     def handleLogEntry(self, entry):
@@ -266,9 +271,18 @@ class ManagerGui(GUIBase):
 
             @param dict entry: Log entry
         """
-        self._mw.logwidget.addEntry(entry)
-        if entry['level'] == 'error' or entry['level'] == 'critical':
-            self.errorDialog.show(entry)
+        self.handleLogEntries([entry])
+
+    def handleLogEntries(self, entries):
+        """ Forward a batch of log entries to the log widget and show an error
+            popup for error messages.
+
+            @param list entries: Log entries
+        """
+        self._mw.logwidget.addEntries(entries)
+        for entry in entries:
+            if entry['level'] == 'error' or entry['level'] == 'critical':
+                self.errorDialog.show(entry)
 
     def startIPython(self):
         """ Create an IPython kernel manager and kernel.
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the Qudi profiling widget class of the manager GUI.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import numpy as np
+import pyqtgraph as pg
+from qtpy import QtCore, QtWidgets
+
+from core.util.profiling import profiler
+
+
+class ProfilingWidget(QtWidgets.QWidget):
+    """ Live view of the statistics collected by core.util.profiling.
+
+    Shows one row per module, section and kind of sample and a histogram of the selected row.
+    The view is only updated while the widget is visible.
+    """
+    columns = ['Module / Section', 'Kind', 'Count', 'Mean', 'Median', '90%', '99%', 'Max']
+
+    def __init__(self, parent=None, update_interval=1000):
+        """
+          @param QWidget parent: parent widget
+          @param int update_interval: update interval in ms
+        """
+        super().__init__(parent)
+        self.enabledCheckBox = QtWidgets.QCheckBox('Enabled')
+        self.enabledCheckBox.setChecked(profiler.enabled)
+        self.resetButton = QtWidgets.QPushButton('Reset')
+        self.saveButton = QtWidgets.QPushButton('Save samples...')
+        buttonLayout = QtWidgets.QHBoxLayout()
+        buttonLayout.addWidget(self.enabledCheckBox)
+        buttonLayout.addStretch()
+        buttonLayout.addWidget(self.resetButton)
+        buttonLayout.addWidget(self.saveButton)
+
+        self.statisticsTree = QtWidgets.QTreeWidget()
+        self.statisticsTree.setColumnCount(len(self.columns))
+        self.statisticsTree.setHeaderLabels(self.columns)
+        self.statisticsTree.setAlternatingRowColors(True)
+
+        self.histogramPlot = pg.PlotWidget()
+        self.histogramPlot.setMinimumHeight(120)
+        self.histogramItem = pg.PlotDataItem(stepMode=True, fillLevel=0, brush=(100, 100, 255, 150))
+        self.histogramPlot.addItem(self.histogramItem)
+
+        splitter = QtWidgets.QSplitter(QtCore.Qt.Vertical)
+        splitter.addWidget(self.statisticsTree)
+        splitter.addWidget(self.histogramPlot)
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addLayout(buttonLayout)
+        layout.addWidget(splitter)
+
+        # (module, section, kind) -> tree item
+        self._items = dict()
+        self._moduleItems = dict()
+
+        self.enabledCheckBox.toggled.connect(profiler.enable)
+        self.resetButton.clicked.connect(self.resetStatistics)
+        self.saveButton.clicked.connect(self.saveSamples)
+        self.statisticsTree.currentItemChanged.connect(self.updateHistogram)
+        self.updateTimer = QtCore.QTimer(self)
+        self.updateTimer.timeout.connect(self.updateStatistics)
+        self.updateTimer.start(update_interval)
+
+    def updateStatistics(self):
+        """ Refresh the statistics table and the histogram of the selected row. """
+        if not self.isVisible():
+            return
+        self.enabledCheckBox.setChecked(profiler.enabled)
+        for key, series in profiler.series().items():
+            item = self._items.get(key)
+            if item is None:
+                item = self._createItem(key)
+            stats = series.statistics()
+            item.setText(2, str(stats['total_count']))
+            for column, name in enumerate(('mean', 'p50', 'p90', 'p99', 'max'), 3):
+                item.setText(column, self._formatValue(key[2], stats[name]))
+        self.updateHistogram(self.statisticsTree.currentItem())
+
+    def updateHistogram(self, item, previous=None):
+        """ Show the histogram of the samples of a table row.
+
+          @param QTreeWidgetItem item: row of the statistics table
+          @param QTreeWidgetItem previous: previously selected row (unused)
+        """
+        key = None if item is None else item.data(0, QtCore.Qt.UserRole)
+        series = profiler.series().get(tuple(key)) if key is not None else None
+        if series is None:
+            self.histogramItem.setData([], [])
+            return
+        counts, edges = series.histogram(bins=40)
+        if key[2] != 'backlog':
+            edges = edges * 1e3
+        self.histogramItem.setData(edges, counts)
+        unit = '' if key[2] == 'backlog' else 'ms'
+        self.histogramPlot.setLabel('bottom', '{0} {1}'.format(key[1], key[2]), units=unit)
+
+    def resetStatistics(self):
+        """ Discard all samples and clear the table. """
+        profiler.reset()
+        self.statisticsTree.clear()
+        self._items.clear()
+        self._moduleItems.clear()
+        self.histogramItem.setData([], [])
+
+    def saveSamples(self):
+        """ Save the buffered samples to a .npz file selected by the user. """
+        filename = QtWidgets.QFileDialog.getSaveFileName(
+            self, 'Save profiling samples', '', 'Numpy archive (*.npz)')[0]
+        if filename:
+            profiler.dump(filename)
+
+    def _createItem(self, key):
+        module, section, kind = key
+        moduleItem = self._moduleItems.get(module)
+        if moduleItem is None:
+            moduleItem = QtWidgets.QTreeWidgetItem(self.statisticsTree, [module])
+            moduleItem.setExpanded(True)
+            self._moduleItems[module] = moduleItem
+        item = QtWidgets.QTreeWidgetItem(moduleItem, [section, kind])
+        item.setData(0, QtCore.Qt.UserRole, list(key))
+        self._items[key] = item
+        return item
+
+    @staticmethod
+    def _formatValue(kind, value):
+        if np.isnan(value):
+            return ''
+        if kind == 'backlog':
+            return '{0:.1f}'.format(value)
+        return '{0:.3f} ms'.format(value * 1e3)
@@ -243,7 +243,7 @@ class ProteusQGUI(GUIBase):
         #self.default_view()
 
         self._qafm_logic.sigQAFMScanInitialized.connect(self.adjust_qafm_image)
-        self._qafm_logic.sigQAFMLineScanFinished.connect(self._update_qafm_data)
+        self._qafm_logic.sigQAFMDataUpdated.connect(self._update_qafm_data)
         self._qafm_logic.sigQAFMScanStarted.connect(self.periodic_optimzer_autorun_start)
         self._qafm_logic.sigQAFMScanFinished.connect(self.enable_scan_actions)
         self._qafm_logic.sigQAFMScanFinished.connect(self.autosave_qafm_measurement)
@@ -1887,15 +1887,22 @@ class ProteusQGUI(GUIBase):
             viewbox.updateViewRange()
 
 
-    def _update_qafm_data(self):
-        """ Update all displays of the qafm scan with data from the logic. """
+    def _update_qafm_data(self, directions=None):
+        """ Update the displays of the qafm scan with data from the logic.
+
+        @param list directions: optional, scan directions changed since the last
+                                update. The images of these directions are
+                                redrawn. None updates all displays.
+        """
 
         qafm_data = self._qafm_logic.get_qafm_data()
+        if directions is None:
+            directions = ('fw', 'bw')
 
         # order them in forward scan and backward scan:
-        for direc in ('fw', 'bw'):
+        for direc in directions:
             for param_name in qafm_data:
-                if direc in param_name:
+                if param_name.endswith('_' + direc):
                     dockwidget = self.get_dockwidget(param_name)  # param_name = dockWidgetname
 
                     if dockwidget.checkBox_tilt_corr.isVisible() and \
@@ -21,13 +21,14 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 """
 
 
+import io
 import os
 import time
 import visa
 import numpy as np
 
 from collections import OrderedDict
-from ftplib import FTP
+from ftplib import FTP, all_errors as ftp_errors, error_perm
 from lxml import etree as ET
 
 from core.module import Base
@@ -52,6 +53,8 @@ class AWG70K(Base, PulserInterface):
         # ftp_root_dir: 'C:\\inetpub\\ftproot' # optional, root directory on AWG device
         # ftp_login: 'anonymous' # optional, the username for ftp login
         # ftp_passwd: 'anonymous@' # optional, the password for ftp login
+        # wfmx_in_memory_size: 67108864 # optional, wfmx files up to this size in bytes are
+                                        # built in memory instead of in tmp_work_dir
 
     """
 
@@ -65,6 +68,12 @@ class AWG70K(Base, PulserInterface):
     _ftp_dir = ConfigOption(name='ftp_root_dir', default='C:\\inetpub\\ftproot', missing='warn')
     _username = ConfigOption(name='ftp_login', default='anonymous', missing='warn')
     _password = ConfigOption(name='ftp_passwd', default='anonymous@', missing='warn')
+    _wfmx_in_memory_size = ConfigOption(name='wfmx_in_memory_size',
+                                        default=64 * 2**20,
+                                        missing='nothing')
+
+    # block size of the FTP upload in bytes
+    _ftp_block_size = 2**20
 
     # translation dict from qudi trigger descriptor to device command
     __event_triggers = {'OFF': 'OFF', 'A': 'ATR', 'B': 'BTR', 'INT': 'INT'}
@@ -79,6 +88,9 @@ class AWG70K(Base, PulserInterface):
         self.awg_model = ''  # String describing the model
 
         self.ftp_working_dir = 'waves'  # subfolder of FTP root dir on AWG disk to work in
+        self._ftp_session = None  # FTP connection reused for all file transfers
+        # wfmx files which are currently written, keys are the file names
+        self._wfmx_files = dict()
 
         self.__max_seq_steps = 0
         self.__max_seq_repetitions = 0
@@ -106,9 +118,7 @@ class AWG70K(Base, PulserInterface):
             self.awg.timeout = self._visa_timeout * 1000
 
         # try connecting to AWG using FTP protocol
-        with FTP(self._ip_address) as ftp:
-            ftp.login(user=self._username, passwd=self._password)
-            ftp.cwd(self.ftp_working_dir)
+        self._ftp()
 
         if self.awg is not None:
             self.awg_model = self.query('*IDN?').split(',')[1]
@@ -132,6 +142,10 @@ class AWG70K(Base, PulserInterface):
             self.awg.close()
         except:
             self.log.debug('Closing AWG connection using pyvisa failed.')
+        self._close_ftp()
+        for wfmx in self._wfmx_files.values():
+            wfmx['file'].close()
+        self._wfmx_files.clear()
         self.log.info('Closed connection to AWG')
         return
 
@@ -388,10 +402,6 @@ class AWG70K(Base, PulserInterface):
             # Create waveform name string
             wfm_name = '{0}_ch{1:d}'.format(name, a_ch_num)
 
-            # Check if waveform already exists and delete if necessary.
-            if wfm_name in self.get_waveform_names():
-                self.delete_waveform(wfm_name)
-
             # Write WFMX file for waveform
             start = time.time()
             self._write_wfmx(filename=wfm_name,
@@ -402,6 +412,15 @@ class AWG70K(Base, PulserInterface):
                              total_number_of_samples=total_number_of_samples)
             self.log.debug('Write WFMX file: {0}'.format(time.time() - start))
 
+            # The file is transferred and loaded only once it is complete
+            if not is_last_chunk:
+                waveforms.append(wfm_name)
+                continue
+
+            # Check if waveform already exists and delete if necessary.
+            if wfm_name in self.get_waveform_names():
+                self.delete_waveform(wfm_name)
+
             # transfer waveform to AWG and load into workspace
             start = time.time()
             self._send_file(filename=wfm_name + '.wfmx')
@@ -1509,30 +1528,59 @@ class AWG70K(Base, PulserInterface):
         """
         return bool(int(self.query('AWGC:RST?')))
 
+    def _ftp(self):
+        """ FTP session in the working directory on the AWG.
+
+        The session is opened once and reused for all transfers. It is opened again if the AWG
+        closed it in the meantime.
+
+        @return ftplib.FTP: logged in FTP session
+        """
+        if self._ftp_session is not None:
+            try:
+                self._ftp_session.voidcmd('NOOP')
+                return self._ftp_session
+            except ftp_errors:
+                self.log.debug('FTP session to AWG was closed, reconnecting.')
+                self._close_ftp()
+        ftp = FTP(self._ip_address)
+        ftp.login(user=self._username, passwd=self._password)
+        ftp.cwd(self.ftp_working_dir)
+        self._ftp_session = ftp
+        return ftp
+
+    def _close_ftp(self):
+        """ Close the FTP session if one is open.
+        """
+        if self._ftp_session is not None:
+            try:
+                self._ftp_session.quit()
+            except ftp_errors:
+                self._ftp_session.close()
+            self._ftp_session = None
+        return
+
     def _get_filenames_on_device(self):
         """
 
         @return list: filenames found in <ftproot>\\waves
         """
         filename_list = list()
-        with FTP(self._ip_address) as ftp:
-            ftp.login(user=self._username, passwd=self._password)
-            ftp.cwd(self.ftp_working_dir)
-            # get only the files from the dir and skip possible directories
-            log = list()
-            ftp.retrlines('LIST', callback=log.append)
-            for line in log:
-                if '<DIR>' not in line:
-                    # that is how a potential line is looking like:
-                    #   '05-10-16  05:22PM                  292 SSR aom adjusted.seq'
-                    # The first part consists of the date information. Remove this information and
-                    # separate the first number, which indicates the size of the file. This is
-                    # necessary if the filename contains whitespaces.
-                    size_filename = line[18:].lstrip()
-                    # split after the first appearing whitespace and take the rest as filename.
-                    # Remove for safety all trailing and leading whitespaces:
-                    filename = size_filename.split(' ', 1)[1].strip()
-                    filename_list.append(filename)
+        # get only the files from the dir and skip possible directories
+        log = list()
+        self._ftp().retrlines('LIST', callback=log.append)
+        for line in log:
+            if '<DIR>' not in line:
+                # that is how a potential line is looking like:
+                #   '05-10-16  05:22PM                  292 SSR aom adjusted.seq'
+                # The first part consists of the date information. Remove this information and
+                # separate the first number, which indicates the size of the file. This is
+                # necessary if the filename contains whitespaces.
+                size_filename = line[18:].lstrip()
+                # split after the first appearing whitespace and take the rest as filename.
+                # Remove for safety all trailing and leading whitespaces:
+                filename = size_filename.split(' ', 1)[1].strip()
+                filename_list.append(filename)
         return filename_list
 
     def _delete_file(self, filename):
@@ -1540,39 +1588,42 @@ class AWG70K(Base, PulserInterface):
 
         @param str filename:
         """
-        if filename in self._get_filenames_on_device():
-            with FTP(self._ip_address) as ftp:
-                ftp.login(user=self._username, passwd=self._password)
-                ftp.cwd(self.ftp_working_dir)
-                ftp.delete(filename)
+        try:
+            self._ftp().delete(filename)
+        except error_perm:
+            # the file does not exist
+            pass
         return
 
     def _send_file(self, filename):
         """
+        Upload a file to the working directory of the AWG. wfmx files which were built in memory
+        are uploaded from memory, all other files from the tmp_work_dir.
 
-        @param filename:
-        @return:
+        @param str filename: name of the file
+        @return int: error code (0:OK, -1:error)
         """
         # check input
         if not filename:
             self.log.error('No filename provided for file upload to awg!\nCommand will be ignored.')
             return -1
 
-        filepath = os.path.join(self._tmp_work_dir, filename)
-        if not os.path.isfile(filepath):
-            self.log.error('No file "{0}" found in "{1}". Unable to upload!'
-                           ''.format(filename, self._tmp_work_dir))
-            return -1
-
-        # Delete old file on AWG by the same filename
-        self._delete_file(filename)
+        wfmx = self._wfmx_files.pop(filename, None)
+        if wfmx is not None and wfmx['in_memory']:
+            file = wfmx['file']
+            file.seek(0)
+        else:
+            filepath = os.path.join(self._tmp_work_dir, filename)
+            if not os.path.isfile(filepath):
+                self.log.error('No file "{0}" found in "{1}". Unable to upload!'
+                               ''.format(filename, self._tmp_work_dir))
+                return -1
+            file = open(filepath, 'rb')
 
-        # Transfer file
-        with FTP(self._ip_address) as ftp:
-            ftp.login(user=self._username, passwd=self._password)
-            ftp.cwd(self.ftp_working_dir)
-            with open(filepath, 'rb') as file:
-                ftp.storbinary('STOR ' + filename, file)
+        # Delete old file on AWG by the same filename and transfer file
+        with file:
+            self._delete_file(filename)
+            self._ftp().storbinary('STOR ' + filename, file, blocksize=self._ftp_block_size)
         return 0
 
     def _write_wfmx(self, filename, analog_samples, marker_bytes, is_first_chunk, is_last_chunk,
@@ -1583,6 +1634,12 @@ class AWG70K(Base, PulserInterface):
         If both flags (is_first_chunk, is_last_chunk) are set to TRUE it means
         that the whole ensemble is written as a whole in one big chunk.
 
+        The file consists of the xml header, the analog samples (float32) of the whole waveform
+        and, if present, the marker bytes of the whole waveform. Since the total number of samples
+        is known with the first chunk, the position of every chunk in both sections is known as
+        well and the chunks are written directly at their offsets. Files up to
+        wfmx_in_memory_size bytes are built in memory and uploaded from there by _send_file.
+
         @param name: string, represents the name of the sampled ensemble
         @param analog_samples: dict containing float32 numpy ndarrays, contains the
                                        samples for the analog channels that
@@ -1596,58 +1653,53 @@ class AWG70K(Base, PulserInterface):
                                first write to this file.
         @param is_last_chunk: bool, indicates if the current chunk is the last
                               write to this file.
-
-        @return list: the list contains the string names of the created files for the passed
-                      presampled arrays
         """
-        # The memory overhead of the tmp file write/read process in bytes. Only used if wfmx file is
-        # written in chunks in order to avoid excessive memory usage.
-        tmp_bytes_overhead = 16777216  # 16 MB
-
         if not filename.endswith('.wfmx'):
             filename += '.wfmx'
-        wfmx_path = os.path.join(self._tmp_work_dir, filename)
-        tmp_path = os.path.join(self._tmp_work_dir, 'digital_tmp.bin')
 
         # if it is the first chunk, create the .WFMX file with header.
         if is_first_chunk:
+            wfmx = self._wfmx_files.pop(filename, None)
+            if wfmx is not None:
+                wfmx['file'].close()
             # create header
-            header = self._create_xml_header(total_number_of_samples, marker_bytes is not None)
-            # write header
-            with open(wfmx_path, 'wb') as wfmxfile:
-                wfmxfile.write(header.encode('utf8'))
-            # Check if a tmp digital samples file is present and delete it if necessary.
-            if os.path.isfile(tmp_path):
-                os.remove(tmp_path)
-
-        # append analog samples to the .WFMX file.
-        # Write digital samples in temporary file if not the entire samples are passed at once.
-        with open(wfmx_path, 'ab') as wfmxfile:
-            # append analog samples in binary format. One sample is 4 bytes (np.float32).
-            wfmxfile.write(analog_samples)
-
-        # Write digital samples to tmp file if chunkwise writing is used and it's not the last chunk
-        if not is_last_chunk and marker_bytes is not None:
-            with open(tmp_path, 'ab') as tmp_file:
-                tmp_file.write(marker_bytes)
-
-        # If this is the last chunk, write digital samples from tmp file to wfmx file (if present)
-        # and also append the currently passed digital samples to wfmx file.
-        # Read from tmp file in chunks of tmp_bytes_overhead in order to avoid too much memory
-        # overhead.
-        if is_last_chunk and marker_bytes is not None:
-            with open(wfmx_path, 'ab') as wfmxfile:
-                # Copy over digital samples from tmp file. Delete tmp file afterwards.
-                if os.path.isfile(tmp_path):
-                    with open(tmp_path, 'rb') as tmp_file:
-                        while True:
-                            tmp = tmp_file.read(tmp_bytes_overhead)
-                            if not tmp:
-                                break
-                            wfmxfile.write(tmp)
-                    os.remove(tmp_path)
-                # Append current digital samples array to wfmx file
-                wfmxfile.write(marker_bytes)
+            header = self._create_xml_header(total_number_of_samples,
+                                             marker_bytes is not None).encode('utf8')
+            file_size = len(header) + total_number_of_samples * (5 if marker_bytes is not None
+                                                                 else 4)
+            in_memory = file_size <= self._wfmx_in_memory_size
+            if in_memory:
+                file = io.BytesIO()
+            else:
+                file = open(os.path.join(self._tmp_work_dir, filename), 'w+b')
+            file.write(header)
+            wfmx = {'file': file,
+                    'in_memory': in_memory,
+                    'analog_offset': len(header),
+                    'marker_offset': len(header) + 4 * total_number_of_samples,
+                    'samples_written': 0}
+            self._wfmx_files[filename] = wfmx
+        else:
+            wfmx = self._wfmx_files.get(filename)
+            if wfmx is None:
+                self.log.error('Unable to append samples to "{0}", the first chunk was not '
+                               'written.'.format(filename))
+                return
+
+        file = wfmx['file']
+        # analog samples in binary format. One sample is 4 bytes (np.float32).
+        file.seek(wfmx['analog_offset'] + 4 * wfmx['samples_written'])
+        file.write(analog_samples)
+        # one marker byte per sample after the analog samples of the whole waveform
+        if marker_bytes is not None:
+            file.seek(wfmx['marker_offset'] + wfmx['samples_written'])
+            file.write(marker_bytes)
+        wfmx['samples_written'] += len(analog_samples)
+
+        # files on disk are complete, files in memory are kept until _send_file uploads them.
+        if is_last_chunk and not wfmx['in_memory']:
+            file.close()
+            del self._wfmx_files[filename]
         return
 
     def _create_xml_header(self, number_of_samples, markers_active):
@@ -26,16 +26,28 @@ from core.module import Base
 from core.connector import Connector
 from core.configoption import ConfigOption
 from interface.confocal_scanner_interface import ConfocalScannerInterface
+from interface.confocal_scanner_interface import ConfocalFrameScannerInterface
 
 
-class ConfocalScannerDummy(Base, ConfocalScannerInterface):
+class ConfocalScannerDummy(Base, ConfocalScannerInterface, ConfocalFrameScannerInterface):
     """ Dummy confocal scanner. Produces a picture with several gaussian spots.
 
+    Supports scanning whole frames in one stream (ConfocalFrameScannerInterface). The lines of a
+    frame become available in real time according to the clock frequency.
+
+    The emitters are sorted into a grid of cells of the size of the cutoff radius, so for every
+    sample only the emitters in the neighbouring cells are evaluated. With psf_lookup the
+    fluorescence of all emitters is precomputed once on a 3D grid with a spacing of half the mean
+    emitter width and every sample is interpolated (trilinear) from that volume.
+
     Example config for copy-paste:
 
     confocal_scanner_dummy:
         module.Class: 'confocal_scanner_dummy.ConfocalScannerDummy'
         clock_frequency: 100 # in Hz
+        num_points: 500 # number of simulated emitters
+        seed: null # seed of the random emitter positions and noise, null for a random sample
+        psf_lookup: False # use a precomputed PSF volume for faster simulation
         fitlogic: 'fitlogic' # name of the fitlogic module, see default config
 
     """
@@ -45,6 +57,12 @@ class ConfocalScannerDummy(Base, ConfocalScannerInterface):
 
     # config
     _clock_frequency = ConfigOption('clock_frequency', 100, missing='warn')
+    _num_points = ConfigOption('num_points', 500)
+    _seed = ConfigOption('seed', None)
+    _psf_lookup = ConfigOption('psf_lookup', False)
+
+    # emitters further away than this many (maximum) sigma are not evaluated
+    _cutoff_sigma = 5
 
     def __init__(self, config, **kwargs):
         super().__init__(config=config, **kwargs)
@@ -55,7 +73,12 @@ class ConfocalScannerDummy(Base, ConfocalScannerInterface):
 
         self._position_range = [[0, 100e-6], [0, 100e-6], [0, 100e-6], [0, 1e-6]]
         self._current_position = [0, 0, 0, 0][0:len(self.get_scanner_axes())]
-        self._num_points = 500
+
+        # frame stream
+        self._frame_path = None
+        self._frame_samples_per_line = 0
+        self._frame_start_time = 0
+        self._frame_lines_read = 0
 
     def on_activate(self):
         """ Initialisation performed during activation of the module.
@@ -63,30 +86,32 @@ class ConfocalScannerDummy(Base, ConfocalScannerInterface):
 
         self._fit_logic = self.fitlogic()
 
+        self._rng = np.random.RandomState(self._seed)
+
         # put randomly distributed NVs in the scanner, first the x,y scan
         self._points = np.empty([self._num_points, 7])
         # amplitude
-        self._points[:, 0] = np.random.normal(
+        self._points[:, 0] = self._rng.normal(
             4e5,
             1e5,
             self._num_points)
         # x_zero
-        self._points[:, 1] = np.random.uniform(
+        self._points[:, 1] = self._rng.uniform(
             self._position_range[0][0],
             self._position_range[0][1],
             self._num_points)
         # y_zero
-        self._points[:, 2] = np.random.uniform(
+        self._points[:, 2] = self._rng.uniform(
             self._position_range[1][0],
             self._position_range[1][1],
             self._num_points)
         # sigma_x
-        self._points[:, 3] = np.random.normal(
+        self._points[:, 3] = self._rng.normal(
             0.7e-6,
             0.1e-6,
             self._num_points)
         # sigma_y
-        self._points[:, 4] = np.random.normal(
+        self._points[:, 4] = self._rng.normal(
             0.7e-6,
             0.1e-6,
             self._num_points)
@@ -100,19 +125,19 @@ class ConfocalScannerDummy(Base, ConfocalScannerInterface):
 
         self._points_z = np.empty([self._num_points, 4])
         # amplitude
-        self._points_z[:, 0] = np.random.normal(
+        self._points_z[:, 0] = self._rng.normal(
             1,
             0.05,
             self._num_points)
 
         # x_zero
-        self._points_z[:, 1] = np.random.uniform(
+        self._points_z[:, 1] = self._rng.uniform(
             45e-6,
             55e-6,
             self._num_points)
 
         # sigma
-        self._points_z[:, 2] = np.random.normal(
+        self._points_z[:, 2] = self._rng.normal(
             0.5e-6,
             0.1e-6,
             self._num_points)
@@ -120,6 +145,8 @@ class ConfocalScannerDummy(Base, ConfocalScannerInterface):
         # offset
         self._points_z[:, 3] = 0
 
+        self._build_emitter_index()
+
     def on_deactivate(self):
         """ Deactivate properly the confocal scanner dummy.
         """
@@ -316,16 +343,7 @@ class ConfocalScannerDummy(Base, ConfocalScannerInterface):
         if np.shape(line_path)[1] != self._line_length:
             self._set_up_line(np.shape(line_path)[1])
 
-        count_data = np.random.uniform(0, 2e4, self._line_length)
-        z_data = line_path[2, :]
-
-        #TODO: Change the gaussian function here to the one from fitlogic and delete the local modules to calculate
-        #the gaussian functions
-        x_data = np.array(line_path[0, :])
-        y_data = np.array(line_path[1, :])
-        for i in range(self._num_points):
-            count_data += self.twoD_gaussian_function((x_data, y_data), *(self._points[i])
-                ) * self.gaussian_function(np.array(z_data), *(self._points_z[i]))
+        count_data = self._simulate_counts(line_path)
 
         time.sleep(self._line_length * 1. / self._clock_frequency)
         time.sleep(self._line_length * 1. / self._clock_frequency)
@@ -333,12 +351,248 @@ class ConfocalScannerDummy(Base, ConfocalScannerInterface):
         # update the scanner position instance variable
         self._current_position = list(line_path[:, -1])
 
+        return count_data
+
+    def _simulate_counts(self, path, samples_per_line=None):
+        """ Count rates of all channels along a scanner path.
+
+        @param float[][n] path: positions of n samples
+        @param int samples_per_line: optional, number of samples per line if the path consists
+                                     of several lines. Default is a single line.
+
+        @return float[n][3]: the photon counts per second of n samples
+        """
+        path = np.asarray(path, dtype=np.float64)
+        count_data = self._rng.uniform(0, 2e4, path.shape[1])
+        x_data = path[0, :]
+        y_data = path[1, :]
+        z_data = path[2, :]
+
+        if self._psf_lookup:
+            count_data += self._psf_value(x_data, y_data, z_data)
+        else:
+            samples, emitters = self._find_emitter_pairs(x_data, y_data)
+            dx = x_data[samples] - self._points[emitters, 1]
+            dy = y_data[samples] - self._points[emitters, 2]
+            dz = z_data[samples] - self._points_z[emitters, 1]
+            a, b, c = self._psf_coefficients[:, emitters]
+            signal = self._points[emitters, 0] * self._points_z[emitters, 0] * np.exp(
+                -(a * dx ** 2 + 2 * b * dx * dy + c * dy ** 2)
+                - dz ** 2 / (2 * self._points_z[emitters, 2] ** 2))
+            count_data += np.bincount(samples, weights=signal, minlength=count_data.size)
+
+        # the third channel is constant along each line, given by its first y position
+        if samples_per_line is None:
+            samples_per_line = max(path.shape[1], 1)
+        line_data = np.repeat(path[1, ::samples_per_line] * 100, samples_per_line)
+
         return np.array([
                 count_data,
                 5e5 - count_data,
-                np.ones(count_data.shape) * line_path[1, 0] * 100
+                line_data[:path.shape[1]]
             ]).transpose()
 
+    def _build_emitter_index(self):
+        """ Sort the emitters into a 2D grid of cells and precompute the emitter shapes.
+
+        The cell size equals the cutoff radius, so all emitters contributing to a sample are in
+        the cell of the sample or one of its 8 neighbours. The emitter offsets are zero and
+        therefore not simulated. Also builds the fluorescence volume if psf_lookup is set.
+        """
+        amplitude, x_zero, y_zero, sigma_x, sigma_y, theta, offset = self._points.T
+        self._psf_coefficients = np.array([
+            np.cos(theta) ** 2 / (2 * sigma_x ** 2) + np.sin(theta) ** 2 / (2 * sigma_y ** 2),
+            -np.sin(2 * theta) / (4 * sigma_x ** 2) + np.sin(2 * theta) / (4 * sigma_y ** 2),
+            np.sin(theta) ** 2 / (2 * sigma_x ** 2) + np.cos(theta) ** 2 / (2 * sigma_y ** 2)])
+
+        max_sigma = np.max(np.abs(self._points[:, 3:5])) if self._num_points > 0 else 1e-6
+        self._cutoff_radius = self._cutoff_sigma * max_sigma
+        self._grid_origin = np.array([self._position_range[0][0], self._position_range[1][0]])
+        extent = np.array([self._position_range[0][1], self._position_range[1][1]]) \
+            - self._grid_origin
+        self._grid_shape = np.maximum(np.ceil(extent / self._cutoff_radius), 1).astype(int)
+
+        cells = self._cell_index(*self._grid_cell(x_zero, y_zero))
+        order = np.argsort(cells, kind='stable')
+        self._points = self._points[order]
+        self._points_z = self._points_z[order]
+        self._psf_coefficients = self._psf_coefficients[:, order]
+        counts = np.bincount(cells, minlength=int(np.prod(self._grid_shape)))
+        self._cell_count = counts
+        self._cell_start = np.cumsum(counts) - counts
+
+        if self._psf_lookup:
+            self._build_psf_volume()
+
+    def _grid_cell(self, x, y):
+        ix = np.floor((x - self._grid_origin[0]) / self._cutoff_radius).astype(int)
+        iy = np.floor((y - self._grid_origin[1]) / self._cutoff_radius).astype(int)
+        return np.clip(ix, 0, self._grid_shape[0] - 1), np.clip(iy, 0, self._grid_shape[1] - 1)
+
+    def _cell_index(self, ix, iy):
+        return ix * self._grid_shape[1] + iy
+
+    def _find_emitter_pairs(self, x_data, y_data):
+        """ Find the emitters close enough to contribute to each sample.
+
+        @param numpy.ndarray x_data: x positions of the samples
+        @param numpy.ndarray y_data: y positions of the samples
+
+        @return tuple(numpy.ndarray, numpy.ndarray): sample and emitter index of every pair
+        """
+        ix, iy = self._grid_cell(x_data, y_data)
+        sample_indices = list()
+        emitter_indices = list()
+        for shift_x in (-1, 0, 1):
+            for shift_y in (-1, 0, 1):
+                nx = ix + shift_x
+                ny = iy + shift_y
+                valid = np.flatnonzero((nx >= 0) & (nx < self._grid_shape[0])
+                                       & (ny >= 0) & (ny < self._grid_shape[1]))
+                cells = self._cell_index(nx[valid], ny[valid])
+                counts = self._cell_count[cells]
+                total = counts.sum()
+                if total == 0:
+                    continue
+                # index of each pair within its cell
+                within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+                sample_indices.append(np.repeat(valid, counts))
+                emitter_indices.append(np.repeat(self._cell_start[cells], counts) + within)
+        if not sample_indices:
+            return np.empty(0, dtype=int), np.empty(0, dtype=int)
+        return np.concatenate(sample_indices), np.concatenate(emitter_indices)
+
+    def _build_psf_volume(self):
+        """ Precompute the fluorescence of all emitters on a 3D grid.
+
+        The grid spacing is half the mean emitter width. Axially the volume only covers the
+        range in which emitters are found (plus the cutoff), the signal is zero outside.
+        """
+        step = np.array([np.mean(self._points[:, 3]),
+                         np.mean(self._points[:, 4]),
+                         np.mean(self._points_z[:, 2])]) / 2
+        z_cutoff = self._cutoff_sigma * np.max(np.abs(self._points_z[:, 2]))
+        origin = np.array([self._position_range[0][0],
+                           self._position_range[1][0],
+                           np.min(self._points_z[:, 1]) - z_cutoff])
+        end = np.array([self._position_range[0][1],
+                        self._position_range[1][1],
+                        np.max(self._points_z[:, 1]) + z_cutoff])
+        shape = np.floor((end - origin) / step).astype(int) + 1
+        volume = np.zeros(shape, dtype=np.float32)
+        axes = [origin[ii] + step[ii] * np.arange(shape[ii]) for ii in range(3)]
+        half_width = np.ceil(np.array([self._cutoff_radius, self._cutoff_radius, z_cutoff])
+                             / step).astype(int)
+
+        # each emitter only adds to the grid points within the cutoff around it
+        for point, point_z, (a, b, c) in zip(self._points, self._points_z,
+                                             self._psf_coefficients.T):
+            center = np.rint((np.array([point[1], point[2], point_z[1]]) - origin)
+                             / step).astype(int)
+            lo = np.maximum(center - half_width, 0)
+            hi = np.minimum(center + half_width + 1, shape)
+            dx = axes[0][lo[0]:hi[0], None] - point[1]
+            dy = axes[1][None, lo[1]:hi[1]] - point[2]
+            dz = axes[2][lo[2]:hi[2]] - point_z[1]
+            lateral = np.exp(-(a * dx ** 2 + 2 * b * dx * dy + c * dy ** 2))
+            axial = np.exp(-dz ** 2 / (2 * point_z[2] ** 2))
+            volume[lo[0]:hi[0], lo[1]:hi[1], lo[2]:hi[2]] += (
+                point[0] * point_z[0] * lateral[:, :, None] * axial[None, None, :])
+
+        self._psf_volume = volume
+        self._psf_origin = origin
+        self._psf_step = step
+
+    def _psf_value(self, x, y, z):
+        """ Interpolate (trilinear) the precomputed fluorescence at the sample positions. """
+        shape = np.array(self._psf_volume.shape)
+        coords = np.vstack([(d - o) / st for d, o, st in
+                            zip((x, y, z), self._psf_origin, self._psf_step)])
+        inside = np.all((coords >= 0) & (coords <= shape[:, None] - 1), axis=0)
+        coords = coords[:, inside]
+        lower = np.minimum(np.floor(coords).astype(int), shape[:, None] - 2)
+        frac = coords - lower
+        values = np.zeros(x.shape)
+        signal = np.zeros(coords.shape[1])
+        for corner in np.ndindex(2, 2, 2):
+            weight = np.prod([f if c else 1 - f for f, c in zip(frac, corner)], axis=0)
+            signal += weight * self._psf_volume[lower[0] + corner[0],
+                                                lower[1] + corner[1],
+                                                lower[2] + corner[2]]
+        values[inside] = signal
+        return values
+
+    def start_frame_stream(self, frame_path=None, samples_per_line=None, pixel_clock=False):
+        """ Uploads the trajectory of a whole frame and starts scanning it.
+
+        @param float[k][n*m] frame_path: k axis positions of n lines with m samples each, the lines
+                                         are concatenated
+        @param int samples_per_line: number of samples m of each line
+        @param bool pixel_clock: whether we need to output a pixel clock for the frame
+
+        @return int: error code (0:OK, -1:error)
+        """
+        if not isinstance(frame_path, (frozenset, list, set, tuple, np.ndarray, )):
+            self.log.error('Given frame path is no array type.')
+            return -1
+        frame_path = np.asarray(frame_path)
+        if samples_per_line is None or samples_per_line < 1 \
+                or frame_path.shape[1] % samples_per_line != 0:
+            self.log.error('Length of the frame path ({0:d}) is not a multiple of the samples per '
+                           'line ({1}).'.format(frame_path.shape[1], samples_per_line))
+            return -1
+        self._frame_path = frame_path
+        self._frame_samples_per_line = int(samples_per_line)
+        self._frame_lines_read = 0
+        self._frame_start_time = time.perf_counter()
+        return 0
+
+    def read_lines(self, number_of_lines=None, timeout=None):
+        """ Returns the counts of lines of the running frame stream that are completed.
+
+        @param int number_of_lines: maximum number of lines to return, None for all completed lines
+        @param float timeout: maximum time to wait for a line in s, None for a hardware default
+
+        @return float[l][m][c]: the photon counts per second of l completed lines with m samples
+                                and c channels
+        """
+        if self._frame_path is None:
+            self.log.error('No frame stream running.')
+            return np.array([[[-1.]]])
+        spl = self._frame_samples_per_line
+        total_lines = self._frame_path.shape[1] // spl
+        if self._frame_lines_read >= total_lines:
+            return np.empty((0, spl, len(self.get_scanner_count_channels())))
+        line_time = spl / self._clock_frequency
+        if timeout is None:
+            timeout = 2 * line_time + 1
+        # wait for the next line to complete
+        next_line_done = self._frame_start_time + (self._frame_lines_read + 1) * line_time
+        wait_time = next_line_done - time.perf_counter()
+        if wait_time > timeout:
+            time.sleep(timeout)
+            return np.empty((0, spl, len(self.get_scanner_count_channels())))
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+        completed = min(int((time.perf_counter() - self._frame_start_time) / line_time),
+                        total_lines)
+        stop = completed
+        if number_of_lines is not None:
+            stop = min(stop, self._frame_lines_read + number_of_lines)
+        path = self._frame_path[:, self._frame_lines_read * spl:stop * spl]
+        self._frame_lines_read = stop
+        self._current_position = list(path[:, -1])
+        return self._simulate_counts(path, samples_per_line=spl).reshape((-1, spl, len(self.get_scanner_count_channels())))
+
+    def stop_frame_stream(self):
+        """ Stops the frame stream.
+
+        @return int: error code (0:OK, -1:error)
+        """
+        self._frame_path = None
+        return 0
+
     def close_scanner(self):
         """ Closes the scanner and cleans up afterwards.
 
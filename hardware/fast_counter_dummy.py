@@ -27,6 +27,7 @@ import numpy as np
 from core.module import Base
 from core.configoption import ConfigOption
 from core.util.modules import get_main_dir
+from core.util.trace_accumulator import TraceAccumulator
 from interface.fast_counter_interface import FastCounterInterface
 
 
@@ -39,12 +40,45 @@ class FastCounterDummy(Base, FastCounterInterface):
         module.Class: 'fast_counter_dummy.FastCounterDummy'
         gated: False
         #load_trace: None # path to the saved dummy trace
-
+        #emulate_fastcomtec: False # read the trace like the FastComTec MCS6 without waiting
+        #emulated_counts_scale: 1 # factor for the counts added per poll, large values let the
+                                  # 32 bit bins of the emulated card wrap around. The counts
+                                  # added per poll have to stay below 2**32.
+        #trace_source: 'file'     # 'file' (load_trace) or 'synthetic'
+        # the following options are only used for synthetic traces
+        #count_rate: 200e3        # count rate during the laser pulses in counts/s
+        #dark_count_rate: 500     # count rate outside the laser pulses in counts/s
+        #contrast: 0.3            # fluorescence contrast of the spin states
+        #polarization_time: 300e-9  # decay time of the spin dependent fluorescence in s
+        #signal_model: 'rabi'     # 'rabi', 'ramsey' or 'flat'
+        #signal_frequency: 5e6    # Rabi frequency or Ramsey detuning in Hz
+        #signal_decay: 2e-6       # decay time of the oscillation in s, 0 for no decay
+        #sweep_rate: null         # sweeps/s, null to derive it from the loaded sequence
+        #laser_delay: 0           # delay of the fluorescence relative to the laser in s
+
+    Synthetic traces are built from the sampling information of the loaded pulse sequence
+    (laser positions and sample rate) and the measurement information (controlled variable,
+    alternating, ignored lasers), which the pulsed measurement logic passes on with
+    set_sequence_information. The controlled variable is interpreted as the free evolution
+    time of the signal model. Every poll adds Poisson distributed counts of all sweeps which
+    passed since the previous poll, without waiting.
     """
 
     # config option
     _gated = ConfigOption('gated', False, missing='warn')
     trace_path = ConfigOption('load_trace', None)
+    _emulate_fastcomtec = ConfigOption('emulate_fastcomtec', False)
+    _emulated_counts_scale = ConfigOption('emulated_counts_scale', 1)
+    _trace_source = ConfigOption('trace_source', 'file')
+    _count_rate = ConfigOption('count_rate', 200e3)
+    _dark_count_rate = ConfigOption('dark_count_rate', 500)
+    _contrast = ConfigOption('contrast', 0.3)
+    _polarization_time = ConfigOption('polarization_time', 300e-9)
+    _signal_model = ConfigOption('signal_model', 'rabi')
+    _signal_frequency = ConfigOption('signal_frequency', 5e6)
+    _signal_decay = ConfigOption('signal_decay', 2e-6)
+    _sweep_rate = ConfigOption('sweep_rate', None)
+    _laser_delay = ConfigOption('laser_delay', 0.0)
 
     def __init__(self, config, **kwargs):
         super().__init__(config=config, **kwargs)
@@ -67,6 +101,23 @@ class FastCounterDummy(Base, FastCounterInterface):
         self.statusvar = 0
         self._binwidth = 1
         self._gate_length_bins = 8192
+        self._number_of_gates = 0
+
+        if self._trace_source not in ('file', 'synthetic'):
+            self.log.error('Unknown trace_source "{0}", loading the trace from file instead.'
+                           ''.format(self._trace_source))
+            self._trace_source = 'file'
+        if self._signal_model not in ('rabi', 'ramsey', 'flat'):
+            self.log.error('Unknown signal_model "{0}", using "flat" instead.'
+                           ''.format(self._signal_model))
+            self._signal_model = 'flat'
+        self._sampling_information = dict()
+        self._measurement_information = dict()
+        self._rng = np.random.default_rng()
+        # set up by start_measure
+        self._expected_counts = None
+        self._count_data = None
+        self._card_histogram = None
         return
 
     def on_deactivate(self):
@@ -136,6 +187,7 @@ class FastCounterDummy(Base, FastCounterInterface):
         self._gate_length_bins = int(np.rint(record_length_s / bin_width_s))
         actual_binwidth = self._binwidth * 1000 / 950e9
         actual_length = self._gate_length_bins * actual_binwidth
+        self._number_of_gates = int(number_of_gates) if number_of_gates else 0
         self.statusvar = 1
         return actual_binwidth, actual_length, number_of_gates
 
@@ -153,15 +205,32 @@ class FastCounterDummy(Base, FastCounterInterface):
         return self.statusvar
 
     def start_measure(self):
-        time.sleep(1)
-        self.statusvar = 2
-        try:
-            self._count_data = np.loadtxt(self.trace_path, dtype='int64')
-        except:
-            return -1
-
-        if self._gated:
-            self._count_data = self._count_data.transpose()
+        if self._trace_source == 'synthetic':
+            self._expected_counts = self._synthesize_expected_counts()
+            shape = self._expected_counts.shape
+            self._trace = np.zeros(shape, dtype=np.int64)
+            self.statusvar = 2
+        else:
+            time.sleep(1)
+            self.statusvar = 2
+            try:
+                self._count_data = np.loadtxt(self.trace_path, dtype='int64')
+            except:
+                return -1
+
+            if self._gated:
+                self._count_data = self._count_data.transpose()
+            shape = self._count_data.shape
+
+        if self._emulate_fastcomtec:
+            # 32 bit histogram of the emulated card, the counts of every poll are added to it
+            self._card_histogram = np.zeros(shape, dtype=np.uint32)
+            self._accumulator = TraceAccumulator(shape)
+
+        self._elapsed_sweeps = 0
+        self._sweep_progress = 0.0
+        self._elapsed_time = 0.0
+        self._last_update = time.monotonic()
         return 0
 
     def pause_measure(self):
@@ -169,14 +238,18 @@ class FastCounterDummy(Base, FastCounterInterface):
 
         Fast counter must be initially in the run state to make it pause.
         """
-        time.sleep(1)
+        if self._trace_source == 'synthetic':
+            self._acquire()
+        else:
+            time.sleep(1)
         self.statusvar = 3
         return 0
 
     def stop_measure(self):
         """ Stop the fast counter. """
 
-        time.sleep(1)
+        if self._trace_source != 'synthetic':
+            time.sleep(1)
         self.statusvar = 1
         return 0
 
@@ -185,7 +258,7 @@ class FastCounterDummy(Base, FastCounterInterface):
 
         If fast counter is in pause state, then fast counter will be continued.
         """
-
+        self._last_update = time.monotonic()
         self.statusvar = 2
         return 0
 
@@ -224,12 +297,181 @@ class FastCounterDummy(Base, FastCounterInterface):
 
         If the hardware does not support these features, the values should be None
         """
+        if self._trace_source == 'synthetic':
+            started = self._expected_counts is not None
+        else:
+            started = self._count_data is not None
+        if not started or (self._emulate_fastcomtec and self._card_histogram is None):
+            self.log.error('No trace available, start the measurement first.')
+            empty_trace = np.zeros((0, 0) if self._gated else 0, dtype='int64')
+            return empty_trace, {'elapsed_sweeps': None, 'elapsed_time': None}
+
+        if self._trace_source == 'synthetic':
+            self._acquire()
+            info_dict = {'elapsed_sweeps': self._elapsed_sweeps,
+                         'elapsed_time': self._elapsed_time}
+            if self._emulate_fastcomtec:
+                return self._read_emulated_card(), info_dict
+            return self._trace.copy(), info_dict
+
+        if self._emulate_fastcomtec:
+            if self.statusvar == 2:
+                self._add_to_emulated_card(self._count_data)
+            return self._read_emulated_card(), {'elapsed_sweeps': None, 'elapsed_time': None}
 
         # include an artificial waiting time
         time.sleep(0.5)
         info_dict = {'elapsed_sweeps': None, 'elapsed_time': None}
         return self._count_data, info_dict
 
+    def set_sequence_information(self, sampling_information, measurement_information):
+        """ Pulse sequence the synthetic traces are built from, used from the next start on.
+
+        @param dict sampling_information: sampling information of the loaded ensemble/sequence
+        @param dict measurement_information: measurement information of the loaded
+                                             ensemble/sequence
+        """
+        self._sampling_information = dict(sampling_information) if sampling_information else dict()
+        self._measurement_information = \
+            dict(measurement_information) if measurement_information else dict()
+
+    def _acquire(self):
+        """ Add the counts of all sweeps which passed since the last call. """
+        if self._expected_counts is None:
+            return
+        now = time.monotonic()
+        if self.statusvar == 2:
+            elapsed = now - self._last_update
+            self._elapsed_time += elapsed
+            self._sweep_progress += elapsed * self._current_sweep_rate
+        self._last_update = now
+        new_sweeps = int(self._sweep_progress) - self._elapsed_sweeps
+        if new_sweeps <= 0:
+            return
+        self._elapsed_sweeps += new_sweeps
+        counts = self._rng.poisson(self._expected_counts * new_sweeps)
+        if self._emulate_fastcomtec:
+            self._add_to_emulated_card(counts)
+        else:
+            self._trace += counts
+
+    def _add_to_emulated_card(self, counts):
+        """ Add counts to the 32 bit histogram of the emulated card, which wraps around. """
+        increment = np.asarray(counts * self._emulated_counts_scale).astype(np.uint32)
+        np.add(self._card_histogram, increment, out=self._card_histogram)
+
+    def _read_emulated_card(self):
+        """ Read the trace the way the FastComTec MCS6 hardware module does: the card histogram
+        is copied into the persistent uint32 buffer of a TraceAccumulator and unwrapped into
+        the int64 trace.
+        """
+        # LVGetDat
+        np.copyto(self._accumulator.raw, self._card_histogram)
+        return self._accumulator.update()
+
+    def _synthesize_expected_counts(self):
+        """ Expected counts of a single sweep in every bin of the trace.
+
+        @return numpy.ndarray: 1D array[timebin_index] if not gated,
+                               2D array[gate_index, timebin_index] if gated
+        """
+        binwidth = self.get_binwidth()
+        record_length = self._gate_length_bins * binwidth
+        sample_rate = self._sampling_information.get('pulse_generator_settings',
+                                                     dict()).get('sample_rate')
+        if sample_rate and len(self._sampling_information.get('laser_rising_bins', [])) > 0:
+            laser_starts = np.asarray(self._sampling_information['laser_rising_bins']) / sample_rate
+            laser_stops = np.asarray(self._sampling_information['laser_falling_bins']) / sample_rate
+            sweep_duration = self._sampling_information.get('number_of_samples', 0) / sample_rate
+        else:
+            # no sequence information, equally spaced laser pulses of 3 us
+            if self._gated and self._number_of_gates > 0:
+                number_of_lasers = self._number_of_gates
+                spacing = record_length
+            else:
+                number_of_lasers = max(
+                    int(self._measurement_information.get('number_of_lasers', 50)), 1)
+                spacing = record_length / number_of_lasers
+            laser_starts = np.arange(number_of_lasers) * spacing
+            laser_stops = laser_starts + min(3e-6, spacing / 2)
+            sweep_duration = number_of_lasers * spacing
+
+        if self._sweep_rate:
+            self._current_sweep_rate = float(self._sweep_rate)
+        else:
+            self._current_sweep_rate = 1 / max(sweep_duration, record_length)
+
+        populations = self._laser_populations(len(laser_starts))
+
+        if self._gated:
+            number_of_gates = self._number_of_gates if self._number_of_gates > 0 else len(laser_starts)
+            expected = np.zeros((number_of_gates, self._gate_length_bins))
+            # every gate opens with its laser pulse
+            for gate in range(min(number_of_gates, len(laser_starts))):
+                self._add_laser_counts(expected[gate], self._laser_delay,
+                                       laser_stops[gate] - laser_starts[gate], populations[gate])
+        else:
+            expected = np.zeros(self._gate_length_bins)
+            for start, stop, population in zip(laser_starts, laser_stops, populations):
+                self._add_laser_counts(expected, start + self._laser_delay, stop - start,
+                                       population)
+        expected += self._dark_count_rate * binwidth
+        return expected
+
+    def _add_laser_counts(self, trace, start, length, population):
+        """ Add the expected fluorescence counts of one laser pulse to a trace.
+
+        @param numpy.ndarray trace: expected counts per bin
+        @param float start: start of the fluorescence in the trace in s
+        @param float length: length of the laser pulse in s
+        @param float population: population of the bright spin state before the laser pulse
+        """
+        binwidth = self.get_binwidth()
+        first = int(np.rint(start / binwidth))
+        last = min(int(np.rint((start + length) / binwidth)), len(trace))
+        if first >= last:
+            return
+        t = (np.arange(last - first) + 0.5) * binwidth
+        darkening = self._contrast * (1 - population) * np.exp(-t / self._polarization_time)
+        trace[first:last] += self._count_rate * binwidth * (1 - darkening)
+
+    def _laser_populations(self, number_of_lasers):
+        """ Population of the bright spin state before every laser pulse.
+
+        Ignored lasers and lasers without a controlled variable value read out the bright state.
+        For alternating sequences every second laser reads out the inverted signal.
+
+        @param int number_of_lasers: number of laser pulses of the sequence
+
+        @return numpy.ndarray: population for every laser pulse
+        """
+        info = self._measurement_information
+        ignored = {index % max(number_of_lasers, 1)
+                   for index in info.get('laser_ignore_list', list())}
+        signal_lasers = [index for index in range(number_of_lasers) if index not in ignored]
+        alternating = bool(info.get('alternating', False))
+
+        tau = info.get('controlled_variable')
+        if tau is None or len(tau) == 0:
+            tau = np.arange(len(signal_lasers) // (2 if alternating else 1)) * 10e-9
+        tau = np.asarray(tau, dtype=float)
+
+        if self._signal_model == 'rabi':
+            decay = np.exp(-tau / self._signal_decay) if self._signal_decay else 1
+            signal = (1 + np.cos(2 * np.pi * self._signal_frequency * tau) * decay) / 2
+        elif self._signal_model == 'ramsey':
+            decay = np.exp(-(tau / self._signal_decay) ** 2) if self._signal_decay else 1
+            signal = (1 + np.cos(2 * np.pi * self._signal_frequency * tau) * decay) / 2
+        else:
+            signal = np.ones(len(tau))
+        if alternating:
+            signal = np.column_stack((signal, 1 - signal)).ravel()
+
+        populations = np.ones(number_of_lasers)
+        count = min(len(signal_lasers), len(signal))
+        populations[signal_lasers[:count]] = signal[:count]
+        return populations
+
     def get_frequency(self):
         freq = 950.
         time.sleep(0.5)
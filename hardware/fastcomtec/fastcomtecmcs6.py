@@ -28,6 +28,7 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 from core.module import Base
 from core.configoption import ConfigOption
 from core.util.modules import get_main_dir
+from core.util.trace_accumulator import TraceAccumulator
 from interface.fast_counter_interface import FastCounterInterface
 import time
 import os
@@ -194,7 +195,8 @@ class FastComtec(Base, FastCounterInterface):
         #this variable has to be added because there is no difference
         #in the fastcomtec it can be on "stopped" or "halt"
         self.stopped_or_halt = "stopped"
-        self.timetrace_tmp = []
+        # persistent read buffer and int64 accumulator of the time trace
+        self._accumulator = None
 
     def on_activate(self):
         """ Initialisation performed during activation of the module.
@@ -324,6 +326,12 @@ class FastComtec(Base, FastCounterInterface):
 
     def start_measure(self):
         """Start the measurement. """
+        # the card clears its histogram on start
+        if self._accumulator is not None:
+            self._accumulator.reset()
+        return self._start()
+
+    def _start(self):
         status = self.dll.Start(0)
         while self.get_status() != 2:
             time.sleep(0.05)
@@ -335,8 +343,6 @@ class FastComtec(Base, FastCounterInterface):
         status = self.dll.Halt(0)
         while self.get_status() != 1:
             time.sleep(0.05)
-        if self.gated:
-            self.timetrace_tmp = []
         return status
 
     def pause_measure(self):
@@ -347,13 +353,15 @@ class FastComtec(Base, FastCounterInterface):
             time.sleep(0.05)
 
         if self.gated:
-            self.timetrace_tmp = self.get_data_trace()
+            # a gated measurement is continued with a new start, which clears the histogram
+            self.get_data_trace()
+            self._accumulator.hold()
         return status
 
     def continue_measure(self):
         """Continue a paused measurement. """
         if self.gated:
-            status = self.start_measure()
+            status = self._start()
         else:
             status = self.dll.Continue(0)
             while self.get_status() != 2:
@@ -388,6 +396,10 @@ class FastComtec(Base, FastCounterInterface):
         If the counter is UNgated it will return a 1D-numpy-array with returnarray[timebin_index]
         If the counter is gated it will return a 2D-numpy-array with returnarray[gate_index, timebin_index]
 
+        The card is read into a persistent buffer and accumulated into an int64 trace, wrap
+        arounds of the 32 bit bins are detected by comparison with the previous poll. Every
+        call returns a new array.
+
           @return arrray: Time trace.
         """
         setting = AcqSettings()
@@ -400,18 +412,14 @@ class FastComtec(Base, FastCounterInterface):
             H = bsetting.cycles
             if H==0:
                 H=1
-            data = np.empty((H, int(N / H)), dtype=np.uint32)
-
+            shape = (H, int(N / H))
         else:
-            data = np.empty((N,), dtype=np.uint32)
-
-        p_type_ulong = ctypes.POINTER(ctypes.c_uint32)
-        ptr = data.ctypes.data_as(p_type_ulong)
-        self.dll.LVGetDat(ptr, 0)
-        time_trace = np.int64(data)
+            shape = (N, )
 
-        if self.gated and self.timetrace_tmp != []:
-            time_trace = time_trace + self.timetrace_tmp
+        if self._accumulator is None or self._accumulator.shape != shape:
+            self._accumulator = TraceAccumulator(shape)
+        self.dll.LVGetDat(self._accumulator.raw_pointer, 0)
+        time_trace = self._accumulator.update()
 
         info_dict = {'elapsed_sweeps': None,
                      'elapsed_time': None}  # TODO : implement that according to hardware capabilities
@@ -19,6 +19,9 @@ along with Qudi. If not, see <http://www.gnu.org/licenses/>.
 Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
 top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
 """
+import numpy as np
+
+from core.configoption import ConfigOption
 from interface.slow_counter_interface import SlowCounterConstraints
 from interface.slow_counter_interface import CountingMode
 from .national_instruments_x_series import NationalInstrumentsXSeries
@@ -80,6 +83,9 @@ class SlowGatedNICard(NationalInstrumentsXSeries):
         """ Starts up the NI Card at activation.
         """
         self._gated_counter_daq_task = None
+        self._gated_buffer_length = 0
+        self._gated_lost_samples = 0
+        self._gated_stream_data = np.empty(0, dtype=np.uint32)
         self._counter_channels = []
         self._counter_channel = '/Dev1/Ctr0'
 
@@ -96,7 +102,8 @@ class SlowGatedNICard(NationalInstrumentsXSeries):
         constraints.max_detectors = 4
         constraints.min_count_frequency = 1e-3
         constraints.max_count_frequency = 10e9
-        constraints.counting_mode = [CountingMode.FINITE_GATED]
+        constraints.counting_mode = [CountingMode.GATED, CountingMode.FINITE_GATED]
+        constraints.streaming_counting_mode = [CountingMode.GATED, CountingMode.FINITE_GATED]
         return constraints
 
     #overwrite the SlowCounterInterface commands of the class NICard:
@@ -157,6 +164,45 @@ class SlowGatedNICard(NationalInstrumentsXSeries):
         """
         return self.get_gated_counts(samples=samples)
 
+    def start_counter_stream(self, buffer_length=2**20):
+        """ Configures and starts the gated counter with a circular buffer.
+
+        @param int buffer_length: number of gates the circular buffer can hold
+
+        @return int: error code (0:OK, -1:error)
+        """
+        if self.set_up_gated_counter(buffer_length=buffer_length, circular_buffer=True) < 0:
+            return -1
+        self._gated_stream_data = np.empty(int(buffer_length), dtype=np.uint32)
+        return self.start_gated_counter()
+
+    def read_available_counts_into_buffer(self, buffer):
+        """ Read the counts of all gates since the last read into buffer.
+
+        @param numpy.ndarray buffer: 2D array to write the counts to, shape (1, samples)
+
+        @return int: number of samples read into buffer, negative value indicates error
+        """
+        samples = min(buffer.shape[1], self._gated_stream_data.size)
+        read_samples = self.read_available_gated_counts(self._gated_stream_data[:samples])
+        if read_samples > 0:
+            buffer[0, :read_samples] = self._gated_stream_data[:read_samples]
+        return read_samples
+
+    def get_lost_samples(self):
+        """ Number of gates which were overwritten in the circular buffer before they were read.
+
+        @return int: number of lost samples
+        """
+        return self._gated_lost_samples
+
+    def get_counter_channels(self):
+        """ Returns the list of counter channel names.
+
+        @return list(str): channel names
+        """
+        return [self._counter_channel]
+
     def close_counter(self, scanner=False):
         """ Closes the counter or scanner and cleans up afterwards.
 
@@ -21,6 +21,7 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 """
 
 from collections import OrderedDict
+from concurrent.futures import Future
 
 from core.module import Base
 from interface.magnet_interface import MagnetInterface
@@ -319,6 +320,21 @@ class MagnetDummy(Base, MagnetInterface):
         self.log.info('MagnetDummy: Movement stopped!')
         return 0
 
+    def get_motion_future(self, target=None, tolerance=None, timeout=None):
+        """ Get a future which is resolved when the current movement has finished.
+
+        @param dict target: optional, absolute target position of the movement (ignored)
+        @param float tolerance: optional, allowed deviation from the target (ignored)
+        @param float timeout: optional, timeout in seconds (ignored)
+
+        @return concurrent.futures.Future: resolved with the position dict after the movement
+
+        The dummy magnet reaches every position immediately, so the future is already done.
+        """
+        future = Future()
+        future.set_result(self.get_pos())
+        return future
+
     def get_pos(self, param_list=None):
         """ Gets current position of the magnet stage arms
 
@@ -21,15 +21,51 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 """
 
 from collections import OrderedDict
+from concurrent.futures import Future
+import threading
 import time
 
 from core.module import Base
+from core.util.motion import resolve_future
 from interface.motor_interface import MotorInterface
 
 class MotorAxisDummy:
-    """ Generic dummy motor representing one axis. """
+    """ Generic dummy motor representing one axis. A movement takes a fixed time during which
+        the position changes linearly from the start to the target.
+    """
     def __init__(self, label):
         self.label = label
+        self._start_pos = 0.0
+        self._target_pos = 0.0
+        self._move_start = 0.0
+        self.end_time = 0.0
+
+    @property
+    def pos(self):
+        now = time.monotonic()
+        if now >= self.end_time:
+            return self._target_pos
+        progress = (now - self._move_start) / (self.end_time - self._move_start)
+        return self._start_pos + progress * (self._target_pos - self._start_pos)
+
+    @pos.setter
+    def pos(self, value):
+        """ Set the position immediately, stopping a running movement. """
+        self._start_pos = value
+        self._target_pos = value
+        self.end_time = time.monotonic()
+
+    @property
+    def status(self):
+        """ 1 while moving, 0 otherwise. """
+        return 1 if time.monotonic() < self.end_time else 0
+
+    def move_to(self, target, duration):
+        """ Start a movement to target which takes duration seconds. """
+        self._start_pos = self.pos
+        self._target_pos = target
+        self._move_start = time.monotonic()
+        self.end_time = self._move_start + duration
 
 
 class MotorDummy(Base, MotorInterface):
@@ -57,7 +93,7 @@ class MotorDummy(Base, MotorInterface):
         self._z_axis = MotorAxisDummy('z')
         self._phi_axis = MotorAxisDummy('phi')
 
-        self._wait_after_movement = 1 #in seconds
+        self._wait_after_movement = 1 # duration of a movement in seconds
 
     #TODO: Checks if configuration is set and is reasonable
 
@@ -77,10 +113,8 @@ class MotorDummy(Base, MotorInterface):
         self._z_axis.vel = 1.0
         self._phi_axis.vel = 1.0
 
-        self._x_axis.status = 0
-        self._y_axis.status = 0
-        self._z_axis.status = 0
-        self._phi_axis.status = 0
+        # futures and timers of get_motion_future which are not resolved yet
+        self._motion_timers = list()
 
     def on_deactivate(self):
         pass
@@ -205,8 +239,7 @@ class MotorDummy(Base, MotorInterface):
                             constraints[self._x_axis.label]['pos_min'],
                             constraints[self._x_axis.label]['pos_max']))
             else:
-                self._make_wait_after_movement()
-                self._x_axis.pos = self._x_axis.pos + move_x
+                self._x_axis.move_to(self._x_axis.pos + move_x, self._wait_after_movement)
 
         if param_dict.get(self._y_axis.label) is not None:
             move_y = param_dict[self._y_axis.label]
@@ -222,8 +255,7 @@ class MotorDummy(Base, MotorInterface):
                             constraints[self._y_axis.label]['pos_min'],
                             constraints[self._y_axis.label]['pos_max']))
             else:
-                self._make_wait_after_movement()
-                self._y_axis.pos = self._y_axis.pos + move_y
+                self._y_axis.move_to(self._y_axis.pos + move_y, self._wait_after_movement)
 
         if param_dict.get(self._z_axis.label) is not None:
             move_z = param_dict[self._z_axis.label]
@@ -239,8 +271,7 @@ class MotorDummy(Base, MotorInterface):
                             constraints[self._z_axis.label]['pos_min'],
                             constraints[self._z_axis.label]['pos_max']))
             else:
-                self._make_wait_after_movement()
-                self._z_axis.pos = self._z_axis.pos + move_z
+                self._z_axis.move_to(self._z_axis.pos + move_z, self._wait_after_movement)
 
 
         if param_dict.get(self._phi_axis.label) is not None:
@@ -257,8 +288,7 @@ class MotorDummy(Base, MotorInterface):
                             constraints[self._phi_axis.label]['pos_min'],
                             constraints[self._phi_axis.label]['pos_max']))
             else:
-                self._make_wait_after_movement()
-                self._phi_axis.pos = self._phi_axis.pos + move_phi
+                self._phi_axis.move_to(self._phi_axis.pos + move_phi, self._wait_after_movement)
 
 
     def move_abs(self, param_dict):
@@ -285,8 +315,7 @@ class MotorDummy(Base, MotorInterface):
                             constr['pos_min'],
                             constr['pos_max']))
             else:
-                self._make_wait_after_movement()
-                self._x_axis.pos = desired_pos
+                self._x_axis.move_to(desired_pos, self._wait_after_movement)
 
 
         if param_dict.get(self._y_axis.label) is not None:
@@ -301,8 +330,7 @@ class MotorDummy(Base, MotorInterface):
                             constr['pos_min'],
                             constr['pos_max']))
             else:
-                self._make_wait_after_movement()
-                self._y_axis.pos = desired_pos
+                self._y_axis.move_to(desired_pos, self._wait_after_movement)
 
 
         if param_dict.get(self._z_axis.label) is not None:
@@ -317,8 +345,7 @@ class MotorDummy(Base, MotorInterface):
                             constr['pos_min'],
                             constr['pos_max']))
             else:
-                self._make_wait_after_movement()
-                self._z_axis.pos = desired_pos
+                self._z_axis.move_to(desired_pos, self._wait_after_movement)
 
 
         if param_dict.get(self._phi_axis.label) is not None:
@@ -333,8 +360,7 @@ class MotorDummy(Base, MotorInterface):
                             constr['pos_min'],
                             constr['pos_max']))
             else:
-                self._make_wait_after_movement()
-                self._phi_axis.pos = desired_pos
+                self._phi_axis.move_to(desired_pos, self._wait_after_movement)
 
 
 
@@ -343,6 +369,13 @@ class MotorDummy(Base, MotorInterface):
 
         @return int: error code (0:OK, -1:error)
         """
+        for axis in (self._x_axis, self._y_axis, self._z_axis, self._phi_axis):
+            axis.pos = axis.pos
+        for timer, future in self._motion_timers:
+            timer.cancel()
+            if not future.done():
+                self._resolve_motion_future(future)
+        self._motion_timers = list()
         self.log.info('MotorDummy: Movement stopped!')
         return 0
 
@@ -549,7 +582,36 @@ class MotorDummy(Base, MotorInterface):
                 self._phi_axis.vel = desired_vel
 
 
-    def _make_wait_after_movement(self):
-        """ Define a time which the dummy should wait after each movement. """
-        time.sleep(self._wait_after_movement)
+    def get_motion_future(self, target=None, tolerance=None, timeout=None):
+        """ Get a future which is resolved when the current movement has finished.
+
+        @param dict target: optional, absolute target position of the movement (ignored, the
+                            dummy knows when its movement ends)
+        @param float tolerance: optional, allowed deviation from the target (ignored)
+        @param float timeout: optional, the future fails with a TimeoutError after this many
+                              seconds.
+
+        @return concurrent.futures.Future: resolved with the position dict after the movement
+        """
+        future = Future()
+        end_time = max(axis.end_time
+                       for axis in (self._x_axis, self._y_axis, self._z_axis, self._phi_axis))
+        delay = max(0.0, end_time - time.monotonic())
+        if timeout is not None and delay > timeout:
+            timer = threading.Timer(timeout, self._fail_motion_future, args=(future,))
+        else:
+            timer = threading.Timer(delay, self._resolve_motion_future, args=(future,))
+        self._motion_timers = [(t, f) for t, f in self._motion_timers if not f.done()]
+        self._motion_timers.append((timer, future))
+        timer.daemon = True
+        timer.start()
+        return future
+
+    def _resolve_motion_future(self, future):
+        # the timer and abort may resolve the same future at the same time
+        resolve_future(future, self.get_pos())
+
+    def _fail_motion_future(self, future):
+        resolve_future(future,
+                       exception=TimeoutError('Movement did not finish within the timeout.'))
 
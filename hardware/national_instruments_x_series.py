@@ -22,6 +22,7 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 
 import numpy as np
 import re
+import time
 
 import PyDAQmx as daq
 
@@ -32,9 +33,11 @@ from interface.slow_counter_interface import SlowCounterConstraints
 from interface.slow_counter_interface import CountingMode
 from interface.odmr_counter_interface import ODMRCounterInterface
 from interface.confocal_scanner_interface import ConfocalScannerInterface
+from interface.confocal_scanner_interface import ConfocalFrameScannerInterface
 
 
-class NationalInstrumentsXSeries(Base, SlowCounterInterface, ConfocalScannerInterface, ODMRCounterInterface):
+class NationalInstrumentsXSeries(Base, SlowCounterInterface, ConfocalScannerInterface,
+                                 ConfocalFrameScannerInterface, ODMRCounterInterface):
     """ A National Instruments device that can count and control microvave generators.
 
     !!!!!! NI USB 63XX, NI PCIe 63XX and NI PXIe 63XX DEVICES ONLY !!!!!!
@@ -137,10 +140,18 @@ class NationalInstrumentsXSeries(Base, SlowCounterInterface, ConfocalScannerInte
         self._line_length = None
         self._odmr_length = None
         self._gated_counter_daq_task = None
+        self._gated_buffer_length = 0
+        self._gated_lost_samples = 0
         self._scanner_analog_daq_task = None
         self._odmr_pulser_daq_task = None
+        self._odmr_continuous = None
         self._oversampling = 0
         self._lock_in_active = False
+        self._frame_path = None
+        self._frame_samples_per_line = 0
+        self._frame_lines_read = 0
+        self._frame_read_offset = 0
+        self._frame_pixel_clock = False
 
         self._photon_sources = self._photon_sources if self._photon_sources is not None else list()
         self._scanner_counter_channels = self._scanner_counter_channels if self._scanner_counter_channels is not None else list()
@@ -1405,6 +1416,181 @@ class NationalInstrumentsXSeries(Base, SlowCounterInterface, ConfocalScannerInte
         # return values is a rate of counts/s
         return all_data.transpose()
 
+    def start_frame_stream(self, frame_path=None, samples_per_line=None, pixel_clock=False):
+        """ Uploads the trajectory of a whole frame and starts scanning it.
+
+        The analog output, clock and counter tasks are set up and started once for the whole
+        frame. The counts are read line by line with read_lines while the frame is scanned.
+        Not available if analog input channels are configured for the scanner.
+
+        @param float[c][n*m] frame_path: c axis positions of n lines with m samples each, the lines
+                                         are concatenated
+        @param int samples_per_line: number of samples m of each line
+        @param bool pixel_clock: whether we need to output a pixel clock for the frame
+
+        @return int: error code (0:OK, -1:error)
+        """
+        if self._scanner_ai_channels:
+            self.log.error('Frame scanning is not supported with scanner analog input channels.')
+            return -1
+
+        if len(self._scanner_counter_daq_tasks) < 1:
+            self.log.error('Configured counter is not running, cannot scan a frame.')
+            return -1
+
+        if not isinstance(frame_path, (frozenset, list, set, tuple, np.ndarray, )):
+            self.log.error('Given frame_path list is not array type.')
+            return -1
+
+        frame_path = np.asarray(frame_path)
+        if samples_per_line is None or samples_per_line < 1 \
+                or frame_path.shape[1] % samples_per_line != 0:
+            self.log.error('Length of the frame path ({0:d}) is not a multiple of the samples per '
+                           'line ({1}).'.format(frame_path.shape[1], samples_per_line))
+            return -1
+        try:
+            daq.DAQmxSetSampTimingType(self._scanner_ao_task, daq.DAQmx_Val_SampClk)
+            if self._set_up_line(frame_path.shape[1]) != 0:
+                return -1
+            frame_volts = self._scanner_position_to_volt(frame_path)
+            # write the positions of the whole frame to the analog output buffer
+            self._write_scanner_ao(
+                voltages=frame_volts,
+                length=self._line_length,
+                start=False)
+
+            # start the timed analog output task
+            daq.DAQmxStartTask(self._scanner_ao_task)
+
+            for task in self._scanner_counter_daq_tasks:
+                daq.DAQmxStopTask(task)
+
+            daq.DAQmxStopTask(self._scanner_clock_daq_task)
+
+            if pixel_clock and self._pixel_clock_channel is not None:
+                daq.DAQmxConnectTerms(
+                    self._scanner_clock_channel + 'InternalOutput',
+                    self._pixel_clock_channel,
+                    daq.DAQmx_Val_DoNotInvertPolarity)
+
+            # start the scanner counting tasks, they run until the frame is finished
+            for task in self._scanner_counter_daq_tasks:
+                daq.DAQmxStartTask(task)
+
+            daq.DAQmxStartTask(self._scanner_clock_daq_task)
+        except:
+            self.log.exception('Error while starting frame scan.')
+            self._frame_path = frame_path
+            self._frame_pixel_clock = pixel_clock
+            self.stop_frame_stream()
+            return -1
+
+        self._frame_path = frame_path
+        self._frame_samples_per_line = int(samples_per_line)
+        self._frame_lines_read = 0
+        # the first counter sample is read with an offset of one sample (see _set_up_line)
+        self._frame_read_offset = 1
+        self._frame_pixel_clock = pixel_clock
+        return 0
+
+    def read_lines(self, number_of_lines=None, timeout=None):
+        """ Returns the counts of lines of the running frame stream that are completed.
+
+        @param int number_of_lines: maximum number of lines to return, None for all completed lines
+        @param float timeout: maximum time to wait for a line in s, None for read_write_timeout
+
+        @return float[l][m][c]: the photon counts per second of l completed lines with m samples
+                                and c channels
+        """
+        if self._frame_path is None:
+            self.log.error('No frame stream running.')
+            return np.array([[[-1.]]])
+
+        samples_per_line = self._frame_samples_per_line
+        n_channels = len(self.get_scanner_count_channels())
+        remaining = self._frame_path.shape[1] // samples_per_line - self._frame_lines_read
+        if number_of_lines is not None:
+            remaining = min(remaining, number_of_lines)
+        if remaining < 1:
+            return np.empty((0, samples_per_line, n_channels))
+        if timeout is None:
+            timeout = self._RWTimeout
+        # the counters sample both clock edges, i.e. two counter samples per pixel
+        counter_samples_per_line = 2 * samples_per_line
+
+        try:
+            available = daq.uInt32()
+            deadline = time.perf_counter() + timeout
+            while True:
+                daq.DAQmxGetReadAvailSampPerChan(self._scanner_counter_daq_tasks[0],
+                                                 daq.byref(available))
+                lines = (available.value - self._frame_read_offset) // counter_samples_per_line
+                if lines > 0 or time.perf_counter() >= deadline:
+                    break
+                time.sleep(min(0.01, samples_per_line / self._scanner_clock_frequency / 4))
+            lines = min(lines, remaining)
+            if lines < 1:
+                return np.empty((0, samples_per_line, n_channels))
+
+            n_samples = lines * counter_samples_per_line
+            scan_data = np.empty((len(self._scanner_counter_daq_tasks), n_samples),
+                                 dtype=np.uint32)
+            n_read_samples = daq.int32()
+            for i, task in enumerate(self._scanner_counter_daq_tasks):
+                daq.DAQmxReadCounterU32(
+                    task,
+                    n_samples,
+                    self._RWTimeout,
+                    scan_data[i],
+                    n_samples,
+                    daq.byref(n_read_samples),
+                    None)
+                if self._frame_read_offset:
+                    # following reads continue directly after the last sample read
+                    daq.DAQmxSetReadOffset(task, 0)
+            self._frame_read_offset = 0
+
+            # add up adjoint samples to also get the counts from the low time of the clock
+            real_data = scan_data[:, ::2] + scan_data[:, 1::2]
+            all_data = np.full((n_channels, lines * samples_per_line), 2, dtype=np.float64)
+            all_data[0:len(real_data)] = real_data * self._scanner_clock_frequency
+
+            self._frame_lines_read += lines
+            self._current_position = np.array(
+                self._frame_path[:, self._frame_lines_read * samples_per_line - 1])
+        except:
+            self.log.exception('Error while reading lines of frame scan.')
+            return np.array([[[-1.]]])
+        return all_data.transpose().reshape((lines, samples_per_line, n_channels))
+
+    def stop_frame_stream(self):
+        """ Stops the frame stream, also if the frame is not finished yet.
+
+        @return int: error code (0:OK, -1:error)
+        """
+        if self._frame_path is None:
+            return 0
+        retval = 0
+        try:
+            for task in self._scanner_counter_daq_tasks:
+                daq.DAQmxStopTask(task)
+            daq.DAQmxStopTask(self._scanner_clock_daq_task)
+        except:
+            self.log.exception('Error while stopping frame scan.')
+            retval = -1
+        if self._stop_analog_output() < 0:
+            retval = -1
+        if self._frame_pixel_clock and self._pixel_clock_channel is not None:
+            try:
+                daq.DAQmxDisconnectTerms(
+                    self._scanner_clock_channel + 'InternalOutput',
+                    self._pixel_clock_channel)
+            except:
+                self.log.exception('Error while disconnecting pixel clock.')
+                retval = -1
+        self._frame_path = None
+        return retval
+
     def close_scanner(self):
         """ Closes the scanner and cleans up afterwards.
 
@@ -1868,12 +2054,177 @@ class NationalInstrumentsXSeries(Base, SlowCounterInterface, ConfocalScannerInte
             self.log.exception('Error while counting for ODMR.')
             return True, np.full((len(self.get_odmr_channels()), 1), [-1.])
 
+    def start_continuous_odmr(self, length=100, sweeps_per_read=10, buffered_sweeps=100):
+        """ Starts consecutive hardware timed sweeps without dead time between them.
+
+        The clock runs continuously, the microwave list has to return to its first frequency
+        after length triggers. Counter and analog input buffer buffered_sweeps sweeps on the
+        card. Not available in lock-in mode.
+
+        @param int length: length of microwave sweep in pixel
+        @param int sweeps_per_read: minimum number of sweeps returned by read_continuous_odmr
+        @param int buffered_sweeps: number of sweeps the hardware buffer holds
+
+        @return int: error code (0:OK, -1:error)
+        """
+        if self._odmr_pulser_daq_task or self.lock_in_active:
+            self.log.warning('Continuous ODMR is not available in lock-in mode.')
+            return -1
+
+        if len(self._scanner_counter_daq_tasks) < 1 and self._scanner_counter_channels:
+            self.log.error('No counter is running, cannot scan ODMR without one.')
+            return -1
+
+        if self._scanner_ai_channels and self._scanner_analog_daq_task is None:
+            self.log.error('No analog task is running, cannot do ODMR without one.')
+            return -1
+
+        length = int(length)
+        sweeps_per_read = max(int(sweeps_per_read), 1)
+        buffered_sweeps = max(int(buffered_sweeps), sweeps_per_read)
+        self._odmr_length = length
+        try:
+            daq.DAQmxCfgImplicitTiming(
+                self._scanner_clock_daq_task,
+                daq.DAQmx_Val_ContSamps,
+                length)
+
+            if self._scanner_counter_channels:
+                # the counter gives two samples (high and low time of the clock) per pixel
+                daq.DAQmxCfgImplicitTiming(
+                    self._scanner_counter_daq_tasks[0],
+                    daq.DAQmx_Val_ContSamps,
+                    2 * length * buffered_sweeps)
+                daq.DAQmxSetReadRelativeTo(
+                    self._scanner_counter_daq_tasks[0],
+                    daq.DAQmx_Val_CurrReadPos)
+                daq.DAQmxSetReadOffset(
+                    self._scanner_counter_daq_tasks[0],
+                    0)
+                # an overflow of the buffer is an error instead of silently lost sweeps
+                daq.DAQmxSetReadOverWrite(
+                    self._scanner_counter_daq_tasks[0],
+                    daq.DAQmx_Val_DoNotOverwriteUnreadSamps)
+
+            if self._scanner_ai_channels:
+                daq.DAQmxCfgSampClkTiming(
+                    self._scanner_analog_daq_task,
+                    self._scanner_clock_channel + 'InternalOutput',
+                    self._scanner_clock_frequency,
+                    daq.DAQmx_Val_Rising,
+                    daq.DAQmx_Val_ContSamps,
+                    length * buffered_sweeps)
+
+            if self._scanner_counter_channels:
+                daq.DAQmxStartTask(self._scanner_counter_daq_tasks[0])
+            if self._scanner_ai_channels:
+                daq.DAQmxStartTask(self._scanner_analog_daq_task)
+            daq.DAQmxStartTask(self._scanner_clock_daq_task)
+        except:
+            self.log.exception('Cannot start continuous ODMR.')
+            self._odmr_continuous = dict()
+            self.stop_continuous_odmr()
+            return -1
+
+        self._odmr_continuous = {
+            'sweeps_per_read': sweeps_per_read,
+            'buffered_sweeps': buffered_sweeps,
+            'counts': np.zeros(2 * length * buffered_sweeps, dtype=np.uint32),
+            'analog': np.zeros(len(self._scanner_ai_channels) * length * buffered_sweeps,
+                               dtype=np.float64)}
+        return 0
+
+    def read_continuous_odmr(self):
+        """ Returns all sweeps completed since the last call, at least sweeps_per_read.
+
+        @return (bool, float[][][]): tuple: was there an error, the photon counts per second
+                                     as array[sweep, channel, pixel]
+        """
+        n_channels = len(self.get_odmr_channels())
+        if not self._odmr_continuous:
+            self.log.error('No continuous ODMR running.')
+            return True, np.empty((0, n_channels, 0))
+
+        length = self._odmr_length
+        sweeps_per_read = self._odmr_continuous['sweeps_per_read']
+        buffered_sweeps = self._odmr_continuous['buffered_sweeps']
+        try:
+            # take everything which is already on the card, but at least sweeps_per_read
+            available = daq.uInt32()
+            if self._scanner_counter_channels:
+                daq.DAQmxGetReadAvailSampPerChan(self._scanner_counter_daq_tasks[0],
+                                                 daq.byref(available))
+                completed = available.value // (2 * length)
+            else:
+                daq.DAQmxGetReadAvailSampPerChan(self._scanner_analog_daq_task,
+                                                 daq.byref(available))
+                completed = available.value // length
+            sweeps = min(max(completed, sweeps_per_read), buffered_sweeps)
+            timeout = self._RWTimeout + sweeps * length / self._scanner_clock_frequency
+
+            all_data = np.empty((sweeps, n_channels, length), dtype=np.float64)
+            n_read_samples = daq.int32()
+            start_index = 0
+            if self._scanner_counter_channels:
+                odmr_data = self._odmr_continuous['counts'][:2 * length * sweeps]
+                daq.DAQmxReadCounterU32(
+                    self._scanner_counter_daq_tasks[0],
+                    2 * length * sweeps,
+                    timeout,
+                    odmr_data,
+                    2 * length * sweeps,
+                    daq.byref(n_read_samples),
+                    None)
+                # add up adjoint pixels to also get the counts from the low time of the clock
+                real_data = odmr_data.reshape(sweeps, length, 2).sum(axis=2)
+                np.multiply(real_data, self._scanner_clock_frequency, out=all_data[:, 0])
+                start_index += 1
+
+            if self._scanner_ai_channels:
+                n_ai = len(self._scanner_ai_channels)
+                odmr_analog_data = self._odmr_continuous['analog'][:n_ai * length * sweeps]
+                daq.DAQmxReadAnalogF64(
+                    self._scanner_analog_daq_task,
+                    length * sweeps,
+                    timeout,
+                    daq.DAQmx_Val_GroupByChannel,
+                    odmr_analog_data,
+                    n_ai * length * sweeps,
+                    daq.byref(n_read_samples),
+                    None)
+                all_data[:, start_index:] = \
+                    odmr_analog_data.reshape(n_ai, sweeps, length).transpose(1, 0, 2)
+        except:
+            self.log.exception('Error while reading continuous ODMR.')
+            return True, np.empty((0, n_channels, 0))
+        return False, all_data
+
+    def stop_continuous_odmr(self):
+        """ Stops the acquisition started by start_continuous_odmr.
+
+        @return int: error code (0:OK, -1:error)
+        """
+        if self._odmr_continuous is None:
+            return 0
+        retval = 0
+        try:
+            daq.DAQmxStopTask(self._scanner_clock_daq_task)
+            if self._scanner_counter_channels:
+                daq.DAQmxStopTask(self._scanner_counter_daq_tasks[0])
+            if self._scanner_ai_channels:
+                daq.DAQmxStopTask(self._scanner_analog_daq_task)
+        except:
+            self.log.exception('Error while stopping continuous ODMR.')
+            retval = -1
+        self._odmr_continuous = None
+        return retval
+
     def close_odmr(self):
         """ Closes the odmr and cleans up afterwards.
 
         @return int: error code (0:OK, -1:error)
         """
-        retval = 0
+        retval = self.stop_continuous_odmr()
         try:
             # disconnect the trigger channel
             daq.DAQmxDisconnectTerms(
@@ -1961,7 +2312,8 @@ class NationalInstrumentsXSeries(Base, SlowCounterInterface, ConfocalScannerInte
 
     # ======================== Gated photon counting ==========================
 
-    def set_up_gated_counter(self, buffer_length, read_available_samples=False):
+    def set_up_gated_counter(self, buffer_length, read_available_samples=False,
+                             circular_buffer=False):
         """ Initializes and starts task for external gated photon counting.
 
         @param int buffer_length: Defines how long the buffer to be filled with
@@ -1980,6 +2332,13 @@ class NationalInstrumentsXSeries(Base, SlowCounterInterface, ConfocalScannerInte
                                             buffer before, if True it returns
                                             what is in buffer until 'samples'
                                             is full
+        @param bool circular_buffer: if True, unread samples are overwritten
+                                     when the buffer is full instead of
+                                     stopping the task with an error. The
+                                     lost samples are counted by
+                                     read_available_gated_counts.
+
+        @return int: error code (0:OK, -1:error)
         """
         if self._gated_counter_daq_task is not None:
             self.log.error(
@@ -2007,8 +2366,8 @@ class NationalInstrumentsXSeries(Base, SlowCounterInterface, ConfocalScannerInte
                 self._max_counts,
                 # units of width measurement,  here photon ticks.
                 daq.DAQmx_Val_Ticks,
-                # start pulse width measurement on rising edge
-                self._counting_edge,
+                # start pulse width measurement on rising or falling edge
+                daq.DAQmx_Val_Rising if self._counting_edge_rising else daq.DAQmx_Val_Falling,
                 '')
 
             # Set the pulses to counter self._counter_channel
@@ -2022,7 +2381,7 @@ class NationalInstrumentsXSeries(Base, SlowCounterInterface, ConfocalScannerInte
             daq.DAQmxSetCICtrTimebaseSrc(
                 self._gated_counter_daq_task,
                 self._counter_channel,
-                self._photon_source)
+                self._photon_sources[0])
 
             # set timing to continuous
             daq.DAQmxCfgImplicitTiming(
@@ -2045,13 +2404,18 @@ class NationalInstrumentsXSeries(Base, SlowCounterInterface, ConfocalScannerInte
             # Do not read first sample:
             daq.DAQmxSetReadOffset(self._gated_counter_daq_task, 0)
 
-            # Unread data in buffer is not overwritten
-            daq.DAQmxSetReadOverWrite(
-                self._gated_counter_daq_task,
-                daq.DAQmx_Val_DoNotOverwriteUnreadSamps)
+            # Unread data in buffer is not overwritten, unless it is used as a
+            # circular buffer
+            if circular_buffer:
+                overwrite = daq.DAQmx_Val_OverwriteUnreadSamps
+            else:
+                overwrite = daq.DAQmx_Val_DoNotOverwriteUnreadSamps
+            daq.DAQmxSetReadOverWrite(self._gated_counter_daq_task, overwrite)
         except:
             self.log.exception('Error while setting up gated counting.')
             return -1
+        self._gated_buffer_length = int(buffer_length)
+        self._gated_lost_samples = 0
         return 0
 
     def start_gated_counter(self):
@@ -2138,6 +2502,73 @@ class NationalInstrumentsXSeries(Base, SlowCounterInterface, ConfocalScannerInte
             self.log.exception('Error while reading gated count data.')
             return np.array([-1])
 
+    def read_available_gated_counts(self, buffer):
+        """ Reads all gated count samples acquired since the last read.
+
+        Does not wait for new samples. If the gated counter was set up with a
+        circular buffer and unread samples were overwritten, reading continues
+        with the oldest samples still in the buffer and the skipped samples are
+        added to self._gated_lost_samples.
+
+        @param numpy.ndarray buffer: 1D uint32 array to write the counts to,
+                                     at most buffer.size samples are read
+
+        @return int: number of samples read, -1 on error
+        """
+        if self._gated_counter_daq_task is None:
+            self.log.error('No gated counter running, call set_up_gated_counter before '
+                           'reading it.')
+            return -1
+
+        task = self._gated_counter_daq_task
+        # Samples arriving between the check of the buffer and the read must
+        # not overwrite the samples to read, so keep a margin to the end.
+        keep = self._gated_buffer_length - self._gated_buffer_length // 10
+        try:
+            acquired = daq.uInt64()
+            read_position = daq.uInt64()
+            daq.DAQmxGetReadTotalSampPerChanAcquired(task, daq.byref(acquired))
+            daq.DAQmxGetReadCurrReadPos(task, daq.byref(read_position))
+            unread = acquired.value - read_position.value
+            if unread < 1 or buffer.size < 1:
+                return 0
+
+            n_read_samples = daq.int32()
+            if unread <= keep:
+                daq.DAQmxReadCounterU32(
+                    task,
+                    min(unread, buffer.size),
+                    self._RWTimeout,
+                    buffer,
+                    buffer.size,
+                    daq.byref(n_read_samples),
+                    None)
+            else:
+                # The oldest unread samples are overwritten, continue with the
+                # last 'keep' samples.
+                daq.DAQmxSetReadRelativeTo(task, daq.DAQmx_Val_MostRecentSamp)
+                daq.DAQmxSetReadOffset(task, -keep)
+                try:
+                    daq.DAQmxReadCounterU32(
+                        task,
+                        min(keep, buffer.size),
+                        self._RWTimeout,
+                        buffer,
+                        buffer.size,
+                        daq.byref(n_read_samples),
+                        None)
+                finally:
+                    daq.DAQmxSetReadRelativeTo(task, daq.DAQmx_Val_CurrReadPos)
+                    daq.DAQmxSetReadOffset(task, 0)
+                new_read_position = daq.uInt64()
+                daq.DAQmxGetReadCurrReadPos(task, daq.byref(new_read_position))
+                first_read = new_read_position.value - n_read_samples.value
+                self._gated_lost_samples += first_read - read_position.value
+        except:
+            self.log.exception('Error while reading gated count data.')
+            return -1
+        return n_read_samples.value
+
     def stop_gated_counter(self):
         """Actually start the preconfigured counter task
 
@@ -56,6 +56,7 @@ class ODMRCounterDummy(Base, ODMRCounterInterface):
         self._pulse_out_channel = 'dummy'
         self._lock_in_active = False
         self._oversampling = 10
+        self._continuous = None
 
     def on_activate(self):
         """ Initialisation performed during activation of the module.
@@ -137,6 +138,21 @@ class ODMRCounterDummy(Base, ODMRCounterInterface):
 
         self._odmr_length = length
 
+        ret = self._simulate_sweeps(1, length)[0]
+
+        time.sleep(self._odmr_length*1./self._clock_frequency)
+
+        self.module_state.unlock()
+        return False, ret
+
+    def _simulate_sweeps(self, number_of_sweeps, length):
+        """ Simulated count data of several sweeps.
+
+        @param int number_of_sweeps: number of sweeps
+        @param int length: length of microwave sweep in pixel
+
+        @return float[][][]: 3D array[sweep, channel, pixel]
+        """
         lorentians, params = self._fit_logic.make_lorentziandouble_model()
 
         sigma = 3.
@@ -149,18 +165,68 @@ class ODMRCounterDummy(Base, ODMRCounterInterface):
         params.add('l1_sigma', value=sigma)
         params.add('offset', value=50000.)
 
-        ret = np.empty((self._number_of_channels, length))
+        spectrum = lorentians.eval(x=np.arange(1, length + 1, 1), params=params)
+        channel_factor = np.arange(1, self._number_of_channels + 1)
+        ret = np.random.uniform(0, 5e4, (number_of_sweeps, self._number_of_channels, length))
+        ret += channel_factor[:, np.newaxis] * spectrum
+        return ret
 
-        for chnl_index in range(self._number_of_channels):
-            count_data = np.random.uniform(0, 5e4, length)
-            count_data += (chnl_index + 1) * lorentians.eval(x=np.arange(1, length + 1, 1),
-                                                             params=params)
-            ret[chnl_index] = count_data
+    def start_continuous_odmr(self, length=100, sweeps_per_read=10, buffered_sweeps=100):
+        """ Start a hardware timed acquisition of consecutive sweeps without dead time.
 
-        time.sleep(self._odmr_length*1./self._clock_frequency)
+        @param int length: length of microwave sweep in pixel
+        @param int sweeps_per_read: minimum number of sweeps returned by read_continuous_odmr
+        @param int buffered_sweeps: number of sweeps the hardware buffer can hold
 
-        self.module_state.unlock()
-        return False, ret
+        @return int: error code (0:OK, -1:error)
+        """
+        if self.module_state() == 'locked':
+            self.log.error('A scan_line is already running, close this one first.')
+            return -1
+        self.module_state.lock()
+        self._odmr_length = length
+        self._continuous = {'sweeps_per_read': max(1, int(sweeps_per_read)),
+                            'buffered_sweeps': max(1, int(buffered_sweeps)),
+                            'sweep_time': length / self._clock_frequency,
+                            'start_time': time.perf_counter(),
+                            'sweeps_read': 0}
+        return 0
+
+    def read_continuous_odmr(self):
+        """ Get the sweeps completed since the last read, at least sweeps_per_read of them.
+
+        @return (bool, float[][][]): tuple: was there an error, the photon counts per second
+                                     as 3D array[sweep, channel, pixel]
+        """
+        cont = self._continuous
+        if cont is None:
+            self.log.error('No continuous ODMR acquisition running.')
+            return True, np.empty((0, self._number_of_channels, 0))
+
+        # wait until the sweeps of this read are completed
+        target = cont['sweeps_read'] + cont['sweeps_per_read']
+        remaining = cont['start_time'] + target * cont['sweep_time'] - time.perf_counter()
+        if remaining > 0:
+            time.sleep(remaining)
+        completed = int((time.perf_counter() - cont['start_time']) / cont['sweep_time'])
+        number_of_sweeps = completed - cont['sweeps_read']
+        if number_of_sweeps > cont['buffered_sweeps']:
+            self.log.warning('{0:d} ODMR sweeps were lost, the buffer holds {1:d} sweeps.'
+                             ''.format(number_of_sweeps - cont['buffered_sweeps'],
+                                       cont['buffered_sweeps']))
+            number_of_sweeps = cont['buffered_sweeps']
+        cont['sweeps_read'] = completed
+        return False, self._simulate_sweeps(number_of_sweeps, self._odmr_length)
+
+    def stop_continuous_odmr(self):
+        """ Stop the continuous acquisition started with start_continuous_odmr.
+
+        @return int: error code (0:OK, -1:error)
+        """
+        if self._continuous is not None:
+            self._continuous = None
+            self.module_state.unlock()
+        return 0
 
 
     def close_odmr(self):
@@ -20,6 +20,7 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 """
 
 import ctypes
+import os
 import numpy as np
 import time
 from qtpy import QtCore
@@ -32,6 +33,8 @@ from interface.slow_counter_interface import SlowCounterInterface
 from interface.slow_counter_interface import SlowCounterConstraints
 from interface.slow_counter_interface import CountingMode
 from interface.fast_counter_interface import FastCounterInterface
+from hardware.picoquant.tttr import TTTRDecoder, TriggerTracker, TimeHistogram, \
+    MODE_T2, T2_RESOLUTION_PS
 
 # =============================================================================
 # Wrapper around the PHLib.DLL. The current file is based on the header files
@@ -99,11 +102,15 @@ class PicoHarp300(Base, SlowCounterInterface, FastCounterInterface):
         module.Class: 'picoquant.picoharp300.PicoHarp300'
         deviceID: 0 # a device index from 0 to 7.
         mode: 0 # 0: histogram mode, 2: T2 mode, 3: T3 mode
+        gated: False # gated fast counter, a marker starts every sequence
+        sequence_marker: 1 # marker bit(s) which start a sequence in gated mode
         
     """
 
     _deviceID = ConfigOption('deviceID', 0, missing='warn') # a device index from 0 to 7.
     _mode = ConfigOption('mode', 0, missing='warn')
+    _gated = ConfigOption('gated', False)
+    _sequence_marker = ConfigOption('sequence_marker', 1)
 
     sigReadoutPicoharp = QtCore.Signal()
     sigAnalyzeData = QtCore.Signal(object, object)
@@ -126,8 +133,19 @@ class PicoHarp300(Base, SlowCounterInterface, FastCounterInterface):
         self._dll = ctypes.cdll.LoadLibrary('phlib64')
 
         # Just some default values:
-        self._bin_width_ns = 3000
-        self._record_length_ns = 100 *1e9
+        self._bin_width_ps = 3000000
+        self._record_length_s = 100
+        self._number_of_gates = 0
+        self._resolution_ps = T2_RESOLUTION_PS
+        self._start_time = None
+
+        # reused FIFO buffers, the analysis of the previous read may still hold one of them
+        self._fifo_buffers = np.zeros((4, self.TTREADMAX), dtype=np.uint32)
+        self._fifo_index = 0
+        self._decoder = None
+        self._histogram = TimeHistogram(1, self._bin_width_ps)
+        self._sync_tracker = TriggerTracker()
+        self._sequence_tracker = TriggerTracker()
 
         self._photon_source2 = None #for compatibility reasons with second APD
         self._count_channel = 1
@@ -735,7 +753,8 @@ class PicoHarp300(Base, SlowCounterInterface, FastCounterInterface):
 
         num_counts = self.TTREADMAX
 
-        buffer = np.zeros((num_counts,), dtype=np.uint32)
+        buffer = self._fifo_buffers[self._fifo_index]
+        self._fifo_index = (self._fifo_index + 1) % len(self._fifo_buffers)
 
         actual_num_counts = ctypes.c_int32()
 
@@ -1057,29 +1076,46 @@ class PicoHarp300(Base, SlowCounterInterface, FastCounterInterface):
 
     #FIXME: The interface connection to the fast counter must be established!
 
-    def configure(self, bin_width_ns, record_length_ns, number_of_gates = 0):
-        """
-        Configuration of the fast counter.
-        bin_width_ns: Length of a single time bin in the time trace histogram
-                      in nanoseconds.
-        record_length_ns: Total length of the timetrace/each single gate in
-                          nanoseconds.
-        number_of_gates: Number of gates in the pulse sequence. Ignore for
-                         ungated counter.
-        """
-        #        self.initialize(mode=3)
-        self._bin_width_ns = bin_width_ns
-        self._record_length_ns = record_length_ns
-        self._number_of_gates = number_of_gates
+    def configure(self, bin_width_s, record_length_s, number_of_gates=0):
+        """ Configuration of the fast counter.
 
-        #FIXME: actualle only an unsigned array will be needed. Change that later.
-        #        self.data_trace = np.zeros(number_of_gates, dtype=np.int64 )
-        self.data_trace = [0]*number_of_gates
-        self.count = 0
+        @param float bin_width_s: Length of a single time bin in the time trace histogram in
+                                  seconds.
+        @param float record_length_s: Total length of the timetrace/each single gate in
+                                      seconds.
+        @param int number_of_gates: optional, number of gates in the pulse sequence. Ignore
+                                    for not gated counter.
 
-        self.result = []
-        self.initialize(2)
-        return
+        @return tuple(binwidth_s, record_length_s, number_of_gates):
+                    binwidth_s: float the actual set binwidth in seconds
+                    gate_length_s: the actual record length in seconds
+                    number_of_gates: the number of gated, which are accepted, None if not-gated
+        """
+        mode = self._mode if self._mode in (self.MODE_T2, self.MODE_T3) else self.MODE_T2
+        self.initialize(mode)
+        if mode == self.MODE_T2:
+            resolution_ps = T2_RESOLUTION_PS
+        else:
+            resolution_ps = self.get_resolution()
+
+        # the bin width is a multiple of the resolution of the time tags
+        bin_steps = max(int(round(bin_width_s * 1e12 / resolution_ps)), 1)
+        self._resolution_ps = resolution_ps
+        self._bin_width_ps = bin_steps * resolution_ps
+        num_bins = max(int(np.ceil(record_length_s * 1e12 / self._bin_width_ps)), 1)
+        self._record_length_s = num_bins * self._bin_width_ps * 1e-12
+        self._number_of_gates = int(number_of_gates) if self._gated else 0
+
+        with self.threadlock:
+            self._decoder = TTTRDecoder(mode)
+            # delays are histogrammed in units of the resolution
+            self._histogram = TimeHistogram(num_bins, bin_steps, self._number_of_gates)
+            self._sync_tracker.reset()
+            self._sequence_tracker.reset()
+
+        return (self._bin_width_ps * 1e-12,
+                self._record_length_s,
+                self._number_of_gates if self._gated else None)
 
     def get_status(self):
         """
@@ -1112,23 +1148,32 @@ class PicoHarp300(Base, SlowCounterInterface, FastCounterInterface):
     def continue_measure(self):
         """
         Continues the current measurement if the fast counter is in pause state.
+        The histogram is kept, the time axis of the records starts again.
         """
+        with self.threadlock:
+            if self._decoder is not None:
+                self._decoder.reset()
+            self._sync_tracker.reset()
+            self._sequence_tracker.reset()
         self.meas_run = True
-        self.start(self._record_length_ns/1e6)
+        self.start(self.ACQTMAX)
+        # the readout loop may still be running
+        if self.module_state() != 'locked':
+            self.lock()
+            self.sigReadoutPicoharp.emit()
 
     def is_gated(self):
         """
         Boolean return value indicates if the fast counter is a gated counter
         (TRUE) or not (FALSE).
         """
-        return False
+        return bool(self._gated)
 
     def get_binwidth(self):
         """
         returns the width of a single timebin in the timetrace in seconds
         """
-        #FIXME: Must be implemented
-        return 2e-9
+        return self._bin_width_ps * 1e-12
 
     def get_data_trace(self):
         """
@@ -1142,9 +1187,13 @@ class PicoHarp300(Base, SlowCounterInterface, FastCounterInterface):
             returnarray[gate_index, timebin_index]
         """
 
-        info_dict = {'elapsed_sweeps': None,
-                     'elapsed_time': None}  # TODO : implement that according to hardware capabilities
-        return self.data_trace, info_dict
+        with self.threadlock:
+            data_trace = self._histogram.trace()
+            sweeps = self._sequence_tracker.count if self._number_of_gates > 0 else None
+        elapsed = None if self._start_time is None else time.time() - self._start_time
+        info_dict = {'elapsed_sweeps': sweeps,
+                     'elapsed_time': elapsed}
+        return data_trace, info_dict
 
     # =========================================================================
     #  Test routine for continuous readout
@@ -1157,10 +1206,17 @@ class PicoHarp300(Base, SlowCounterInterface, FastCounterInterface):
         """
         self.lock()
 
+        with self.threadlock:
+            if self._decoder is not None:
+                self._decoder.reset()
+            self._histogram.clear()
+            self._sync_tracker.reset()
+            self._sequence_tracker.reset()
+        self._start_time = time.time()
         self.meas_run = True
 
-        # start the device:
-        self.start(int(self._record_length_ns/1e6))
+        # start the device, the acquisition runs until stop_measure is called:
+        self.start(self.ACQTMAX)
 
         self.sigReadoutPicoharp.emit()
 
@@ -1177,7 +1233,7 @@ class PicoHarp300(Base, SlowCounterInterface, FastCounterInterface):
         #        buffer, actual_counts = [1,2,3,4,5,6,7,8,9], 9
 
         # This analysis signel should be analyzed in a queued thread:
-        self.sigAnalyzeData.emit(buffer[0:actual_counts-1], actual_counts)
+        self.sigAnalyzeData.emit(buffer[:actual_counts], actual_counts)
 
         if not self.meas_run:
             with self.threadlock:
@@ -1185,7 +1241,6 @@ class PicoHarp300(Base, SlowCounterInterface, FastCounterInterface):
                 self.stop_device()
                 return
 
-        print('get new data.')
         # get the next data:
         self.sigReadoutPicoharp.emit()
 
@@ -1197,110 +1252,48 @@ class PicoHarp300(Base, SlowCounterInterface, FastCounterInterface):
         @param arr_data: numpy uint32 array with length 'actual_counts'.
         @param actual_counts: int, number of read out events from the buffer.
 
-        Write the obtained arr_data to the predefined array data_trace,
-        initialized in the configure method.
-
-        The received array contains 32bit words. The bit assignment starts from
-        the MSB (most significant bit), which is here displayed as the most
-        left bit.
-
-        For T2 (initialized device with mode=2):
-        ----------------------------------------
-
-        [ 4 bit for channel-number |28 bit for time-tag] = [32 bit word]
-
-        channel-number: 4 marker, which serve for the different channels.
-                            0001 = marker 1
-                            0010 = marker 2
-                            0011 = marker 3
-                            0100 = marker 4
-
-                        The channel code 15 (all bits ones, 1111) marks a
-                        special record. Special records can be overflows or
-                        external markers. To differentiate this, the lower 4
-                        bits of timetag must be checked:
-                            - If they are all zero, the record marks an
-                              overflow.
-                            - If they are >=1 the individual bits are external
-                              markers.
-
-                        Overflow period: 210698240
-
-                        the first bit is the overflow bit. It will be set if
-                        the time-tag reached 2^28:
-
-                            0000 = overflow
-
-                        Afterwards both overflow marker and time-tag
-                        will be reseted. This overflow should be detected and
-                        the time axis should be adjusted accordingly.
-
-        time-tag: The resolution is fixed to 4ps. Within the time of
-                  4ps*2^28 = 1.073741824 ms
-                  another photon event should occur so that the time axis can
-                  be computed properly.
-
-        For T3 (initialized device with mode=3):
-        ----------------------------------------
-
-        [ 4 bit for channel-number | 12 bit for start-stop-time | 16 bit for sync counter] = [32 bit word]
-
-        channel-number: 4 marker, which serve for the different channels.
-                            0001 = marker 1
-                            0010 = marker 2
-                            0011 = marker 3
-                            0100 = marker 4
-
-                        the first bit is the overflow bit. It will be set if
-                        the sync-counter reached 65536 events:
-
-                            1000 = overflow
-
-                        Afterwards both, overflow marker and sync-counter
-                        will be reseted. This overflow should be detected and
-                        the time axis should be adjusted accordingly.
-
-        start-stop-time: time between to consecutive sync pulses. Maximal time
-                         between two sync pulses is therefore limited to
-                             2^12 * Res
-                         where Res is the Resolution
-                             Res = {4,8,16,32,54,128,256,512} (in ps)
-                         For largest Resolution of 512ps you have 2097.152 ns.
-        sync-counter: can hold up to 2^16 = 65536 events. It that number is
-                      reached overflow will be set. That means all 4 bits in
-                      the channel-number are set to high (i.e. 1).
+        The records are decoded (see hardware.picoquant.tttr for the record format) and the
+        photons of the counting channel are added to the histogram, which was set up in the
+        configure method.
+        T2: the delay of a photon is measured from the last sync (channel 0) event.
+        T3: the delay of a photon is its start-stop time.
+        If the counter is gated, the sequence marker starts every sequence and the gate of a
+        photon is the number of syncs since the last sequence start.
         """
-
-        # at first just a simple test
-        time.sleep(0.2)
-
-        self.data_trace[self.count] = actual_counts
-        self.count += 1
-
-        if self.count > self._number_of_gates-1:
-            self.count = 0
-
+        if self._decoder is None:
+            return
         if actual_counts == self.TTREADMAX:
-            self.log.warning('Overflow!')
-
-        print('Data analyzed.')
-
-#        self.result = []
-#        for entry in arr_data[0:actual_counts-1]:
-#
-#            # apply three bitmasks to extract the relavent numbers:
-#            overflow = entry & (2**(32-1) )
-#            marker_ch = entry & (2**(32-2)  + 2**(32-3) + 2**(32-4))
-#            time_tag = entry & (2**32 -1 - 2**(32-1) + 2**(32-2) + 2**(32-3) + 2**(32-4))
-
-
-
-
-
-
-
-
-
-
-
-
+            self.log.warning('The FIFO was read out completely, the readout may not keep '
+                             'up with the count rate.')
+
+        with self.threadlock:
+            events = self._decoder.decode(arr_data)
+            photons = events['channel'] == self._count_channel
+            times = events['time'][photons]
+            sequence_starts = (events['marker'] & self._sequence_marker) != 0
+            marker_times = events['marker_time'][sequence_starts]
+
+            if self._decoder.mode == MODE_T2:
+                sync_times = events['time'][events['channel'] == 0]
+                if self._number_of_gates > 0:
+                    # number of the first sync of every sequence
+                    _, first_sync = self._sync_tracker.locate(marker_times, sync_times,
+                                                              update=False)
+                    _, sequence_sync = self._sequence_tracker.locate(times, marker_times,
+                                                                     values=first_sync + 1)
+                sync_time, sync_number = self._sync_tracker.locate(times, sync_times)
+                delays = times - sync_time
+                delays[sync_time < 0] = -1
+            else:
+                if self._number_of_gates > 0:
+                    _, sequence_sync = self._sequence_tracker.locate(times, marker_times,
+                                                                     values=marker_times)
+                    sync_number = times
+                delays = events['dtime'][photons]
+
+            if self._number_of_gates > 0:
+                gates = sync_number - sequence_sync
+                gates[sequence_sync < 0] = -1
+                self._histogram.accumulate(delays, gates)
+            else:
+                self._histogram.accumulate(delays)
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains a vectorized decoder for the TTTR records of the PicoHarp300 and the
+accumulation of the decoded events into (gated) time histograms.
+
+The module does not need the PicoQuant library, so it can be used to analyze recorded .ptu
+data or synthetic record streams as well.
+
+Record format (32 bit words, starting from the MSB):
+
+    T2: [ 4 bit channel | 28 bit time tag (4 ps resolution) ]
+    T3: [ 4 bit channel | 12 bit start-stop time (dtime) | 16 bit sync counter (nsync) ]
+
+The channel code 15 marks a special record. If the marker bits (lowest 4 bits of the time
+tag in T2, lowest 4 bits of dtime in T3) are zero the record is an overflow of the time tag
+or sync counter, otherwise the bits are the external markers which were active.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import numpy as np
+
+MODE_T2 = 2
+MODE_T3 = 3
+
+SPECIAL_CHANNEL = 15
+# time tag range of T2 records in units of 4 ps
+T2_WRAPAROUND = 210698240
+T2_RESOLUTION_PS = 4
+# range of the sync counter of T3 records
+T3_WRAPAROUND = 65536
+
+
+class TTTRDecoder:
+    """ Decodes blocks of T2 or T3 records into photon and marker events.
+
+    The overflow correction is carried from one block to the next, so consecutive FIFO reads
+    can be decoded one after the other.
+    """
+
+    def __init__(self, mode):
+        """
+          @param int mode: 2 for T2 records, 3 for T3 records
+        """
+        if mode not in (MODE_T2, MODE_T3):
+            raise ValueError('TTTR mode must be {0} (T2) or {1} (T3), but {2} was passed.'
+                             ''.format(MODE_T2, MODE_T3, mode))
+        self.mode = mode
+        self.reset()
+
+    def reset(self):
+        """ Start a new measurement, the time axis starts at zero again. """
+        self._overflow_time = 0
+        self.num_overflows = 0
+
+    def decode(self, records):
+        """ Decode a block of records.
+
+          @param numpy.ndarray records: uint32 TTTR records
+
+          @return dict: with the arrays
+                        'channel': channel of each photon
+                        'time': T2: arrival time of each photon in units of 4 ps,
+                                T3: sync number of each photon
+                        'dtime': T3 only, time since the sync in units of the resolution
+                        'marker': active marker bits of each marker record
+                        'marker_time': time (T2) or sync number (T3) of each marker record
+        """
+        records = np.asarray(records, dtype=np.uint32)
+        channel = (records >> 28).astype(np.uint8)
+        special = channel == SPECIAL_CHANNEL
+        if self.mode == MODE_T2:
+            time_tag = records & 0x0FFFFFFF
+            markers = np.where(special, time_tag & 0xF, 0).astype(np.uint8)
+            # the marker bits are no part of the time
+            time_tag = time_tag - markers
+            wraparound = T2_WRAPAROUND
+        else:
+            dtime = ((records >> 16) & 0xFFF).astype(np.uint16)
+            time_tag = records & 0xFFFF
+            markers = np.where(special, dtime & 0xF, 0).astype(np.uint8)
+            wraparound = T3_WRAPAROUND
+        overflow = special & (markers == 0)
+
+        # every overflow record shifts the time of all following records
+        time = np.cumsum(overflow, dtype=np.int64)
+        time *= wraparound
+        time += self._overflow_time
+        time += time_tag
+        num_overflows = int(np.count_nonzero(overflow))
+        self._overflow_time += num_overflows * wraparound
+        self.num_overflows += num_overflows
+
+        photons = ~special
+        marker = special & ~overflow
+        events = {'channel': channel[photons],
+                  'time': time[photons],
+                  'marker': markers[marker],
+                  'marker_time': time[marker]}
+        if self.mode == MODE_T3:
+            events['dtime'] = dtime[photons]
+        return events
+
+
+class TriggerTracker:
+    """ Finds the last trigger before each event, also across blocks of events. """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """ Forget all triggers. """
+        self.count = 0
+        self.last_time = -1
+        self.last_value = -1
+
+    def locate(self, times, trigger_times, values=None, update=True):
+        """ Time and value of the last trigger at or before each event.
+
+          @param numpy.ndarray times: sorted event times
+          @param numpy.ndarray trigger_times: sorted trigger times of the same block
+          @param numpy.ndarray values: optional value of each trigger. Defaults to the running
+                                       number of the trigger since the last reset.
+          @param bool update: remember the last trigger of this block for the next block
+
+          @return tuple(numpy.ndarray, numpy.ndarray): time and value of the last trigger of
+                                                       each event, -1 if there was none
+        """
+        trigger_times = np.asarray(trigger_times, dtype=np.int64)
+        if values is None:
+            values = np.arange(self.count, self.count + len(trigger_times), dtype=np.int64)
+        index = np.searchsorted(trigger_times, times, side='right') - 1
+        before = index < 0
+        index[before] = 0
+        if len(trigger_times) > 0:
+            ref_times = trigger_times[index]
+            ref_values = np.asarray(values, dtype=np.int64)[index]
+        else:
+            ref_times = np.empty(len(index), dtype=np.int64)
+            ref_values = np.empty(len(index), dtype=np.int64)
+        ref_times[before] = self.last_time
+        ref_values[before] = self.last_value
+
+        if update and len(trigger_times) > 0:
+            self.count += len(trigger_times)
+            self.last_time = trigger_times[-1]
+            self.last_value = values[-1]
+        return ref_times, ref_values
+
+
+class TimeHistogram:
+    """ Time histogram of photon delays, optionally one row per gate. """
+
+    def __init__(self, num_bins, bin_width, number_of_gates=0):
+        """
+          @param int num_bins: number of time bins per gate
+          @param int bin_width: width of a time bin in the unit of the delays
+          @param int number_of_gates: number of gates, 0 for an ungated histogram
+        """
+        self.num_bins = int(num_bins)
+        self.bin_width = int(bin_width)
+        self.number_of_gates = int(number_of_gates)
+        self.data = np.zeros((max(self.number_of_gates, 1), self.num_bins), dtype=np.int64)
+
+    def clear(self):
+        """ Set all bins to zero. """
+        self.data[:] = 0
+
+    def accumulate(self, delays, gates=None):
+        """ Add photons to the histogram. Photons outside the histogram are dropped.
+
+          @param numpy.ndarray delays: delay of every photon, negative for no delay
+          @param numpy.ndarray gates: gate index of every photon, ignored if ungated
+
+          @return int: number of photons added
+        """
+        bins = np.asarray(delays, dtype=np.int64) // self.bin_width
+        valid = (bins >= 0) & (bins < self.num_bins)
+        if self.number_of_gates > 0:
+            gates = np.asarray(gates, dtype=np.int64)
+            valid &= (gates >= 0) & (gates < self.number_of_gates)
+            bins = bins[valid] + gates[valid] * self.num_bins
+        else:
+            bins = bins[valid]
+        self.data += np.bincount(bins, minlength=self.data.size).reshape(self.data.shape)
+        return len(bins)
+
+    def trace(self):
+        """ Copy of the histogram.
+
+          @return numpy.ndarray: 1D array[timebin_index] if ungated,
+                                 2D array[gate_index, timebin_index] if gated
+        """
+        if self.number_of_gates > 0:
+            return self.data.copy()
+        return self.data[0].copy()
+
+
+def encode_t2(channels, times, markers=None):
+    """ Build T2 records, e.g. to test the decoder with a synthetic record stream.
+
+      @param numpy.ndarray channels: channel of each event (0 to 14), 15 for marker records
+      @param numpy.ndarray times: sorted absolute times in units of 4 ps
+      @param numpy.ndarray markers: marker bits of each event, only used for channel 15
+
+      @return numpy.ndarray: uint32 records including the overflow records
+    """
+    channels = np.asarray(channels, dtype=np.uint32)
+    times = np.asarray(times, dtype=np.int64)
+    tags = (times % T2_WRAPAROUND).astype(np.uint32)
+    if markers is not None:
+        special = channels == SPECIAL_CHANNEL
+        tags[special] = (tags[special] & np.uint32(0x0FFFFFF0)) \
+            | np.asarray(markers, dtype=np.uint32)[special]
+    return _insert_overflows((channels << 28) | tags, times // T2_WRAPAROUND)
+
+
+def encode_t3(channels, nsync, dtime, markers=None):
+    """ Build T3 records, e.g. to test the decoder with a synthetic record stream.
+
+      @param numpy.ndarray channels: channel of each event (1 to 4), 15 for marker records
+      @param numpy.ndarray nsync: sorted absolute sync numbers
+      @param numpy.ndarray dtime: time since the sync in units of the resolution (< 4096)
+      @param numpy.ndarray markers: marker bits of each event, only used for channel 15
+
+      @return numpy.ndarray: uint32 records including the overflow records
+    """
+    channels = np.asarray(channels, dtype=np.uint32)
+    nsync = np.asarray(nsync, dtype=np.int64)
+    dtime = np.asarray(dtime, dtype=np.uint32)
+    if markers is not None:
+        dtime = np.where(channels == SPECIAL_CHANNEL, markers, dtime).astype(np.uint32)
+    records = (channels << 28) | (dtime << 16) | (nsync % T3_WRAPAROUND).astype(np.uint32)
+    return _insert_overflows(records, nsync // T3_WRAPAROUND)
+
+
+def _insert_overflows(records, wraps):
+    """ Insert an overflow record before every record whose wrap count increased. """
+    num_overflows = np.diff(np.concatenate(([0], wraps)))
+    positions = np.repeat(np.arange(len(records)), num_overflows)
+    return np.insert(records, positions, np.uint32(SPECIAL_CHANNEL << 28)).astype(np.uint32)
@@ -0,0 +1,447 @@
+# -*- coding: utf-8 -*-
+
+"""
+This file contains a dummy recorder, which simulates the TimeTagger counter without hardware.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import threading
+import time
+import numpy as np
+
+from core.module import Base
+from core.configoption import ConfigOption
+from interface.slow_counter_interface import SlowCounterInterface
+from interface.slow_counter_interface import SlowCounterConstraints
+from interface.slow_counter_interface import CountingMode
+from interface.recorder_interface import RecorderInterface, RecorderConstraints, RecorderState
+from hardware.recorder_modes import HWRecorderMode, TimeTaggerMeasurementMode
+
+
+class RecorderDummy(Base, SlowCounterInterface, RecorderInterface):
+    """ Dummy recorder with the modes of the TimeTagger counter.
+
+    Every recorded value (pixel, ESR frequency point) takes value_time, so the acquisition time
+    of a measurement resembles the real device. The data are Poissonian counts of an NV center
+    with an ESR dip, a fluorescence decay for pulsed measurements and a flat count rate
+    otherwise.
+
+    Example config for copy-paste:
+
+    recorder_dummy:
+        module.Class: 'recorder_dummy.RecorderDummy'
+        count_rate: 100e3 # in counts/s
+        value_time: 1e-3 # in s, acquisition time per recorded value
+        resonance_frequency: 2.87e9 # in Hz
+        recorder_timeout: 60 # in s
+
+    """
+
+    _count_rate = ConfigOption('count_rate', 100e3)
+    _value_time = ConfigOption('value_time', 1e-3)
+    _resonance_frequency = ConfigOption('resonance_frequency', 2.87e9)
+    _resonance_linewidth = ConfigOption('resonance_linewidth', 10e6)
+    _resonance_contrast = ConfigOption('resonance_contrast', 0.2)
+    _recorder_timeout = ConfigOption('recorder_timeout', 60)
+
+    _iso_b_pulse_config_time = 3.0e-6
+
+    def on_activate(self):
+        """ Initialisation performed during activation of the module.
+        """
+        self._count_frequency = 50  # Hz
+        self._recorder_constraints = RecorderConstraints()
+        self._create_recorder_constraints()
+
+        self._curr_mode = HWRecorderMode.UNCONFIGURED
+        self._curr_meas_params = dict()
+        self._curr_state = RecorderState.UNLOCKED
+        self.is_measurement_running = False
+
+        self._double_buffer = False
+        self._prearmed = False
+        self._acquisition_end = None
+        self._stop_event = threading.Event()
+
+    def on_deactivate(self):
+        """ Deinitialisation performed during deactivation of the module.
+        """
+        self.stop_measurement()
+
+    # ==========================================================================
+    #                 Slow Counter Interface Implementation
+    # ==========================================================================
+
+    def get_constraints(self):
+        """ Return a constraints class for the slow counter."""
+        constraints = SlowCounterConstraints()
+        constraints.max_detectors = 1
+        constraints.min_count_frequency = 1e-3
+        constraints.max_count_frequency = 10e9
+        constraints.counting_mode = [CountingMode.CONTINUOUS]
+        return constraints
+
+    def set_up_clock(self, clock_frequency=None, clock_channel=None):
+        """ Set the frequency of the counter.
+
+        @param float clock_frequency: if defined, this sets the frequency of the clock
+        @param string clock_channel: ignored
+
+        @return int: error code (0:OK, -1:error)
+        """
+        if clock_frequency is not None:
+            self._count_frequency = float(clock_frequency)
+        return 0
+
+    def set_up_counter(self, counter_channels=None, sources=None, clock_channel=None,
+                       counter_buffer=None):
+        """ Prepare the counter, the parameters are ignored.
+
+        @return int: error code (0:OK, -1:error)
+        """
+        self._curr_mode = HWRecorderMode.COUNTER
+        self._curr_state = RecorderState.ARMED
+        return 0
+
+    def get_counter_channels(self):
+        """ Returns the list of counter channel names.
+
+        @return list(str): channel names
+        """
+        return ['Ctr0']
+
+    def get_counter(self, samples=None):
+        """ Returns the current counts per second of the counter.
+
+        @param int samples: if defined, number of samples to read in one go
+
+        @return numpy.array(uint32): the photon counts per second
+        """
+        samples = 1 if samples is None else int(samples)
+        time.sleep(samples / self._count_frequency)
+        counts = np.random.poisson(self._count_rate / self._count_frequency, samples)
+        return np.array([counts * self._count_frequency])
+
+    def close_counter(self):
+        """ Closes the counter.
+
+        @return int: error code (0:OK, -1:error)
+        """
+        self._curr_state = RecorderState.UNLOCKED
+        return 0
+
+    def close_clock(self):
+        """ Closes the clock.
+
+        @return int: error code (0:OK, -1:error)
+        """
+        return 0
+
+    # ==========================================================================
+    #                 Recorder Interface Implementation
+    # ==========================================================================
+
+    def _create_recorder_constraints(self):
+        rc = self._recorder_constraints
+
+        rc.max_detectors = 1
+        rc.recorder_modes = [HWRecorderMode.UNCONFIGURED,
+                             HWRecorderMode.COUNTER,
+                             HWRecorderMode.ESR,
+                             HWRecorderMode.GENERAL_PULSED,
+                             HWRecorderMode.PIXELCLOCK,
+                             HWRecorderMode.PIXELCLOCK_SINGLE_ISO_B,
+                             HWRecorderMode.PIXELCLOCK_N_ISO_B]
+
+        rc.recorder_mode_states = {
+            HWRecorderMode.UNCONFIGURED: [RecorderState.LOCKED, RecorderState.UNLOCKED],
+            HWRecorderMode.COUNTER: [RecorderState.IDLE, RecorderState.BUSY],
+            HWRecorderMode.ESR: [RecorderState.IDLE, RecorderState.ARMED, RecorderState.BUSY],
+            HWRecorderMode.GENERAL_PULSED: [RecorderState.IDLE, RecorderState.ARMED,
+                                            RecorderState.BUSY],
+            HWRecorderMode.PIXELCLOCK: [RecorderState.IDLE, RecorderState.ARMED,
+                                        RecorderState.BUSY],
+            HWRecorderMode.PIXELCLOCK_SINGLE_ISO_B: [RecorderState.IDLE, RecorderState.ARMED,
+                                                     RecorderState.BUSY],
+            HWRecorderMode.PIXELCLOCK_N_ISO_B: [RecorderState.IDLE, RecorderState.ARMED,
+                                                RecorderState.BUSY]}
+
+        rc.recorder_mode_params = {
+            HWRecorderMode.UNCONFIGURED: {},
+            HWRecorderMode.COUNTER: {'count_frequency': 100},
+            HWRecorderMode.ESR: {'mw_frequency_list': [],
+                                 'mw_power': -30,
+                                 'count_frequency': 100,
+                                 'num_meas': 100},
+            HWRecorderMode.GENERAL_PULSED: {'laser_pulses': 10,
+                                            'bin_width_s': 1e-9,
+                                            'record_length_s': 3e-6,
+                                            'max_counts': 10},
+            HWRecorderMode.PIXELCLOCK: {},
+            HWRecorderMode.PIXELCLOCK_SINGLE_ISO_B: {'mw_frequency': 2.8e9,
+                                                     'mw_power': -30,
+                                                     'num_meas': 100},
+            HWRecorderMode.PIXELCLOCK_N_ISO_B: {'mw_frequency_list': [],
+                                                'mw_pulse_lengths': [],
+                                                'mw_power': -30,
+                                                'num_meas': 100}}
+
+        rc.recorder_mode_params_defaults = {mode: {} for mode in rc.recorder_modes}
+
+        rc.recorder_mode_measurements = {
+            HWRecorderMode.UNCONFIGURED: TimeTaggerMeasurementMode.DUMMY,
+            HWRecorderMode.COUNTER: TimeTaggerMeasurementMode.COUNTER,
+            HWRecorderMode.ESR: TimeTaggerMeasurementMode.ESR,
+            HWRecorderMode.GENERAL_PULSED: TimeTaggerMeasurementMode.GENERAL_PULSED,
+            HWRecorderMode.PIXELCLOCK: TimeTaggerMeasurementMode.PIXELCLOCK,
+            HWRecorderMode.PIXELCLOCK_SINGLE_ISO_B: TimeTaggerMeasurementMode.PIXELCLOCK,
+            HWRecorderMode.PIXELCLOCK_N_ISO_B: TimeTaggerMeasurementMode.PIXELCLOCK_N_ISO_B}
+
+    def get_recorder_constraints(self):
+        """ Retrieve the hardware constrains from the recorder device.
+
+        @return RecorderConstraints: object with constraints for the recorder
+        """
+        return self._recorder_constraints
+
+    def configure_recorder(self, mode, params):
+        """ Configures the recorder mode for current measurement.
+
+        @param HWRecorderMode mode: mode of recorder, as available from
+                                  HWRecorderMode types
+        @param dict params: specific settings as required for the given
+                            measurement mode. Point measurements (ESR, GENERAL_PULSED)
+                            accept 'double_buffer': True to arm the next point while the
+                            data of the current point is fetched.
+
+        @return int: error code (0:OK, -1:error)
+        """
+        if self._prearmed:
+            self._prearmed = False
+            self._curr_state = RecorderState.IDLE
+
+        if self._curr_state == RecorderState.BUSY:
+            self.log.error(f'Recorder dummy cannot be configured in the requested mode '
+                           f'"{HWRecorderMode.name(mode)}", since a measurement is running.')
+            return -1
+
+        if mode not in self._recorder_constraints.recorder_modes \
+                or mode == HWRecorderMode.UNCONFIGURED:
+            self.log.error(f'Requested mode "{HWRecorderMode.name(mode)}" not available.')
+            self._curr_mode = HWRecorderMode.UNCONFIGURED
+            return -1
+
+        self._curr_mode = mode
+        self._curr_meas_params = params
+        self._double_buffer = bool(params.get('double_buffer', False)) and \
+            self.get_current_measurement_method().movement == 'point'
+        self._curr_state = RecorderState.IDLE
+        return 0
+
+    def _num_values(self):
+        """ Number of values recorded in one measurement of the current mode. """
+        params = self._curr_meas_params
+        if self._curr_mode == HWRecorderMode.ESR:
+            return len(params['mw_frequency_list']) * params['num_meas']
+        elif self._curr_mode == HWRecorderMode.GENERAL_PULSED:
+            return params['laser_pulses']
+        return params.get('num_meas', 1)
+
+    def start_recorder(self, arm=False):
+        """ Start recorder
+        start recorder with mode as configured
+        If pixel clock based methods, will begin on first trigger
+        If not first configured, will cause an error
+
+        @param bool: arm: specifies armed state with regard to pixel clock trigger
+
+        @return bool: success of command
+        """
+        if self._prearmed:
+            # armed already while the data of the previous point was fetched
+            self._prearmed = False
+            return True
+
+        if self._curr_state == RecorderState.LOCKED:
+            self.log.warning('Recorder dummy has not been unlocked.')
+            return False
+        elif self._curr_mode == HWRecorderMode.UNCONFIGURED:
+            self.log.warning('Recorder dummy has not been configured.')
+            return False
+        elif self._curr_state not in (RecorderState.IDLE, RecorderState.IDLE_UNACK):
+            self.log.warning('Recorder dummy is not in Idle mode to start the measurement.')
+            return False
+
+        self._arm()
+        self.is_measurement_running = True
+        return True
+
+    def _arm(self):
+        self._stop_event.clear()
+        self._acquisition_end = time.monotonic() + self._num_values() * self._value_time
+        self._curr_state = RecorderState.ARMED
+
+    def get_measurements(self, meas_keys=['counts']):
+        """ get measurements
+        returns the measurement array in integer format, (blocking, changes state)
+
+        @param (list): meas_keys:  list of measurement keys to be returned;
+                                   keys which do not exist in measurment object are returned as None;
+                                   If None is passed, only 'counts' is returned
+
+        @return int_array: array of measurement as tuple elements, format depends upon
+                           current mode setting
+        """
+        if meas_keys is None:
+            meas_keys = ['counts']
+        ret = {'counts': None, 'int_time': None, 'counts2': None, 'counts_diff': None}
+        if self._acquisition_end is None:
+            self.log.error('Recorder dummy was not started.')
+            return [ret[key] for key in meas_keys]
+
+        # sleep until the simulated acquisition has finished, stop_measurement wakes up
+        remaining = self._acquisition_end - time.monotonic()
+        if remaining > self._recorder_timeout:
+            self._stop_event.wait(self._recorder_timeout)
+            self.log.error(f'Recorder dummy: no data within the timeout of '
+                           f'{self._recorder_timeout} s.')
+            return [ret[key] for key in meas_keys]
+        if remaining > 0 and self._stop_event.wait(remaining):
+            return [ret[key] for key in meas_keys]
+
+        if self._double_buffer and self.is_measurement_running:
+            # arm the next point before the data of this point is fetched
+            self._arm()
+            self._prearmed = True
+        else:
+            self._acquisition_end = None
+            self._curr_state = RecorderState.IDLE
+
+        ret.update(self._simulate_data())
+        return [ret[key] for key in meas_keys]
+
+    def _simulate_data(self):
+        """ Simulated data of one measurement in the current mode. """
+        params = self._curr_meas_params
+        mean_counts = self._count_rate * self._value_time
+        data = dict()
+        if self._curr_mode == HWRecorderMode.ESR:
+            freq = np.asarray(params['mw_frequency_list'], dtype=float)
+            lorentz = 1 / (1 + ((freq - self._resonance_frequency)
+                                / (self._resonance_linewidth / 2)) ** 2)
+            rate = mean_counts * (1 - self._resonance_contrast * lorentz)
+            counts = np.random.poisson(np.tile(rate, (params['num_meas'], 1)))
+            data['int_time'] = np.full(counts.shape, self._value_time)
+            data['counts'] = counts / data['int_time']
+
+        elif self._curr_mode == HWRecorderMode.GENERAL_PULSED:
+            num_bins = int(params['record_length_s'] / params['bin_width_s'])
+            decay = np.exp(-np.arange(num_bins) * params['bin_width_s'] / 12e-9)
+            rate = mean_counts * params['bin_width_s'] / 1e-6 * (1 + decay)
+            data['counts'] = np.random.poisson(np.tile(rate, (params['laser_pulses'], 1)))
+
+        else:
+            num_meas = params.get('num_meas', 1)
+            data['counts'] = np.random.poisson(mean_counts, num_meas)
+            data['int_time'] = np.full(num_meas, self._value_time)
+            if self._curr_mode == HWRecorderMode.PIXELCLOCK_N_ISO_B:
+                data['counts2'] = np.random.poisson(mean_counts, num_meas)
+                data['counts_diff'] = data['counts'] - data['counts2']
+        return data
+
+    def get_available_measurements(self, meas_keys=None):
+        """ get measurements, non-blocking, non-state changing
+
+        @param (list): meas_keys: a list of keys in the measurement array
+
+        @return list: the data of the running measurement simulated so far
+        """
+        if meas_keys is None:
+            meas_keys = ['counts']
+        ret = {'counts': None, 'int_time': None, 'counts2': None, 'counts_diff': None}
+        if self._acquisition_end is not None:
+            ret.update(self._simulate_data())
+        return [ret[key] for key in meas_keys]
+
+    def get_current_device_mode(self):
+        """ Get the current device mode with its configuration parameters
+
+        @return: (mode, params)
+                HWRecorderMode.mode mode: the current recorder mode
+                dict params: the current configuration parameter
+        """
+        return self._curr_mode, self._curr_meas_params
+
+    def get_current_device_state(self):
+        """  get_current_device_state
+        returns the current device state
+
+        @return RecorderState.state
+        """
+        return self._curr_state
+
+    def get_measurement_methods(self):
+        """ gets the possible measurement methods
+        """
+        return None
+
+    def get_parameters_for_modes(self, mode=None):
+        """ Returns the required parameters for the modes
+
+        @param HWRecorderMode mode: specifies the mode for sought parameters
+                                  If mode=None, all modes with their parameters
+                                  are returned. Otherwise specific mode
+                                  parameters are returned
+
+        @return dict: containing as keys the HWRecorderMode.mode and as values a
+                      dictionary with all parameters associated to the mode.
+        """
+        rc = self.get_recorder_constraints()
+        if mode is None:
+            return rc.recorder_mode_params
+        if mode not in rc.recorder_modes:
+            self.log.warning(f'Requested mode "{mode}" is not in the available '
+                             f'modes of the recorder dummy. Request skipped.')
+            return {}
+        return {mode: rc.recorder_mode_params[mode]}
+
+    def stop_measurement(self):
+        """ stop measurement
+        stops all on-going measurements, returns device to idle state
+        """
+        self._stop_event.set()
+        self._prearmed = False
+        self._acquisition_end = None
+        self.is_measurement_running = False
+        if self._curr_state != RecorderState.UNLOCKED:
+            self._curr_state = RecorderState.IDLE
+
+    def get_current_measurement_method_name(self):
+        """ gets the name of the measurment method currently in use
+
+        @return string
+        """
+        return self.get_current_measurement_method().name
+
+    def get_current_measurement_method(self):
+        """ get the current measurement method
+        (Note: the measurment method cannot be set directly, it is an aspect of the measurement mode)
+
+        @return TimeTaggerMeasurementMode
+        """
+        return self._recorder_constraints.recorder_mode_measurements[self._curr_mode]
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+"""
+This file contains the recorder modes of the TimeTagger counter. They are kept apart from the
+hardware module, so logic modules and the recorder dummy can use them without the TimeTagger
+library.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+from collections import namedtuple
+from enum import Enum
+
+from interface.recorder_interface import RecorderMode
+
+
+class HWRecorderMode(RecorderMode):
+    # starting methods
+    UNCONFIGURED             = 0
+    DUMMY                    = 1
+
+    # pixel clock counting methods
+    PIXELCLOCK               = 2
+    PIXELCLOCK_SINGLE_ISO_B  = 3
+    PIXELCLOCK_N_ISO_B       = 4
+    PIXELCLOCK_TRACKED_ISO_B = 5
+
+    # continous counting methods
+    CW_MW                    = 6
+    ESR                      = 7
+    COUNTER                  = 8
+    CONTINUOUS_COUNTING      = 9
+
+    # advanced measurement mode
+    PULSED_ESR               = 10
+    GENERAL_PULSED           = 11
+
+    @classmethod
+    def name(cls,val):
+        return { v:k for k,v in dict(vars(cls)).items() if isinstance(v,int)}.get(val, None)
+
+
+class TimeTaggerMeasurementMode(namedtuple('TimeTaggerMeasurementMode', 'value name movement'), Enum):
+    DUMMY                   = -1, 'DUMMY', 'null'
+    COUNTER                 = 0, 'COUNTER', 'null'
+    PIXELCLOCK              = 1, 'PIXELCLOCK', 'line' 
+    PIXELCLOCK_SINGLE_ISO_B = 2, 'PIXELCLOCK_SINGLE_ISO_B', 'line'
+    PIXELCLOCK_N_ISO_B      = 3, 'PIXELCLOCK_N_ISO_B', 'line'
+    ESR                     = 4, 'ESR', 'point'
+    PULSED_ESR              = 5, 'PULSED_ESR', 'point'
+    GENERAL_PULSED          = 6, 'GENERAL_PULSED', 'point'
+
+    def __str__(self):
+        return self.name
+
+    def __int__(self):
+        return self.value
+
@@ -83,6 +83,12 @@ class SlowCounterDummy(Base, SlowCounterInterface):
         self.curr_state_b = True
         self.total_time = 0.0
 
+        # simulated circular buffer of start_counter_stream
+        self._stream_buffer_length = 0
+        self._stream_start_time = 0.0
+        self._stream_position = 0
+        self._stream_lost_samples = 0
+
     def on_deactivate(self):
         """ Deinitialisation performed during deactivation of the module.
         """
@@ -97,6 +103,9 @@ class SlowCounterDummy(Base, SlowCounterInterface):
             CountingMode.CONTINUOUS,
             CountingMode.GATED,
             CountingMode.FINITE_GATED]
+        constraints.streaming_counting_mode = [
+            CountingMode.GATED,
+            CountingMode.FINITE_GATED]
 
         return constraints
 
@@ -148,6 +157,50 @@ class SlowCounterDummy(Base, SlowCounterInterface):
         time.sleep(1 / self._clock_frequency * samples)
         return count_data
 
+    def start_counter_stream(self, buffer_length=2**20):
+        """ Start to simulate a counter which acquires into a circular buffer.
+
+        The clock frequency is used as gate rate.
+
+        @param int buffer_length: number of samples per channel the circular buffer can hold
+
+        @return int: error code (0:OK, -1:error)
+        """
+        self._stream_buffer_length = int(buffer_length)
+        self._stream_start_time = time.time()
+        self._stream_position = 0
+        self._stream_lost_samples = 0
+        return 0
+
+    def read_available_counts_into_buffer(self, buffer):
+        """ Simulate the samples acquired since the last read.
+
+        @param numpy.ndarray buffer: 2D array to write the samples to
+
+        @return int: number of samples per channel read into buffer
+        """
+        acquired = int((time.time() - self._stream_start_time) * self._clock_frequency)
+        unread = acquired - self._stream_position
+        if unread > self._stream_buffer_length:
+            self._stream_lost_samples += unread - self._stream_buffer_length
+            self._stream_position += unread - self._stream_buffer_length
+            unread = self._stream_buffer_length
+        samples = min(unread, buffer.shape[1])
+        if samples < 1:
+            return 0
+        for i, ch in enumerate(self.get_counter_channels()):
+            buffer[i, :samples] = self._simulate_counts(
+                samples, timestep=1 / self._clock_frequency) + i * self.mean_signal
+        self._stream_position += samples
+        return samples
+
+    def get_lost_samples(self):
+        """ Number of samples which were overwritten before they were read.
+
+        @return int: number of lost samples
+        """
+        return self._stream_lost_samples
+
     def get_counter_channels(self):
         """ Returns the list of counter channel names.
         @return tuple(str): channel names
@@ -155,10 +208,11 @@ class SlowCounterDummy(Base, SlowCounterInterface):
         """
         return ['Ctr{0}'.format(i) for i in range(self.source_channels)]
 
-    def _simulate_counts(self, samples=None):
+    def _simulate_counts(self, samples=None, timestep=None):
         """ Simulate counts signal from an APD.  This can be called for each dummy counter channel.
 
         @param int samples: if defined, number of samples to read in one go
+        @param float timestep: optional, simulated time per sample in s
 
         @return float: the photon counts per second
         """
@@ -168,7 +222,8 @@ class SlowCounterDummy(Base, SlowCounterInterface):
         else:
             samples = int(samples)
 
-        timestep = 1 / self._clock_frequency * samples
+        if timestep is None:
+            timestep = 1 / self._clock_frequency * samples
 
         # count data will be written here in the NumPy array
         count_data = np.empty([samples], dtype=np.uint32)
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the data intake of the ASC500 data channels: a preallocated ring buffer
+filled by the daisybase data callback and the vectorized conversion of raw values to
+physical values.
+
+daisybase calls the data callback from its event loop thread with a static buffer that is
+overwritten by the next packet, so the callback only copies the raw values into the ring.
+The conversion is done on the reading side for the whole block at once. The conversion of
+daisybase is linear (scale and offset of the meta data set), so it is evaluated twice per
+meta data set with DYB_convValue2Phys and then applied to the whole array.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import ctypes as ct
+import threading
+import time
+import numpy as np
+
+# DYB_Meta is transferred as 13 32-bit items
+META_SIZE = 13
+MetaArray = ct.c_int32 * META_SIZE
+
+# void (*DYB_DataCallback)(Int32 channel, Int32 length, Int32 index,
+#                          const Int32 *data, const DYB_Meta *meta)
+DataCallback = ct.CFUNCTYPE(None, ct.c_int32, ct.c_int32, ct.c_int32,
+                            ct.POINTER(ct.c_int32), ct.POINTER(MetaArray))
+
+# raw value used together with 0 to determine scale and offset of the conversion
+_CONVERSION_PROBE = 1 << 20
+
+
+class PhysConversion:
+    """ Linear conversion of raw data values to physical values, cached per meta data set. """
+
+    def __init__(self, convert):
+        """
+          @param callable convert: conversion of a single value, convert(meta, value), e.g.
+                                   the convValue2Phys method of the ASC500 base
+        """
+        self._convert = convert
+        self._cache = dict()
+
+    def coefficients(self, meta):
+        """ Scale and offset of the conversion for a meta data set.
+
+          @param meta: meta data set, ctypes array of 13 int32
+
+          @return tuple(float, float): scale, offset
+        """
+        key = bytes(meta)
+        coefficients = self._cache.get(key)
+        if coefficients is None:
+            offset = float(self._convert(meta, 0))
+            scale = (float(self._convert(meta, _CONVERSION_PROBE)) - offset) / _CONVERSION_PROBE
+            coefficients = (scale, offset)
+            self._cache[key] = coefficients
+        return coefficients
+
+    def __call__(self, values, meta):
+        """ Convert raw values to physical values.
+
+          @param numpy.ndarray values: raw int32 values
+          @param meta: meta data set of the values
+
+          @return numpy.ndarray: physical values
+        """
+        scale, offset = self.coefficients(meta)
+        phys = np.asarray(values, dtype=np.float64) * scale
+        phys += offset
+        return phys
+
+
+class ChannelRing:
+    """ Preallocated ring buffer of the raw values of one data channel.
+
+    write() is called from the daisybase event loop, read() from the measurement thread.
+    """
+
+    def __init__(self, capacity):
+        """
+          @param int capacity: number of 32-bit values the ring can hold
+        """
+        self.capacity = int(capacity)
+        self._data = np.zeros(self.capacity, dtype=np.int32)
+        self._meta = MetaArray()
+        self._condition = threading.Condition()
+        self._written = 0
+        self._read = 0
+        self.lost = 0
+
+    def clear(self):
+        """ Drop all values which were not read yet. """
+        with self._condition:
+            self._read = self._written
+            self.lost = 0
+
+    @property
+    def available(self):
+        """ Number of values which can be read. """
+        with self._condition:
+            return self._written - self._read
+
+    def write(self, values, meta=None):
+        """ Append values. If the reader falls behind by more than the capacity, the oldest
+        values are overwritten and counted as lost.
+
+          @param numpy.ndarray values: raw values
+          @param meta: meta data set of the values, ctypes array of 13 int32
+        """
+        values = np.asarray(values, dtype=np.int32)
+        with self._condition:
+            if len(values) > self.capacity:
+                self.lost += len(values) - self.capacity
+                values = values[-self.capacity:]
+            start = self._written % self.capacity
+            stop = start + len(values)
+            if stop <= self.capacity:
+                self._data[start:stop] = values
+            else:
+                split = self.capacity - start
+                self._data[start:] = values[:split]
+                self._data[:stop - self.capacity] = values[split:]
+            if meta is not None:
+                ct.memmove(self._meta, meta, ct.sizeof(MetaArray))
+            self._written += len(values)
+            overrun = self._written - self._read - self.capacity
+            if overrun > 0:
+                self.lost += overrun
+                self._read += overrun
+            self._condition.notify_all()
+
+    def read(self, count, timeout=None):
+        """ Take the next values out of the ring, waits until enough values arrived.
+
+          @param int count: number of values (at most the capacity)
+          @param float timeout: optional, maximum waiting time in s
+
+          @return tuple(numpy.ndarray, MetaArray): copy of the raw values and of the meta data
+                                                   set of the last packet
+        """
+        count = min(int(count), self.capacity)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self._written - self._read < count:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError('Only {0} of {1} values arrived within {2} s.'
+                                       ''.format(self._written - self._read, count, timeout))
+                self._condition.wait(remaining)
+            start = self._read % self.capacity
+            stop = start + count
+            if stop <= self.capacity:
+                values = self._data[start:stop].copy()
+            else:
+                values = np.concatenate((self._data[start:], self._data[:stop - self.capacity]))
+            self._read += count
+            meta = MetaArray.from_buffer_copy(self._meta)
+        return values, meta
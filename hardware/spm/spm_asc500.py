@@ -26,6 +26,7 @@ import numpy as np
 from qtpy import QtCore
 from scipy.interpolate import interp1d
 from hardware.spm.spm_library.ASC500_Python_Control.lib.asc500.asc500_device import Device
+from hardware.spm.asc500_buffer import ChannelRing, DataCallback, PhysConversion
 
 from interface.scanner_interface import ScannerInterface, ScannerMode, ScanStyle, \
                                         ScannerState, ScannerConstraints, ScannerMeasurements  
@@ -39,9 +40,12 @@ class SPM_ASC500(Base, ScannerInterface):
 
     Example config for copy-paste:
 
-    simple_data_dummy:
-        module.Class: 'smart_spm.SmartSPM'
-        libpath: 'path/to/lib/folder'
+    spm_asc500:
+        module.Class: 'spm.spm_asc500.SPM_ASC500'
+        sync_in_timeout: 0
+        data_callback: True     # receive the data channel with the daisybase data callback
+        data_timeout: 10        # in s, maximum waiting time for the data of a point or line
+        ring_buffer_size: 1048576   # number of values buffered from the data callback
 
     """
 
@@ -54,6 +58,9 @@ class SPM_ASC500(Base, ScannerInterface):
     sigCollectObjectiveCounts = QtCore.Signal()
 
     _sync_in_timeout = ConfigOption('sync_in_timeout', missing='warn', default=0)
+    _use_data_callback = ConfigOption('data_callback', default=True)
+    _data_timeout = ConfigOption('data_timeout', default=10)
+    _ring_buffer_size = ConfigOption('ring_buffer_size', default=2**20)
 
     def __init__(self, config, **kwargs):
         """ Create CounterLogic object with connectors.
@@ -86,6 +93,12 @@ class SPM_ASC500(Base, ScannerInterface):
         self._dev.base.setDataEnable(1)
         self._spm_curr_state = ScannerState.UNCONFIGURED
 
+        self._to_phys = PhysConversion(self._dev.base.convValue2Phys)
+        self._data_ring = ChannelRing(self._ring_buffer_size)
+        # keep a reference, the callback must not be garbage collected while registered
+        self._data_callback = DataCallback(self._receive_data)
+        self._callback_chn = None
+
         self._objective_x_volt, self._objective_y_volt, self._objective_z_volt = 0.0, 0.0, 0.0
         # DO NOT CHANGE
         self._dev.base.setParameter(self._dev.base.getConst('ID_GENDAC_LIMIT_RT'), 3e6, 0)
@@ -112,6 +125,7 @@ class SPM_ASC500(Base, ScannerInterface):
         """ Clean up and deactivate the spm module. """
         # self._dev.scanner.closeScanner()
         # self._dev.base.stopServer()
+        self._release_data_callback()
         self._spm_curr_state = ScannerState.DISCONNECTED
         
         return 
@@ -437,7 +451,7 @@ class SPM_ASC500(Base, ScannerInterface):
             self._dev.base.setParameter(self._dev.base.getConst('ID_SCAN_PSPEED'), px/time_back, 0)
             
             while self._dev.base.getParameter(self._dev.base.getConst('ID_PATH_RUNNING'), 0)==1 or self._dev.base.getParameter(self._dev.base.getConst('ID_SCAN_STATUS'), 0)==2:
-                pass
+                time.sleep(0.001)
             
             self._configureSamplePath(line_corr0_start, line_corr0_stop, 
                                     line_corr1_start, line_corr1_stop, self._line_points)
@@ -582,7 +596,7 @@ class SPM_ASC500(Base, ScannerInterface):
         if self._spm_curr_mode == ScannerMode.PROBE_CONTACT:
             while True:
                 if self._dev.base.getParameter(self._dev.base.getConst('ID_PATH_RUNNING'), 0)==1 or self._dev.base.getParameter(self._dev.base.getConst('ID_SCAN_STATUS'), 0)==2:
-                    pass
+                    time.sleep(0.001)
                 else:
                     break
             self._dev.base.setParameter(self._dev.base.getConst('ID_SPEC_PATHCTRL'), -1, 0 ) # -1 is grid mode
@@ -640,7 +654,7 @@ class SPM_ASC500(Base, ScannerInterface):
                     self._dev.base.setParameter(self._dev.base.getConst('ID_SPEC_PATHPROCEED') ,1 ,0)
                     break
                 else:
-                    pass
+                    time.sleep(0.001)
             
             self._poll_point_data()
             return self._polled_data
@@ -669,7 +683,7 @@ class SPM_ASC500(Base, ScannerInterface):
 
             self.spec_count = self._dev.base.getParameter(self._dev.base.getConst('ID_SPEC_COUNT'), self.spec_engine_dummy)
             self._dev.base.setParameter(self._dev.base.getConst('ID_SPEC_MSPOINTS'), int((sampTime/2.5e-6)/self.spec_count), self.spec_engine_dummy)
-            self._dev.base.configureDataBuffering(self._chn_no, self.spec_count) # chNo = same as above; bufSize = Buffersize.
+            self._configureDataIntake(self.spec_count)
         else:
             self.spec_engine_dummy = 2
             self.spec_count = self._line_points
@@ -691,8 +705,46 @@ class SPM_ASC500(Base, ScannerInterface):
             self._dev.base.setParameter(self._dev.base.getConst('ID_SPEC_COUNT'), self.spec_count, self.spec_engine_dummy)
 
             self._dev.base.setParameter(self._dev.base.getConst('ID_SPEC_MSPOINTS'), int(sampTime/2.5e-6), self.spec_engine_dummy)
-            self._dev.base.configureDataBuffering(self._chn_no, self.spec_count) # chNo = same as above; bufSize = Buffersize.
+            self._configureDataIntake(self.spec_count)
         
+    def _configureDataIntake(self, buf_size):
+        """ Set up how the data of the measurement channel is received.
+
+        With the data callback, buffering is switched off (a buffer size of 0) and every packet
+        is copied into the ring buffer. Otherwise daisybase buffers buf_size values, which are
+        fetched with getDataBuffer.
+
+        @param int buf_size: number of values of one buffer for the buffered intake
+        """
+        if self._use_data_callback:
+            self._dev.base.configureDataBuffering(self._chn_no, 0)
+            if self._callback_chn != self._chn_no:
+                self._release_data_callback()
+                self._dev.base.setDataCallback(self._chn_no, self._data_callback)
+                self._callback_chn = self._chn_no
+            self._data_ring.clear()
+        else:
+            self._release_data_callback()
+            self._dev.base.configureDataBuffering(self._chn_no, buf_size) # chNo = same as above; bufSize = Buffersize.
+
+    def _release_data_callback(self):
+        """ Unregister the data callback. """
+        if self._callback_chn is not None:
+            self._dev.base.setDataCallback(self._callback_chn, None)
+            self._callback_chn = None
+
+    def _receive_data(self, chn, length, index, data, meta):
+        """ Data callback, called by the event loop of daisybase for every data packet.
+
+        The data buffer is reused by daisybase for the next packet, so the values are copied
+        into the ring buffer right away and nothing else is done here.
+        """
+        try:
+            if length > 0:
+                self._data_ring.write(np.ctypeslib.as_array(data, shape=(length, )), meta)
+        except:
+            self.log.exception('Receiving ASC500 data failed.')
+
     def _find_spec_count(self, start_cart, stop_cart, m, xy=True):
         spec_engine = 2
         n = 3e6//(305.2*m)
@@ -720,15 +772,20 @@ class SPM_ASC500(Base, ScannerInterface):
         Polls the buffer after the spec engine is triggered at each point. _grabASCData is a blocking statement that only passes after buffer is full.
         To implement Dual Pass the Z position will be set at every point inside the for loop
         '''
-        n = self._line_points if self._spm_curr_mode == ScannerMode.PROBE_CONTACT else 1
-        
-        for i in range(n):
-            self.spec_count = self._dev.base.getParameter(self._dev.base.getConst('ID_SPEC_COUNT'), self.spec_engine_dummy)
-            data = self._grabASCData(self.spec_count)
-            if self._spm_curr_mode == ScannerMode.PROBE_CONTACT:
-                self._polled_data[i] = np.mean(data)
+        self.spec_count = self._dev.base.getParameter(self._dev.base.getConst('ID_SPEC_COUNT'), self.spec_engine_dummy)
+        if self._spm_curr_mode != ScannerMode.PROBE_CONTACT:
+            self._polled_data = self._grabASCData(self.spec_count)
+        elif self._use_data_callback:
+            # the whole line arrives in the ring, average the spec points of every pixel at once
+            data = self._grabASCData(self._line_points * self.spec_count,
+                                     timeout=self._line_points * self._data_timeout)
+            if np.size(data) == self._line_points * self.spec_count:
+                self._polled_data = data.reshape(self._line_points, self.spec_count).mean(axis=1)
             else:
-                self._polled_data = data
+                self._polled_data = np.zeros(self._line_points)
+        else:
+            for i in range(self._line_points):
+                self._polled_data[i] = np.mean(self._grabASCData(self.spec_count))
 
     def _poll_point_data(self):
         '''
@@ -740,23 +797,40 @@ class SPM_ASC500(Base, ScannerInterface):
         data = self._grabASCData(self.spec_count)
         self._polled_data = np.mean(data)
 
-    def _grabASCData(self, bufSize=200):
-        while True:
-            # Wait until buffer is full
-            if self._dev.base.waitForFullBuffer(self._chn_no) != 0:
-                    break
+    def _grabASCData(self, bufSize=200, timeout=None):
+        """ Get the next bufSize values of the measurement channel in physical units.
+
+        @param int bufSize: number of values
+        @param float timeout: optional, maximum waiting time in s, defaults to data_timeout
+
+        @return numpy.ndarray: physical values, 0 if the data could not be obtained
+        """
+        timeout = self._data_timeout if timeout is None else timeout
+        if self._use_data_callback:
+            try:
+                values, meta = self._data_ring.read(bufSize, timeout=timeout)
+            except TimeoutError:
+                self.log.exception('No data from the ASC500 channel {0}.'.format(self._chn_no))
+                return 0
+            if self._data_ring.lost > 0:
+                self.log.warning('{0} values of the ASC500 channel {1} were lost.'
+                                 ''.format(self._data_ring.lost, self._chn_no))
+                self._data_ring.lost = 0
+            return self._to_phys(values, meta)
+
+        # waitForFullBuffer blocks in the event loop of daisybase for up to 500 ms
+        deadline = time.monotonic() + timeout
+        while self._dev.base.waitForFullBuffer(self._chn_no) == 0:
+            if time.monotonic() > deadline:
+                self.log.error('No full buffer of the ASC500 channel {0} within {1} s.'
+                               ''.format(self._chn_no, timeout))
+                return 0
         try:
-            buffer = self._dev.base.getDataBuffer(self._chn_no, 1, bufSize)
+            frame, index, size, values, meta = self._dev.base.getDataBuffer(self._chn_no, 1, bufSize)
         except:
             self.log.error('Buffer fail')
             return 0
-        values = buffer[3][:]
-        meta = buffer[4]
-        phys_vals = []
-        # TODO do all unit conversions, maybe post polling
-        for val in values:
-            phys_vals.append(self._dev.base.convValue2Phys(meta, val))
-        return np.array(phys_vals)
+        return self._to_phys(np.ctypeslib.as_array(values)[:size.value], meta)
 
     def get_measurements(self, reshape=True):
         """ Obtains gathered measurements from scanner
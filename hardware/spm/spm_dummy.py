@@ -19,6 +19,9 @@ Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
 top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
 """
 import copy
+import time
+import numpy as np
+
 from core.module import Base
 from core.util.mutex import Mutex
 
@@ -68,11 +71,16 @@ class SPMDummy(Base, ScannerInterface):
         self._create_scanner_contraints()
         self._create_scanner_measurements()
 
-        pass
+        self._line_points = 100
+        self._curr_meas_params = ['Height(Dac)']
+        self._curr_line = None
+        self._curr_line_time = 0.0
+        self._line_data = None
+        self._line_stream = None
 
     def on_deactivate(self):
         """ Clean up and deactivate the spm module. """
-        pass
+        self.stop_line_stream()
 
 
     # current methods:
@@ -470,7 +478,12 @@ class SPMDummy(Base, ScannerInterface):
 
         @return int: error code (0:OK, -1:error)
         """
-        pass
+        self.stop_line_stream()
+        self._line_points = params.get('line_points', self._line_points)
+        meas_params = params.get('meas_params', [])
+        self._curr_meas_params = [param for param in meas_params
+                                  if param in self._SCANNER_MEASUREMENTS.scanner_measurements]
+        return 1, 0, list(self._curr_meas_params)
 
     def get_current_configuration(self):
         """ Returns the current scanner configuration
@@ -481,8 +494,8 @@ class SPMDummy(Base, ScannerInterface):
         pass
 
     def configure_line(self, 
-                       corr0_start, corr0_stop, 
-                       corr1_start, corr1_stop, # not used in case of z sweep
+                       line_corr0_start, line_corr0_stop, 
+                       line_corr1_start, line_corr1_stop, # not used in case of z sweep
                        time_forward, time_back):
         """ Setup the scan line parameters
         
@@ -510,7 +523,9 @@ class SPMDummy(Base, ScannerInterface):
         plane. It is possible to set zero scan area, then some reasonable 
         values for time_forward and time_back will be chosen automatically.
         """      
-        pass
+        self._curr_line = (line_corr0_start, line_corr0_stop, line_corr1_start, line_corr1_stop)
+        self._curr_line_time = time_forward
+        return True
         
     def scan_line(self,int_time = 0.05): 
         """Execute a scan line measurement. 
@@ -525,7 +540,12 @@ class SPMDummy(Base, ScannerInterface):
 
         @return int: status variable with: 0 = call failed, 1 = call successful
         """
-        pass
+        if self._curr_line is None:
+            self.log.error('Scan line is not configured, call configure_line first.')
+            return 0
+        time.sleep(self._curr_line_time)
+        self._line_data = self._simulate_line(*self._curr_line)
+        return 1
 
     def scan_point(self, num_params=None):
         """ Obtain measurments from a point
@@ -568,7 +588,27 @@ class SPMDummy(Base, ScannerInterface):
         # (required configure_scan_line to be called prior)
         # => blocking method, either with timeout or stoppable via stop measurement
         """
-        pass
+        if self._line_data is None:
+            return np.zeros((len(self._curr_meas_params), 0))
+        if reshape:
+            return self._line_data
+        return self._line_data.ravel()
+
+    def _simulate_line(self, corr0_start, corr0_stop, corr1_start, corr1_stop):
+        """ Simulated measurement of a line on a sample with a regular height pattern.
+
+        @return ndarray: 2D array[num_of_signals, pixel_per_line] in measured units
+        """
+        x = np.linspace(corr0_start, corr0_stop, self._line_points)
+        y = np.linspace(corr1_start, corr1_stop, self._line_points)
+        height = 20 * np.sin(2 * np.pi * x / 5e-6) * np.cos(2 * np.pi * y / 5e-6)
+        data = np.empty((len(self._curr_meas_params), self._line_points))
+        for index, param in enumerate(self._curr_meas_params):
+            if param.startswith('Height'):
+                data[index] = height + np.random.normal(0, 0.1, self._line_points)
+            else:
+                data[index] = np.random.normal(0, 1, self._line_points)
+        return data
 
     def finish_scan(self):
         """ Request completion of the current scan line 
@@ -580,7 +620,9 @@ class SPMDummy(Base, ScannerInterface):
 
         @return int: status variable with: 0 = call failed, 1 = call successfull
         """
-        pass
+        self.stop_line_stream()
+        self._curr_line = None
+        return 1
     
     def stop_measurement(self):
         """ Immediately terminate the measurment
@@ -592,7 +634,8 @@ class SPMDummy(Base, ScannerInterface):
 
         @return: None
         """    
-        pass
+        self.stop_line_stream()
+        self._curr_line = None
 
     def calibrate_constant_height(self, calib_points, safety_lift):
         """ Calibrate constant height
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains a vectorized run-length encoder which converts the boolean digital samples
+of the pulse generator logic into the pulse patterns of the Swabian Instruments Pulse Streamer.
+
+All digital channels are packed into one channel mask per sample (bit i is the i-th channel),
+so a single comparison of neighbouring masks finds the transitions of all channels. The
+waveform is kept as one sequence of (duration, channel mask) states. The last state of a chunk
+stays open until the next chunk is encoded, so splitting a waveform into chunks gives the same
+states as encoding it at once.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import numpy as np
+
+
+class RunLengthEncoder:
+    """ Encodes chunks of digital samples into (duration, channel mask) states. """
+
+    def __init__(self, channels):
+        """
+          @param list channels: names of the digital channels, e.g. ['d_ch1', 'd_ch2'].
+                                The i-th channel is bit i of the channel mask.
+        """
+        self.channels = list(channels)
+        if len(self.channels) > 32:
+            raise ValueError('At most 32 digital channels can be encoded, but {0:d} were '
+                             'passed.'.format(len(self.channels)))
+        # the smallest mask type keeps the comparison of neighbouring samples fast
+        if len(self.channels) <= 8:
+            self.mask_type = np.uint8
+        elif len(self.channels) <= 16:
+            self.mask_type = np.uint16
+        else:
+            self.mask_type = np.uint32
+        self.reset()
+
+    def reset(self):
+        """ Start a new waveform. """
+        self._durations = list()
+        self._masks = list()
+        self._open_duration = 0
+        self._open_mask = 0
+        self.number_of_samples = 0
+
+    def pack(self, digital_samples):
+        """ Pack the samples of all channels into one channel mask per sample.
+
+          @param dict digital_samples: keys are the channel names, values are 1D bool arrays
+                                       of equal length
+
+          @return numpy.ndarray: channel mask of every sample, of type mask_type
+        """
+        length = len(digital_samples[self.channels[0]]) if self.channels else 0
+        mask = np.zeros(length, dtype=self.mask_type)
+        shifted = np.empty(length, dtype=self.mask_type)
+        for bit, channel in enumerate(self.channels):
+            samples = np.asarray(digital_samples[channel], dtype=bool)
+            # shift the samples in place instead of creating temporary arrays
+            np.left_shift(samples, bit, out=shifted, dtype=self.mask_type)
+            np.bitwise_or(mask, shifted, out=mask)
+        return mask
+
+    def encode(self, digital_samples):
+        """ Append a chunk of samples.
+
+          @param dict digital_samples: keys are the channel names, values are 1D bool arrays
+                                       of equal length
+
+          @return int: number of samples in the chunk
+        """
+        mask = self.pack(digital_samples)
+        if mask.size == 0:
+            return 0
+        starts = np.flatnonzero(mask[1:] != mask[:-1]) + 1
+        boundaries = np.concatenate(([0], starts, [mask.size]))
+        durations = np.diff(boundaries)
+        masks = mask[boundaries[:-1]]
+
+        # continue the open state of the previous chunk
+        if self._open_duration > 0:
+            if masks[0] == self._open_mask:
+                durations[0] += self._open_duration
+            else:
+                self._durations.append(np.array([self._open_duration], dtype=np.int64))
+                self._masks.append(np.array([self._open_mask], dtype=np.uint32))
+        self._durations.append(durations[:-1])
+        self._masks.append(masks[:-1])
+        self._open_duration = int(durations[-1])
+        self._open_mask = int(masks[-1])
+        self.number_of_samples += mask.size
+        return mask.size
+
+    def states(self):
+        """ All states of the samples encoded since the last reset.
+
+          @return tuple(numpy.ndarray, numpy.ndarray): duration in samples and channel mask of
+                                                       every state
+        """
+        durations = self._durations + [np.array([self._open_duration], dtype=np.int64)]
+        masks = self._masks + [np.array([self._open_mask], dtype=np.uint32)]
+        if self._open_duration == 0:
+            durations, masks = durations[:-1], masks[:-1]
+        if len(durations) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint32)
+        return (np.concatenate(durations).astype(np.int64),
+                np.concatenate(masks).astype(np.uint32))
+
+    def patterns(self):
+        """ Pulse pattern of every channel in the format of Sequence.setDigital.
+
+          @return dict: keys are the channel names, values are lists of
+                        [duration in samples, level (0 or 1)]
+        """
+        durations, masks = self.states()
+        # sample index at which each state ends
+        ends = np.cumsum(durations)
+        patterns = dict()
+        for bit, channel in enumerate(self.channels):
+            levels = (masks >> np.uint32(bit)) & np.uint32(1)
+            # merge neighbouring states with the same level of this channel
+            last = np.flatnonzero(np.diff(levels))
+            last = np.append(last, len(levels) - 1) if len(levels) > 0 else last
+            channel_ends = ends[last]
+            channel_durations = np.diff(np.concatenate(([0], channel_ends)))
+            patterns[channel] = [[duration, level] for duration, level in
+                                 zip(channel_durations.tolist(), levels[last].tolist())]
+        return patterns
@@ -25,8 +25,8 @@ from core.configoption import ConfigOption
 from core.statusvariable import  StatusVar
 from core.util.modules import get_home_dir
 from interface.pulser_interface import PulserInterface, PulserConstraints
+from hardware.swabian_instruments.pulse_pattern import RunLengthEncoder
 from collections import OrderedDict
-import numpy as np
 import time
 
 import pulsestreamer as ps
@@ -74,6 +74,7 @@ class PulseStreamer(Base, PulserInterface):
         self.__samples_written = 0
         self._trigger = ps.TriggerStart.SOFTWARE
         self._laser_mw_on_state = ps.OutputState([], 0, 0)
+        self._encoder = None
 
     def on_activate(self):
         """ Establish connection to pulse streamer and tell it to cancel all operations """
@@ -666,30 +667,25 @@ class PulseStreamer(Base, PulserInterface):
             self.log.debug('Analog not yet implemented for pulse streamer')
             return -1, list()
 
-        if is_first_chunk:
+        if is_first_chunk or self._encoder is None:
             self.__current_waveform_name = name
             self.__samples_written = 0
-            # initalise to a dict of lists that describe pulse pattern in swabian language
-            self.__current_waveform = {key:[] for key in digital_samples.keys()}
-
-        for channel_number, samples in digital_samples.items():
-            new_channel_indices = np.where(samples[:-1] != samples[1:])[0]
-            new_channel_indices = np.unique(new_channel_indices)
-
-            # add in indices for the start and end of the sequence to simplify iteration
-            new_channel_indices = np.insert(new_channel_indices, 0, [-1])
-            new_channel_indices = np.insert(new_channel_indices, new_channel_indices.size, [samples.shape[0] - 1])
-            pulses = []
-            for new_channel_index in range(1, new_channel_indices.size):
-                pulse = [new_channel_indices[new_channel_index] - new_channel_indices[new_channel_index - 1],
-                         samples[new_channel_indices[new_channel_index - 1] + 1].astype(np.byte)]
-                pulses.append(pulse)
-
-            # extend (as opposed to rewrite) for chunky business
-            #print(pulses)
-            self.__current_waveform[channel_number].extend(pulses)
-
-        return len(samples), [self.__current_waveform_name]
+            # all channels are run-length encoded together into (duration, channel mask) states
+            self._encoder = RunLengthEncoder(sorted(digital_samples))
+        elif set(digital_samples) != set(self._encoder.channels):
+            self.log.error('The digital channels of a chunk have to be the same as those of the '
+                           'first chunk of waveform "{0}".'.format(name))
+            return -1, list()
+
+        number_of_samples = self._encoder.encode(digital_samples)
+        self.__samples_written += number_of_samples
+
+        if is_last_chunk:
+            # dict of lists that describe the pulse pattern of each channel in swabian language
+            self.__current_waveform = self._encoder.patterns()
+            self._encoder = None
+
+        return number_of_samples, [self.__current_waveform_name]
 
 
     
@@ -23,8 +23,6 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 import TimeTagger as tt
 import time
 import numpy as np
-from collections import namedtuple
-from enum import Enum
 
 from core.module import Base
 from core.configoption import ConfigOption
@@ -32,48 +30,8 @@ from interface.slow_counter_interface import SlowCounterInterface
 from interface.slow_counter_interface import SlowCounterConstraints
 from interface.slow_counter_interface import CountingMode
 
-from interface.recorder_interface import RecorderInterface, RecorderConstraints, RecorderState, RecorderMode
-
-class HWRecorderMode(RecorderMode):
-    # starting methods
-    UNCONFIGURED             = 0
-    DUMMY                    = 1
-
-    # pixel clock counting methods
-    PIXELCLOCK               = 2
-    PIXELCLOCK_SINGLE_ISO_B  = 3
-    PIXELCLOCK_N_ISO_B       = 4
-    PIXELCLOCK_TRACKED_ISO_B = 5
-
-    # continous counting methods
-    CW_MW                    = 6
-    ESR                      = 7
-    COUNTER                  = 8
-    CONTINUOUS_COUNTING      = 9
-
-    # advanced measurement mode
-    PULSED_ESR               = 10
-    GENERAL_PULSED           = 11
-
-    @classmethod
-    def name(cls,val):
-        return { v:k for k,v in dict(vars(cls)).items() if isinstance(v,int)}.get(val, None) 
-    
-class TimeTaggerMeasurementMode(namedtuple('TimeTaggerMeasurementMode', 'value name movement'), Enum):
-    DUMMY                   = -1, 'DUMMY', 'null'
-    COUNTER                 = 0, 'COUNTER', 'null'
-    PIXELCLOCK              = 1, 'PIXELCLOCK', 'line' 
-    PIXELCLOCK_SINGLE_ISO_B = 2, 'PIXELCLOCK_SINGLE_ISO_B', 'line'
-    PIXELCLOCK_N_ISO_B      = 3, 'PIXELCLOCK_N_ISO_B', 'line'
-    ESR                     = 4, 'ESR', 'point'
-    PULSED_ESR              = 5, 'PULSED_ESR', 'point'
-    GENERAL_PULSED          = 6, 'GENERAL_PULSED', 'point'
-
-    def __str__(self):
-        return self.name
-
-    def __int__(self):
-        return self.value
+from interface.recorder_interface import RecorderInterface, RecorderConstraints, RecorderState
+from hardware.recorder_modes import HWRecorderMode, TimeTaggerMeasurementMode
 
 class TimeTaggerCounter(Base, SlowCounterInterface, RecorderInterface):
     """ Using the TimeTagger as a slow counter.
@@ -85,6 +43,8 @@ class TimeTaggerCounter(Base, SlowCounterInterface, RecorderInterface):
         timetagger_channel_apd_0: 0
         timetagger_channel_apd_1: 1
         timetagger_sum_channels: 2
+        recorder_timeout: 60 # in s, maximum wait for the data of a recorder measurement
+        recorder_poll_interval: 0.005 # in s, longest sleep between two ready checks
 
     """
 
@@ -97,6 +57,8 @@ class TimeTaggerCounter(Base, SlowCounterInterface, RecorderInterface):
     _channel_detect = ConfigOption('_channel_detect', 2, missing='error')
     _channel_next = ConfigOption('_channel_next', 3, missing='error')
     _channel_sync = ConfigOption('_channel_sync', 4, missing='warn')
+    _recorder_timeout = ConfigOption('recorder_timeout', 60)
+    _recorder_poll_interval = ConfigOption('recorder_poll_interval', 0.005)
 
     _recorder_constraints = RecorderConstraints()
 
@@ -111,6 +73,12 @@ class TimeTaggerCounter(Base, SlowCounterInterface, RecorderInterface):
         self._create_recorder_constraints()
         self.is_measurement_running = False
 
+        # double buffered point measurements: the recorder of the next point is armed
+        # before the data of the current point is fetched
+        self.recorder = None
+        self._standby_recorder = None
+        self._prearmed = False
+
         if self._sum_channels and self._channel_apd_1 is None:
             self.log.error('Cannot sum channels when only one apd channel given')
 
@@ -372,6 +340,14 @@ class TimeTaggerCounter(Base, SlowCounterInterface, RecorderInterface):
         self._curr_mode = mode
         self._curr_meas_params = params
 
+        if self._prearmed:
+            # the recorder armed in advance for the next point is not needed anymore
+            self.recorder.stop()
+            self._prearmed = False
+            self._curr_state = RecorderState.IDLE
+            dev_state = self._curr_state
+        self._standby_recorder = None
+
         if (dev_state == RecorderState.BUSY): 
             # on the fly configuration (in BUSY state) is only allowed in CW_MW mode.
             self.log.error(f'TimeTagger cannot be configured in the '
@@ -414,13 +390,15 @@ class TimeTaggerCounter(Base, SlowCounterInterface, RecorderInterface):
 
         elif mode == HWRecorderMode.ESR:
             ret_val = self._prepare_cw_esr(freq_list=params['mw_frequency_list'], 
-                                          num_esr_runs=params['num_meas'])
+                                          num_esr_runs=params['num_meas'],
+                                          double_buffer=params.get('double_buffer', False))
                                         
         elif mode == HWRecorderMode.GENERAL_PULSED:
             ret_val = self._prepare_general_pulsed(number_of_gates=params['laser_pulses'],
                                                     bin_width_s=params['bin_width_s'],
                                                     record_length_s=params['record_length_s'],
-                                                    max_counts=params['max_counts'])
+                                                    max_counts=params['max_counts'],
+                                                    double_buffer=params.get('double_buffer', False))
 
         if ret_val == -1:
             self._curr_mode = HWRecorderMode.UNCONFIGURED
@@ -440,8 +418,9 @@ class TimeTaggerCounter(Base, SlowCounterInterface, RecorderInterface):
         self.recorder = self.cbm_counter
         return 0
     
-    def _prepare_cw_esr(self, freq_list, num_esr_runs):
-        self.cbm_counter = tt.CountBetweenMarkers(
+    def _prepare_cw_esr(self, freq_list, num_esr_runs, double_buffer=False):
+        def create():
+            return tt.CountBetweenMarkers(
                     self._tagger,
                     click_channel=self._pixelclock_click_chn,
                     begin_channel=self._pixelclock_begin_chn,
@@ -449,26 +428,37 @@ class TimeTaggerCounter(Base, SlowCounterInterface, RecorderInterface):
                     n_values=len(freq_list)*num_esr_runs
                 )
 
+        self.cbm_counter = create()
         self.recorder = self.cbm_counter
+        if double_buffer:
+            self._standby_recorder = create()
+            self._standby_recorder.stop()
         return 0
     
-    def _prepare_general_pulsed(self, number_of_gates, bin_width_s, record_length_s, max_counts):
+    def _prepare_general_pulsed(self, number_of_gates, bin_width_s, record_length_s, max_counts,
+                                double_buffer=False):
         self._number_of_gates = number_of_gates
         self._bin_width = bin_width_s * 1e9
         self._record_length = int(record_length_s / bin_width_s) # removed weird 1 + expected length from here
 
-        self.pulsed = tt.TimeDifferences(
-            tagger=self._tagger,
-            click_channel=self._channel_apd,
-            start_channel=self._channel_detect,
-            next_channel=self._channel_next,
-            sync_channel=self._channel_sync,
-            binwidth=int(np.round(self._bin_width * 1000)),
-            n_bins=int(self._record_length),
-            n_histograms=number_of_gates)
-
-        self.pulsed.setMaxCounts(max_counts)
+        def create():
+            pulsed = tt.TimeDifferences(
+                tagger=self._tagger,
+                click_channel=self._channel_apd,
+                start_channel=self._channel_detect,
+                next_channel=self._channel_next,
+                sync_channel=self._channel_sync,
+                binwidth=int(np.round(self._bin_width * 1000)),
+                n_bins=int(self._record_length),
+                n_histograms=number_of_gates)
+            pulsed.setMaxCounts(max_counts)
+            return pulsed
+
+        self.pulsed = create()
         self.recorder = self.pulsed
+        if double_buffer:
+            self._standby_recorder = create()
+            self._standby_recorder.stop()
         return 0
 
     def start_recorder(self, arm=False):
@@ -486,6 +476,11 @@ class TimeTaggerCounter(Base, SlowCounterInterface, RecorderInterface):
         state = self._curr_state
         meas_type = self._recorder_constraints.recorder_mode_measurements[self._curr_mode]
         
+        if self._prearmed:
+            # armed already while the data of the previous point was fetched
+            self._prearmed = False
+            return self._tagger.sync(timeout=5000)
+
         if state == RecorderState.LOCKED:
             self.log.warning('TT has not been unlocked.')
             return False 
@@ -548,35 +543,69 @@ class TimeTaggerCounter(Base, SlowCounterInterface, RecorderInterface):
                            current mode setting
         """
         ret = {'counts':None, 'int_time':None, 'counts2':None, 'counts_diff': None}
-        while True:
-            if self.recorder.ready():
-                break
+        if not self._wait_until_ready(self._recorder_timeout):
+            self.log.error(f'TimeTagger: no data within the timeout of '
+                           f'{self._recorder_timeout} s.')
+            return [ret[i] for i in meas_keys]
+
+        finished_recorder = self.recorder
+        if self._standby_recorder is not None and self.is_measurement_running:
+            # arm the next point before the data of this point is fetched
+            self.recorder = self._standby_recorder
+            self.recorder.clear()
+            self.recorder.start()
+            self._standby_recorder = finished_recorder
+            self._prearmed = True
 
         if self._curr_mode == HWRecorderMode.PIXELCLOCK or self._curr_mode == HWRecorderMode.PIXELCLOCK_SINGLE_ISO_B:
-            data = self.recorder.getData()
+            data = finished_recorder.getData()
             ret['counts'] = data
 
-            data = self.recorder.getBinWidths()
+            data = finished_recorder.getBinWidths()
             ret['int_time'] = data/1e12 # returns in ps
         
         if self._curr_mode == HWRecorderMode.ESR:
-            data = self.recorder.getData().reshape(self._curr_meas_params['num_meas'], len(self._curr_meas_params['mw_frequency_list']))
+            data = finished_recorder.getData().reshape(self._curr_meas_params['num_meas'], len(self._curr_meas_params['mw_frequency_list']))
             ret['counts'] = data
             
-            data = self.recorder.getBinWidths().reshape(self._curr_meas_params['num_meas'], len(self._curr_meas_params['mw_frequency_list']))
+            data = finished_recorder.getBinWidths().reshape(self._curr_meas_params['num_meas'], len(self._curr_meas_params['mw_frequency_list']))
             ret['int_time'] = data/1e12 # returns in ps
             ret['counts'] = np.divide(ret['counts'].astype(float), ret['int_time'])
         
         if self._curr_mode == HWRecorderMode.GENERAL_PULSED:
-            data = self.recorder.getData()
+            data = finished_recorder.getData()
             ret['counts'] = data          
 
-        # released
-        self._curr_state = RecorderState.IDLE
+        if self._prearmed:
+            finished_recorder.stop()
+            self._curr_state = RecorderState.ARMED
+        else:
+            # released
+            self._curr_state = RecorderState.IDLE
         ret_list = [ret[i] for i in meas_keys]
         
         return ret_list
     
+    def _wait_until_ready(self, timeout=None):
+        """ Wait for the current recorder measurement without occupying the CPU.
+
+        The waiting time between two checks grows from 0.1 ms to the configured poll
+        interval, so short measurements are picked up quickly and long ones are polled
+        rarely.
+
+        @param float timeout: maximum waiting time in s, None to wait forever
+
+        @return bool: True if the data is ready, False after a timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        delay = 1e-4
+        while not self.recorder.ready():
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(delay)
+            delay = min(2 * delay, self._recorder_poll_interval)
+        return True
+
     def get_available_measurements(self, meas_keys=None):
         ret_list = []
 
@@ -660,7 +689,9 @@ class TimeTaggerCounter(Base, SlowCounterInterface, RecorderInterface):
         
     def stop_measurement(self):
         self.recorder.stop()
+        self._prearmed = False
         self.is_measurement_running = False
+        self._curr_state = RecorderState.IDLE
     
     def get_current_measurement_method_name(self):
         """ gets the name of the measurment method currently in use
@@ -21,7 +21,7 @@ Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
 top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
 """
 
-from core.interface import abstract_interface_method
+from core.interface import abstract_interface_method, returns_array
 from core.meta import InterfaceMetaclass
 
 
@@ -77,6 +77,7 @@ class CameraInterface(metaclass=InterfaceMetaclass):
         """
         pass
 
+    @returns_array
     @abstract_interface_method
     def get_acquired_data(self):
         """ Return an array of last acquired image.
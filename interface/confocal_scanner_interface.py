@@ -20,7 +20,9 @@ Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
 top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
 """
 
-from core.interface import abstract_interface_method
+import numpy as np
+
+from core.interface import abstract_interface_method, returns_array, remote_cache
 from core.meta import InterfaceMetaclass
 
 
@@ -82,6 +84,7 @@ class ConfocalScannerInterface(metaclass=InterfaceMetaclass):
         """
         pass
 
+    @remote_cache()
     @abstract_interface_method
     def get_scanner_axes(self):
         """ Find out how many axes the scanning device is using for confocal and their names.
@@ -98,6 +101,7 @@ class ConfocalScannerInterface(metaclass=InterfaceMetaclass):
         """
         pass
 
+    @remote_cache()
     @abstract_interface_method
     def get_scanner_count_channels(self):
         """ Returns the list of channels that are recorded while scanning an image.
@@ -167,6 +171,7 @@ class ConfocalScannerInterface(metaclass=InterfaceMetaclass):
         """
         pass
 
+    @returns_array
     @abstract_interface_method
     def scan_line(self, line_path=None, pixel_clock=False):
         """ Scans a line and returns the counts on that line.
@@ -200,3 +205,83 @@ class ConfocalScannerInterface(metaclass=InterfaceMetaclass):
         """
         pass
 
+
+
+class ConfocalFrameScannerInterface(metaclass=InterfaceMetaclass):
+    """ Optional extension of the ConfocalScannerInterface for hardware that can scan a whole frame
+    in one buffered acquisition.
+
+    Instead of setting up, starting and stopping the hardware for every line (and every retrace),
+    the trajectory of the whole frame is uploaded once and the counts are streamed continuously.
+    The logic collects the lines with read_lines as soon as they are completed.
+
+    Hardware modules implementing this interface must implement ConfocalScannerInterface as well.
+    The scanner clock and scanner have to be set up (set_up_scanner_clock, set_up_scanner) before a
+    frame stream can be started. A frame always consists of lines with the same number of samples.
+    Usually each line contains the pixels of one image line followed by the retrace to the start of
+    the next image line.
+    """
+
+    @abstract_interface_method
+    def start_frame_stream(self, frame_path=None, samples_per_line=None, pixel_clock=False):
+        """ Uploads the trajectory of a whole frame and starts scanning it.
+
+        @param float[k][n*m] frame_path: k axis positions of n lines with m samples each, the lines
+                                         are concatenated
+        @param int samples_per_line: number of samples m of each line
+        @param bool pixel_clock: whether we need to output a pixel clock for the frame
+
+        @return int: error code (0:OK, -1:error)
+        """
+        pass
+
+    @returns_array
+    @abstract_interface_method
+    def read_lines(self, number_of_lines=None, timeout=None):
+        """ Returns the counts of lines of the running frame stream that are completed.
+
+        Blocks until at least one line is completed, the timeout expired or the frame is finished.
+
+        @param int number_of_lines: maximum number of lines to return, None for all completed lines
+        @param float timeout: maximum time to wait for a line in s, None for a hardware default
+
+        @return float[l][m][c]: the photon counts per second of l completed lines with m samples
+                                and c channels. l is 0 if no line was completed within timeout or
+                                all lines have been read. On error [[[-1.]]] is returned.
+        """
+        pass
+
+    @abstract_interface_method
+    def stop_frame_stream(self):
+        """ Stops the frame stream, also if the frame is not finished yet.
+
+        @return int: error code (0:OK, -1:error)
+        """
+        pass
+
+    @returns_array
+    def scan_frame(self, frame_path=None, samples_per_line=None, pixel_clock=False):
+        """ Scans a whole frame and returns the counts of all lines.
+
+        @param float[k][n*m] frame_path: k axis positions of n lines with m samples each, the lines
+                                         are concatenated
+        @param int samples_per_line: number of samples m of each line
+        @param bool pixel_clock: whether we need to output a pixel clock for the frame
+
+        @return float[n][m][c]: the photon counts per second of all lines
+        """
+        number_of_lines = np.shape(frame_path)[1] // samples_per_line
+        if self.start_frame_stream(frame_path, samples_per_line, pixel_clock) < 0:
+            return np.array([[[-1.]]])
+        lines = list()
+        try:
+            while sum(len(chunk) for chunk in lines) < number_of_lines:
+                chunk = self.read_lines()
+                if np.any(chunk == -1):
+                    return np.array([[[-1.]]])
+                if len(chunk) == 0:
+                    return np.array([[[-1.]]])
+                lines.append(chunk)
+        finally:
+            self.stop_frame_stream()
+        return np.concatenate(lines)
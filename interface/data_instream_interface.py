@@ -22,7 +22,7 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 
 import numpy as np
 from enum import Enum
-from core.interface import abstract_interface_method
+from core.interface import abstract_interface_method, returns_array, remote_cache
 from core.meta import InterfaceMetaclass
 from core.interface import ScalarConstraint
 
@@ -201,6 +201,7 @@ class DataInStreamInterface(metaclass=InterfaceMetaclass):
         """
         pass
 
+    @remote_cache()
     @abstract_interface_method
     def get_constraints(self):
         """
@@ -270,6 +271,7 @@ class DataInStreamInterface(metaclass=InterfaceMetaclass):
         """
         pass
 
+    @returns_array
     @abstract_interface_method
     def read_data(self, number_of_samples=None):
         """
@@ -20,7 +20,7 @@ Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
 top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
 """
 
-from core.interface import abstract_interface_method
+from core.interface import abstract_interface_method, returns_array, remote_cache
 from core.meta import InterfaceMetaclass
 
 
@@ -40,6 +40,7 @@ class FastCounterInterface(metaclass=InterfaceMetaclass):
 
     """
 
+    @remote_cache()
     @abstract_interface_method
     def get_constraints(self):
         """ Retrieve the hardware constrains from the Fast counting device.
@@ -155,6 +156,7 @@ class FastCounterInterface(metaclass=InterfaceMetaclass):
         """
         pass
 
+    @returns_array
     @abstract_interface_method
     def get_data_trace(self):
         """ Polls the current timetrace data from the fast counter.
@@ -175,3 +177,15 @@ class FastCounterInterface(metaclass=InterfaceMetaclass):
         If the hardware does not support these features, the values should be None
         """
         pass
+
+    def set_sequence_information(self, sampling_information, measurement_information):
+        """ Pass the information of the loaded pulse sequence, called before start_measure.
+
+        @param dict sampling_information: sampling information of the loaded ensemble/sequence
+        @param dict measurement_information: measurement information of the loaded
+                                             ensemble/sequence
+
+        Only needed by counters which simulate their traces (e.g. the dummy), real hardware
+        ignores it.
+        """
+        pass
@@ -20,7 +20,7 @@ Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
 top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
 """
 
-from core.interface import abstract_interface_method
+from core.interface import abstract_interface_method, remote_cache
 from core.meta import InterfaceMetaclass
 from core.util.helpers import in_range
 from enum import Enum
@@ -217,6 +217,7 @@ class MicrowaveInterface(metaclass=InterfaceMetaclass):
         """
         pass
 
+    @remote_cache()
     @abstract_interface_method
     def get_limits(self):
         """ Return the device-specific limits in a nested dictionary.
@@ -20,8 +20,9 @@ Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
 top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
 """
 
-from core.interface import abstract_interface_method
+from core.interface import abstract_interface_method, remote_cache
 from core.meta import InterfaceMetaclass
+from core.util.motion import MotionPoller
 
 
 class MotorInterface(metaclass=InterfaceMetaclass):
@@ -31,6 +32,7 @@ class MotorInterface(metaclass=InterfaceMetaclass):
         methods for the hardware class, which get called by the general method.
     """
 
+    @remote_cache()
     @abstract_interface_method
     def get_constraints(self):
         """ Retrieve the hardware constrains from the motor device.
@@ -206,3 +208,23 @@ class MotorInterface(metaclass=InterfaceMetaclass):
         @return int: error code (0:OK, -1:error)
         """
         pass
+
+    def get_motion_future(self, target=None, tolerance=None, timeout=None):
+        """ Get a future which is resolved when the current movement of the stage has finished.
+
+        @param dict target: optional, absolute target position of the movement. Usage:
+                             {'axis_label': <the-abs-pos-value>}.
+        @param float tolerance: optional, allowed deviation from the target. Defaults to the
+                                pos_step of each axis.
+        @param float timeout: optional, the future fails with a TimeoutError after this many
+                              seconds.
+
+        @return concurrent.futures.Future: resolved with the position dict (like get_pos)
+                                           after the movement
+
+        Wait for the result with a done callback instead of blocking on it in a measurement
+        loop. The default implementation polls get_pos and get_status in a background thread,
+        frequently close to the target and rarely far away from it. Hardware which knows when
+        a movement ends should override this method.
+        """
+        return MotionPoller.of(self).watch(target, tolerance, timeout)
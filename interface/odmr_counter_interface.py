@@ -19,7 +19,9 @@ Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
 top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
 """
 
-from core.interface import abstract_interface_method
+import numpy as np
+
+from core.interface import abstract_interface_method, returns_array
 from core.meta import InterfaceMetaclass
 
 
@@ -67,6 +69,7 @@ class ODMRCounterInterface(metaclass=InterfaceMetaclass):
         """
         pass
 
+    @returns_array
     @abstract_interface_method
     def count_odmr(self, length = 100):
         """ Sweeps the microwave and returns the counts on that sweep.
@@ -77,6 +80,38 @@ class ODMRCounterInterface(metaclass=InterfaceMetaclass):
         """
         pass
 
+    def start_continuous_odmr(self, length=100, sweeps_per_read=10, buffered_sweeps=100):
+        """ Start a hardware timed acquisition of consecutive sweeps without dead time.
+
+        The clock keeps running over all sweeps and triggers the microwave length times per
+        sweep, so the microwave list (or sweep) has to return to its first frequency by itself
+        after the last one.
+
+        @param int length: length of microwave sweep in pixel
+        @param int sweeps_per_read: minimum number of sweeps returned by read_continuous_odmr
+        @param int buffered_sweeps: number of sweeps the hardware buffer can hold
+
+        @return int: error code (0:OK, -1:error or no continuous ODMR on this hardware)
+        """
+        return -1
+
+    def read_continuous_odmr(self):
+        """ Get the sweeps completed since the last read, at least sweeps_per_read of them.
+
+        Blocks until enough sweeps are completed.
+
+        @return (bool, float[][][]): tuple: was there an error, the photon counts per second
+                                     as 3D array[sweep, channel, pixel]
+        """
+        return True, np.empty((0, len(self.get_odmr_channels()), 0))
+
+    def stop_continuous_odmr(self):
+        """ Stop the continuous acquisition started with start_continuous_odmr.
+
+        @return int: error code (0:OK, -1:error)
+        """
+        return 0
+
     @abstract_interface_method
     def close_odmr(self):
         """ Close the odmr and clean up afterwards.
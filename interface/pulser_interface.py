@@ -21,7 +21,7 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 """
 
 
-from core.interface import abstract_interface_method
+from core.interface import abstract_interface_method, remote_cache
 from core.meta import InterfaceMetaclass
 from core.interface import ScalarConstraint
 from enum import Enum
@@ -46,6 +46,7 @@ class PulserInterface(metaclass=InterfaceMetaclass):
             level jumps and loops to create complex sequence with a limited device memory.
     """
 
+    @remote_cache()
     @abstract_interface_method
     def get_constraints(self):
         """
@@ -24,6 +24,7 @@ import abc
 from enum import Enum, EnumMeta
 from collections import namedtuple
 from datetime import datetime
+from core.interface import returns_array
 from core.meta import InterfaceMetaclass
 
 
@@ -115,6 +116,7 @@ class RecorderInterface(metaclass=InterfaceMetaclass):
         """
         pass
 
+    @returns_array
     @abc.abstractmethod
     def get_measurements(self, meas_keys=None):
         """ get measurements
@@ -23,7 +23,9 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 import abc
 from enum import Enum, EnumMeta
 from posixpath import abspath
+from core.interface import returns_array
 from core.meta import InterfaceMetaclass
+from core.util.line_stream import LineStream, acquire_lines
 
 
 class ScannerState(Enum):
@@ -224,6 +226,7 @@ class ScannerInterface(metaclass=InterfaceMetaclass):
         """
         pass
 
+    @returns_array
     @abc.abstractmethod
     def get_measurements(self, reshape=True):
         """ Obtains gathered measurements from scanner
@@ -268,6 +271,44 @@ class ScannerInterface(metaclass=InterfaceMetaclass):
         """    
         pass
 
+    def start_line_stream(self, lines, time_forward, time_back, callback=None, buffer_lines=8):
+        """ Continuously acquire all lines of a frame in the background.
+
+        The completed lines are handed out through a ring buffer, so the next line is
+        measured while the previous one is processed. configure_scanner has to be called
+        prior. This default implementation calls configure_line, scan_line and
+        get_measurements for every line in a background thread and configures the next
+        line right after the current one was read out. Hardware with a native continuous
+        mode should override it.
+
+        @param list lines: coordinates [corr0_start, corr0_stop, corr1_start, corr1_stop]
+                           of every line in m
+        @param float time_forward: time for the forward movement of every line in s
+        @param float time_back: time for the back (idle) movement of every line in s
+        @param callable callback: optional, called as callback(line_index, line) from the
+                                  acquisition thread for every completed line, before the
+                                  next line is started (e.g. to arm a counter for it)
+        @param int buffer_lines: number of lines the ring buffer can hold
+
+        @return LineStream: stream of (line_index, 2D array[num_of_signals, pixel_per_line])
+        """
+        self.stop_line_stream()
+        self._line_stream = LineStream(len(lines), buffer_lines=buffer_lines, callback=callback,
+                                       log=getattr(self, 'log', None))
+        self._line_stream.start(acquire_lines, self, self._line_stream, lines,
+                                time_forward, time_back)
+        return self._line_stream
+
+    def stop_line_stream(self):
+        """ Stop a running continuous acquisition after the current line.
+
+        @return: None
+        """
+        stream = getattr(self, '_line_stream', None)
+        if stream is not None:
+            stream.stop()
+            self._line_stream = None
+
     @abc.abstractmethod
     def calibrate_constant_height(self, calib_points, safety_lift):
         """ Calibrate constant height
@@ -20,7 +20,7 @@ Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
 top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
 """
 
-from core.interface import abstract_interface_method
+from core.interface import abstract_interface_method, returns_array, remote_cache
 from enum import Enum
 from core.meta import InterfaceMetaclass
 
@@ -37,6 +37,7 @@ class SlowCounterInterface(metaclass=InterfaceMetaclass):
     reading, not knowing if there is one, multiple or none.
     """
 
+    @remote_cache()
     @abstract_interface_method
     def get_constraints(self):
         """ Retrieve the hardware constrains from the counter device.
@@ -84,6 +85,7 @@ class SlowCounterInterface(metaclass=InterfaceMetaclass):
         """
         pass
 
+    @returns_array
     @abstract_interface_method
     def get_counter(self, samples=None):
         """ Returns the current counts per second of the counter.
@@ -94,6 +96,46 @@ class SlowCounterInterface(metaclass=InterfaceMetaclass):
         """
         pass
 
+    def start_counter_stream(self, buffer_length=2**20):
+        """ Configures and starts the counter to acquire continuously into a circular buffer.
+
+        @param int buffer_length: number of samples per channel the circular buffer can hold
+
+        @return int: error code (0:OK, -1:error or streaming not supported)
+
+        Replaces set_up_counter in the modes of the streaming_counting_mode constraint, the
+        clock is set up before as usual. Each gate gives one sample in the gated modes. Unread
+        samples are overwritten once the buffer is full, see get_lost_samples. close_counter
+        stops the stream.
+        """
+        return -1
+
+    def read_available_counts_into_buffer(self, buffer):
+        """ Read all samples acquired since the last read into a 2D numpy array.
+
+        The first index of buffer is the channel, in the order of get_counter_channels, the
+        second one the sample:
+            buffer.shape == (len(self.get_counter_channels()), number_of_samples)
+        If more samples are available than fit into the buffer, only as many as fit are read.
+        Does not wait for new samples.
+
+        @param numpy.ndarray buffer: float64 array to write the samples to, the values are the
+                                     same as returned by get_counter
+
+        @return int: number of samples per channel read into buffer, negative value indicates
+                     error
+        """
+        return -1
+
+    def get_lost_samples(self):
+        """ Number of samples per channel which were overwritten in the circular buffer before
+        they were read, since start_counter_stream.
+
+        @return int: number of lost samples, 0 if the buffer never overflowed
+        """
+        return 0
+
+    @remote_cache()
     @abstract_interface_method
     def get_counter_channels(self):
         """ Returns the list of counter channel names.
@@ -142,4 +184,7 @@ class SlowCounterConstraints:
         self.max_count_frequency = 5e5
         # TODO: add CountingMode enums to this list in instances
         self.counting_mode = []
+        # counting modes in which the counter can stream into a circular buffer,
+        # see start_counter_stream
+        self.streaming_counting_mode = []
 
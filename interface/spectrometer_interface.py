@@ -19,7 +19,7 @@ Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
 top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
 """
 
-from core.interface import abstract_interface_method
+from core.interface import abstract_interface_method, returns_array
 from core.meta import InterfaceMetaclass
 
 
@@ -32,6 +32,7 @@ class SpectrometerInterface(metaclass=InterfaceMetaclass):
     documentation/programming_style.md
 
     """
+    @returns_array
     @abstract_interface_method
     def recordSpectrum(self):
         """ Launch an acquisition a wait for a response
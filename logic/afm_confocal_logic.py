@@ -23,12 +23,15 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 #from hardware.microwaveQ.microwaveq import MicrowaveQ    # for debugging only
 #from hardware.spm.spm_new import SmartSPM                # for debugging only
 from interface.scanner_interface import ScanStyle, ScannerMode
-from hardware.timetagger_counter import HWRecorderMode
+from hardware.recorder_modes import HWRecorderMode
 from core.module import Connector, StatusVar
 from core.configoption import ConfigOption
+from core.logger import RateLimitedLogger
 from logic.generic_logic import GenericLogic
 from core.util import units
 from core.util.mutex import Mutex
+from core.util import nv_field
+from core.util.scan_buffer import ScanImageBuffer
 from scipy.linalg import lstsq
 from math import log10, floor
 from scipy.stats import norm
@@ -308,6 +311,11 @@ class AFMConfocalLogic(GenericLogic):
     __version__ = '0.1.5' # version number 
 
     _meas_path = ConfigOption('meas_path', default='', missing='warn')
+    # maximum rate (Hz) at which the displays are notified about new qafm data
+    _qafm_display_rate = ConfigOption('qafm_display_rate', default=10.0)
+    # write qafm images to a memory-mapped file in meas_path (or the data directory of the
+    # save logic if meas_path is not set) during the scan
+    _qafm_stream_to_disk = ConfigOption('qafm_stream_to_disk', default=False)
 
     # declare connectors. It is either a connector to be connected to another
     # logic or another hardware. Hence the interface variable will take either 
@@ -369,6 +377,7 @@ class AFMConfocalLogic(GenericLogic):
     _obj_scan_line = np.zeros(10)   # scan line array for objective scanner
     _afm_scan_line = np.zeros(10)   # scan line array for objective scanner
     _qafm_scan_line = np.zeros(10)   # scan line array for combined afm + objective scanner
+    _qafm_counter_lines = {}         # counter data of the streamed qafm lines by line index
     _opti_scan_line = np.zeros(10)  # for optimizer
 
     #prepare the required arrays:
@@ -376,6 +385,7 @@ class AFMConfocalLogic(GenericLogic):
     _obj_scan_array = {} # all objective scan data are stored here
     _afm_scan_array = {}  # all pure afm data are stored here
     _qafm_scan_array = {} # all qafm data are stored here
+    _qafm_buffer = None   # ScanImageBuffer holding the data of _qafm_scan_array
     _opti_scan_array = {} # all optimizer data are stored here
     _esr_scan_array = {} # all the esr data from a scan are stored here
 
@@ -411,6 +421,8 @@ class AFMConfocalLogic(GenericLogic):
     # Qualitative Scan (Quenching Mode)
     sigQAFMScanInitialized = QtCore.Signal()
     sigQAFMLineScanFinished = QtCore.Signal()
+    # rate limited data update, list of the scan directions with changed data
+    sigQAFMDataUpdated = QtCore.Signal(list)
     sigQAFMScanStarted = QtCore.Signal()
     sigQAFMScanFinished = QtCore.Signal()
     
@@ -543,6 +555,9 @@ class AFMConfocalLogic(GenericLogic):
     def on_activate(self):
         """ Initialization performed during activation of the module. """
 
+        # progress of the scans is reported per point, keep the log readable
+        self._limited_log = RateLimitedLogger(self.log)
+
         # Connect to hardware and save logic
         self._spm = self.spm_device()
         #self._spm = SmartSPM()                    # temporarily get language server's help
@@ -581,6 +596,8 @@ class AFMConfocalLogic(GenericLogic):
         self.sigSaveDataGwyddion.connect(self._save_to_gwyddion)
         self.sigSaveDataGwyddionFinished.connect(self.decrease_save_counter)
 
+        # an empty meas_path would resolve to the working directory
+        self._meas_path_configured = bool(self._meas_path)
         self._meas_path = os.path.abspath(self._meas_path)
 
         #FIXME: Introduce a state variable to prevent redundant configuration calls of the hardware.
@@ -619,11 +636,17 @@ class AFMConfocalLogic(GenericLogic):
 
 
     def initialize_qafm_scan_array(self, x_start, x_stop, num_columns, 
-                                         y_start, y_stop, num_rows):
+                                         y_start, y_stop, num_rows, stream_to_disk=False):
         """ Initialize the qafm scan array. 
 
         @param int num_columns: number of columns, essentially the x resolution
         @param int num_rows: number of columns, essentially the y resolution
+        @param bool stream_to_disk: store the images in a memory-mapped file
+                                    in the measurement path, completed lines
+                                    are flushed to disk during the scan.
+
+        The images of all parameters and directions are views into one
+        preallocated ScanImageBuffer (self._qafm_buffer).
         """
 
 
@@ -656,12 +679,33 @@ class AFMConfocalLogic(GenericLogic):
         meas_dir = ['fw', 'bw']
         meas_dict = {}
 
+        filename = None
+        if stream_to_disk:
+            timestamp = datetime.datetime.now().strftime('%Y%m%d-%H%M-%S')
+            if self._meas_path_configured:
+                stream_dir = self._meas_path
+            else:
+                stream_dir = self._save_logic.get_path_for_module(module_name='QAFM')
+            filename = os.path.join(stream_dir, f'{timestamp}_qafm_stream.npy')
+        try:
+            self._qafm_buffer = ScanImageBuffer(
+                meas_params, num_rows, num_columns, directions=meas_dir,
+                scale=[meas_params_units[param]['scale_fac'] for param in meas_params],
+                max_rate=self._qafm_display_rate,
+                filename=filename)
+        except OSError:
+            self.log.exception('Could not create the qafm stream file, the data is kept in memory only.')
+            self._qafm_buffer = ScanImageBuffer(
+                meas_params, num_rows, num_columns, directions=meas_dir,
+                scale=[meas_params_units[param]['scale_fac'] for param in meas_params],
+                max_rate=self._qafm_display_rate)
+
         for direction in meas_dir:
             for param in meas_params:
 
                 name = f'{param}_{direction}' # this is the naming convention!
 
-                meas_dict[name] = {'data': np.zeros((num_rows, num_columns))}
+                meas_dict[name] = {'data': self._qafm_buffer.image(direction, param)}
                 #meas_dict[name] = {'data': np.random.rand(num_rows, num_columns)}
                 meas_dict[name]['coord0_arr'] = coord0_arr
                 meas_dict[name]['coord1_arr'] = coord1_arr
@@ -1265,7 +1309,8 @@ class AFMConfocalLogic(GenericLogic):
                                                                     coord0_num,
                                                                     coord1_start,
                                                                     coord1_stop,
-                                                                    coord1_num)
+                                                                    coord1_num,
+                                                                    stream_to_disk=self._qafm_stream_to_disk)
             self._scan_counter = 0
 
         # check input values
@@ -1308,244 +1353,253 @@ class AFMConfocalLogic(GenericLogic):
             self._qafm_scan_array[entry]['params']['Measurement start'] = start_time_afm_scan.isoformat()
 
         pixel_clock_tdiff = deque(maxlen=2500) 
-        for line_num, scan_coords in enumerate(scan_arr):
-
-            # for a continue measurement event, skip the first measurements
-            # until one has reached the desired line, then continue from there.
-            if line_num < self._spm_line_num:
-                continue
-
-            #-------------------
-            # Perform line scan
-            #-------------------
-            self._qafm_scan_line = np.zeros((num_params, coord0_num))
-
+        line_num = self._spm_line_num
+        next_line = self._spm_line_num
+        while next_line < len(scan_arr):
+
+            # the counter is read out and armed for the next line from the
+            # acquisition thread of the line stream
+            self._qafm_counter_lines = {}
+            line_callback = None
             if 'counts' in meas_params:
                 self._counter.start_recorder(arm=True)
+                line_callback = self._read_qafm_counter_line
+
+            # for a continue measurement event, start with the desired line.
+            # The SPM measures the next line while the current one is processed.
+            line_stream = self._spm.start_line_stream(scan_arr[next_line:],
+                                                      time_forward=scan_speed_per_line,
+                                                      time_back=time_idle_move,
+                                                      callback=line_callback)
+            optimize_request = False
+            try:
+                for stream_index, spm_line in line_stream:
+                    line_num = next_line + stream_index
+
+                    #-------------------
+                    # Process line scan
+                    #-------------------
+                    self._qafm_scan_line = np.zeros((num_params, coord0_num))
+
+                    # AFM signal (from SPM)
+                    if  set(curr_scan_params) - {'counts', 'counts2', 'counts_diff'}:
+                        # i.e. afm parameters are set
+                        self._qafm_scan_line[spm_start_idx:] = spm_line
+
+                    # Optical signal (from MicrowaveQ), read out in _read_qafm_counter_line
+                    counter_line = self._qafm_counter_lines.pop(stream_index, None)
+                    if 'counts' in meas_params and counter_line is None:
+                        self.log.error(f'No counter data for line {line_num}, the QAFM scan '
+                                       f'is stopped.')
+                        break
+                    counts, int_time, counts2, counts_diff = \
+                        counter_line if counter_line is not None else (None, None, None, None)
+
+                    if  'counts' in meas_params:
+                        # utilize integration time measurement if available 
+
+                        if int_time is None or np.any(np.isclose(int_time,0,atol=1e-12)):
+                            int_time = freq1_pulse_time
+                        else:
+                            pixel_clock_tdiff.extendleft((int_time - integration_time).tolist())
+
+                        i = meas_params.index('counts')
+                        self._qafm_scan_line[i] = counts/int_time
+                        # print(self._qafm_scan_line[i])
+
+                    if 'counts2' in meas_params:
+                        # integration times for iso-B measurements are exact, not dependent upon pixel clock pulse
+                        i = meas_params.index('counts2')
+                        self._qafm_scan_line[i] = counts2 / freq2_pulse_time
+
+                        i = meas_params.index('counts_diff')
+                        self._qafm_scan_line[i] = counts_diff / (freq1_pulse_time + freq2_pulse_time) / 2
+
+                        # FIXME: currently, this method will not work based on only 2 points
+                        #        Issues:
+                        #               - In reducing the slope formed by L(freq1)/L(freq2)   (L()=Lorenztian)
+                        #                 there are two possible solutions: to left and right of inflection point (sigma/sqrt(3))
+                        #                 It is not possible to determine which side you are on without a 3rd point
+                        #               - With only 2 points, the slope of a curve is not distguishable from noise
+                        #               
+                        #i = meas_params.index('b_field')
+                        #self._qafm_scan_line[i] = self.calc_mag_field_single_res(
+                        #        self.calc_eps_shift_dual_iso_b(
+                        #            counts1=self._counter.get_measurements('counts'),
+                        #            counts2=self._counter.get_measurements('counts2'),
+                        #            freq1=self._freq1_iso_b_frequency,
+                        #            freq2=self._freq2_iso_b_frequency,
+                        #            sigma=self._fwhm_iso_b_frequency / 2) 
+                        #        +  (self._freq1_iso_b_frequency + self._freq2_iso_b_frequency) /2,  
+                        #        self.ZFS, 
+                        #        self.E_FIELD) * 10000
+
+                    row_i = line_num // 2    # row number for qafm_array
+                    if not reverse_meas:
+                        # current is forward pass, optimization occured on backward pass
+                        ref_j = -1             
+                        curr_direc, past_direc  = '_fw' , '_bw'
+                    else:
+                        # current is backward pass, optimization occured on forward pass
+                        ref_j = 0             
+                        curr_direc, past_direc  = '_bw' , '_fw'
+
+                    # store transformed data of all parameters at once, flip reverse scans
+                    self._qafm_buffer.write_line(curr_direc[1:], row_i, self._qafm_scan_line,
+                                                 channels=curr_scan_params, reverse=reverse_meas)
+
+                    # Iterate through parameters
+                    for index, param_name in enumerate(curr_scan_params):
+                        name = param_name + curr_direc 
+
+                        # if optimization was performed after last measurement, then adjust the normalization 
+                        if _update_normalization:
+
+                            if 'Height(Dac)' in name:
+                                self._height_dac_norm =   self._qafm_scan_array['Height(Dac)' + past_direc]['data'][row_i - 1][ref_j]   \
+                                                        - self._qafm_scan_array['Height(Dac)' + curr_direc]['data'][row_i    ][ref_j]
+                                _update_normalization -= 1   # parameter complete
+
+                            if 'Height(Sen)' in name:
+                                self._height_sens_norm =  self._qafm_scan_array['Height(Sen)' + past_direc]['data'][row_i - 1][ref_j]   \
+                                                        - self._qafm_scan_array['Height(Sen)' + curr_direc]['data'][row_i    ][ref_j]
+                                _update_normalization -= 1   # parameter complete
+
+
+                        # apply normalization (at start, normalization parameters = 0)
+                        if 'Height(Dac)' in name:
+                            self._qafm_scan_array[name]['data'][row_i] += self._height_dac_norm
+
+                        if 'Height(Sen)' in name:
+                            self._qafm_scan_array[name]['data'][row_i] += self._height_sens_norm
+
+                    # determine correction plane for relative measurements
+                    if row_i >= 1:
+                        for name in {p + sfx for p in curr_scan_params for sfx in ('_fw', '_bw')} & \
+                                    {'Height(Dac)_fw', 'Height(Dac)_bw', 'Height(Sen)_fw','Height(Sen)_bw'}:
+                            x_range = [self._qafm_scan_array[name]['coord0_arr'][0], 
+                                       self._qafm_scan_array[name]['coord0_arr'][-1]]
+                            y_range = [self._qafm_scan_array[name]['coord1_arr'][0], 
+                                       self._qafm_scan_array[name]['coord1_arr'][row_i]]
+                            xy_data = self._qafm_scan_array[name]['data'][:row_i+1]
+                            _,C = self.correct_plane(xy_data=xy_data,x_range=x_range,y_range=y_range)
+                            #self.log.debug(f"Determined tilt correction for name={name} as C={C.tolist()}")
+
+                            # update plane equation
+                            self._qafm_scan_array[name]['params']['correction_plane_eq'] = str(C.tolist())
+                            self._qafm_scan_array[name]['params']['image_correction'] = str(self._qafm_scan_array[name]['image_correction'])
+                            self._qafm_scan_array[name]['corr_plane_coeff'] = C.copy()
+
+                    self._qafm_buffer.complete_line(curr_direc[1:], row_i)
+                    self._notify_qafm_update()
+
+                    # change direction
+                    if reverse_meas:
+                        reverse_meas = False
+                        self._notify_qafm_update(force=True)
+                        self.sigQAFMLineScanFinished.emit()      # emit only a signal if the reversed is finished.
+                    else:
+                        reverse_meas = True
 
-            self._spm.configure_line(line_corr0_start=scan_coords[0],
-                                     line_corr0_stop=scan_coords[1],
-                                     line_corr1_start=scan_coords[2],
-                                     line_corr1_stop=scan_coords[3],
-                                     time_forward=scan_speed_per_line,
-                                     time_back=time_idle_move)
-
-            self._spm.scan_line()  # start the scan line
-
-            #-------------------
-            # Process line scan
-            #-------------------
-
-            # AFM signal (from SPM)
-            if  set(curr_scan_params) - {'counts', 'counts2', 'counts_diff'}:
-                # i.e. afm parameters are set
-                self._qafm_scan_line[spm_start_idx:] = self._spm.get_measurements(reshape=True)
-            else:
-                # perform just the scan without using the data.
-                self._spm.get_measurements(reshape=True)
-
-            # Optical signal (from MicrowaveQ)
-            # The same variables are requested from 'pixel', 'single iso-b', and 'dual iso-b'
-            # if they don't exist, then missing value is returned as None
-            counts, int_time, counts2, counts_diff = \
-                self._counter.get_measurements(['counts', 'int_time', 'counts2', 'counts_diff']) 
-
-            if  'counts' in meas_params:
-                # utilize integration time measurement if available 
-
-                if int_time is None or np.any(np.isclose(int_time,0,atol=1e-12)):
-                    int_time = freq1_pulse_time
-                else:
-                    pixel_clock_tdiff.extendleft((int_time - integration_time).tolist())
-
-                i = meas_params.index('counts')
-                self._qafm_scan_line[i] = counts/int_time
-                # print(self._qafm_scan_line[i])
-
-            if 'counts2' in meas_params:
-                # integration times for iso-B measurements are exact, not dependent upon pixel clock pulse
-                i = meas_params.index('counts2')
-                self._qafm_scan_line[i] = counts2 / freq2_pulse_time
-
-                i = meas_params.index('counts_diff')
-                self._qafm_scan_line[i] = counts_diff / (freq1_pulse_time + freq2_pulse_time) / 2
-
-                # FIXME: currently, this method will not work based on only 2 points
-                #        Issues:
-                #               - In reducing the slope formed by L(freq1)/L(freq2)   (L()=Lorenztian)
-                #                 there are two possible solutions: to left and right of inflection point (sigma/sqrt(3))
-                #                 It is not possible to determine which side you are on without a 3rd point
-                #               - With only 2 points, the slope of a curve is not distguishable from noise
-                #               
-                #i = meas_params.index('b_field')
-                #self._qafm_scan_line[i] = self.calc_mag_field_single_res(
-                #        self.calc_eps_shift_dual_iso_b(
-                #            counts1=self._counter.get_measurements('counts'),
-                #            counts2=self._counter.get_measurements('counts2'),
-                #            freq1=self._freq1_iso_b_frequency,
-                #            freq2=self._freq2_iso_b_frequency,
-                #            sigma=self._fwhm_iso_b_frequency / 2) 
-                #        +  (self._freq1_iso_b_frequency + self._freq2_iso_b_frequency) /2,  
-                #        self.ZFS, 
-                #        self.E_FIELD) * 10000
-
-            row_i = line_num // 2    # row number for qafm_array
-            if not reverse_meas:
-                # current is forward pass, optimization occured on backward pass
-                ref_j = -1             
-                curr_direc, past_direc  = '_fw' , '_bw'
-            else:
-                # current is backward pass, optimization occured on forward pass
-                ref_j = 0             
-                curr_direc, past_direc  = '_bw' , '_fw'
-
-            # Iterate through parameters
-            for index, param_name in enumerate(curr_scan_params):
-                name = param_name + curr_direc 
-
-                # check if line was a reverse scan, if so, flip
-                if not reverse_meas:
-                    data = self._qafm_scan_line[index] 
-                else:
-                    data = np.flip(self._qafm_scan_line[index], axis=0) 
-
-                # store transformed data
-                self._qafm_scan_array[name]['data'][row_i] = data * self._qafm_scan_array[name]['scale_fac']
-
-                # if optimization was performed after last measurement, then adjust the normalization 
-                if _update_normalization:
-
-                    if 'Height(Dac)' in name:
-                        self._height_dac_norm =   self._qafm_scan_array['Height(Dac)' + past_direc]['data'][row_i - 1][ref_j]   \
-                                                - self._qafm_scan_array['Height(Dac)' + curr_direc]['data'][row_i    ][ref_j]
-                        _update_normalization -= 1   # parameter complete
-
-                    if 'Height(Sen)' in name:
-                        self._height_sens_norm =  self._qafm_scan_array['Height(Sen)' + past_direc]['data'][row_i - 1][ref_j]   \
-                                                - self._qafm_scan_array['Height(Sen)' + curr_direc]['data'][row_i    ][ref_j]
-                        _update_normalization -= 1   # parameter complete
-
-                
-                # apply normalization (at start, normalization parameters = 0)
-                if 'Height(Dac)' in name:
-                    self._qafm_scan_array[name]['data'][row_i] += self._height_dac_norm
-
-                if 'Height(Sen)' in name:
-                    self._qafm_scan_array[name]['data'][row_i] += self._height_sens_norm
-            
-            # determine correction plane for relative measurements
-            if row_i >= 1:
-                for name in {p + sfx for p in curr_scan_params for sfx in ('_fw', '_bw')} & \
-                            {'Height(Dac)_fw', 'Height(Dac)_bw', 'Height(Sen)_fw','Height(Sen)_bw'}:
-                    x_range = [self._qafm_scan_array[name]['coord0_arr'][0], 
-                               self._qafm_scan_array[name]['coord0_arr'][-1]]
-                    y_range = [self._qafm_scan_array[name]['coord1_arr'][0], 
-                               self._qafm_scan_array[name]['coord1_arr'][row_i]]
-                    xy_data = self._qafm_scan_array[name]['data'][:row_i+1]
-                    _,C = self.correct_plane(xy_data=xy_data,x_range=x_range,y_range=y_range)
-                    #self.log.debug(f"Determined tilt correction for name={name} as C={C.tolist()}")
-
-                    # update plane equation
-                    self._qafm_scan_array[name]['params']['correction_plane_eq'] = str(C.tolist())
-                    self._qafm_scan_array[name]['params']['image_correction'] = str(self._qafm_scan_array[name]['image_correction'])
-                    self._qafm_scan_array[name]['corr_plane_coeff'] = C.copy()
-
-            # change direction
-            if reverse_meas:
-                reverse_meas = False
-                self.sigQAFMLineScanFinished.emit()      # emit only a signal if the reversed is finished.
-            else:
-                reverse_meas = True
+                    self.log.info(f'Line number {line_num} completed.')
 
-            self.log.info(f'Line number {line_num} completed.')
+                    # determine pixel clock margin to use
+                    if pixel_clock_tdiff:
+                        int_time_ms = int(integration_time * 1000)
+                        tdiff = np.array(pixel_clock_tdiff)
+
+                        # obtain the min time difference for the short pulses
+                        # where there is less than 0.01% chance of being lower (short pulse)
+                        if tdiff.min() < 0.0:
+                            sym_tdiff = tdiff[ tdiff < -tdiff.min()]
+                            mu, sigma = norm.fit(sym_tdiff)
+                            margin_01p = norm.ppf(0.0001,mu,sigma)  # the 0.01% chance
+                        else:
+                            margin_01p = tdiff.min() 
+
+                        margin_2sd = margin_01p - 2*tdiff.std()     # extra safety margin
+
+                        self._pixel_clock_tdiff[int_time_ms] = { 'n'         : tdiff.shape[0],
+                                                                 'mean'      : tdiff.mean(),
+                                                                 'stdev'     : tdiff.std(),
+                                                                 'min'       : tdiff.min(),
+                                                                 'max'       : tdiff.max(),
+                                                                 'margin_01p': margin_01p,
+                                                                 'margin_2sd': margin_2sd }
+                        self._pixel_clock_tdiff_data[int_time_ms] = pixel_clock_tdiff
+
+                    # enable the break only if next scan goes into forward movement
+                    if self._stop_request and not reverse_meas:
+                        break
 
-            # determine pixel clock margin to use
-            if pixel_clock_tdiff:
-                int_time_ms = int(integration_time * 1000)
-                tdiff = np.array(pixel_clock_tdiff)
-
-                # obtain the min time difference for the short pulses
-                # where there is less than 0.01% chance of being lower (short pulse)
-                if tdiff.min() < 0.0:
-                    sym_tdiff = tdiff[ tdiff < -tdiff.min()]
-                    mu, sigma = norm.fit(sym_tdiff)
-                    margin_01p = norm.ppf(0.0001,mu,sigma)  # the 0.01% chance
-                else:
-                    margin_01p = tdiff.min() 
-                    
-                margin_2sd = margin_01p - 2*tdiff.std()     # extra safety margin
+                    # store the current line number
+                    self._spm_line_num = line_num
 
-                self._pixel_clock_tdiff[int_time_ms] = { 'n'         : tdiff.shape[0],
-                                                         'mean'      : tdiff.mean(),
-                                                         'stdev'     : tdiff.std(),
-                                                         'min'       : tdiff.min(),
-                                                         'max'       : tdiff.max(),
-                                                         'margin_01p': margin_01p,
-                                                         'margin_2sd': margin_2sd }
-                self._pixel_clock_tdiff_data[int_time_ms] = pixel_clock_tdiff
+                    # if next measurement is not in the reverse way, make a quick stop
+                    # and perform here an optimization first
+                    if self.get_optimize_request():
+                        optimize_request = True
+                        break
+            except Exception:
+                self.log.exception('QAFM line scan failed, the scan is stopped.')
+            finally:
+                self._spm.stop_line_stream()
 
-            # enable the break only if next scan goes into forward movement
-            if self._stop_request and not reverse_meas:
+            if not optimize_request:
                 break
+            next_line = line_num + 1
 
-            # store the current line number
-            self._spm_line_num = line_num
-
-            # if next measurement is not in the reverse way, make a quick stop
-            # and perform here an optimization first
-            if self.get_optimize_request():
-
-                _update_normalization = 0
-                if 'Height(Dac)' in curr_scan_params: _update_normalization += 1 
-                if 'Height(Sen)' in curr_scan_params: _update_normalization += 1 
+            _update_normalization = 0
+            if 'Height(Dac)' in curr_scan_params: _update_normalization += 1 
+            if 'Height(Sen)' in curr_scan_params: _update_normalization += 1 
 
-                self._counter.stop_measurement()
-                self._spm.finish_scan()
+            self._counter.stop_measurement()
+            self._spm.finish_scan()
 
-                self.sigHealthCheckStartSkip.emit()
-                time.sleep(2)
-                self.log.debug('optimizer started.')
+            self.sigHealthCheckStartSkip.emit()
+            time.sleep(2)
+            self.log.debug('optimizer started.')
 
-                self.default_optimize()
-                _, _, _ = self._spm.configure_scanner(mode=ScannerMode.PROBE_CONTACT,
-                                                      params= {'line_points': coord0_num,
-                                                               'meas_params': meas_params},
-                                                      scan_style=ScanStyle.LINE) 
+            self.default_optimize()
+            _, _, _ = self._spm.configure_scanner(mode=ScannerMode.PROBE_CONTACT,
+                                                  params= {'line_points': coord0_num,
+                                                           'meas_params': meas_params},
+                                                  scan_style=ScanStyle.LINE) 
 
-                if 'counts' in meas_params:
-                    self._spm.set_ext_trigger(True)
+            if 'counts' in meas_params:
+                self._spm.set_ext_trigger(True)
 
-                # pixel clock
-                if scan_mode == 'pixel':
-                    self._counter.configure_recorder(
-                        mode=HWRecorderMode.PIXELCLOCK, 
-                        params={'mw_frequency': self._freq1_iso_b_frequency,
-                                'num_meas': coord0_num})
+            # pixel clock
+            if scan_mode == 'pixel':
+                self._counter.configure_recorder(
+                    mode=HWRecorderMode.PIXELCLOCK, 
+                    params={'mw_frequency': self._freq1_iso_b_frequency,
+                            'num_meas': coord0_num})
 
-                # single iso-b
-                elif scan_mode == 'single iso-b':
-                    self._counter.configure_recorder(
-                        mode=HWRecorderMode.PIXELCLOCK_SINGLE_ISO_B,
-                        params={'mw_frequency':self._freq1_iso_b_frequency,
-                                'mw_power': self._iso_b_power, 
-                                'num_meas': coord0_num })
+            # single iso-b
+            elif scan_mode == 'single iso-b':
+                self._counter.configure_recorder(
+                    mode=HWRecorderMode.PIXELCLOCK_SINGLE_ISO_B,
+                    params={'mw_frequency':self._freq1_iso_b_frequency,
+                            'mw_power': self._iso_b_power, 
+                            'num_meas': coord0_num })
 
-                # dual iso-b
-                elif scan_mode == 'dual iso-b':
-                    self._counter.configure_recorder(
-                        mode=HWRecorderMode.PIXELCLOCK_N_ISO_B,
-                        params={'mw_frequency_list': freq_list,
-                                'mw_pulse_lengths': pulse_lengths,
-                                'mw_power': self._iso_b_power,
-                                'mw_n_freq_splits': self._sg_n_iso_b_n_freq_splits,
-                                'mw_laser_cooldown_time': self._sg_n_iso_b_laser_cooldown_length,
-                                'num_meas': coord0_num })
+            # dual iso-b
+            elif scan_mode == 'dual iso-b':
+                self._counter.configure_recorder(
+                    mode=HWRecorderMode.PIXELCLOCK_N_ISO_B,
+                    params={'mw_frequency_list': freq_list,
+                            'mw_pulse_lengths': pulse_lengths,
+                            'mw_power': self._iso_b_power,
+                            'mw_n_freq_splits': self._sg_n_iso_b_n_freq_splits,
+                            'mw_laser_cooldown_time': self._sg_n_iso_b_laser_cooldown_length,
+                            'num_meas': coord0_num })
 
-                # incosistend mode found
-                else:
-                    self.log.error('AFM_logic error; inconsitent modality')
+            # incosistend mode found
+            else:
+                self.log.error('AFM_logic error; inconsitent modality')
 
-                self.log.debug('optimizer finished.')
+            self.log.debug('optimizer finished.')
 
         stop_time_afm_scan = datetime.datetime.now()
         self._afm_meas_duration = self._afm_meas_duration + (stop_time_afm_scan - start_time_afm_scan).total_seconds()
@@ -1571,6 +1625,25 @@ class AFMConfocalLogic(GenericLogic):
 
         return self._qafm_scan_array
 
+    def _read_qafm_counter_line(self, line_index, line):
+        """ Read out the counter for a completed QAFM line and arm it for the next line.
+
+        Called from the acquisition thread of the SPM line stream, before the next
+        line is started, and not from the thread of the counter module. The counter is
+        not thread-safe, so while the stream runs nothing else may access it: the scan
+        loop only reads the lines stored here and arms the counter before the stream
+        starts. An exception stops the line stream, the scan then ends at the line
+        without counter data.
+
+        @param int line_index: index of the completed line in the stream
+        @param numpy.ndarray line: SPM data of the completed line, not used
+        """
+        # The same variables are requested from 'pixel', 'single iso-b', and 'dual iso-b'
+        # if they don't exist, then missing value is returned as None
+        self._qafm_counter_lines[line_index] = \
+            self._counter.get_measurements(['counts', 'int_time', 'counts2', 'counts_diff'])
+        self._counter.start_recorder(arm=True)
+
 
     def start_scan_area_qafm_bw_fw_by_line(self, coord0_start=48*1e-6, coord0_stop=53*1e-6, coord0_num=40,
                             coord1_start=47*1e-6, coord1_stop=52*1e-6, coord1_num=40, integration_time=None,
@@ -1604,18 +1677,32 @@ class AFMConfocalLogic(GenericLogic):
 # ==============================================================================
 
     @staticmethod
-    def calc_mag_field_single_res(res_freq, zero_field=2.87e9, e_field=0.0):
+    def calc_mag_field_single_res(res_freq, zero_field=2.87e9, e_field=0.0, theta=None):
         """ Calculate the magnetic field experience by the NV, assuming low 
             mag. field.
 
+        @param float|numpy.ndarray res_freq: resonance frequency (or map of
+                                             resonance frequencies) in Hz
+        @param float zero_field: Zerofield splitting of NV in Hz
+        @param float e_field: Estimated electrical field on the NV center
+        @param float theta: optional, known angle between field and NV axis
+                            in rad. If given, the field is obtained from the
+                            full NV Hamiltonian (interpolation table), which is
+                            also valid for off-axis fields.
+
+        @return float|numpy.ndarray: the experienced mag. field in Tesla
+
         according to:
         https://iopscience.iop.org/article/10.1088/0034-4885/77/5/056503
 
         """
+        if theta is not None:
+            table = nv_field.field_table(zero_field, e_field)
+            return table.field_from_single_resonance(res_freq, theta)
 
         gyro_nv = 28e9  # gyromagnetic ratio of the NV in Hz/T (would be 28 GHz/T)
 
-        return np.sqrt(abs(res_freq - zero_field)**2 - e_field**2) / gyro_nv
+        return np.sqrt(np.abs(res_freq - zero_field)**2 - e_field**2) / gyro_nv
 
     @staticmethod
     def calc_mag_field_double_res(res_freq_low, res_freq_high, 
@@ -1623,12 +1710,12 @@ class AFMConfocalLogic(GenericLogic):
         """ Calculate the magnetic field experience by the NV, assuming low 
             mag. field by measuring two frequencies.
 
-        @param float res_freq_low: lower resonance frequency in Hz
-        @param float res_freq_high: high resonance frequency in Hz
+        @param float|numpy.ndarray res_freq_low: lower resonance frequency in Hz
+        @param float|numpy.ndarray res_freq_high: high resonance frequency in Hz
         @param float zero_field: Zerofield splitting of NV in Hz
         @param float e_field: Estimated electrical field on the NV center
 
-        @return float: the experiences mag. field of the NV in Tesla
+        @return float|numpy.ndarray: the experiences mag. field of the NV in Tesla
 
         according to:
         https://www.osapublishing.org/josab/fulltext.cfm?uri=josab-33-3-B19&id=335418
@@ -1639,6 +1726,48 @@ class AFMConfocalLogic(GenericLogic):
 
         return np.sqrt((res_freq_low**2 +res_freq_high**2 - res_freq_low*res_freq_high - zero_field**2)/3 - e_field**2) / gyro_nv
 
+    @staticmethod
+    def calc_mag_field_angle_double_res(res_freq_low, res_freq_high,
+                                        zero_field=2.87e9, e_field=0.0):
+        """ Calculate magnitude and angle (to the NV axis) of the magnetic
+            field from both resonance frequencies, without low field
+            approximation.
+
+        @param float|numpy.ndarray res_freq_low: lower resonance frequency in Hz
+        @param float|numpy.ndarray res_freq_high: high resonance frequency in Hz
+        @param float zero_field: Zerofield splitting of NV in Hz
+        @param float e_field: Estimated electrical field on the NV center
+
+        @return tuple: mag. field in Tesla and angle in rad, NaN for pixels
+                       where the frequencies are inconsistent.
+        """
+        return nv_field.field_from_double_resonance(res_freq_low, res_freq_high,
+                                                    zero_field, e_field)
+
+    @staticmethod
+    def calc_iso_b_frequencies(b_field, theta=0.0, fwhm=10e6, upper=False,
+                               zero_field=2.87e9, e_field=0.0):
+        """ Calculate the dual iso-B frequencies for a target field.
+
+        The two frequencies are placed at the inflection points of a
+        Lorentzian resonance (sigma/sqrt(3) from the center, sigma = FWHM/2),
+        where the difference signal is most sensitive to a field change.
+
+        @param float|numpy.ndarray b_field: target field in Tesla
+        @param float|numpy.ndarray theta: angle between field and NV axis in rad
+        @param float fwhm: full width at half maximum of the resonance in Hz
+        @param bool upper: use the upper instead of the lower resonance
+        @param float zero_field: Zerofield splitting of NV in Hz
+        @param float e_field: Estimated electrical field on the NV center
+
+        @return tuple: lower and upper iso-B frequency in Hz
+        """
+        freq_low, freq_high = nv_field.field_table(zero_field, e_field).frequencies(b_field,
+                                                                                   theta)
+        res_freq = freq_high if upper else freq_low
+        d = fwhm / 2 / np.sqrt(3)
+        return res_freq - d, res_freq + d
+
     @staticmethod
     def calc_eps_shift_dual_iso_b(counts1, counts2, freq1, freq2, sigma=None):
         """ Calculate the relative magnetic field in the dual isoB situation, 
@@ -1657,17 +1786,17 @@ class AFMConfocalLogic(GenericLogic):
                 L(x; I, x_0, sigma) =   I * |  --------------------------|
                                             |_ (x_0 - x)^2 + (sigma)^2  _|
 
-        @param float counts1: counts achieved at lower frequency (left of dip) (c/s)
-        @param float counts2: counts achieved at upper frequency (right of dip) (c/s)
+        @param float|numpy.ndarray counts1: counts achieved at lower frequency (left of dip) (c/s)
+        @param float|numpy.ndarray counts2: counts achieved at upper frequency (right of dip) (c/s)
         @param float freq1: lower frequency (Hz)
         @param float freq2: upper frequency (Hz)
         @param float sigma: width of curve at HWHM.  At FWHM, this is 2*sigma
 
-        @return float mag_field: the relative mag. field of the NV in Tesla
+        @return float|numpy.ndarray mag_field: the relative mag. field of the NV in Tesla
         """
+        counts1 = np.asarray(counts1, dtype='float64')
         # protect against /0; ideally counts2 is very large and 1 is ~0
-        c2 = counts2.copy()
-        c2[c2 == 0] = 1
+        c2 = np.where(counts2 == 0, 1, counts2)
 
         ratio = counts1/c2
         d = abs(freq2 - freq1)/2
@@ -1675,24 +1804,16 @@ class AFMConfocalLogic(GenericLogic):
         if sigma is None:
             sigma = d 
 
-        # at ratio = 1, the field is 0
-        mag_field = np.zeros_like(counts1,dtype='float64')
-
-        # using eps1 method, ratio < 1
-        s = ratio < 1
-        operand = 4*d**2 * ( ratio[s]/ (1-ratio[s])**2) -sigma**2
-        operand[operand < 0.0 ] = 0.0
-            
-        mag_field[s] = np.sqrt(operand) - d * ( (1+ratio[s])/(1-ratio[s]))
-
-        # using eps4 method, ratio > 1 
-        s = ratio > 1
-        operand = 4*d**2 * ( ratio[s]/ (ratio[s]-1)**2) -sigma**2
-        operand[operand < 0.0 ] = 0.0
+        # eps1 method for ratio < 1, eps4 method for ratio > 1. Both have the
+        # same form with the sign of (1 - ratio) flipped.
+        # At ratio = 1, the field is 0.
+        sign = np.sign(1 - ratio)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            denom = sign * (1 - ratio)
+            operand = np.maximum(4*d**2 * (ratio / denom**2) - sigma**2, 0.0)
+            mag_field = sign * (np.sqrt(operand) - d * ((1 + ratio) / denom))
 
-        mag_field[s] = -np.sqrt(operand) + d * ( (1+ratio[s])/(ratio[s]-1))
-
-        return mag_field
+        return np.where(sign == 0, 0.0, mag_field)
 
 
 
@@ -1757,7 +1878,8 @@ class AFMConfocalLogic(GenericLogic):
         ret_val = self._counter.configure_recorder(
             mode=HWRecorderMode.ESR,
             params={'mw_frequency_list': freq_list,
-                    'num_meas': num_esr_runs } )
+                    'num_meas': num_esr_runs,
+                    'double_buffer': True } )
                     
         self._mw.set_list(freq_list, mw_power)
                 
@@ -1796,7 +1918,8 @@ class AFMConfocalLogic(GenericLogic):
                                                                     coord0_num,
                                                                     coord1_start, 
                                                                     coord1_stop, 
-                                                                    coord1_num)
+                                                                    coord1_num,
+                                                                    stream_to_disk=self._qafm_stream_to_disk)
             self._scan_counter = 0
 
 
@@ -1942,10 +2065,9 @@ class AFMConfocalLogic(GenericLogic):
                 
                 if reverse_meas:
 
-                    for param_index, param_name in enumerate(curr_scan_params):
-                        name = f'{param_name}_bw'
-
-                        self._qafm_scan_array[name]['data'][line_num // 2][coord0_num-index-1] = self._scan_point[param_index] * self._qafm_scan_array[name]['scale_fac']
+                    self._qafm_buffer.write_point('bw', line_num // 2, coord0_num-index-1,
+                                                  self._scan_point[:len(curr_scan_params)],
+                                                  channels=curr_scan_params)
 
                     # insert number from the back
                     self._esr_scan_array['esr_bw']['data'][line_num// 2][coord0_num-index-1] = esr_meas_mean
@@ -1955,10 +2077,9 @@ class AFMConfocalLogic(GenericLogic):
  
                 else:
 
-                    for param_index, param_name in enumerate(curr_scan_params):
-                        name = f'{param_name}_fw'
-
-                        self._qafm_scan_array[name]['data'][line_num // 2][index] = self._scan_point[param_index] * self._qafm_scan_array[name]['scale_fac']
+                    self._qafm_buffer.write_point('fw', line_num // 2, index,
+                                                  self._scan_point[:len(curr_scan_params)],
+                                                  channels=curr_scan_params)
 
                     self._esr_scan_array['esr_fw']['data'][line_num//2][index] = esr_meas_mean
                     self._esr_scan_array['esr_fw']['data_std'][line_num//2][index] = esr_meas_std
@@ -1966,7 +2087,7 @@ class AFMConfocalLogic(GenericLogic):
                     self._esr_scan_array['esr_fw']['data_fit'][line_num//2][coord0_num-index-1] = esr_data_fit
 
 
-                self.log.info(f'Point: {line_num * coord0_num + index + 1} out of {coord0_num*coord1_num*2}, {(line_num * coord0_num + index +1)/(coord0_num*coord1_num*2) * 100:.2f}% finished.')
+                self._limited_log.progress('scan', line_num * coord0_num + index + 1, coord0_num * coord1_num * 2, 'Point:')
 
                 if index != last_elem:
                     self._afm_pos['x'] += x_step
@@ -1974,14 +2095,18 @@ class AFMConfocalLogic(GenericLogic):
 
                 self._scan_counter += 1
 
-                # emit a signal at every point, so that update can happen in real time.
-                self.sigQAFMLineScanFinished.emit()
+                # notify at the display rate, so that update can happen in real time.
+                self._notify_qafm_update()
                 self._mw.reset_listpos()
 
                 # remove possibility to stop during line scan.
                 if self._stop_request:
                    break
 
+            self._qafm_buffer.complete_line('bw' if reverse_meas else 'fw', line_num // 2)
+            self._notify_qafm_update(force=True)
+            self.sigQAFMLineScanFinished.emit()
+
             # self.log.info(f'Line number {line_num} completed.')
             self.log.info(f'Line number {line_num} completed.')
 
@@ -2017,7 +2142,8 @@ class AFMConfocalLogic(GenericLogic):
                     params={'mw_frequency_list': freq_list,
                             'mw_power': mw_power,
                             'count_frequency': esr_count_freq,
-                            'num_meas': num_esr_runs } )
+                            'num_meas': num_esr_runs,
+                            'double_buffer': True } )
 
                 time.sleep(2)
                 self.sigHealthCheckStopSkip.emit()
@@ -2038,6 +2164,7 @@ class AFMConfocalLogic(GenericLogic):
         self._spm.finish_scan()
         self._mw.off()
         self._counter.stop_measurement()
+        self._limited_log.flush()
         # self.module_state.unlock()
         self.sigQuantiScanFinished.emit()
 
@@ -2166,7 +2293,8 @@ class AFMConfocalLogic(GenericLogic):
         ret_val = self._counter.configure_recorder(
             mode=HWRecorderMode.ESR,
             params={'mw_frequency_list': freq_list,
-                    'num_meas': num_esr_runs } )
+                    'num_meas': num_esr_runs,
+                    'double_buffer': True } )
                     
         self._mw.set_list(freq_list, mw_power)
                 
@@ -2204,7 +2332,8 @@ class AFMConfocalLogic(GenericLogic):
 
             # AFM signal
             self._qafm_scan_array = self.initialize_qafm_scan_array(coord0_start, coord0_stop, coord0_num,
-                                                                    coord1_start, coord1_stop, coord1_num)
+                                                                    coord1_start, coord1_stop, coord1_num,
+                                                                    stream_to_disk=self._qafm_stream_to_disk)
             self._scan_counter = 0
 
             self._esr_scan_array = self.initialize_esr_scan_array(freq_start, freq_stop, freq_points,
@@ -2348,19 +2477,16 @@ class AFMConfocalLogic(GenericLogic):
                 self._scan_point[1] = mag_field
 
                 # save measured data in array:
-                for param_index, param_name in enumerate(curr_scan_params):
-                    name = f'{param_name}_fw'
-
-                    self._qafm_scan_array[name]['data'][line_num][index] = self._scan_point[param_index] * self._qafm_scan_array[name]['scale_fac']
+                self._qafm_buffer.write_point('fw', line_num, index,
+                                              self._scan_point[:len(curr_scan_params)],
+                                              channels=curr_scan_params)
 
                 self._esr_scan_array['esr_fw']['data'][line_num][index] = esr_meas_mean
                 self._esr_scan_array['esr_fw']['data_std'][line_num][index] = esr_meas_std
                 self._esr_scan_array['esr_fw']['data_fit'][line_num][index] = esr_data_fit
 
                 # For debugging, display status text:
-                progress_text = f'Point: {line_num * coord0_num + index + 1} out of {coord0_num * coord1_num }, {(line_num * coord0_num + index + 1) / (coord0_num * coord1_num ) * 100:.2f}% finished.'
-                print(progress_text)
-                self.log.info(progress_text)
+                self._limited_log.progress('scan', line_num * coord0_num + index + 1, coord0_num * coord1_num, 'Point:')
 
                 # track current AFM position:
                 if index != last_elem:
@@ -2369,8 +2495,8 @@ class AFMConfocalLogic(GenericLogic):
 
                 self._scan_counter += 1
 
-                # emit a signal at every point, so that update can happen in real time.
-                self.sigQAFMLineScanFinished.emit()
+                # notify at the display rate, so that update can happen in real time.
+                self._notify_qafm_update()
                 self._mw.reset_listpos()
 
                 # possibility to stop during line scan.
@@ -2380,7 +2506,9 @@ class AFMConfocalLogic(GenericLogic):
             self.log.info(f'Line number {line_num} completed.')
             print(f'Line number {line_num} completed.')
 
-            self.sigQAFMLineScanFinished.emit()   # this triggers repainting of the line
+            self._qafm_buffer.complete_line('fw', line_num)
+            self._notify_qafm_update(force=True)   # this triggers repainting of the line
+            self.sigQAFMLineScanFinished.emit()
             self.sigQuantiLineFinished.emit()     # this signals line is complete, return to new line
 
             # store the current line number
@@ -2414,7 +2542,8 @@ class AFMConfocalLogic(GenericLogic):
                     params={'mw_frequency_list': freq_list,
                             'mw_power': mw_power,
                             'count_frequency': esr_count_freq,
-                            'num_meas': num_esr_runs } )
+                            'num_meas': num_esr_runs,
+                            'double_buffer': True } )
                 time.sleep(2)
                 self.sigHealthCheckStopSkip.emit()
 
@@ -2437,6 +2566,7 @@ class AFMConfocalLogic(GenericLogic):
         self._spm.finish_scan()
         self._mw.off()
         self._counter.stop_measurement()
+        self._limited_log.flush()
         # self.module_state.unlock()
         self.sigQuantiScanFinished.emit()
 
@@ -2597,7 +2727,8 @@ class AFMConfocalLogic(GenericLogic):
                                                                         coord0_num,
                                                                         coord1_start, 
                                                                         coord1_stop, 
-                                                                        coord1_num)
+                                                                        coord1_num,
+                                                                        stream_to_disk=self._qafm_stream_to_disk)
                 self._scan_counter = 0
 
 
@@ -2700,10 +2831,9 @@ class AFMConfocalLogic(GenericLogic):
                     
                     if reverse_meas:
 
-                        for param_index, param_name in enumerate(curr_scan_params):
-                            name = f'{param_name}_bw'
-
-                            self._qafm_scan_array[name]['data'][line_num // 2][coord0_num-index-1] = self._scan_point[param_index] * self._qafm_scan_array[name]['scale_fac']
+                        self._qafm_buffer.write_point('bw', line_num // 2, coord0_num-index-1,
+                                                      self._scan_point[:len(curr_scan_params)],
+                                                      channels=curr_scan_params)
 
                         # insert number from the back
                         self._esr_scan_array['esr_bw']['data'][line_num// 2][coord0_num-index-1] = esr_meas_mean
@@ -2713,10 +2843,9 @@ class AFMConfocalLogic(GenericLogic):
     
                     else:
 
-                        for param_index, param_name in enumerate(curr_scan_params):
-                            name = f'{param_name}_fw'
-
-                            self._qafm_scan_array[name]['data'][line_num // 2][index] = self._scan_point[param_index] * self._qafm_scan_array[name]['scale_fac']
+                        self._qafm_buffer.write_point('fw', line_num // 2, index,
+                                                      self._scan_point[:len(curr_scan_params)],
+                                                      channels=curr_scan_params)
 
                         self._esr_scan_array['esr_fw']['data'][line_num//2][index] = esr_meas_mean
                         self._esr_scan_array['esr_fw']['data_std'][line_num//2][index] = esr_meas_std
@@ -2724,7 +2853,7 @@ class AFMConfocalLogic(GenericLogic):
                         self._esr_scan_array['esr_fw']['data_fit'][line_num//2][coord0_num-index-1] = esr_data_fit
 
 
-                    self.log.info(f'Point: {line_num * coord0_num + index + 1} out of {coord0_num*coord1_num*2}, {(line_num * coord0_num + index +1)/(coord0_num*coord1_num*2) * 100:.2f}% finished.')
+                    self._limited_log.progress('scan', line_num * coord0_num + index + 1, coord0_num * coord1_num * 2, 'Point:')
 
                     if index != last_elem:
                         self._afm_pos['x'] += x_step
@@ -2732,14 +2861,18 @@ class AFMConfocalLogic(GenericLogic):
 
                     self._scan_counter += 1
 
-                    # emit a signal at every point, so that update can happen in real time.
-                    self.sigQAFMLineScanFinished.emit()
+                    # notify at the display rate, so that update can happen in real time.
+                    self._notify_qafm_update()
                     self._mw.reset_listpos()
 
                     # remove possibility to stop during line scan.
                     if self._stop_request:
                         break
 
+                self._qafm_buffer.complete_line('bw' if reverse_meas else 'fw', line_num // 2)
+                self._notify_qafm_update(force=True)
+                self.sigQAFMLineScanFinished.emit()
+
                 # self.log.info(f'Line number {line_num} completed.')
                 self.log.info(f'Line number {line_num} completed.')
 
@@ -2796,6 +2929,7 @@ class AFMConfocalLogic(GenericLogic):
             self._spm.finish_scan()
             self._mw.off()
             self._counter.stop_measurement()
+            self._limited_log.flush()
             # self.module_state.unlock()
             self.sigQuantiScanFinished.emit()
 
@@ -4042,7 +4176,7 @@ class AFMConfocalLogic(GenericLogic):
 #        Perform a scan just in one direction
 # ==============================================================================
 
-    @deprecated('Current function no longer in use; currently it will not work')
+    @deprecated('Current function no longer in use')
     def scan_area_by_line(self, x_start, x_stop, y_start, y_stop, res_x, res_y, 
                           time_forward=1, time_back=1, meas_params=['Height(Dac)']):
         """ Measurement method for a scan by line. An XY area is scanned.
@@ -4068,12 +4202,6 @@ class AFMConfocalLogic(GenericLogic):
         self._scan_counter = 0
         self._line_counter = 0
 
-        # check input values
-        ret_val = self._spm._check_spm_scan_params(x_afm_start=x_start, x_afm_stop=x_stop,
-                                              y_afm_start=y_start, y_afm_stop=y_stop)
-        if ret_val:
-            return self._meas_array_scan
-        
         scan_arr = self.create_scan_leftright2(x_start, x_stop, y_start, y_stop, res_y)
         
         ret_val, _, _ = self._spm.configure_scanner(mode=ScannerMode.PROBE_CONTACT,
@@ -4084,35 +4212,30 @@ class AFMConfocalLogic(GenericLogic):
         if ret_val < 1:
             return self._meas_array_scan
 
-        for scan_coords in scan_arr:
+        # the SPM measures the next line while the current one is processed here
+        line_stream = self._spm.start_line_stream(scan_arr, time_forward=time_forward,
+                                                  time_back=time_back)
+        try:
+            for _, scan_line in line_stream:
 
-            self._spm.configure_line(line_corr0_start=scan_coords[0], 
-                                     line_corr0_stop=scan_coords[1], 
-                                     line_corr1_start=scan_coords[2], 
-                                     line_corr1_stop=scan_coords[3], 
-                                     time_forward=time_forward, 
-                                     time_back=time_back)
-            self.scan_line()
-
-            # this method will wait until the line was measured.
-            scan_line = self._spm.get_measurements(reshape=False)
-
-            if reverse_meas:
-                self._meas_array_scan.append(list(reversed(scan_line)))
-                reverse_meas = False
-            else:
-                self._meas_array_scan.append(scan_line)
-                reverse_meas = True
-                
-            self._scan_counter += 1
-            #self.send_log_message('Line complete.')
+                if reverse_meas:
+                    self._meas_array_scan.append(scan_line[:, ::-1].ravel())
+                    reverse_meas = False
+                else:
+                    self._meas_array_scan.append(scan_line.ravel())
+                    reverse_meas = True
+                    
+                self._scan_counter += 1
+                #self.send_log_message('Line complete.')
 
-            if self._stop_request:
-                break
+                if self._stop_request:
+                    break
+        finally:
+            self._spm.stop_line_stream()
 
         self.log.info('Scan finished. Yeehaa!')
         print('Scan finished. Yeehaa!')
-        self._spm._dev.finish_scan()
+        self._spm.finish_scan()
         
         return self._meas_array_scan
 
@@ -4575,6 +4698,16 @@ class AFMConfocalLogic(GenericLogic):
     def get_qafm_data(self):
         return self._qafm_scan_array
 
+    def _notify_qafm_update(self, force=False):
+        """ Emit sigQAFMDataUpdated with the changed scan directions, at most with
+        the configured display rate unless forced.
+
+        @param bool force: notify regardless of the display rate
+        """
+        directions = self._qafm_buffer.take_dirty(force)
+        if directions:
+            self.sigQAFMDataUpdated.emit(directions)
+
     def get_obj_data(self):
         return self._obj_scan_array
 
@@ -29,9 +29,12 @@ import matplotlib as mpl
 import matplotlib.pyplot as plt
 
 from logic.generic_logic import GenericLogic
+from interface.confocal_scanner_interface import ConfocalFrameScannerInterface
 from core.util.mutex import Mutex
+from core.util.profiling import profiler, profiled
 from core.connector import Connector
 from core.statusvariable import StatusVar
+from core.configoption import ConfigOption
 
 
 class OldConfigFileError(Exception):
@@ -257,6 +260,10 @@ class ConfocalLogic(GenericLogic):
     confocalscanner1 = Connector(interface='ConfocalScannerInterface')
     savelogic = Connector(interface='SaveLogic')
 
+    # config options
+    # scan whole frames in one hardware stream if the scanner supports it
+    _frame_scanning = ConfigOption('frame_scanning', True)
+
     # status vars
     _clock_frequency = StatusVar('clock_frequency', 500)
     return_slowness = StatusVar(default=50)
@@ -299,6 +306,9 @@ class ConfocalLogic(GenericLogic):
         self.depth_scan_dir_is_xz = True
         self.depth_img_is_xz = True
         self.permanent_scan = False
+        self._frame_stream_active = False
+        self._frame_stream_failed = False
+        self._frame_pixels = 0
 
     def on_activate(self):
         """ Initialisation performed during activation of the module.
@@ -595,6 +605,7 @@ class ConfocalLogic(GenericLogic):
             self.set_position('scanner')
             return -1
 
+        self._frame_stream_failed = False
         self.signal_scan_lines_next.emit()
         return 0
 
@@ -624,6 +635,7 @@ class ConfocalLogic(GenericLogic):
             self.set_position('scanner')
             return -1
 
+        self._frame_stream_failed = False
         self.signal_scan_lines_next.emit()
         return 0
 
@@ -632,17 +644,23 @@ class ConfocalLogic(GenericLogic):
 
         @return int: error code (0:OK, -1:error)
         """
+        if self._frame_stream_active:
+            self._frame_stream_active = False
+            try:
+                self._scanning_device.stop_frame_stream()
+            except Exception:
+                self.log.exception('Could not stop the frame stream.')
         try:
             self._scanning_device.close_scanner()
-        except Exception as e:
+        except Exception:
             self.log.exception('Could not close the scanner.')
         try:
             self._scanning_device.close_scanner_clock()
-        except Exception as e:
+        except Exception:
             self.log.exception('Could not close the scanner clock.')
         try:
             self._scanning_device.module_state.unlock()
-        except Exception as e:
+        except Exception:
             self.log.exception('Could not unlock scanning device.')
 
         return 0
@@ -712,6 +730,7 @@ class ConfocalLogic(GenericLogic):
         """
         return self._scanning_device.get_scanner_count_channels()
 
+    @profiled(queued=True)
     def _scan_line(self):
         """scanning an image in either depth or xy
 
@@ -743,7 +762,7 @@ class ConfocalLogic(GenericLogic):
         s_ch = len(self.get_scanner_count_channels())
 
         try:
-            if self._scan_counter == 0:
+            if self._scan_counter == 0 and not self._frame_stream_active:
                 # make a line from the current cursor position to
                 # the starting position of the first scan line of the scan
                 rs = self.return_slowness
@@ -762,57 +781,29 @@ class ConfocalLogic(GenericLogic):
                     self.signal_scan_lines_next.emit()
                     return
 
+            if self._frame_scanning and not self._frame_stream_failed and isinstance(
+                    self._scanning_device, ConfocalFrameScannerInterface):
+                if self._scan_frame_lines(image, n_ch, s_ch):
+                    return
+
             # adjust z of line in image to current z before building the line
             if not self._zscan:
                 z_shape = image[self._scan_counter, :, 2].shape
                 image[self._scan_counter, :, 2] = self._current_z * np.ones(z_shape)
 
             # make a line in the scan, _scan_counter says which one it is
-            lsx = image[self._scan_counter, :, 0]
-            lsy = image[self._scan_counter, :, 1]
-            lsz = image[self._scan_counter, :, 2]
-            if n_ch <= 3:
-                line = np.vstack([lsx, lsy, lsz][0:n_ch])
-            else:
-                line = np.vstack(
-                    [lsx, lsy, lsz, np.ones(lsx.shape) * self._current_a])
+            line = self._build_scan_line(image, self._scan_counter, n_ch)
 
             # scan the line in the scan
-            line_counts = self._scanning_device.scan_line(line, pixel_clock=True)
+            with profiler.section(self._name, 'scan_line', kind='latency'):
+                line_counts = self._scanning_device.scan_line(line, pixel_clock=True)
             if np.any(line_counts == -1):
                 self.stopRequested = True
                 self.signal_scan_lines_next.emit()
                 return
 
             # make a line to go to the starting position of the next scan line
-            if self.depth_img_is_xz or not self._zscan:
-                if n_ch <= 3:
-                    return_line = np.vstack([
-                        self._return_XL,
-                        image[self._scan_counter, 0, 1] * np.ones(self._return_XL.shape),
-                        image[self._scan_counter, 0, 2] * np.ones(self._return_XL.shape)
-                    ][0:n_ch])
-                else:
-                    return_line = np.vstack([
-                            self._return_XL,
-                            image[self._scan_counter, 0, 1] * np.ones(self._return_XL.shape),
-                            image[self._scan_counter, 0, 2] * np.ones(self._return_XL.shape),
-                            np.ones(self._return_XL.shape) * self._current_a
-                        ])
-            else:
-                if n_ch <= 3:
-                    return_line = np.vstack([
-                            image[self._scan_counter, 0, 1] * np.ones(self._return_YL.shape),
-                            self._return_YL,
-                            image[self._scan_counter, 0, 2] * np.ones(self._return_YL.shape)
-                        ][0:n_ch])
-                else:
-                    return_line = np.vstack([
-                            image[self._scan_counter, 0, 1] * np.ones(self._return_YL.shape),
-                            self._return_YL,
-                            image[self._scan_counter, 0, 2] * np.ones(self._return_YL.shape),
-                            np.ones(self._return_YL.shape) * self._current_a
-                        ])
+            return_line = self._build_return_line(image, self._scan_counter, n_ch)
 
             # return the scanner to the start of next line, counts are thrown away
             return_line_counts = self._scanning_device.scan_line(return_line)
@@ -834,24 +825,135 @@ class ConfocalLogic(GenericLogic):
 
             # next line in scan
             self._scan_counter += 1
+            self._check_scan_finished()
 
-            # stop scanning when last line scan was performed and makes scan not continuable
-            if self._scan_counter >= np.size(self._image_vert_axis):
-                if not self.permanent_scan:
-                    self.stop_scanning()
-                    if self._zscan:
-                        self._zscan_continuable = False
-                    else:
-                        self._xyscan_continuable = False
-                else:
-                    self._scan_counter = 0
-
+            profiler.queued(self._name, '_scan_line')
             self.signal_scan_lines_next.emit()
         except:
             self.log.exception('The scan went wrong, killing the scanner.')
             self.stop_scanning()
             self.signal_scan_lines_next.emit()
 
+    def _scan_frame_lines(self, image, n_ch, s_ch):
+        """ Scan the image with one frame stream of the scanning device.
+
+        The remaining lines of the image (including the return lines) are uploaded at the first
+        call. Every call stores the lines completed since the last call.
+
+        @param numpy.ndarray image: the image being scanned
+        @param int n_ch: number of scanner axes
+        @param int s_ch: number of count channels
+
+        @return bool: False if the frame stream could not be started, scan line by line instead
+        """
+        if not self._frame_stream_active:
+            rows = range(self._scan_counter, image.shape[0])
+            if not self._zscan:
+                image[self._scan_counter:, :, 2] = self._current_z
+            frame = np.hstack([np.hstack((self._build_scan_line(image, row, n_ch),
+                                          self._build_return_line(image, row, n_ch)))
+                               for row in rows])
+            self._frame_pixels = image.shape[1]
+            samples_per_line = frame.shape[1] // len(rows)
+            if self._scanning_device.start_frame_stream(frame, samples_per_line,
+                                                        pixel_clock=True) < 0:
+                self.log.warning('Scanning device could not scan the whole frame at once. '
+                                 'Scanning line by line instead.')
+                self._frame_stream_failed = True
+                return False
+            self._frame_stream_active = True
+
+        with profiler.section(self._name, 'read_lines', kind='latency'):
+            lines = self._scanning_device.read_lines()
+        if np.any(lines == -1):
+            self.stopRequested = True
+            self.signal_scan_lines_next.emit()
+            return True
+
+        for line_counts in lines:
+            image[self._scan_counter, :, 3:3 + s_ch] = line_counts[:self._frame_pixels]
+            self._scan_counter += 1
+            if self._scan_counter >= image.shape[0]:
+                break
+        if len(lines) > 0:
+            if self._zscan:
+                self.signal_depth_image_updated.emit()
+            else:
+                self.signal_xy_image_updated.emit()
+
+        if self._scan_counter >= image.shape[0]:
+            self._frame_stream_active = False
+            self._scanning_device.stop_frame_stream()
+            self._check_scan_finished()
+
+        profiler.queued(self._name, '_scan_line')
+        self.signal_scan_lines_next.emit()
+        return True
+
+    def _check_scan_finished(self):
+        """ Stop the scan or start it over after the last line has been scanned. """
+        # stop scanning when last line scan was performed and makes scan not continuable
+        if self._scan_counter >= np.size(self._image_vert_axis):
+            if not self.permanent_scan:
+                self.stop_scanning()
+                if self._zscan:
+                    self._zscan_continuable = False
+                else:
+                    self._xyscan_continuable = False
+            else:
+                self._scan_counter = 0
+
+    def _build_scan_line(self, image, row, n_ch):
+        """ Scanner positions of one line of the image.
+
+        @param numpy.ndarray image: the image being scanned
+        @param int row: index of the line in the image
+        @param int n_ch: number of scanner axes
+
+        @return numpy.ndarray: positions of the line, shape (n_ch, pixels)
+        """
+        lsx = image[row, :, 0]
+        lsy = image[row, :, 1]
+        lsz = image[row, :, 2]
+        if n_ch <= 3:
+            return np.vstack([lsx, lsy, lsz][0:n_ch])
+        return np.vstack([lsx, lsy, lsz, np.ones(lsx.shape) * self._current_a])
+
+    def _build_return_line(self, image, row, n_ch):
+        """ Scanner positions to go back from the end of a line to the start of the next one.
+
+        @param numpy.ndarray image: the image being scanned
+        @param int row: index of the line in the image
+        @param int n_ch: number of scanner axes
+
+        @return numpy.ndarray: positions of the return line, shape (n_ch, return_slowness)
+        """
+        if self.depth_img_is_xz or not self._zscan:
+            if n_ch <= 3:
+                return np.vstack([
+                    self._return_XL,
+                    image[row, 0, 1] * np.ones(self._return_XL.shape),
+                    image[row, 0, 2] * np.ones(self._return_XL.shape)
+                ][0:n_ch])
+            return np.vstack([
+                    self._return_XL,
+                    image[row, 0, 1] * np.ones(self._return_XL.shape),
+                    image[row, 0, 2] * np.ones(self._return_XL.shape),
+                    np.ones(self._return_XL.shape) * self._current_a
+                ])
+        if n_ch <= 3:
+            return np.vstack([
+                    image[row, 0, 1] * np.ones(self._return_YL.shape),
+                    self._return_YL,
+                    image[row, 0, 2] * np.ones(self._return_YL.shape)
+                ][0:n_ch])
+        return np.vstack([
+                image[row, 0, 1] * np.ones(self._return_YL.shape),
+                self._return_YL,
+                image[row, 0, 2] * np.ones(self._return_YL.shape),
+                np.ones(self._return_YL.shape) * self._current_a
+            ])
+
     def save_xy_data(self, colorscale_range=None, percentile_range=None, block=True):
         """ Save the current confocal xy data to file.
 
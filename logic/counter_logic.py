@@ -26,10 +26,12 @@ import time
 import matplotlib.pyplot as plt
 
 from core.connector import Connector
+from core.configoption import ConfigOption
 from core.statusvariable import StatusVar
 from logic.generic_logic import GenericLogic
 from interface.slow_counter_interface import CountingMode
 from core.util.mutex import Mutex
+from core.util.profiling import profiler, profiled
 
 
 class CounterLogic(GenericLogic):
@@ -54,11 +56,18 @@ class CounterLogic(GenericLogic):
     sigSavingStatusChanged = QtCore.Signal(bool)
     sigCountStatusChanged = QtCore.Signal(bool)
     sigCountingModeChanged = QtCore.Signal(CountingMode)
+    sigLostSamplesChanged = QtCore.Signal(int)
 
     # declare connectors
     counter1 = Connector(interface='SlowCounterInterface')
     savelogic = Connector(interface='SaveLogic')
 
+    # config options
+    # circular buffer of the hardware in the counting modes it can stream in, in samples
+    _stream_buffer_length = ConfigOption('stream_buffer_length', 2**20)
+    # time between two reads of the stream in s
+    _stream_read_interval = ConfigOption('stream_read_interval', 0.05)
+
     # status vars
     _count_length = StatusVar('count_length', 300)
     _smooth_window_length = StatusVar('smooth_window_length', 10)
@@ -118,6 +127,13 @@ class CounterLogic(GenericLogic):
         self._already_counted_samples = 0  # For gated counting
         self._data_to_save = []
 
+        # hardware stream of the gated counting modes
+        self._streaming = False
+        self._stream_data = np.zeros([len(self.get_channels()), 0])
+        self._stream_remainder = np.zeros([len(self.get_channels()), 0])
+        self._last_stream_read = 0
+        self._lost_samples = 0
+
         # Flag to stop the loop
         self.stopRequested = False
 
@@ -381,6 +397,14 @@ class CounterLogic(GenericLogic):
         """
         return self._counting_mode
 
+    def get_lost_samples(self):
+        """ Number of samples per channel the hardware stream lost since the counter was started
+        because its buffer overflowed.
+
+        @return int: number of lost samples
+        """
+        return self._lost_samples
+
     # FIXME: Not implemented for self._counting_mode == 'gated'
     def startCount(self):
         """ This is called externally, and is basically a wrapper that
@@ -412,7 +436,11 @@ class CounterLogic(GenericLogic):
                 return -1
 
             # Set up counter
-            if self._counting_mode == CountingMode['FINITE_GATED']:
+            self._streaming = self._counting_mode in constraints.streaming_counting_mode
+            if self._streaming:
+                counter_status = self._counting_device.start_counter_stream(
+                    buffer_length=self._stream_buffer_length)
+            elif self._counting_mode == CountingMode['FINITE_GATED']:
                 counter_status = self._counting_device.set_up_counter(counter_buffer=self._count_length)
             # elif self._counting_mode == CountingMode['GATED']:
             #
@@ -433,6 +461,14 @@ class CounterLogic(GenericLogic):
             # the sample index for gated counting
             self._already_counted_samples = 0
 
+            if self._streaming:
+                self._stream_data = np.zeros([len(self.get_channels()),
+                                              self._stream_buffer_length])
+                self._stream_remainder = np.zeros([len(self.get_channels()), 0])
+                self._last_stream_read = time.time()
+                self._lost_samples = 0
+                self.sigLostSamplesChanged.emit(self._lost_samples)
+
             # Start data reader loop
             self.sigCountStatusChanged.emit(True)
             self.sigCountDataNext.emit()
@@ -446,6 +482,7 @@ class CounterLogic(GenericLogic):
                 self.stopRequested = True
         return
 
+    @profiled(queued=True)
     def count_loop_body(self):
         """ This method gets the count data from the hardware for the continuous counting mode (default).
 
@@ -453,6 +490,12 @@ class CounterLogic(GenericLogic):
         to sigCountContinuousNext and emitting sigCountContinuousNext through a queued connection.
         """
         if self.module_state() == 'locked':
+            if self._streaming:
+                # the hardware buffers the samples, so wait for the next read instead of
+                # polling an empty buffer
+                remaining = self._last_stream_read + self._stream_read_interval - time.time()
+                if remaining > 0:
+                    time.sleep(remaining)
             with self.threadlock:
                 # check for aborts of the thread in break if necessary
                 if self.stopRequested:
@@ -467,23 +510,29 @@ class CounterLogic(GenericLogic):
                     self.sigCounterUpdated.emit()
                     return
 
-                # read the current counter value
-                self.rawdata = self._counting_device.get_counter(samples=self._counting_samples)
-                if self.rawdata[0, 0] < 0:
-                    self.log.error('The counting went wrong, killing the counter.')
-                    self.stopRequested = True
+                if self._streaming:
+                    self._read_counter_stream()
                 else:
-                    if self._counting_mode == CountingMode['CONTINUOUS']:
-                        self._process_data_continous()
-                    elif self._counting_mode == CountingMode['GATED']:
-                        self._process_data_gated()
-                    elif self._counting_mode == CountingMode['FINITE_GATED']:
-                        self._process_data_finite_gated()
+                    # read the current counter value
+                    with profiler.section(self._name, 'get_counter', kind='latency'):
+                        self.rawdata = self._counting_device.get_counter(
+                            samples=self._counting_samples)
+                    if self.rawdata[0, 0] < 0:
+                        self.log.error('The counting went wrong, killing the counter.')
+                        self.stopRequested = True
                     else:
-                        self.log.error('No valid counting mode set! Can not process counter data.')
+                        if self._counting_mode == CountingMode['CONTINUOUS']:
+                            self._process_data_continous()
+                        elif self._counting_mode == CountingMode['GATED']:
+                            self._process_data_gated()
+                        elif self._counting_mode == CountingMode['FINITE_GATED']:
+                            self._process_data_finite_gated()
+                        else:
+                            self.log.error('No valid counting mode set! Can not process counter data.')
 
             # call this again from event loop
             self.sigCounterUpdated.emit()
+            profiler.queued(self._name, 'count_loop_body')
             self.sigCountDataNext.emit()
         return
 
@@ -638,6 +687,111 @@ class CounterLogic(GenericLogic):
             self._already_counted_samples += len(self.rawdata[0])
         return
 
+    def _read_counter_stream(self):
+        """
+        Reads all samples the hardware acquired since the last read and processes them at once
+        """
+        self._last_stream_read = time.time()
+        with profiler.section(self._name, 'read_available_counts', kind='latency'):
+            samples = self._counting_device.read_available_counts_into_buffer(self._stream_data)
+        if samples < 0:
+            self.log.error('The counting went wrong, killing the counter.')
+            self.stopRequested = True
+            return
+
+        lost_samples = self._counting_device.get_lost_samples()
+        if lost_samples > self._lost_samples:
+            self.log.warning('The counter buffer overflowed, {0:d} samples were lost. Increase '
+                             'stream_buffer_length or decrease stream_read_interval.'
+                             ''.format(lost_samples - self._lost_samples))
+            self._lost_samples = lost_samples
+            self.sigLostSamplesChanged.emit(self._lost_samples)
+
+        if samples > 0:
+            if self._counting_mode == CountingMode['GATED']:
+                self._process_stream_gated(self._stream_data[:, :samples])
+            elif self._counting_mode == CountingMode['FINITE_GATED']:
+                self._process_stream_finite_gated(self._stream_data[:, :samples])
+            else:
+                self.log.error('No valid counting mode set! Can not process counter data.')
+        return
+
+    def _process_stream_gated(self, data):
+        """
+        Processes a block of samples from the hardware stream, the samples are averaged in
+        bins of counting_samples.
+
+        @param numpy.ndarray data: samples, shape (channels, samples)
+        """
+        # complete the bin started with the last block
+        if self._stream_remainder.shape[1] > 0:
+            data = np.concatenate((self._stream_remainder, data), axis=1)
+        bins = data.shape[1] // self._counting_samples
+        binned_samples = bins * self._counting_samples
+        self._stream_remainder = data[:, binned_samples:].copy()
+        if bins == 0:
+            return
+
+        binned = data[:, :binned_samples].reshape(
+            (data.shape[0], bins, self._counting_samples)).mean(axis=2)
+        self._append_counts(binned)
+
+        # save the data if necessary
+        if self._saving:
+            self._sampling_data = np.empty((binned_samples, data.shape[0] + 1))
+            self._sampling_data[:, 0] = time.time() - self._saving_start_time
+            self._sampling_data[:, 1:] = data[:, :binned_samples].transpose()
+            self._data_to_save.extend(list(self._sampling_data))
+        return
+
+    def _process_stream_finite_gated(self, data):
+        """
+        Processes a block of samples from the hardware stream and stops the counter once
+        count_length samples were acquired.
+
+        @param numpy.ndarray data: samples, shape (channels, samples)
+        """
+        needed_counts = self._count_length - self._already_counted_samples
+        self._append_counts(data[:, :needed_counts])
+        self._already_counted_samples += min(data.shape[1], needed_counts)
+        if self._already_counted_samples >= self._count_length:
+            self._already_counted_samples = 0
+            self.stopRequested = True
+        return
+
+    def _append_counts(self, counts):
+        """
+        Appends a block of new values to the circular count arrays and updates the running
+        median of the new values.
+
+        @param numpy.ndarray counts: new values, shape (channels, values)
+        """
+        length = self.countdata.shape[1]
+        counts = counts[:, -length:]
+        new = counts.shape[1]
+
+        # move the arrays to the left by the number of new values at once
+        self.countdata[:, :length - new] = self.countdata[:, new:]
+        self.countdata[:, length - new:] = counts
+        self.countdata_smoothed[:, :length - new] = self.countdata_smoothed[:, new:]
+
+        # Median of the window ending at every new value. As in _process_data_continous it is
+        # stored half a window before the window end, the last half window holds the median of
+        # the most recent window.
+        window = max(1, min(self._smooth_window_length, length))
+        half_window = int(window / 2)
+        first_end = max(length - new, window - 1)
+        windows = np.lib.stride_tricks.as_strided(
+            self.countdata[:, first_end - window + 1:],
+            shape=(self.countdata.shape[0], length - first_end, window),
+            strides=(self.countdata.strides[0], self.countdata.strides[1],
+                     self.countdata.strides[1]),
+            writeable=False)
+        medians = np.median(windows, axis=2)
+        self.countdata_smoothed[:, first_end - half_window:length - half_window] = medians
+        self.countdata_smoothed[:, length - half_window - 1:] = medians[:, -1:]
+        return
+
     def _stopCount_wait(self, timeout=5.0):
         """
         Stops the counter and waits until it actually has stopped.
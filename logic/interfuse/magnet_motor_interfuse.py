@@ -129,6 +129,19 @@ class MagnetMotorInterfuse(GenericLogic, MagnetInterface):
         return self._motor_device.get_pos(param_list)
 
 
+    def get_motion_future(self, target=None, tolerance=None, timeout=None):
+        """ Get a future which is resolved when the current movement has finished.
+
+        @param dict target: optional, absolute target position of the movement
+        @param float tolerance: optional, allowed deviation from the target
+        @param float timeout: optional, the future fails with a TimeoutError after this many
+                              seconds.
+
+        @return concurrent.futures.Future: resolved with the position dict after the movement
+        """
+        return self._motor_device.get_motion_future(target, tolerance, timeout)
+
+
     def get_status(self, param_list=None):
         """ Get the status of the position
 
@@ -27,6 +27,7 @@ import time
 from collections import OrderedDict
 from core.connector import Connector
 from core.statusvariable import StatusVar
+from core.util.path_planning import order_pathway
 from logic.generic_logic import GenericLogic
 from qtpy import QtCore
 from interface.slow_counter_interface import CountingMode
@@ -82,6 +83,10 @@ class MagnetLogic(GenericLogic):
     align_2d_axis1_step = StatusVar('align_2d_axis1_step', 1e-3)
     align_2d_axis1_vel = StatusVar('align_2d_axis1_vel', 10e-6)
     curr_2d_pathway_mode = StatusVar('curr_2d_pathway_mode', 'snake-wise')
+    # adaptive alignment: coarse-to-fine search for the best point instead of the full raster
+    align_2d_adaptive = StatusVar('align_2d_adaptive', False)
+    # True if the alignment measurement value has to be maximized, False to minimize it
+    align_2d_adaptive_maximize = StatusVar('align_2d_adaptive_maximize', True)
 
     _checktime = StatusVar('_checktime', 2.5)
     _1D_axis0_data = StatusVar('_1D_axis0_data', default=np.arange(3))
@@ -144,6 +149,7 @@ class MagnetLogic(GenericLogic):
     _sigStepwiseAlignmentNext = QtCore.Signal()
     _sigContinuousAlignmentNext = QtCore.Signal()
     _sigInitializeMeasPos = QtCore.Signal(bool)  # signal to go to the initial measurement position
+    _sigMotionFinished = QtCore.Signal(object)  # (future, callback) of a finished movement
     sigPosReached = QtCore.Signal()
 
     # signals if new data are writen to the data arrays (during measurement):
@@ -215,8 +221,10 @@ class MagnetLogic(GenericLogic):
         self._sigInitializeMeasPos.connect(self._move_to_curr_pathway_index)
         self._sigStepwiseAlignmentNext.connect(self._stepwise_loop_body,
                                                QtCore.Qt.QueuedConnection)
+        self._sigMotionFinished.connect(self._motion_finished, QtCore.Qt.QueuedConnection)
 
-        self.pathway_modes = ['spiral-in', 'spiral-out', 'snake-wise', 'diagonal-snake-wise']
+        self.pathway_modes = ['spiral-in', 'spiral-out', 'snake-wise', 'diagonal-snake-wise',
+                              'travel-time']
 
         # relative movement settings
 
@@ -323,7 +331,6 @@ class MagnetLogic(GenericLogic):
         """
 
         self.sigMoveRel.emit(param_dict)
-        # self._check_position_reached_loop(start_pos, end_pos)
         # self.sigPosChanged.emit(param_dict)
         return param_dict
 
@@ -346,8 +353,6 @@ class MagnetLogic(GenericLogic):
         # start_pos = self.get_pos(list(param_dict))
         self.sigMoveAbs.emit(param_dict)
 
-        # self._check_position_reached_loop(start_pos, param_dict)
-
         # self.sigPosChanged.emit(param_dict)
         return param_dict
 
@@ -617,8 +622,127 @@ class MagnetLogic(GenericLogic):
                                         'index': (axis0_index, axis1_index)}
                 path_index += 1
 
+        if self.curr_2d_pathway_mode == 'travel-time':
+            pathway, back_map = order_pathway(pathway, back_map,
+                                              self.get_hardware_constraints(), init_pos)
+
+        return pathway, back_map
+
+    def _adaptive_initial_indices(self):
+        """ Matrix indices of the coarse grid an adaptive alignment starts with.
+
+        @return list: (axis0_index, axis1_index) tuples in snake-wise order
+
+        The grid spacing (stride) is the largest power of 2 which still gives at least 3 points
+        along the longer axis. The stride is halved whenever the best point is surrounded by
+        measured points, see _extend_adaptive_pathway.
+        """
+        num_axis0, num_axis1 = np.shape(self._2D_data_matrix)
+        self._adaptive_measured = np.zeros((num_axis0, num_axis1), dtype=bool)
+        self._adaptive_stride = 1
+        while 2 * self._adaptive_stride <= (max(num_axis0, num_axis1) - 1) / 2:
+            self._adaptive_stride *= 2
+
+        axis0_indices = np.unique(np.append(np.arange(0, num_axis0, self._adaptive_stride),
+                                            num_axis0 - 1))
+        axis1_indices = np.unique(np.append(np.arange(0, num_axis1, self._adaptive_stride),
+                                            num_axis1 - 1))
+        indices = []
+        for ii, axis1_index in enumerate(axis1_indices):
+            row = axis0_indices if ii % 2 == 0 else axis0_indices[::-1]
+            indices.extend((int(axis0_index), int(axis1_index)) for axis0_index in row)
+        return indices
+
+    def _create_2d_adaptive_pathway(self, indices, axis0_vel=None, axis1_vel=None,
+                                    start_index=0):
+        """ Create pathway and back map entries for arbitrary points of the alignment matrix.
+
+        @param list indices: (axis0_index, axis1_index) tuples of the points to visit
+        @param float axis0_vel: velocity of axis0, None to keep the current one
+        @param float axis1_vel: velocity of axis1, None to keep the current one
+        @param int start_index: pathway index of the first point
+
+        @return tuple(list, dict): pathway and back map with the same structure as created by
+                                   _create_2d_pathway
+        """
+        pathway = []
+        back_map = dict()
+        for path_index, (axis0_index, axis1_index) in enumerate(indices, start_index):
+            axis0_pos = round(self._2D_axis0_data[axis0_index], 7)
+            axis1_pos = round(self._2D_axis1_data[axis1_index], 7)
+            step_config = dict()
+            step_config[self.align_2d_axis0_name] = {'move_abs': axis0_pos}
+            step_config[self.align_2d_axis1_name] = {'move_abs': axis1_pos}
+            if axis0_vel is not None:
+                step_config[self.align_2d_axis0_name]['move_vel'] = axis0_vel
+            if axis1_vel is not None:
+                step_config[self.align_2d_axis1_name]['move_vel'] = axis1_vel
+            pathway.append(step_config)
+            back_map[path_index] = {self.align_2d_axis0_name: axis0_pos,
+                                    self.align_2d_axis1_name: axis1_pos,
+                                    'index': (axis0_index, axis1_index)}
         return pathway, back_map
 
+    def _extend_adaptive_pathway(self):
+        """ Append the next points of an adaptive alignment to the pathway.
+
+        The neighbours (at the current stride) of the best point measured so far are measured
+        next. If all of them are known already, the stride is halved. The alignment has
+        converged when all direct neighbours of the best point are measured.
+
+        @return int: number of appended points, 0 if the alignment has converged
+        """
+        for entry in self._backmap.values():
+            self._adaptive_measured[entry['index']] = True
+        values = np.where(self._adaptive_measured, self._2D_data_matrix,
+                          -np.inf if self.align_2d_adaptive_maximize else np.inf)
+        if self.align_2d_adaptive_maximize:
+            best = np.unravel_index(np.argmax(values), values.shape)
+        else:
+            best = np.unravel_index(np.argmin(values), values.shape)
+
+        while True:
+            candidates = []
+            for axis0_step in (-1, 0, 1):
+                for axis1_step in (-1, 0, 1):
+                    index = (best[0] + axis0_step * self._adaptive_stride,
+                             best[1] + axis1_step * self._adaptive_stride)
+                    if (0 <= index[0] < values.shape[0] and 0 <= index[1] < values.shape[1]
+                            and not self._adaptive_measured[index]):
+                        candidates.append((int(index[0]), int(index[1])))
+            if candidates or self._adaptive_stride == 1:
+                break
+            self._adaptive_stride //= 2
+
+        if not candidates:
+            self.log.info('Adaptive alignment converged after {0:d} of {1:d} points at matrix '
+                          'index {2}.'.format(int(np.sum(self._adaptive_measured)),
+                                              values.size, tuple(int(i) for i in best)))
+            return 0
+
+        # visit the candidates in the order of the shortest travel time from the last point
+        pathway, back_map = self._create_2d_adaptive_pathway(candidates,
+                                                             self.align_2d_axis0_vel,
+                                                             self.align_2d_axis1_vel)
+        pathway, back_map = order_pathway(pathway, back_map, self.get_hardware_constraints(),
+                                          self._backmap[len(self._pathway) - 1])
+        for index, entry in back_map.items():
+            self._backmap[len(self._pathway) + index] = entry
+        self._pathway.extend(pathway)
+        return len(candidates)
+
+    def set_align_2d_adaptive(self, adaptive, maximize=None):
+        """ Switch between the full raster and the adaptive search for 2D alignments.
+
+        @param bool adaptive: True to use the adaptive search
+        @param bool maximize: True to search for the maximum of the measurement value, False for
+                              the minimum. None keeps the current setting.
+        """
+        self.align_2d_adaptive = bool(adaptive)
+        if maximize is not None:
+            self.align_2d_adaptive_maximize = bool(maximize)
+        return self.align_2d_adaptive
+
     def _create_2d_cont_pathway(self, pathway):
 
         # go through the passed 1D path and reduce the whole movement just to
@@ -694,7 +818,12 @@ class MagnetLogic(GenericLogic):
 
         # start measurement value
 
-
+        # the next points of an adaptive alignment are chosen after every measured point,
+        # which only the stepwise loop does
+        if self.align_2d_adaptive and not stepwise_meas:
+            self.log.error('The adaptive 2D alignment is only available for stepwise '
+                           'measurements. Switch off align_2d_adaptive or measure stepwise.')
+            return -1
 
         self._start_measurement_time = datetime.datetime.now()
         self._stop_measurement_time = None
@@ -740,9 +869,10 @@ class MagnetLogic(GenericLogic):
                                                                    self.align_2d_axis1_vel)
 
             # determine the start point, either relative or absolute!
-            # Now the absolute position will be used:
-            axis0_start = self._backmap[0][self.align_2d_axis0_name]
-            axis1_start = self._backmap[0][self.align_2d_axis1_name]
+            # Now the absolute position will be used (the lowest values, since the
+            # pathway does not necessarily start there):
+            axis0_start = min(entry[self.align_2d_axis0_name] for entry in self._backmap.values())
+            axis1_start = min(entry[self.align_2d_axis1_name] for entry in self._backmap.values())
 
             prepared_graph = self._prepare_2d_graph(
                 axis0_start,
@@ -756,6 +886,15 @@ class MagnetLogic(GenericLogic):
 
             self._2D_add_data_matrix = np.zeros(shape=np.shape(self._2D_data_matrix), dtype=object)
 
+            if self.align_2d_adaptive:
+                # replace the full raster by the points of the coarsest search grid. More points
+                # are appended by _extend_adaptive_pathway while the measurement runs. Points
+                # which are never visited stay NaN and are not mistaken for measured zeros.
+                self._2D_data_matrix = np.full(np.shape(self._2D_data_matrix), np.nan)
+                self._pathway, self._backmap = self._create_2d_adaptive_pathway(
+                    self._adaptive_initial_indices(), self.align_2d_axis0_vel,
+                    self.align_2d_axis1_vel)
+
             if stepwise_meas:
                 # just make it to an empty dict
                 self._pathway_cont = dict()
@@ -797,16 +936,15 @@ class MagnetLogic(GenericLogic):
         # self.set_velocity(move_dict_vel)
         self._magnet_device.move_abs(move_dict_abs)
         # self.move_rel(move_dict_rel)
-        while self._check_is_moving():
-            time.sleep(self._checktime)
-            self.log.debug("Went into while loop in _move_to_curr_pathway_index")
 
-        # this function will return to this function if position is reached:
-        start_pos = self._saved_pos_before_align
-        end_pos = dict()
-        for axis_name in self._saved_pos_before_align:
-            end_pos[axis_name] = self._backmap[self._pathway_index][axis_name]
+        # start the alignment loop as soon as the position is reached
+        self._after_motion(move_dict_abs, lambda: self._start_alignment_loop(stepwise_meas))
 
+    def _start_alignment_loop(self, stepwise_meas):
+        """ Start the alignment loop after the first position has been reached.
+
+        @param bool stepwise_meas: True for a stepwise, False for a continuous alignment
+        """
         self.log.debug("(first movement) magnet moving ? {0}".format(self._check_is_moving()))
 
         if stepwise_meas:
@@ -868,6 +1006,10 @@ class MagnetLogic(GenericLogic):
         # increase the index
         self._pathway_index += 1
 
+        # choose the next points of an adaptive alignment from the results so far
+        if self.align_2d_adaptive and self._pathway_index >= len(self._pathway):
+            self._extend_adaptive_pathway()
+
         if self._pathway_index < len(self._pathway):
 
             #
@@ -880,21 +1022,8 @@ class MagnetLogic(GenericLogic):
             # self.set_velocity(move_dict_vel)
             self._magnet_device.move_abs(move_dict_abs)
 
-            while self._check_is_moving():
-                time.sleep(self._checktime)
-                self.log.debug("Went into while loop in stepwise_loop_body")
-
-            self.log.debug("stepwise_loop_body reports magnet moving ? {0}".format(self._check_is_moving()))
-
-            # this function will return to this function if position is reached:
-            start_pos = dict()
-            end_pos = dict()
-            for axis_name in self._saved_pos_before_align:
-                start_pos[axis_name] = self._backmap[self._pathway_index - 1][axis_name]
-                end_pos[axis_name] = self._backmap[self._pathway_index][axis_name]
-
-            # rerun this loop again
-            self._sigStepwiseAlignmentNext.emit()
+            # rerun this loop again as soon as the next position is reached
+            self._after_motion(move_dict_abs, self._sigStepwiseAlignmentNext.emit)
 
         else:
             self._end_alignment_procedure()
@@ -934,10 +1063,11 @@ class MagnetLogic(GenericLogic):
             last_pos[axis_name] = self._backmap[self._pathway_index - 1][axis_name]
 
         self._magnet_device.move_abs(self._saved_pos_before_align)
+        self._after_motion(self._saved_pos_before_align, self._finish_alignment)
 
-        while self._check_is_moving():
-            time.sleep(self._checktime)
-
+    def _finish_alignment(self):
+        """ Report the end of the alignment after the magnet is back at its initial position.
+        """
         self.sigMeasurementFinished.emit()
 
         self._pathway_index = 0
@@ -947,55 +1077,34 @@ class MagnetLogic(GenericLogic):
 
         pass
 
-    def _check_position_reached_loop(self, start_pos_dict, end_pos_dict):
-        """ Perform just a while loop, which checks everytime the conditions
-
-        @param dict start_pos_dict: the position in this dictionary must be
-                                    absolute positions!
-        @param dict end_pos_dict:
-        @param float checktime: the checktime in seconds
+    def _after_motion(self, target, callback):
+        """ Call a method in the thread of this module when the current movement has finished.
 
-        @return:
-
-        Whenever the magnet has passed 95% of the way, the method will return.
-
-        Check also whether the difference in position increases again, and if so
-        stop the measurement and raise an error, since either the velocity was
-        too fast or the magnet does not move further.
+        @param dict target: absolute target position of the movement
+        @param callable callback: method called without arguments after the movement
         """
+        future = self._magnet_device.get_motion_future(target=target)
+        future.add_done_callback(lambda f: self._sigMotionFinished.emit((f, callback)))
 
-        distance_init = 0.0
-        constraints = self.get_hardware_constraints()
-        minimal_distance = 0.0
-        for axis_label in start_pos_dict:
-            distance_init = (end_pos_dict[axis_label] - start_pos_dict[axis_label]) ** 2
-            minimal_distance = minimal_distance + (constraints[axis_label]['pos_step']) ** 2
-        distance_init = np.sqrt(distance_init)
-        minimal_distance = np.sqrt(minimal_distance)
-
-        # take 97% distance tolerance:
-        distance_tolerance = 0.03 * distance_init
-
-        current_dist = 0.0
+    def _motion_finished(self, future_callback):
+        """ Continue after a movement, see _after_motion.
 
-        while True:
-            time.sleep(self._checktime)
-
-            curr_pos = self.get_pos(list(end_pos_dict))
-
-            for axis_label in start_pos_dict:
-                current_dist = (end_pos_dict[axis_label] - curr_pos[axis_label]) ** 2
-
-            current_dist = np.sqrt(current_dist)
-
-            self.sigPosChanged.emit(curr_pos)
-
-            if (current_dist <= distance_tolerance) or (current_dist <= minimal_distance) or self._stop_measure:
-                self.sigPosReached.emit()
-
-                break
-
-                # return either pos reached signal of check position
+        @param tuple future_callback: the future of the movement and the method to call
+        """
+        future, callback = future_callback
+        if future.cancelled():
+            error = 'waiting for the end of the movement was cancelled'
+        elif future.exception() is not None:
+            error = 'the end of the movement could not be determined: {0}'.format(
+                future.exception())
+        else:
+            self.sigPosChanged.emit(future.result())
+            callback()
+            return
+        # the position was never confirmed, do not measure there
+        self.log.error('Magnet alignment aborted, {0}.'.format(error))
+        self._stop_measure = True
+        self._finish_alignment()
 
     def _check_is_moving(self):
         """
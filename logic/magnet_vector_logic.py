@@ -27,6 +27,7 @@ import time
 from collections import OrderedDict
 from core.connector import Connector
 from core.statusvariable import StatusVar
+from core.util.path_planning import order_pathway
 from logic.generic_logic import GenericLogic
 from qtpy import QtCore
 from interface.slow_counter_interface import CountingMode
@@ -123,6 +124,7 @@ class MagnetLogic(GenericLogic):
     _sigStepwiseAlignmentNext = QtCore.Signal()
     _sigContinuousAlignmentNext = QtCore.Signal()
     _sigInitializeMeasPos = QtCore.Signal(bool)  # signal to go to the initial measurement position
+    _sigMotionFinished = QtCore.Signal(object)  # (future, callback) of a finished movement
     sigPosReached = QtCore.Signal()
 
     # signals if new data are writen to the data arrays (during measurement):
@@ -184,8 +186,10 @@ class MagnetLogic(GenericLogic):
         self._sigInitializeMeasPos.connect(self._move_to_curr_pathway_index)
         self._sigStepwiseAlignmentNext.connect(self._stepwise_loop_body,
                                                QtCore.Qt.QueuedConnection)
+        self._sigMotionFinished.connect(self._motion_finished, QtCore.Qt.QueuedConnection)
 
-        self.pathway_modes = ['spiral-in', 'spiral-out', 'snake-wise', 'diagonal-snake-wise']
+        self.pathway_modes = ['spiral-in', 'spiral-out', 'snake-wise', 'diagonal-snake-wise',
+                              'travel-time']
 
         # relative movement settings
 
@@ -273,7 +277,6 @@ class MagnetLogic(GenericLogic):
         """
 
         self.sigMoveRel.emit(param_dict)
-        # self._check_position_reached_loop(start_pos, end_pos)
         # self.sigPosChanged.emit(param_dict)
         return param_dict
 
@@ -296,7 +299,6 @@ class MagnetLogic(GenericLogic):
         # start_pos = self.get_pos(list(param_dict))
         self.sigMoveAbs.emit(param_dict)
 
-        # self._check_position_reached_loop(start_pos, param_dict)
 
         # self.sigPosChanged.emit(param_dict)
         return param_dict
@@ -567,6 +569,10 @@ class MagnetLogic(GenericLogic):
                                         'index': (axis0_index, axis1_index)}
                 path_index += 1
 
+        if self.curr_2d_pathway_mode == 'travel-time':
+            pathway, back_map = order_pathway(pathway, back_map,
+                                              self.get_hardware_constraints(), init_pos)
+
         return pathway, back_map
 
     def _create_2d_cont_pathway(self, pathway):
@@ -690,9 +696,10 @@ class MagnetLogic(GenericLogic):
                                                                    self.align_2d_axis1_vel)
 
             # determine the start point, either relative or absolute!
-            # Now the absolute position will be used:
-            axis0_start = self._backmap[0][self.align_2d_axis0_name]
-            axis1_start = self._backmap[0][self.align_2d_axis1_name]
+            # Now the absolute position will be used (the lowest values, since the
+            # pathway does not necessarily start there):
+            axis0_start = min(entry[self.align_2d_axis0_name] for entry in self._backmap.values())
+            axis1_start = min(entry[self.align_2d_axis1_name] for entry in self._backmap.values())
 
             prepared_graph = self._prepare_2d_graph(
                 axis0_start,
@@ -747,16 +754,15 @@ class MagnetLogic(GenericLogic):
         # self.set_velocity(move_dict_vel)
         self._magnet_device.move_abs(move_dict_abs)
         # self.move_rel(move_dict_rel)
-        while self._check_is_moving():
-            time.sleep(self._checktime)
-            self.log.debug("Went into while loop in _move_to_curr_pathway_index")
 
-        # this function will return to this function if position is reached:
-        start_pos = self._saved_pos_before_align
-        end_pos = dict()
-        for axis_name in self._saved_pos_before_align:
-            end_pos[axis_name] = self._backmap[self._pathway_index][axis_name]
+        # start the alignment loop as soon as the position is reached
+        self._after_motion(move_dict_abs, lambda: self._start_alignment_loop(stepwise_meas))
 
+    def _start_alignment_loop(self, stepwise_meas):
+        """ Start the alignment loop after the first position has been reached.
+
+        @param bool stepwise_meas: True for a stepwise, False for a continuous alignment
+        """
         self.log.debug("(first movement) magnet moving ? {0}".format(self._check_is_moving()))
 
         if stepwise_meas:
@@ -830,21 +836,8 @@ class MagnetLogic(GenericLogic):
             # self.set_velocity(move_dict_vel)
             self._magnet_device.move_abs(move_dict_abs)
 
-            while self._check_is_moving():
-                time.sleep(self._checktime)
-                self.log.debug("Went into while loop in stepwise_loop_body")
-
-            self.log.debug("stepwise_loop_body reports magnet moving ? {0}".format(self._check_is_moving()))
-
-            # this function will return to this function if position is reached:
-            start_pos = dict()
-            end_pos = dict()
-            for axis_name in self._saved_pos_before_align:
-                start_pos[axis_name] = self._backmap[self._pathway_index - 1][axis_name]
-                end_pos[axis_name] = self._backmap[self._pathway_index][axis_name]
-
-            # rerun this loop again
-            self._sigStepwiseAlignmentNext.emit()
+            # rerun this loop again as soon as the next position is reached
+            self._after_motion(move_dict_abs, self._sigStepwiseAlignmentNext.emit)
 
         else:
             self._end_alignment_procedure()
@@ -884,10 +877,11 @@ class MagnetLogic(GenericLogic):
             last_pos[axis_name] = self._backmap[self._pathway_index - 1][axis_name]
 
         self._magnet_device.move_abs(self._saved_pos_before_align)
+        self._after_motion(self._saved_pos_before_align, self._finish_alignment)
 
-        while self._check_is_moving():
-            time.sleep(self._checktime)
-
+    def _finish_alignment(self):
+        """ Report the end of the alignment after the magnet is back at its initial position.
+        """
         self.sigMeasurementFinished.emit()
 
         self._pathway_index = 0
@@ -897,55 +891,34 @@ class MagnetLogic(GenericLogic):
 
         pass
 
-    def _check_position_reached_loop(self, start_pos_dict, end_pos_dict):
-        """ Perform just a while loop, which checks everytime the conditions
-
-        @param dict start_pos_dict: the position in this dictionary must be
-                                    absolute positions!
-        @param dict end_pos_dict:
-        @param float checktime: the checktime in seconds
-
-        @return:
-
-        Whenever the magnet has passed 95% of the way, the method will return.
+    def _after_motion(self, target, callback):
+        """ Call a method in the thread of this module when the current movement has finished.
 
-        Check also whether the difference in position increases again, and if so
-        stop the measurement and raise an error, since either the velocity was
-        too fast or the magnet does not move further.
+        @param dict target: absolute target position of the movement
+        @param callable callback: method called without arguments after the movement
         """
+        future = self._magnet_device.get_motion_future(target=target)
+        future.add_done_callback(lambda f: self._sigMotionFinished.emit((f, callback)))
 
-        distance_init = 0.0
-        constraints = self.get_hardware_constraints()
-        minimal_distance = 0.0
-        for axis_label in start_pos_dict:
-            distance_init = (end_pos_dict[axis_label] - start_pos_dict[axis_label]) ** 2
-            minimal_distance = minimal_distance + (constraints[axis_label]['pos_step']) ** 2
-        distance_init = np.sqrt(distance_init)
-        minimal_distance = np.sqrt(minimal_distance)
-
-        # take 97% distance tolerance:
-        distance_tolerance = 0.03 * distance_init
-
-        current_dist = 0.0
-
-        while True:
-            time.sleep(self._checktime)
-
-            curr_pos = self.get_pos(list(end_pos_dict))
-
-            for axis_label in start_pos_dict:
-                current_dist = (end_pos_dict[axis_label] - curr_pos[axis_label]) ** 2
-
-            current_dist = np.sqrt(current_dist)
+    def _motion_finished(self, future_callback):
+        """ Continue after a movement, see _after_motion.
 
-            self.sigPosChanged.emit(curr_pos)
-
-            if (current_dist <= distance_tolerance) or (current_dist <= minimal_distance) or self._stop_measure:
-                self.sigPosReached.emit()
-
-                break
-
-                # return either pos reached signal of check position
+        @param tuple future_callback: the future of the movement and the method to call
+        """
+        future, callback = future_callback
+        if future.cancelled():
+            error = 'waiting for the end of the movement was cancelled'
+        elif future.exception() is not None:
+            error = 'the end of the movement could not be determined: {0}'.format(
+                future.exception())
+        else:
+            self.sigPosChanged.emit(future.result())
+            callback()
+            return
+        # the position was never confirmed, do not measure there
+        self.log.error('Magnet alignment aborted, {0}.'.format(error))
+        self._stop_measure = True
+        self._finish_alignment()
 
     def _check_is_moving(self):
         """
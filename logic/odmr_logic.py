@@ -31,6 +31,7 @@ import matplotlib.pyplot as plt
 
 from logic.generic_logic import GenericLogic
 from core.util.mutex import Mutex
+from core.util.profiling import profiler, profiled
 from core.connector import Connector
 from core.configoption import ConfigOption
 from core.statusvariable import StatusVar
@@ -52,6 +53,11 @@ class ODMRLogic(GenericLogic):
         'LIST',
         missing='warn',
         converter=lambda x: MicrowaveMode[x.upper()])
+    # Minimum number of sweeps per hardware read in continuous mode. With 0 every sweep is
+    # counted on its own with count_odmr.
+    sweeps_per_read = ConfigOption('sweeps_per_read', 0)
+    # Number of sweeps the hardware buffers in continuous mode
+    buffered_sweeps = ConfigOption('buffered_sweeps', 100)
 
     clock_frequency = StatusVar('clock_frequency', 100)
     cw_mw_frequency = StatusVar('cw_mw_frequency', 2870e6)
@@ -125,6 +131,8 @@ class ODMRLogic(GenericLogic):
         self._stopRequested = False
         # for clearing the ODMR data during a measurement
         self._clearOdmrData = False
+        # continuous multi sweep acquisition is running
+        self._continuous_odmr = False
 
         # Initalize the ODMR data arrays (mean signal and sweep matrix)
         self._initialize_odmr_plots()
@@ -626,6 +634,33 @@ class ODMRLogic(GenericLogic):
         # Check with a bitwise or:
         return ret_val1 | ret_val2
 
+    def _start_continuous_odmr(self):
+        """ Start the continuous multi sweep acquisition if it is configured.
+
+        Falls back to counting single sweeps if the hardware does not support it.
+        """
+        self._continuous_odmr = False
+        if self.sweeps_per_read <= 0:
+            return
+        self.reset_sweep()
+        status = self._odmr_counter.start_continuous_odmr(
+            length=self.odmr_plot_x.size,
+            sweeps_per_read=self.sweeps_per_read,
+            buffered_sweeps=self.buffered_sweeps)
+        if status < 0:
+            self.log.warning('Continuous ODMR acquisition could not be started, every sweep '
+                             'is counted on its own.')
+        else:
+            self._continuous_odmr = True
+
+    def _stop_continuous_odmr(self):
+        """ Stop the continuous multi sweep acquisition if it is running.
+        """
+        if self._continuous_odmr:
+            self._continuous_odmr = False
+            if self._odmr_counter.stop_continuous_odmr() < 0:
+                self.log.error('Continuous ODMR acquisition could not be stopped!')
+
     def start_odmr_scan(self):
         """ Starting an ODMR scan.
 
@@ -675,6 +710,7 @@ class ODMRLogic(GenericLogic):
                  self.odmr_plot_x.size]
             )
             self._odmr_counter.set_odmr_length(self.odmr_plot_x.size)
+            self._start_continuous_odmr()
             self.sigNextLine.emit()
             return 0
 
@@ -710,6 +746,7 @@ class ODMRLogic(GenericLogic):
                 self.module_state.unlock()
                 return -1
 
+            self._start_continuous_odmr()
             self.sigNextLine.emit()
             return 0
 
@@ -733,6 +770,7 @@ class ODMRLogic(GenericLogic):
                 self._clearOdmrData = True
         return
 
+    @profiled(queued=True)
     def _scan_odmr_line(self):
         """ Scans one line in ODMR
 
@@ -747,6 +785,7 @@ class ODMRLogic(GenericLogic):
             if self.stopRequested:
                 self.stopRequested = False
                 self.mw_off()
+                self._stop_continuous_odmr()
                 self._stop_odmr_counter()
                 self.module_state.unlock()
                 return
@@ -756,37 +795,46 @@ class ODMRLogic(GenericLogic):
                 self.elapsed_sweeps = 0
                 self._startTime = time.time()
 
-            # reset position so every line starts from the same frequency
-            self.reset_sweep()
-
-            # Acquire count data
-            error, new_counts = self._odmr_counter.count_odmr(length=self.odmr_plot_x.size)
-
+            # Acquire count data as array[sweep, channel, pixel]
+            with profiler.section(self._name, 'count_odmr', kind='latency'):
+                if self._continuous_odmr:
+                    error, new_counts = self._odmr_counter.read_continuous_odmr()
+                else:
+                    # reset position so every line starts from the same frequency
+                    self.reset_sweep()
+                    error, new_counts = self._odmr_counter.count_odmr(
+                        length=self.odmr_plot_x.size)
+                    new_counts = new_counts[np.newaxis]
 
             if error:
                 self.stopRequested = True
                 self.sigNextLine.emit()
                 return
+            number_of_sweeps = new_counts.shape[0]
+            if number_of_sweeps == 0:
+                self.sigNextLine.emit()
+                return
 
             # Add new count data to raw_data array and append if array is too small
             if self._clearOdmrData:
                 self.odmr_raw_data[:, :, :] = 0
                 self._clearOdmrData = False
-            if self.elapsed_sweeps == (self.odmr_raw_data.shape[0] - 1):
+            while self.elapsed_sweeps + number_of_sweeps >= self.odmr_raw_data.shape[0]:
                 expanded_array = np.zeros(self.odmr_raw_data.shape)
                 self.odmr_raw_data = np.concatenate((self.odmr_raw_data, expanded_array), axis=0)
                 self.log.warning('raw data array in ODMRLogic was not big enough for the entire '
                                  'measurement. Array will be expanded.\nOld array shape was '
                                  '({0:d}, {1:d}), new shape is ({2:d}, {3:d}).'
-                                 ''.format(self.odmr_raw_data.shape[0] - self.number_of_lines,
+                                 ''.format(self.odmr_raw_data.shape[0] // 2,
                                            self.odmr_raw_data.shape[1],
                                            self.odmr_raw_data.shape[0],
                                            self.odmr_raw_data.shape[1]))
 
-            # shift data in the array "up" and add new data at the "bottom"
-            self.odmr_raw_data = np.roll(self.odmr_raw_data, 1, axis=0)
+            # shift data in the array "up" and add new data at the "bottom", newest sweep first
+            self.odmr_raw_data = np.roll(self.odmr_raw_data, number_of_sweeps, axis=0)
 
-            self.odmr_raw_data[0] = new_counts
+            self.odmr_raw_data[:number_of_sweeps] = new_counts[::-1]
+            self.elapsed_sweeps += number_of_sweeps
 
             # Add new count data to mean signal
             if self._clearOdmrData:
@@ -808,14 +856,14 @@ class ODMRLogic(GenericLogic):
             # Set plot slice of matrix
             self.odmr_plot_xy = self.odmr_raw_data[:self.number_of_lines, :, :]
 
-            # Update elapsed time/sweeps
-            self.elapsed_sweeps += 1
+            # Update elapsed time
             self.elapsed_time = time.time() - self._startTime
             if self.elapsed_time >= self.run_time:
                 self.stopRequested = True
             # Fire update signals
             self.sigOdmrElapsedTimeUpdated.emit(self.elapsed_time, self.elapsed_sweeps)
             self.sigOdmrPlotsUpdated.emit(self.odmr_plot_x, self.odmr_plot_y, self.odmr_plot_xy)
+            profiler.queued(self._name, '_scan_odmr_line')
             self.sigNextLine.emit()
             return
 
@@ -32,6 +32,13 @@ from core.util.mutex import Mutex
 class OptimizerLogic(GenericLogic):
 
     """This is the Logic class for optimizing scanner position on bright features.
+
+    Two refocus modes are available and can be chosen for every call of start_refocus:
+      - 'raster': scan a full XY image and a Z line and fit gaussians to them
+      - 'tracking': only probe a few points (two hexagon rings in XY, a short line in Z)
+        around the last optimum and fit a paraboloid to the logarithm of the counts. The
+        pattern is moved uphill until the maximum is inside of it. If the spot width is not
+        known yet or the tracking is lost, the full raster is used instead.
     """
 
     # declare connectors
@@ -50,12 +57,20 @@ class OptimizerLogic(GenericLogic):
     do_surface_subtraction = StatusVar('surface_subtraction', False)
     surface_subtr_scan_offset = StatusVar('surface_subtraction_offset', 1e-6)
     opt_channel = StatusVar('optimization_channel', 0)
+    refocus_mode = StatusVar('refocus_mode', 'raster')
+
+    # maximum number of times the tracking pattern is moved before falling back to the raster
+    _tracking_max_iterations = 4
+    # minimum ratio of the maximum to the minimum counts of the tracking samples
+    _tracking_min_contrast = 1.2
 
     # "private" signals to keep track of activities here in the optimizer logic
     _sigScanNextXyLine = QtCore.Signal()
     _sigScanZLine = QtCore.Signal()
     _sigCompletedXyOptimizerScan = QtCore.Signal()
     _sigDoNextOptimizationStep = QtCore.Signal()
+    _sigTrackXy = QtCore.Signal()
+    _sigTrackZ = QtCore.Signal()
     _sigFinishedAllOptimizationSteps = QtCore.Signal()
 
     # public signals
@@ -79,6 +94,12 @@ class OptimizerLogic(GenericLogic):
         # Keep track of who called the refocus
         self._caller_tag = ''
 
+        # refocus mode of the running refocus and the spot widths used for tracking
+        self._current_mode = 'raster'
+        self._tracking_sigma_xy = None
+        self._tracking_sigma_z = None
+        self.tracking_samples = np.zeros((0, 4))
+
     def on_activate(self):
         """ Initialisation performed during activation of the module.
 
@@ -126,6 +147,8 @@ class OptimizerLogic(GenericLogic):
         self._sigScanNextXyLine.connect(self._refocus_xy_line, QtCore.Qt.QueuedConnection)
         self._sigScanZLine.connect(self.do_z_optimization, QtCore.Qt.QueuedConnection)
         self._sigCompletedXyOptimizerScan.connect(self._set_optimized_xy_from_fit, QtCore.Qt.QueuedConnection)
+        self._sigTrackXy.connect(self._track_xy, QtCore.Qt.QueuedConnection)
+        self._sigTrackZ.connect(self._track_z, QtCore.Qt.QueuedConnection)
 
         self._sigDoNextOptimizationStep.connect(self._do_next_optimization_step, QtCore.Qt.QueuedConnection)
         self._sigFinishedAllOptimizationSteps.connect(self.finish_refocus)
@@ -151,6 +174,16 @@ class OptimizerLogic(GenericLogic):
                            'The default [\'XY\', \'Z\'] will be used.')
             self.optimization_sequence = ['XY', 'Z']
 
+    def set_refocus_mode(self, mode):
+        """ Set the refocus mode used if start_refocus is called without a mode.
+
+            @param str mode: 'raster' or 'tracking'
+        """
+        if mode not in ('raster', 'tracking'):
+            self.log.error('Unknown refocus mode "{0}". Use "raster" or "tracking".'.format(mode))
+            return
+        self.refocus_mode = mode
+
     def get_scanner_count_channels(self):
         """ Get lis of counting channels from scanning device.
           @return list(str): names of counter channels
@@ -188,12 +221,13 @@ class OptimizerLogic(GenericLogic):
         self.refocus_Z_size = size
         self.sigRefocusZSizeChanged.emit()
 
-    def start_refocus(self, initial_pos=None, caller_tag='unknown', tag='logic'):
+    def start_refocus(self, initial_pos=None, caller_tag='unknown', tag='logic', mode=None):
         """ Starts the optimization scan around initial_pos
 
             @param list initial_pos: with the structure [float, float, float]
             @param str caller_tag:
             @param str tag:
+            @param str mode: 'raster' or 'tracking', None uses refocus_mode
         """
         # checking if refocus corresponding to crosshair or corresponding to initial_pos
 
@@ -210,6 +244,10 @@ class OptimizerLogic(GenericLogic):
 
         # Keep track of where the start_refocus was initiated
         self._caller_tag = caller_tag
+        self._current_mode = self.refocus_mode if mode is None else mode
+        if self._current_mode not in ('raster', 'tracking'):
+            self.log.error('Unknown refocus mode "{0}", using the full raster.'.format(mode))
+            self._current_mode = 'raster'
 
         # Set the optim_pos values to match the initial_pos values.
         # This means we can use optim_pos in subsequent steps and ensure
@@ -411,6 +449,7 @@ class OptimizerLogic(GenericLogic):
                         self.optim_pos_y = result_2D_gaus.best_values['center_y']
                         self.optim_sigma_x = result_2D_gaus.best_values['sigma_x']
                         self.optim_sigma_y = result_2D_gaus.best_values['sigma_y']
+                        self._set_tracking_sigma_xy(self.optim_sigma_x, self.optim_sigma_y)
             else:
                 self.optim_pos_x = self._initial_pos_x
                 self.optim_pos_y = self._initial_pos_y
@@ -467,6 +506,7 @@ class OptimizerLogic(GenericLogic):
                 if self.z_range[0] <= result.best_values['center'] <= self.z_range[1]:
                     self.optim_pos_z = result.best_values['center']
                     self.optim_sigma_z = result.best_values['sigma']
+                    self._set_tracking_sigma_z(self.optim_sigma_z)
                     gauss, params = self._fit_logic.make_gaussianlinearoffset_model()
                     self.z_fit_data = gauss.eval(
                         x=self._fit_zimage_Z_values, params=result.params)
@@ -630,10 +670,187 @@ class OptimizerLogic(GenericLogic):
         # Launch the next step
         if this_step == 'XY':
             self._initialize_xy_refocus_image()
-            self._sigScanNextXyLine.emit()
+            if self._current_mode == 'tracking' and self._tracking_sigma_xy is not None:
+                self._sigTrackXy.emit()
+            else:
+                self._sigScanNextXyLine.emit()
         elif this_step == 'Z':
             self._initialize_z_refocus_image()
+            if self._current_mode == 'tracking' and self._tracking_sigma_z is not None:
+                self._sigTrackZ.emit()
+            else:
+                self._sigScanZLine.emit()
+
+    def _set_tracking_sigma_xy(self, sigma_x, sigma_y):
+        """ Remember the lateral spot width for the tracking pattern. """
+        sigma = np.sqrt(abs(sigma_x * sigma_y))
+        # ignore fits of spots smaller than a pixel or much larger than the raster
+        if self.refocus_XY_size / (2 * self.optimizer_XY_res) < sigma < 2 * self.refocus_XY_size:
+            self._tracking_sigma_xy = sigma
+
+    def _set_tracking_sigma_z(self, sigma_z):
+        """ Remember the axial spot width for the tracking pattern. """
+        sigma = abs(sigma_z)
+        if self.refocus_Z_size / (2 * self.optimizer_Z_res) < sigma < 2 * self.refocus_Z_size:
+            self._tracking_sigma_z = sigma
+
+    def _scan_points(self, points):
+        """ Move to the first of the given points and count at all of them.
+
+        @param numpy.ndarray points: positions to count at, shape (number of points, 3)
+
+        @return numpy.ndarray: counts of the optimization channel or None on error
+        """
+        status = self._move_to_start_pos(points[0])
+        if status < 0:
+            self.log.error('Error during move to starting point.')
+            return None
+        n_ch = len(self._scanning_device.get_scanner_axes())
+        if n_ch <= 3:
+            line = points.T[0:n_ch]
+        else:
+            line = np.vstack((points.T, np.zeros(len(points))))
+        counts = self._scanning_device.scan_line(line)
+        if np.any(counts == -1):
+            self.log.error('The tracking scan went wrong, killing the scanner.')
+            return None
+        self.tracking_samples = np.hstack((points, counts))
+        return counts[:, self.opt_channel]
+
+    def _track_xy(self):
+        """ Find the lateral maximum by probing two hexagon rings around the last optimum.
+
+        The logarithm of the counts is fitted with a paraboloid (exact for a gaussian spot
+        without background). If the maximum is outside of the pattern, the pattern is moved
+        towards it by at most one spot width and the measurement is repeated. Falls back to
+        the full raster if no maximum is found.
+        """
+        if self.stopRequested:
+            self._sigScanNextXyLine.emit()
+            return
+
+        # the pattern should not be larger than the raster
+        radius = min(self._tracking_sigma_xy, self.refocus_XY_size / 2)
+        angles = np.arange(6) * np.pi / 3
+        offsets = np.vstack((
+            [0, 0],
+            np.column_stack((np.cos(angles), np.sin(angles))) * radius,
+            np.column_stack((np.cos(angles + np.pi / 6), np.sin(angles + np.pi / 6))) * radius / 2))
+        center = np.array([self.optim_pos_x, self.optim_pos_y])
+        start = center.copy()
+
+        for iteration in range(self._tracking_max_iterations):
+            points = np.column_stack((center + offsets,
+                                      np.full(len(offsets), self.optim_pos_z)))
+            counts = self._scan_points(points)
+            if counts is None:
+                self.stop_refocus()
+                self._sigScanNextXyLine.emit()
+                return
+
+            peak, sigma, model = self._fit_log_paraboloid(offsets, counts)
+            if peak is None:
+                break
+            if np.linalg.norm(peak) < radius:
+                center = center + peak
+                if (np.all(np.abs(center - start) <= self.refocus_XY_size / 2)
+                        and self.x_range[0] <= center[0] <= self.x_range[1]
+                        and self.y_range[0] <= center[1] <= self.y_range[1]):
+                    self.optim_pos_x, self.optim_pos_y = center
+                    self.optim_sigma_x, self.optim_sigma_y = sigma
+                    self._set_tracking_sigma_xy(*sigma)
+                    # show the fitted spot instead of the image of the last raster scan
+                    pattern_center = center - peak
+                    grid_offsets = (self.xy_refocus_image[:, :, 0:2].reshape((-1, 2))
+                                    - pattern_center)
+                    self.xy_refocus_image[:, :, 3:] = 0
+                    self.xy_refocus_image[:, :, 3 + self.opt_channel] = model(
+                        grid_offsets).reshape(self.xy_refocus_image.shape[0:2])
+                    self.sigImageUpdated.emit()
+                    self._sigDoNextOptimizationStep.emit()
+                    return
+                break
+            # move uphill by at most one spot width
+            center = center + peak * min(1, radius / np.linalg.norm(peak))
+            if np.any(np.abs(center - start) > self.refocus_XY_size / 2):
+                break
+
+        self.log.info('Lost track of the XY maximum, doing a full raster scan.')
+        self._tracking_sigma_xy = None
+        self._sigScanNextXyLine.emit()
+
+    def _track_z(self):
+        """ Find the axial maximum by probing a few points around the last optimum and fitting a
+        parabola to the logarithm of the counts. Falls back to the full Z line scan if no maximum
+        is found.
+        """
+        if self.stopRequested:
+            self._sigScanZLine.emit()
+            return
+
+        sigma = min(self._tracking_sigma_z, self.refocus_Z_size / 3)
+        offsets = np.linspace(-1.5, 1.5, 7) * sigma
+        points = np.column_stack((np.full(len(offsets), self.optim_pos_x),
+                                  np.full(len(offsets), self.optim_pos_y),
+                                  self.optim_pos_z + offsets))
+        counts = self._scan_points(points)
+        if counts is None:
+            self.stop_refocus()
             self._sigScanZLine.emit()
+            return
+
+        if (np.min(counts) > 0
+                and np.max(counts) >= self._tracking_min_contrast * np.min(counts)):
+            curvature, slope, intercept = np.polyfit(offsets, np.log(counts), 2)
+            if curvature < 0:
+                peak = -slope / (2 * curvature)
+                new_z = self.optim_pos_z + peak
+                if abs(peak) < sigma and self.z_range[0] <= new_z <= self.z_range[1]:
+                    self.optim_pos_z = new_z
+                    self.optim_sigma_z = np.sqrt(-1 / (2 * curvature))
+                    self._set_tracking_sigma_z(self.optim_sigma_z)
+                    # show the fitted spot instead of the last line scan
+                    self.z_fit_data = np.exp(np.polyval(
+                        [curvature, slope, intercept],
+                        self._fit_zimage_Z_values - (self.optim_pos_z - peak)))
+                    self.sigImageUpdated.emit()
+                    self._sigDoNextOptimizationStep.emit()
+                    return
+
+        self.log.info('Lost track of the Z maximum, doing a full line scan.')
+        self._tracking_sigma_z = None
+        self._sigScanZLine.emit()
+
+    def _fit_log_paraboloid(self, offsets, counts):
+        """ Fit a paraboloid to the logarithm of counts measured at lateral offsets.
+
+        @param numpy.ndarray offsets: positions relative to the pattern center, shape (n, 2)
+        @param numpy.ndarray counts: counts at the positions
+
+        @return tuple: position of the maximum relative to the center, the spot widths
+                       (sigma_x, sigma_y) and the fitted counts as function of offsets with
+                       shape (n, 2), (None, None, None) if there is no maximum
+        """
+        if np.min(counts) <= 0 or np.max(counts) < self._tracking_min_contrast * np.min(counts):
+            return None, None, None
+        # scale the offsets for a well conditioned fit
+        scale = np.max(np.abs(offsets))
+        x, y = offsets.T / scale
+        design = np.column_stack((np.ones_like(x), x, y, x ** 2, x * y, y ** 2))
+        coefficients = np.linalg.lstsq(design, np.log(counts), rcond=None)[0]
+        _, bx, by, axx, axy, ayy = coefficients
+        hessian = np.array([[2 * axx, axy], [axy, 2 * ayy]])
+        if np.any(np.linalg.eigvalsh(hessian) >= 0):
+            return None, None, None
+        peak = np.linalg.solve(hessian, [-bx, -by]) * scale
+        covariance = -np.linalg.inv(hessian) * scale ** 2
+
+        def model(model_offsets):
+            mx, my = np.asarray(model_offsets).T / scale
+            return np.exp(np.column_stack(
+                (np.ones_like(mx), mx, my, mx ** 2, mx * my, my ** 2)).dot(coefficients))
+
+        return peak, np.sqrt(np.diag(covariance)), model
 
     def set_position(self, tag, x=None, y=None, z=None, a=None):
         """ Set focus position.
@@ -32,6 +32,7 @@ from datetime import datetime
 from logic.generic_logic import GenericLogic
 from qtpy import QtCore
 from core.util.mutex import Mutex
+from core.util.path_planning import plan_path
 
 
 class RegionOfInterest:
@@ -349,6 +350,126 @@ class PointOfInterest:
         return cls(**dict_repr)
 
 
+class DriftPredictor:
+    """
+    Kalman filter estimating the sample drift from the ROI position history.
+
+    Each axis is modelled independently with a constant drift velocity that changes randomly
+    (random walk with the spectral density q) and position measurements with the variance r.
+    Both are unknown and are chosen from a grid of candidates by maximizing the likelihood of
+    the measured history, so they adapt to the actual drift and refocus precision.
+    """
+    # candidate velocity random walk spectral densities in m^2/s^3
+    process_noise_candidates = np.logspace(-28, -14, 15)
+    # candidate position measurement standard deviations in m
+    measurement_noise_candidates = np.logspace(-9, -6, 13)
+    # initial drift velocity uncertainty in m/s
+    initial_velocity_std = 1e-7
+
+    def __init__(self, history=None):
+        # time of the last measurement in s (relative to the ROI creation time)
+        self.time = 0.
+        # state (position, velocity) and covariance of each axis
+        self.state = np.zeros((3, 2))
+        self.covariance = np.zeros((3, 2, 2))
+        self.process_noise = np.zeros(3)
+        self.measurement_noise = np.zeros(3)
+        # normalized innovation of the last measurement of each axis
+        self.residual = np.zeros(3)
+        self.count = 0
+        if history is not None:
+            self.fit(history)
+
+    @property
+    def is_valid(self):
+        """ At least 3 measurements are needed to estimate position, velocity and noise. """
+        return self.count >= 3
+
+    def fit(self, history):
+        """
+        Run the filter over a position history.
+
+        @param float[n][4] history: entries of (time_in_s, x, y, z)
+        """
+        history = np.asarray(history, dtype=float).reshape(-1, 4)
+        history = history[np.argsort(history[:, 0], kind='stable')]
+        self.count = len(history)
+        if self.count == 0:
+            return
+        q, r = np.meshgrid(self.process_noise_candidates, self.measurement_noise_candidates ** 2)
+        q = np.broadcast_to(q.ravel(), (3, q.size))
+        r = np.broadcast_to(r.ravel(), (3, r.size))
+        # state and covariance for each axis and each noise candidate
+        x = np.zeros((3, q.shape[1], 2))
+        x[:, :, 0] = history[0, 1:, None]
+        p = np.zeros((3, q.shape[1], 2, 2))
+        p[..., 0, 0] = r
+        p[..., 1, 1] = self.initial_velocity_std ** 2
+        log_likelihood = np.zeros(q.shape)
+        residual = np.zeros(q.shape)
+
+        for last, entry in zip(history[:-1], history[1:]):
+            dt = max(entry[0] - last[0], 0.)
+            # predict
+            x[..., 0] += dt * x[..., 1]
+            p00 = p[..., 0, 0] + dt * (p[..., 0, 1] + p[..., 1, 0]) + dt ** 2 * p[..., 1, 1]
+            p01 = p[..., 0, 1] + dt * p[..., 1, 1]
+            p[..., 0, 0] = p00 + q * dt ** 3 / 3
+            p[..., 0, 1] = p[..., 1, 0] = p01 + q * dt ** 2 / 2
+            p[..., 1, 1] += q * dt
+            # update with the measured position
+            innovation = entry[1:, None] - x[..., 0]
+            variance = p[..., 0, 0] + r
+            log_likelihood -= 0.5 * (np.log(2 * np.pi * variance) + innovation ** 2 / variance)
+            residual = innovation / np.sqrt(variance)
+            gain = p[..., :, 0] / variance[..., None]
+            x += gain * innovation[..., None]
+            p -= gain[..., :, None] * p[..., None, 0, :]
+
+        best = np.argmax(log_likelihood, axis=1)
+        axes = np.arange(3)
+        self.time = history[-1, 0]
+        self.state = x[axes, best]
+        self.covariance = p[axes, best]
+        self.process_noise = q[axes, best]
+        self.measurement_noise = r[axes, best]
+        self.residual = residual[axes, best]
+
+    def predict(self, timestamp):
+        """
+        Predict the drift at a given time.
+
+        @param float timestamp: time in s (relative to the ROI creation time)
+
+        @return tuple(float[3], float[3]): predicted position and its standard deviation
+        """
+        dt = np.maximum(timestamp - self.time, 0.)
+        position = self.state[:, 0] + dt * self.state[:, 1]
+        if not self.is_valid:
+            return position, np.full(3, np.inf)
+        variance = (self.covariance[:, 0, 0]
+                    + dt * (self.covariance[:, 0, 1] + self.covariance[:, 1, 0])
+                    + dt ** 2 * self.covariance[:, 1, 1]
+                    + self.process_noise * dt ** 3 / 3)
+        return position, np.sqrt(variance)
+
+    def time_to_uncertainty(self, tolerance):
+        """
+        Time after the last measurement until the position uncertainty of any axis exceeds the
+        tolerance.
+
+        @param float tolerance: maximum standard deviation of the predicted position in m
+
+        @return float: time in s, 0 if the tolerance is already exceeded
+        """
+        if not self.is_valid:
+            return 0.
+        delays = np.concatenate(([0.], np.logspace(-1, 6, 701)))
+        _, std = self.predict(self.time + delays[:, None])
+        exceeded = np.nonzero(np.any(std > tolerance, axis=1))[0]
+        return delays[-1] if exceeded.size == 0 else delays[max(exceeded[0] - 1, 0)]
+
+
 class PoiManagerLogic(GenericLogic):
 
     """
@@ -367,6 +488,15 @@ class PoiManagerLogic(GenericLogic):
     _move_scanner_after_optimization = StatusVar(default=True)
     _poi_threshold = StatusVar(default=5)
     _poi_diameter = StatusVar(default=1.5)
+    # refocus mode of the optimiserlogic used for periodic refocus ('raster' or 'tracking')
+    _periodic_refocus_mode = StatusVar(default='tracking')
+    # start refocus and scanner moves at the position predicted from the drift history
+    _use_drift_prediction = StatusVar(default=False)
+    # adapt the refocus period to the predicted drift uncertainty
+    _adaptive_refocus = StatusVar(default=False)
+    _drift_tolerance = StatusVar(default=100e-9)
+    _min_refocus_period = StatusVar(default=10)
+    _max_refocus_period = StatusVar(default=1800)
 
     # Signals for connecting modules
     sigRefocusStateUpdated = QtCore.Signal(bool)  # is_active
@@ -376,6 +506,7 @@ class PoiManagerLogic(GenericLogic):
     sigRoiUpdated = QtCore.Signal(dict)  # Dict containing ROI parameters to update
     sigThresholdUpdated = QtCore.Signal(float)
     sigDiameterUpdated = QtCore.Signal(float)
+    sigDriftPredictionUpdated = QtCore.Signal(dict)
 
     # Internal signals
     __sigStartPeriodicRefocus = QtCore.Signal()
@@ -389,6 +520,10 @@ class PoiManagerLogic(GenericLogic):
         self._last_refocus = 0
         self._periodic_refocus_poi = None
 
+        # drift prediction and the history it was fitted to
+        self._drift_predictor = DriftPredictor()
+        self._drift_history = None
+
         # threading
         self._threadlock = Mutex()
         return
@@ -535,7 +670,58 @@ class PoiManagerLogic(GenericLogic):
     def time_until_refocus(self):
         if not self.__timer.isActive():
             return -1
-        return max(0., self._refocus_period - (time.time() - self._last_refocus))
+        return max(0., self.current_refocus_period - (time.time() - self._last_refocus))
+
+    @property
+    def current_refocus_period(self):
+        """ The refocus period in use. With adaptive refocus this is the time after the last
+        refocus until the predicted drift uncertainty exceeds the drift tolerance.
+        """
+        if not self._adaptive_refocus:
+            return float(self._refocus_period)
+        predictor = self.drift_predictor
+        if not predictor.is_valid:
+            return float(self._refocus_period)
+        period = predictor.time_to_uncertainty(self._drift_tolerance)
+        # the history time stamps are measured from the creation of the ROI
+        period -= self._last_refocus - self.roi_creation_time.timestamp() - predictor.time
+        return float(np.clip(period, self._min_refocus_period, self._max_refocus_period))
+
+    @property
+    def drift_predictor(self):
+        """ DriftPredictor fitted to the current ROI position history. """
+        history = self.roi_pos_history
+        if self._drift_history is None or not np.array_equal(history, self._drift_history):
+            self._drift_predictor = DriftPredictor(history)
+            self._drift_history = history
+        return self._drift_predictor
+
+    @property
+    def use_drift_prediction(self):
+        return bool(self._use_drift_prediction)
+
+    @use_drift_prediction.setter
+    def use_drift_prediction(self, use):
+        self.set_use_drift_prediction(use)
+        return
+
+    @property
+    def adaptive_refocus(self):
+        return bool(self._adaptive_refocus)
+
+    @adaptive_refocus.setter
+    def adaptive_refocus(self, adaptive):
+        self.set_adaptive_refocus(adaptive)
+        return
+
+    @property
+    def drift_tolerance(self):
+        return float(self._drift_tolerance)
+
+    @drift_tolerance.setter
+    def drift_tolerance(self, tolerance):
+        self.set_drift_tolerance(tolerance)
+        return
 
     @property
     def scanner_position(self):
@@ -557,6 +743,121 @@ class PoiManagerLogic(GenericLogic):
             self._move_scanner_after_optimization = bool(move)
         return
 
+    @property
+    def periodic_refocus_mode(self):
+        return str(self._periodic_refocus_mode)
+
+    @periodic_refocus_mode.setter
+    def periodic_refocus_mode(self, mode):
+        self.set_periodic_refocus_mode(mode)
+        return
+
+    @QtCore.Slot(str)
+    def set_periodic_refocus_mode(self, mode):
+        if mode not in ('raster', 'tracking'):
+            self.log.error('Unknown refocus mode "{0}". Use "raster" or "tracking".'.format(mode))
+            return
+        with self._threadlock:
+            self._periodic_refocus_mode = mode
+        return
+
+    @QtCore.Slot(bool)
+    def set_use_drift_prediction(self, use):
+        with self._threadlock:
+            self._use_drift_prediction = bool(use)
+        return
+
+    @QtCore.Slot(bool)
+    def set_adaptive_refocus(self, adaptive):
+        with self._threadlock:
+            self._adaptive_refocus = bool(adaptive)
+        self._emit_refocus_timer()
+        return
+
+    @QtCore.Slot(float)
+    def set_drift_tolerance(self, tolerance):
+        if not tolerance > 0:
+            self.log.error('Drift tolerance must be a value > 0.')
+            return
+        with self._threadlock:
+            self._drift_tolerance = float(tolerance)
+        self._emit_refocus_timer()
+        return
+
+    def predict_drift(self, timestamp=None):
+        """
+        Predict the ROI origin (sample drift) from the ROI position history.
+
+        @param float timestamp: time (as returned by time.time()) to predict the drift for.
+                                None (default) predicts the current drift.
+
+        @return dict: 'position' (float[3], predicted ROI origin), 'std' (float[3], standard
+                      deviation of the prediction, inf if the history is too short),
+                      'velocity' (float[3], drift velocity in m/s) and 'residual' (float[3],
+                      normalized deviation of the last refocus from its prediction)
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        predictor = self.drift_predictor
+        position, std = predictor.predict(timestamp - self.roi_creation_time.timestamp())
+        return {'position': position,
+                'std': std,
+                'velocity': predictor.state[:, 1].copy(),
+                'residual': predictor.residual.copy()}
+
+    def get_predicted_poi_position(self, name=None, timestamp=None):
+        """
+        Returns the POI position corrected by the predicted drift.
+
+        @param str name: Name of the POI. If None (default) the active POI is used.
+        @param float timestamp: time (as returned by time.time()) to predict the position for.
+                                None (default) predicts the current position.
+
+        @return tuple(float[3], float[3]): predicted position (x,y,z) and its standard deviation
+        """
+        if name is None:
+            name = self.active_poi
+        prediction = self.predict_drift(timestamp)
+        if not self.drift_predictor.is_valid:
+            return self.get_poi_position(name), prediction['std']
+        return self.get_poi_anchor(name) + prediction['position'], prediction['std']
+
+    def get_poi_visit_order(self, names=None, start_position=None):
+        """
+        Order POIs to minimize the total travel time of the scanner, e.g. for measurements on
+        a batch of POIs. The scanner axes are assumed to move simultaneously and equally fast.
+
+        @param list names: Names of the POIs to visit. None (default) orders all POIs.
+        @param float[3] start_position: Position to start from. None (default) starts at the
+                                        current scanner position.
+
+        @return list: POI names in the order of the visits
+        """
+        if names is None:
+            names = self.poi_names
+        names = list(names)
+        if start_position is None:
+            start_position = self.scanner_position
+        positions = np.array([self.get_poi_position(name) for name in names]).reshape(-1, 3)
+        order = plan_path(positions, velocities=[1, 1, 1], start=start_position)
+        return [names[ii] for ii in order]
+
+    def _emit_refocus_timer(self):
+        with self._threadlock:
+            if self.__timer.isActive():
+                self.sigRefocusTimerUpdated.emit(True,
+                                                 self.current_refocus_period,
+                                                 self.time_until_refocus)
+            else:
+                self.sigRefocusTimerUpdated.emit(False, self.refocus_period, self.refocus_period)
+        return
+
+    def _emit_drift_prediction(self):
+        prediction = self.predict_drift()
+        prediction['refocus_period'] = self.current_refocus_period
+        self.sigDriftPredictionUpdated.emit(prediction)
+        return
+
     @QtCore.Slot(str)
     def set_poi_nametag(self, tag):
         if tag is None or isinstance(tag, str):
@@ -774,6 +1075,7 @@ class PoiManagerLogic(GenericLogic):
                                  'history': self.roi_pos_history,
                                  'scan_image': self.roi_scan_image,
                                  'scan_image_extent': self.roi_scan_image_extent})
+        self._emit_drift_prediction()
         return
 
     @QtCore.Slot()
@@ -793,12 +1095,14 @@ class PoiManagerLogic(GenericLogic):
                                      'scan_image_extent': self.roi_scan_image_extent})
         else:
             self.sigRoiUpdated.emit({'history': self.roi_pos_history})
+        self._emit_drift_prediction()
         return
 
     @QtCore.Slot()
     def go_to_poi(self, name=None):
         """
-        Move crosshair to the given poi.
+        Move crosshair to the given poi. If drift prediction is used, the position is corrected
+        by the drift predicted since the last refocus.
 
         @param str name: the name of the POI
         """
@@ -807,7 +1111,10 @@ class PoiManagerLogic(GenericLogic):
         if not isinstance(name, str):
             self.log.error('POI name to move to must be of type str.')
             return
-        self.move_scanner(self.get_poi_position(name))
+        if self._use_drift_prediction:
+            self.move_scanner(self.get_predicted_poi_position(name)[0])
+        else:
+            self.move_scanner(self.get_poi_position(name))
         return
 
     def move_scanner(self, position):
@@ -858,10 +1165,7 @@ class PoiManagerLogic(GenericLogic):
         # Acquire thread lock in order to change the period during a running periodic refocus
         with self._threadlock:
             self._refocus_period = float(period)
-            if self.__timer.isActive():
-                self.sigRefocusTimerUpdated.emit(True, self.refocus_period, self.time_until_refocus)
-            else:
-                self.sigRefocusTimerUpdated.emit(False, self.refocus_period, self.refocus_period)
+        self._emit_refocus_timer()
         return
 
     @QtCore.Slot(float)
@@ -903,12 +1207,14 @@ class PoiManagerLogic(GenericLogic):
                 return
             self.module_state.lock()
             self._periodic_refocus_poi = name
-            self.optimise_poi_position(name=name)
+            self.optimise_poi_position(name=name, mode=self._periodic_refocus_mode)
             self._last_refocus = time.time()
             self.__timer.timeout.connect(self._periodic_refocus_loop)
             self.__timer.start(500)
 
-            self.sigRefocusTimerUpdated.emit(True, self.refocus_period, self.refocus_period)
+            self.sigRefocusTimerUpdated.emit(True,
+                                             self.current_refocus_period,
+                                             self.time_until_refocus)
         return
 
     def stop_periodic_refocus(self):
@@ -944,14 +1250,15 @@ class PoiManagerLogic(GenericLogic):
         with self._threadlock:
             if self.__timer.isActive():
                 remaining_time = self.time_until_refocus
-                self.sigRefocusTimerUpdated.emit(True, self.refocus_period, remaining_time)
+                self.sigRefocusTimerUpdated.emit(True, self.current_refocus_period, remaining_time)
                 if remaining_time <= 0 and self.optimiserlogic().module_state() == 'idle':
-                    self.optimise_poi_position(self._periodic_refocus_poi)
+                    self.optimise_poi_position(self._periodic_refocus_poi,
+                                               mode=self._periodic_refocus_mode)
                     self._last_refocus = time.time()
         return
 
     @QtCore.Slot()
-    def optimise_poi_position(self, name=None, update_roi_position=True):
+    def optimise_poi_position(self, name=None, update_roi_position=True, mode=None):
         """
         Triggers the optimisation procedure for the given poi using the optimiserlogic.
         The difference between old and new position can be used to update the ROI position.
@@ -960,6 +1267,8 @@ class PoiManagerLogic(GenericLogic):
 
         @param str name: Name of the POI for which to optimise the position.
         @param bool update_roi_position: Flag indicating if the ROI should be shifted accordingly.
+        @param str mode: refocus mode of the optimiserlogic ('raster' or 'tracking'),
+                         None uses the default mode of the optimiserlogic
         """
         if name is None:
             if self.active_poi is None:
@@ -974,9 +1283,15 @@ class PoiManagerLogic(GenericLogic):
         else:
             tag = 'poimanager_{0}'.format(name)
 
+        if self._use_drift_prediction:
+            initial_pos = self.get_predicted_poi_position(name)[0]
+        else:
+            initial_pos = self.get_poi_position(name)
+
         if self.optimiserlogic().module_state() == 'idle':
-            self.optimiserlogic().start_refocus(initial_pos=self.get_poi_position(name),
-                                                caller_tag=tag)
+            self.optimiserlogic().start_refocus(initial_pos=initial_pos,
+                                                caller_tag=tag,
+                                                mode=mode)
             self.sigRefocusStateUpdated.emit(True)
         else:
             self.log.warning('Unable to start POI refocus procedure. '
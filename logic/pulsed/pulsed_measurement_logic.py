@@ -29,8 +29,10 @@ import matplotlib.pyplot as plt
 
 from core.connector import Connector
 from core.configoption import ConfigOption
+from core.logger import RateLimitedLogger
 from core.statusvariable import StatusVar
 from core.util.mutex import Mutex
+from core.util.profiling import profiler, profiled
 from core.util.network import netobtain
 from core.util import units
 from core.util.math import compute_ft
@@ -158,6 +160,8 @@ class PulsedMeasurementLogic(GenericLogic):
         """ Initialisation performed during activation of the module.
         """
         # self.__fast_counter_gates = int(0)
+        # messages issued on every analysis timer tick
+        self._limited_log = RateLimitedLogger(self.log)
         # Create an instance of PulseExtractor
         self._pulseextractor = PulseExtractor(pulsedmeasurementlogic=self)
         self._pulseanalyzer = PulseAnalyzer(pulsedmeasurementlogic=self)
@@ -307,6 +311,9 @@ class PulsedMeasurementLogic(GenericLogic):
         @return int: error code (0:OK, -1:error)
         """
         # return self.fastcounter().start_measure(self._number_of_lasers)
+        # simulating fast counters (e.g. the dummy) build their traces from the loaded sequence
+        self.fastcounter().set_sequence_information(self._sampling_information,
+                                                    self._measurement_information)
         return self.fastcounter().start_measure()
 
     def fast_counter_off(self):
@@ -870,6 +877,9 @@ class PulsedMeasurementLogic(GenericLogic):
                 # Set measurement paused flag
                 self.__is_paused = False
 
+                # report messages still suppressed by the rate limit
+                self._limited_log.flush()
+
                 self.module_state.unlock()
                 self.sigMeasurementStatusUpdated.emit(False, False)
         return
@@ -1125,6 +1135,7 @@ class PulsedMeasurementLogic(GenericLogic):
                                                                         self.__fast_counter_gates))
         return
 
+    @profiled()
     def _pulsed_analysis_loop(self):
         """ Acquires laser pulses from fast counter,
             calculates fluorescence signal and creates plots.
@@ -1197,7 +1208,8 @@ class PulsedMeasurementLogic(GenericLogic):
         else:
             tmp_signal = np.zeros(self.laser_data.shape[0])
             tmp_error = np.zeros(self.laser_data.shape[0])
-            print('laser data any failed - pulse extraction failed')
+            self._limited_log.warning('No laser data found. Pulse extraction failed.',
+                                      interval=10)
         return tmp_signal, tmp_error
 
     def _get_raw_data(self):
@@ -1208,7 +1220,8 @@ class PulsedMeasurementLogic(GenericLogic):
                                                  info_dict with keys 'elapsed_sweeps' and 'elapsed_time'
         """
         # get raw data from fast counter
-        fc_data = self.fastcounter().get_data_trace()
+        with profiler.section(self._name, 'get_data_trace', kind='latency'):
+            fc_data = self.fastcounter().get_data_trace()
         if type(fc_data) == tuple and len(fc_data) == 2:  # if the hardware implement the new version of the interface
             fc_data, info_dict = fc_data
         else:
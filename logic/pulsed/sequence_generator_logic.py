@@ -20,6 +20,7 @@ Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
 top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
 """
 
+import hashlib
 import numpy as np
 import os
 import pickle
@@ -1650,7 +1651,8 @@ class SequenceGeneratorLogic(GenericLogic):
         return -1 if ensembles_missing else 0
 
     @QtCore.Slot(str)
-    def sample_pulse_block_ensemble(self, ensemble, offset_bin=0, name_tag=None):
+    def sample_pulse_block_ensemble(self, ensemble, offset_bin=0, name_tag=None,
+                                    sample_digest=None, samples=None):
         """ General sampling of a PulseBlockEnsemble object, which serves as the construction plan.
 
         @param str|PulseBlockEnsemble ensemble: PulseBlockEnsemble instance or name of a saved
@@ -1661,6 +1663,12 @@ class SequenceGeneratorLogic(GenericLogic):
         @param str name_tag: a name tag, which is used to keep the sampled files together, which
                              where sampled from the same PulseBlockEnsemble object but where
                              different offset_bins were used.
+        @param sample_digest: optional hashlib hash object which is updated with all samples, e.g.
+                              to find identical waveforms
+        @param tuple samples: optional (analog_samples, digital_samples) of the whole ensemble,
+                              sampled before with the same offset_bin (see
+                              _sample_ensemble_digest). They are written instead of sampling the
+                              ensemble again.
 
         @return tuple: of length 3 with
                        (offset_bin, created_waveforms, ensemble_info).
@@ -1764,20 +1772,8 @@ class SequenceGeneratorLogic(GenericLogic):
                 self.log.warn('Extending waveform {0} by {2} bins. New length {1}.'.format(
                     ensemble.name, ensemble_info['number_of_samples'], extension_samples))
 
-        # Calculate the byte size per sample.
-        # One analog sample per channel is 4 bytes (np.float32) and one digital sample per channel
-        # is 1 byte (np.bool).
-        bytes_per_sample = len(ensemble_info['analog_channels']) * 4 + len(
-            ensemble_info['digital_channels'])
-
-        # Calculate the bytes estimate for the entire ensemble
-        bytes_per_ensemble = bytes_per_sample * ensemble_info['number_of_samples']
-
         # Determine the size of the sample arrays to be written as a whole.
-        if bytes_per_ensemble <= self._overhead_bytes or self._overhead_bytes == 0:
-            array_length = ensemble_info['number_of_samples']
-        else:
-            array_length = self._overhead_bytes // bytes_per_sample
+        array_length = self._sample_array_length(ensemble_info)
 
         n_max_samples = self.pulsegenerator().get_constraints().waveform_length.max
         if n_max_samples > 0. and ensemble_info['number_of_samples'] > n_max_samples:
@@ -1789,23 +1785,33 @@ class SequenceGeneratorLogic(GenericLogic):
             self.sigSampleEnsembleComplete.emit(None)
             return -1, list(), dict()
 
-        # Allocate the sample arrays that are used for a single write command
-        analog_samples = dict()
-        digital_samples = dict()
-        try:
-            for chnl in ensemble_info['analog_channels']:
-                analog_samples[chnl] = np.empty(array_length, dtype='float32')
-            for chnl in ensemble_info['digital_channels']:
-                digital_samples[chnl] = np.empty(array_length, dtype=bool)
-        except MemoryError:
-            self.log.error('Sampling of PulseBlockEnsemble "{0}" failed due to a MemoryError.\n'
-                           'The sample array needed is too large to allocate in memory.\n'
-                           'Try using the overhead_bytes ConfigOption to limit memory usage.'
-                           ''.format(ensemble.name))
-            if not self.__sequence_generation_in_progress:
-                self.module_state.unlock()
-            self.sigSampleEnsembleComplete.emit(None)
-            return -1, list(), dict()
+        # Samples of the whole ensemble calculated before are written as a single chunk
+        if samples is not None and array_length == ensemble_info['number_of_samples'] and all(
+                chnl_samples.size == array_length for chnl_samples in
+                list(samples[0].values()) + list(samples[1].values())):
+            if ensemble.rotating_frame:
+                offset_bin += ensemble_info['number_of_samples']
+            chunks = [(samples[0], samples[1], ensemble_info['number_of_samples'], offset_bin)]
+        else:
+            # Allocate the sample arrays that are used for a single write command
+            analog_samples = dict()
+            digital_samples = dict()
+            try:
+                for chnl in ensemble_info['analog_channels']:
+                    analog_samples[chnl] = np.empty(array_length, dtype='float32')
+                for chnl in ensemble_info['digital_channels']:
+                    digital_samples[chnl] = np.empty(array_length, dtype=bool)
+            except MemoryError:
+                self.log.error('Sampling of PulseBlockEnsemble "{0}" failed due to a MemoryError.\n'
+                               'The sample array needed is too large to allocate in memory.\n'
+                               'Try using the overhead_bytes ConfigOption to limit memory usage.'
+                               ''.format(ensemble.name))
+                if not self.__sequence_generation_in_progress:
+                    self.module_state.unlock()
+                self.sigSampleEnsembleComplete.emit(None)
+                return -1, list(), dict()
+            chunks = self._sample_ensemble_chunks(ensemble, ensemble_info, analog_samples,
+                                                  digital_samples, offset_bin)
 
         t_est_upload = self._benchmark_write.estimate_time(ensemble_info['number_of_samples'])
         if t_est_upload > self._info_on_estimated_upload_time:
@@ -1814,14 +1820,185 @@ class SequenceGeneratorLogic(GenericLogic):
                           " {0:%Y-%m-%d %H:%M:%S} ({1:d} s)".format(
                 (now + datetime.timedelta(0, t_est_upload)), int(t_est_upload)))
 
+        # set of written waveform names on the device
+        written_waveforms = set()
+        # integer to keep track of the samples already written
+        written_total = 0
+        for analog_samples, digital_samples, processed_samples, offset_bin in chunks:
+            chunk_length = processed_samples - written_total
+            if sample_digest is not None:
+                self._update_sample_digest(sample_digest, analog_samples, digital_samples)
+            # Set first/last chunk flags
+            is_first_chunk = written_total == 0
+            is_last_chunk = processed_samples == ensemble_info['number_of_samples']
+            written_samples, wfm_list = self.pulsegenerator().write_waveform(
+                name=waveform_name,
+                analog_samples=analog_samples,
+                digital_samples=digital_samples,
+                is_first_chunk=is_first_chunk,
+                is_last_chunk=is_last_chunk,
+                total_number_of_samples=ensemble_info['number_of_samples'])
+
+            # Update written waveforms set
+            written_waveforms.update(wfm_list)
+
+            # check if write process was successful
+            if written_samples != chunk_length:
+                self.log.error('Sampling of ensemble "{0}" failed. Write to device was '
+                               'unsuccessful.\nThe number of actually written samples ({1:d}) '
+                               'does not match the number of samples staged to write ({2:d}).'
+                               ''.format(ensemble.name, written_samples, chunk_length))
+                if not self.__sequence_generation_in_progress:
+                    self.module_state.unlock()
+                self.sigAvailableWaveformsUpdated.emit(self.sampled_waveforms)
+                self.sigSampleEnsembleComplete.emit(None)
+                return -1, list(), dict()
+            written_total = processed_samples
+
+        # Save sampling related parameters to the sampling_information container within the
+        # PulseBlockEnsemble.
+        # This step is only performed if the resulting waveforms are named by the PulseBlockEnsemble
+        # and not by a sequence nametag
+        if waveform_name == ensemble.name:
+            ensemble.sampling_information = dict()
+            ensemble.sampling_information.update(ensemble_info)
+            ensemble.sampling_information['pulse_generator_settings'] = self.pulse_generator_settings
+            ensemble.sampling_information['waveforms'] = natural_sort(written_waveforms)
+            self.save_ensemble(ensemble)
+
+        self.log.info('Time needed for sampling and writing PulseBlockEnsemble {0} to device: {1} sec'
+                      ''.format(ensemble.name, int(np.rint(time.time() - start_time))))
+        self.log.debug('Estimated {:.3f} s from current estimated write speed {:.2f} MSa/s'
+                       ' from {} benchmarks'.format(
+            self._benchmark_write.estimate_time(ensemble_info['number_of_samples']),
+            self._benchmark_write.estimate_speed() / 1e6,
+            self._benchmark_write.n_benchmarks))
+
+        self._benchmark_write.add_benchmark(time.time() - start_time, ensemble_info['number_of_samples'])
+
+        if ensemble_info['number_of_samples'] == 0:
+            self.log.warning('Empty waveform (0 samples) created from PulseBlockEnsemble "{0}".'
+                             ''.format(ensemble.name))
+        if not self.__sequence_generation_in_progress:
+            self.module_state.unlock()
+        self.sigAvailableWaveformsUpdated.emit(self.sampled_waveforms)
+        self.sigSampleEnsembleComplete.emit(ensemble)
+        return offset_bin, natural_sort(written_waveforms), ensemble_info
+
+    def _sample_array_length(self, ensemble_info):
+        """ Number of samples per chunk, limited by the overhead_bytes ConfigOption.
+
+        @param dict ensemble_info: the result of analyze_block_ensemble
+
+        @return int: length of the sample arrays which are written as a whole
+        """
+        # Calculate the byte size per sample.
+        # One analog sample per channel is 4 bytes (np.float32) and one digital sample per channel
+        # is 1 byte (np.bool).
+        bytes_per_sample = len(ensemble_info['analog_channels']) * 4 + len(
+            ensemble_info['digital_channels'])
+
+        # Calculate the bytes estimate for the entire ensemble
+        bytes_per_ensemble = bytes_per_sample * ensemble_info['number_of_samples']
+
+        if bytes_per_ensemble <= self._overhead_bytes or self._overhead_bytes == 0:
+            return ensemble_info['number_of_samples']
+        return self._overhead_bytes // bytes_per_sample
+
+    def _estimated_write_time(self, number_of_samples):
+        """ Time needed to sample and write a waveform according to the write benchmark.
+
+        @param int number_of_samples: length of the waveform
+
+        @return float: estimated time in s, 0 if there is no valid benchmark
+        """
+        estimate = self._benchmark_write.estimate_time(number_of_samples)
+        return float(estimate) if estimate > 0 else 0.
+
+    def _sample_ensemble_digest(self, ensemble, ensemble_info, offset_bin=0):
+        """ Samples a PulseBlockEnsemble at once without writing it to the pulse generator and
+        hashes the samples. The samples can be passed to sample_pulse_block_ensemble afterwards,
+        so the ensemble is not sampled a second time if it has to be written.
+
+        @param PulseBlockEnsemble ensemble: the ensemble to sample
+        @param dict ensemble_info: the result of analyze_block_ensemble for the ensemble
+        @param int offset_bin: time bin offset of the first sample (rotating frame)
+
+        @return tuple: (hex digest of the samples, (analog_samples, digital_samples))
+        """
+        number_of_samples = ensemble_info['number_of_samples']
+        analog_samples = {chnl: np.empty(number_of_samples, dtype='float32')
+                          for chnl in ensemble_info['analog_channels']}
+        digital_samples = {chnl: np.empty(number_of_samples, dtype=bool)
+                           for chnl in ensemble_info['digital_channels']}
+        # a single chunk, the arrays are filled in place
+        for _ in self._sample_ensemble_chunks(ensemble, ensemble_info, analog_samples,
+                                              digital_samples, offset_bin):
+            pass
+        sample_digest = hashlib.sha1()
+        self._update_sample_digest(sample_digest, analog_samples, digital_samples)
+        return sample_digest.hexdigest(), (analog_samples, digital_samples)
+
+    def _ensemble_depends_on_offset(self, ensemble):
+        """ Check if the samples of a PulseBlockEnsemble depend on the offset_bin, i.e. if any
+        element has analog samples which are not constant in time (anything but Idle and DC).
+
+        @param PulseBlockEnsemble ensemble: the ensemble
+
+        @return bool: True if the samples depend on the offset_bin
+        """
+        for block_name, reps in ensemble.block_list:
+            block = self.get_block(block_name)
+            if block is None:
+                return True
+            for element in block.element_list:
+                for function in element.pulse_function.values():
+                    if type(function).__name__ not in ('Idle', 'DC'):
+                        return True
+        return False
+
+    def _ensemble_fingerprint(self, ensemble):
+        """ Hash of the definition of a PulseBlockEnsemble (blocks, elements and repetitions).
+        Ensembles with the same fingerprint result in the same samples for the same offset_bin,
+        regardless of their names.
+
+        @param PulseBlockEnsemble ensemble: the ensemble
+
+        @return str: hex digest
+        """
+        definition = [repr(ensemble.rotating_frame)]
+        for block_name, reps in ensemble.block_list:
+            block = self.get_block(block_name)
+            element_list = None if block is None else block.element_list
+            definition.append('{0!r}*{1:d}'.format(element_list, reps + 1))
+        return hashlib.sha1('\n'.join(definition).encode()).hexdigest()
+
+    def _sample_ensemble_chunks(self, ensemble, ensemble_info, analog_samples, digital_samples,
+                                offset_bin=0):
+        """ Generator calculating the samples of a PulseBlockEnsemble chunk by chunk.
+
+        @param PulseBlockEnsemble ensemble: the ensemble to sample
+        @param dict ensemble_info: the result of analyze_block_ensemble for the ensemble
+        @param dict analog_samples: preallocated float32 arrays of the chunk size, keys are the
+                                    analog channels
+        @param dict digital_samples: preallocated bool arrays of the chunk size, keys are the
+                                     digital channels
+        @param int offset_bin: time bin offset of the first sample (rotating frame)
+
+        @return generator: yields (analog_samples, digital_samples, processed_samples, offset_bin)
+                           for every completely filled chunk. The arrays are reused for the next
+                           chunk, the last chunk may be shorter.
+        """
+        # all preallocated arrays have the length of a chunk
+        array_length = max([samples.size for samples in analog_samples.values()] +
+                           [samples.size for samples in digital_samples.values()])
+
         # integer to keep track of the sampls already processed
         processed_samples = 0
         # Index to keep track of the samples written into the preallocated samples array
         array_write_index = 0
         # Keep track of the number of elements already written
         element_count = 0
-        # set of written waveform names on the device
-        written_waveforms = set()
         # Iterate over all blocks within the PulseBlockEnsemble object
         for block_name, reps in ensemble.block_list:
             block = self.get_block(block_name)
@@ -1866,35 +2043,9 @@ class SequenceGeneratorLogic(GenericLogic):
                         if ensemble.rotating_frame:
                             offset_bin += samples_to_add
 
-                        # Check if the temporary sample array is full and write to the device if so.
+                        # Check if the temporary sample array is full and hand it over if so.
                         if array_write_index == array_length:
-                            # Set first/last chunk flags
-                            is_first_chunk = array_write_index == processed_samples
-                            is_last_chunk = processed_samples == ensemble_info['number_of_samples']
-                            written_samples, wfm_list = self.pulsegenerator().write_waveform(
-                                name=waveform_name,
-                                analog_samples=analog_samples,
-                                digital_samples=digital_samples,
-                                is_first_chunk=is_first_chunk,
-                                is_last_chunk=is_last_chunk,
-                                total_number_of_samples=ensemble_info['number_of_samples'])
-
-                            # Update written waveforms set
-                            written_waveforms.update(wfm_list)
-
-                            # check if write process was successful
-                            if written_samples != array_length:
-                                self.log.error('Sampling of block "{0}" in ensemble "{1}" failed. '
-                                               'Write to device was unsuccessful.\nThe number of '
-                                               'actually written samples ({2:d}) does not match '
-                                               'the number of samples staged to write ({3:d}).'
-                                               ''.format(block_name, ensemble.name, written_samples,
-                                                         array_length))
-                                if not self.__sequence_generation_in_progress:
-                                    self.module_state.unlock()
-                                self.sigAvailableWaveformsUpdated.emit(self.sampled_waveforms)
-                                self.sigSampleEnsembleComplete.emit(None)
-                                return -1, list(), dict()
+                            yield analog_samples, digital_samples, processed_samples, offset_bin
 
                             # Reset array write start pointer
                             array_write_index = 0
@@ -1914,35 +2065,20 @@ class SequenceGeneratorLogic(GenericLogic):
                     # Increment element index
                     element_count += 1
 
-        # Save sampling related parameters to the sampling_information container within the
-        # PulseBlockEnsemble.
-        # This step is only performed if the resulting waveforms are named by the PulseBlockEnsemble
-        # and not by a sequence nametag
-        if waveform_name == ensemble.name:
-            ensemble.sampling_information = dict()
-            ensemble.sampling_information.update(ensemble_info)
-            ensemble.sampling_information['pulse_generator_settings'] = self.pulse_generator_settings
-            ensemble.sampling_information['waveforms'] = natural_sort(written_waveforms)
-            self.save_ensemble(ensemble)
-
-        self.log.info('Time needed for sampling and writing PulseBlockEnsemble {0} to device: {1} sec'
-                      ''.format(ensemble.name, int(np.rint(time.time() - start_time))))
-        self.log.debug('Estimated {:.3f} s from current estimated write speed {:.2f} MSa/s'
-                       ' from {} benchmarks'.format(
-            self._benchmark_write.estimate_time(ensemble_info['number_of_samples']),
-            self._benchmark_write.estimate_speed() / 1e6,
-            self._benchmark_write.n_benchmarks))
+    @staticmethod
+    def _update_sample_digest(sample_digest, analog_samples, digital_samples):
+        """ Feed a chunk of samples into a hash object.
 
-        self._benchmark_write.add_benchmark(time.time() - start_time, ensemble_info['number_of_samples'])
-
-        if ensemble_info['number_of_samples'] == 0:
-            self.log.warning('Empty waveform (0 samples) created from PulseBlockEnsemble "{0}".'
-                             ''.format(ensemble.name))
-        if not self.__sequence_generation_in_progress:
-            self.module_state.unlock()
-        self.sigAvailableWaveformsUpdated.emit(self.sampled_waveforms)
-        self.sigSampleEnsembleComplete.emit(ensemble)
-        return offset_bin, natural_sort(written_waveforms), ensemble_info
+        @param sample_digest: hashlib hash object
+        @param dict analog_samples: float32 sample arrays of the chunk
+        @param dict digital_samples: bool sample arrays of the chunk
+        """
+        for chnl in natural_sort(analog_samples):
+            sample_digest.update(chnl.encode())
+            sample_digest.update(analog_samples[chnl])
+        for chnl in natural_sort(digital_samples):
+            sample_digest.update(chnl.encode())
+            sample_digest.update(digital_samples[chnl])
 
     @QtCore.Slot(str)
     def sample_pulse_sequence(self, sequence):
@@ -2009,12 +2145,29 @@ class SequenceGeneratorLogic(GenericLogic):
         #           (('waveform3', 'waveform4'), seq_param_dict2)]
         sequence_param_dict_list = list()
 
+        # Identical waveforms are written only once and referenced by all sequence steps using
+        # them. Ensembles are identified by a hash of their definition, independent of their name.
+        fingerprints = [self._ensemble_fingerprint(self.get_ensemble(seq_step.ensemble))
+                        for seq_step in sequence]
+        repeated_fingerprints = {fingerprint for fingerprint in fingerprints
+                                 if fingerprints.count(fingerprint) > 1}
+        # Waveforms written in this run. Keys are ensemble fingerprints, values are lists of
+        # dicts with the sample hash (None outside the rotating frame), the ensemble_info
+        # (including the waveform names) and the time needed for sampling and writing.
+        unique_waveforms = dict()
+        dedup_report = {'unique_waveforms': 0,
+                        'reused_steps': 0,
+                        'saved_bytes': 0,
+                        'saved_time': 0.0,
+                        'hashing_time': 0.0}
+
         # if all the Pulse_Block_Ensembles should be in the rotating frame, then each ensemble
         # will be created in general with a different offset_bin. Therefore, in order to keep track
         # of the sampled Pulse_Block_Ensembles one has to introduce a running number as an
         # additional name tag, so keep the sampled files separate.
         offset_bin = 0  # that will be used for phase preservation
         for step_index, seq_step in enumerate(sequence):
+            fingerprint = fingerprints[step_index]
             if sequence.rotating_frame:
                 # to make something like 001
                 name_tag = seq_step.ensemble + '_' + str(step_index).zfill(3)
@@ -2022,15 +2175,62 @@ class SequenceGeneratorLogic(GenericLogic):
                 name_tag = seq_step.ensemble
                 offset_bin = 0  # Keep the offset at 0
 
+            # Look for an identical waveform written before in this run. In the rotating frame the
+            # samples of oscillating analog content depend on offset_bin, so ensembles with the
+            # same definition are sampled (without writing) and compared by the hash of their
+            # samples. If no identical waveform exists, these samples are written. Ensembles which
+            # do not fit into a single chunk (see overhead_bytes) are not compared.
+            ensemble = self.get_ensemble(seq_step.ensemble)
+            compare_samples = sequence.rotating_frame and \
+                self._ensemble_depends_on_offset(ensemble)
+            if compare_samples:
+                ensemble_info = self.analyze_block_ensemble(ensemble)
+                single_chunk = self._sample_array_length(ensemble_info) == \
+                    ensemble_info['number_of_samples']
+            sample_hash = None
+            samples = None
+            reused = None
+            if fingerprint in unique_waveforms and not compare_samples:
+                reused = unique_waveforms[fingerprint][0]
+            elif fingerprint in unique_waveforms and single_chunk:
+                start_hash = time.time()
+                sample_hash, samples = self._sample_ensemble_digest(ensemble, ensemble_info,
+                                                                    offset_bin)
+                dedup_report['hashing_time'] += time.time() - start_hash
+                for candidate in unique_waveforms[fingerprint]:
+                    if candidate['sample_hash'] == sample_hash:
+                        reused = candidate
+                        break
+            if reused is not None and sequence.rotating_frame and ensemble.rotating_frame:
+                offset_bin += reused['ensemble_info']['number_of_samples']
+
+            if reused is not None:
+                self.log.debug('Sequence step {0:d} uses the identical waveform {1}.'
+                               ''.format(step_index, reused['ensemble_info']['waveforms']))
+                generated_ensembles[name_tag] = reused['ensemble_info']
+                dedup_report['reused_steps'] += 1
+                dedup_report['saved_bytes'] += reused['bytes']
+                dedup_report['saved_time'] += reused['time']
+
             # Only sample ensembles if they have not already been sampled
-            if sequence.rotating_frame or \
+            elif sequence.rotating_frame or \
                     not self.get_ensemble(name_tag).sampling_information or \
                     self.get_ensemble(name_tag).sampling_information['pulse_generator_settings'] != self.pulse_generator_settings:
 
+                start_step = time.time()
+                if compare_samples and single_chunk and samples is None and \
+                        fingerprint in repeated_fingerprints:
+                    sample_digest = hashlib.sha1()
+                else:
+                    sample_digest = None
                 offset_bin, waveform_list, ensemble_info = self.sample_pulse_block_ensemble(
                     ensemble=seq_step.ensemble,
                     offset_bin=offset_bin,
-                    name_tag=name_tag)
+                    name_tag=name_tag,
+                    sample_digest=sample_digest,
+                    samples=samples)
+                if sample_digest is not None:
+                    sample_hash = sample_digest.hexdigest()
 
                 if len(waveform_list) == 0:
                     self.log.error('Sampling of PulseBlockEnsemble "{0}" failed during sampling of '
@@ -2047,6 +2247,15 @@ class SequenceGeneratorLogic(GenericLogic):
 
                 # Add created waveform names to the set
                 written_waveforms.update(waveform_list)
+
+                bytes_per_sample = len(ensemble_info['analog_channels']) * 4 + len(
+                    ensemble_info['digital_channels'])
+                unique_waveforms.setdefault(fingerprint, list()).append(
+                    {'sample_hash': sample_hash,
+                     'ensemble_info': ensemble_info,
+                     'bytes': int(bytes_per_sample * ensemble_info['number_of_samples']),
+                     'time': time.time() - start_step})
+                dedup_report['unique_waveforms'] += 1
             else:
                 self.log.debug('Waveform already sampled: {0}'.format(name_tag))
                 ensemble_info = self.get_ensemble(name_tag).sampling_information.copy()
@@ -2056,6 +2265,16 @@ class SequenceGeneratorLogic(GenericLogic):
                 # Add created waveform names to the set
                 written_waveforms.update(ensemble_info['waveforms'])
 
+                # Identical ensembles of the following steps use these waveforms as well
+                bytes_per_sample = len(ensemble_info['analog_channels']) * 4 + len(
+                    ensemble_info['digital_channels'])
+                unique_waveforms.setdefault(fingerprint, list()).append(
+                    {'sample_hash': None,
+                     'ensemble_info': ensemble_info,
+                     'bytes': int(bytes_per_sample * ensemble_info['number_of_samples']),
+                     'time': self._estimated_write_time(ensemble_info['number_of_samples'])})
+                dedup_report['unique_waveforms'] += 1
+
             # Append written sequence step to sequence_param_dict_list
             sequence_param_dict_list.append(
                 (tuple(generated_ensembles[name_tag]['waveforms']), seq_step))
@@ -2077,10 +2296,21 @@ class SequenceGeneratorLogic(GenericLogic):
         sequence.sampling_information['waveforms'] = natural_sort(written_waveforms)
         sequence.sampling_information['step_waveform_list'] = [step[0] for step in
                                                                sequence_param_dict_list]
+        sequence.sampling_information['waveform_deduplication'] = dedup_report
         self.save_sequence(sequence)
 
         self.log.info('Time needed for sampling and writing PulseSequence {0} to device: {1} sec.'
                       ''.format(sequence.name, int(np.rint(time.time() - start_time))))
+        if dedup_report['reused_steps'] > 0:
+            self.log.info('PulseSequence {0}: {1:d} unique waveforms for {2:d} sequence steps. '
+                          'Reusing identical waveforms saved {3:.3f} MB of waveform memory and '
+                          'about {4:.1f} s of sampling and writing ({5:.1f} s spent on hashing '
+                          'samples).'.format(sequence.name,
+                                             dedup_report['unique_waveforms'],
+                                             len(sequence_param_dict_list),
+                                             dedup_report['saved_bytes'] / 1e6,
+                                             dedup_report['saved_time'],
+                                             dedup_report['hashing_time']))
 
         # unlock module
         self.module_state.unlock()
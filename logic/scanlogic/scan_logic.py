@@ -20,7 +20,7 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 """
 
 
-from core.module import Connector, StatusVar, ConfigOption
+from core.module import Connector, StatusVar
 from logic.generic_logic import GenericLogic
 from core.util import units
 from core.util.mutex import Mutex
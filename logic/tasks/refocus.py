@@ -20,10 +20,22 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 """
 
 from logic.generic_task import InterruptableTask
+import numpy as np
 import time
 
 class Task(InterruptableTask):
     """ This task does a confocal focus optimisation.
+
+    If a POI manager is given in needsmodules (as 'poimanager') and it has an active POI, the
+    refocus starts at the position of that POI predicted from the drift history. The sparse
+    tracking refocus is used as long as the prediction is more precise than half the XY refocus
+    size, the full raster otherwise.
+
+    Example config:
+
+        needsmodules:
+            optimizer: 'optimizerlogic'
+            poimanager: 'poimanagerlogic'
     """
 
     def __init__(self, **kwargs):
@@ -32,6 +44,15 @@ class Task(InterruptableTask):
 
     def startTask(self):
         """ Get position from scanning device and do the refocus """
+        poimanager = self.ref.get('poimanager')
+        if poimanager is not None and poimanager.active_poi is not None:
+            pos, std = poimanager.get_predicted_poi_position()
+            if np.all(std < self.ref['optimizer'].refocus_XY_size / 2):
+                mode = 'tracking'
+            else:
+                mode = 'raster'
+            self.ref['optimizer'].start_refocus(pos, 'task', mode=mode)
+            return
         pos = self.ref['optimizer']._scanning_device.get_scanner_position()
         self.ref['optimizer'].start_refocus(pos, 'task')
         # self.ref['optimizer'].start_refocus(caller_tag='task')
@@ -30,6 +30,7 @@ from core.statusvariable import StatusVar
 from core.configoption import ConfigOption
 from logic.generic_logic import GenericLogic
 from core.util.mutex import Mutex
+from core.util.profiling import profiler, profiled
 from core.util.units import ScaledFloat
 from interface.data_instream_interface import StreamChannelType, StreamingMode
 
@@ -530,6 +531,7 @@ class TimeSeriesReaderLogic(GenericLogic):
         return 0
 
     @QtCore.Slot()
+    @profiled(queued=True)
     def acquire_data_block(self):
         """
         This method gets the available data from the hardware.
@@ -560,7 +562,8 @@ class TimeSeriesReaderLogic(GenericLogic):
                     return
 
                 # read the current counter values
-                data = self._streamer.read_data(number_of_samples=samples_to_read)
+                with profiler.section(self._name, 'read_data', kind='latency'):
+                    data = self._streamer.read_data(number_of_samples=samples_to_read)
                 if data.shape[1] != samples_to_read:
                     self.log.error('Reading data from streamer went wrong; '
                                    'killing the stream with next data frame.')
@@ -573,6 +576,7 @@ class TimeSeriesReaderLogic(GenericLogic):
 
                 # Emit update signal
                 self.sigDataChanged.emit(*self.trace_data, *self.averaged_trace_data)
+                profiler.queued(self._name, 'acquire_data_block')
                 self._sigNextDataFrame.emit()
         return
 
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the progress entries of the log widget in gui.manager.logwidget.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import os
+
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+QtWidgets = pytest.importorskip('qtpy.QtWidgets')
+
+from gui.manager.logwidget import LogWidget
+
+
+@pytest.fixture(scope='module')
+def app():
+    application = QtWidgets.QApplication.instance()
+    if application is None:
+        application = QtWidgets.QApplication([])
+    return application
+
+
+def _progress_entry(current, total, key='scan'):
+    """ Log entry in dict format carrying progress information.
+
+    @return dict: log entry
+    """
+    return {'name': 'logic.afm', 'timestamp': '00:00:00', 'level': 'info',
+            'message': 'Scan {0}/{1}'.format(current, total),
+            'progress': {'key': key, 'current': current, 'total': total}}
+
+
+def test_progress_updates_one_row(app):
+    widget = LogWidget()
+    for current in range(4):
+        widget.addEntry(_progress_entry(current, 3))
+    assert widget.model.rowCount() == 1
+    assert widget.model.entries[0][3] == 'Scan 3/3'
+
+
+def test_finished_run_releases_key(app):
+    widget = LogWidget()
+    for run in range(2):
+        for current in range(4):
+            widget.addEntry(_progress_entry(current, 3))
+    assert widget.model.rowCount() == 2
+    assert [entry[3] for entry in widget.model.entries] == ['Scan 3/3', 'Scan 3/3']
+    assert len(widget._progressRows) == 0
+
+
+def test_finished_run_in_one_batch(app):
+    widget = LogWidget()
+    for run in range(2):
+        widget.addEntries([_progress_entry(current, 3) for current in range(4)])
+    assert widget.model.rowCount() == 2
+    assert len(widget._progressRows) == 0
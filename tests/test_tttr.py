@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Round trip tests of the TTTR record encoders and the decoder in hardware.picoquant.tttr.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import numpy as np
+
+from hardware.picoquant.tttr import TTTRDecoder, TriggerTracker, TimeHistogram, \
+    encode_t2, encode_t3, MODE_T2, MODE_T3, SPECIAL_CHANNEL, T2_WRAPAROUND, T3_WRAPAROUND
+
+OVERFLOW_RECORD = SPECIAL_CHANNEL << 28
+
+
+def _events(rng, num, wraparound, num_wraps, jump=3):
+    """ Sorted event times over several wraparounds, with a gap of more than one wraparound.
+
+    @return numpy.ndarray: absolute times
+    """
+    times = np.sort(rng.randint(0, num_wraps * wraparound, num)).astype(np.int64)
+    # no event for several wraparounds, this needs consecutive overflow records
+    times[num // 2:] += jump * wraparound
+    return times
+
+
+def _add_markers(rng, channels, times, num_markers, time_step=1):
+    """ Insert marker records (channel 15 with marker bits 1 to 15) into an event stream.
+
+    @return tuple: channels, times and markers of all records sorted by time, markers before
+                   photons of the same time
+    """
+    marker_times = rng.choice(times, num_markers, replace=False) // time_step * time_step
+    markers = rng.randint(1, 16, num_markers)
+    channels = np.concatenate((np.full(num_markers, SPECIAL_CHANNEL), channels))
+    times = np.concatenate((marker_times, times))
+    markers = np.concatenate((markers, np.zeros(len(times) - num_markers, dtype=int)))
+    order = np.lexsort((channels != SPECIAL_CHANNEL, times))
+    return channels[order], times[order], markers[order]
+
+
+def _block_boundaries(records):
+    """ Split positions right before and right after every overflow record. """
+    overflows = np.flatnonzero(records == OVERFLOW_RECORD)
+    return np.unique(np.concatenate((overflows, overflows + 1, [len(records) // 3])))
+
+
+def _decode_blocks(decoder, records, boundaries):
+    """ Decode the records in consecutive blocks and join the decoded events. """
+    blocks = [decoder.decode(block) for block in np.split(records, boundaries)]
+    return {key: np.concatenate([events[key] for events in blocks]) for key in blocks[0]}
+
+
+def test_t2_round_trip_across_blocks():
+    rng = np.random.RandomState(2)
+    times = _events(rng, 2000, T2_WRAPAROUND, num_wraps=5)
+    channels = rng.randint(0, 2, len(times))
+    # the lowest 4 bits of a T2 marker record hold the marker bits, not the time
+    channels, times, markers = _add_markers(rng, channels, times, 50, time_step=16)
+
+    records = encode_t2(channels, times, markers)
+    assert records.dtype == np.uint32
+    num_overflows = np.count_nonzero(records == OVERFLOW_RECORD)
+    assert num_overflows == times[-1] // T2_WRAPAROUND
+
+    decoder = TTTRDecoder(MODE_T2)
+    events = _decode_blocks(decoder, records, _block_boundaries(records))
+    assert decoder.num_overflows == num_overflows
+
+    photons = channels != SPECIAL_CHANNEL
+    np.testing.assert_array_equal(events['channel'], channels[photons])
+    np.testing.assert_array_equal(events['time'], times[photons])
+    np.testing.assert_array_equal(events['marker'], markers[~photons])
+    np.testing.assert_array_equal(events['marker_time'], times[~photons])
+    assert 'dtime' not in events
+
+
+def test_t3_round_trip_across_blocks():
+    rng = np.random.RandomState(3)
+    nsync = _events(rng, 2000, T3_WRAPAROUND, num_wraps=4)
+    channels = rng.randint(1, 5, len(nsync))
+    channels, nsync, markers = _add_markers(rng, channels, nsync, 50)
+    dtime = rng.randint(0, 4096, len(nsync))
+
+    records = encode_t3(channels, nsync, dtime, markers)
+    num_overflows = np.count_nonzero(records == OVERFLOW_RECORD)
+    assert num_overflows == nsync[-1] // T3_WRAPAROUND
+
+    decoder = TTTRDecoder(MODE_T3)
+    events = _decode_blocks(decoder, records, _block_boundaries(records))
+    assert decoder.num_overflows == num_overflows
+
+    photons = channels != SPECIAL_CHANNEL
+    np.testing.assert_array_equal(events['channel'], channels[photons])
+    np.testing.assert_array_equal(events['time'], nsync[photons])
+    np.testing.assert_array_equal(events['dtime'], dtime[photons])
+    np.testing.assert_array_equal(events['marker'], markers[~photons])
+    np.testing.assert_array_equal(events['marker_time'], nsync[~photons])
+
+    # a new measurement starts at zero again
+    decoder.reset()
+    events = decoder.decode(encode_t3([1], [5], [7]))
+    assert events['time'].tolist() == [5]
+    assert decoder.num_overflows == 0
+
+
+def test_gated_t3_histogram():
+    rng = np.random.RandomState(4)
+    num_bins, bin_width, number_of_gates = 32, 4, 6
+    sequence_marker = 1
+    # sequences start every 8 syncs and run across the wraparounds of the sync counter. The
+    # last two syncs of each sequence are beyond the gates.
+    sequence_starts = np.arange(3, 2 * T3_WRAPAROUND, 8, dtype=np.int64)
+    nsync = np.concatenate((rng.randint(0, 2 * T3_WRAPAROUND, 100000),
+                            # photons on every sync around the wraparound
+                            np.arange(T3_WRAPAROUND - 8, T3_WRAPAROUND + 8)))
+    nsync = np.sort(nsync).astype(np.int64)
+    # some delays are beyond the last time bin
+    dtime = rng.randint(0, num_bins * bin_width + 20, len(nsync))
+
+    channels = np.concatenate((np.full(len(sequence_starts), SPECIAL_CHANNEL),
+                               np.ones(len(nsync), dtype=int)))
+    times = np.concatenate((sequence_starts, nsync))
+    markers = np.concatenate((np.full(len(sequence_starts), sequence_marker),
+                              np.zeros(len(nsync), dtype=int)))
+    dtimes = np.concatenate((np.zeros(len(sequence_starts), dtype=int), dtime))
+    order = np.lexsort((channels != SPECIAL_CHANNEL, times))
+    records = encode_t3(channels[order], times[order], dtimes[order], markers[order])
+
+    # the same steps as the gated T3 analysis of the PicoHarp300
+    decoder = TTTRDecoder(MODE_T3)
+    tracker = TriggerTracker()
+    histogram = TimeHistogram(num_bins, bin_width, number_of_gates)
+    for block in np.split(records, _block_boundaries(records)):
+        events = decoder.decode(block)
+        marker_times = events['marker_time'][(events['marker'] & sequence_marker) != 0]
+        _, sequence_sync = tracker.locate(events['time'], marker_times, values=marker_times)
+        gates = events['time'] - sequence_sync
+        gates[sequence_sync < 0] = -1
+        histogram.accumulate(events['dtime'], gates)
+
+    reference = np.zeros((number_of_gates, num_bins), dtype=np.int64)
+    for sync, delay in zip(nsync, dtime):
+        if sync < sequence_starts[0]:
+            continue
+        gate = (sync - 3) % 8
+        time_bin = delay // bin_width
+        if gate < number_of_gates and time_bin < num_bins:
+            reference[gate, time_bin] += 1
+
+    trace = histogram.trace()
+    assert trace.shape == (number_of_gates, num_bins)
+    np.testing.assert_array_equal(trace, reference)
+    assert 0 < trace.sum() < len(nsync)
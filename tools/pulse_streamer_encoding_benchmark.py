@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of the conversion of digital samples into Pulse Streamer pulse patterns: the former
+per-channel conversion with a Python loop over every transition against the vectorized
+RunLengthEncoder (hardware/swabian_instruments/pulse_pattern.py).
+
+Run from the qudi main directory:
+    python tools/pulse_streamer_encoding_benchmark.py
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+from hardware.swabian_instruments.pulse_pattern import RunLengthEncoder
+
+
+def loop_conversion(digital_samples):
+    """ The conversion PulseStreamer.write_waveform used before the RunLengthEncoder. """
+    waveform = dict()
+    for channel_number, samples in digital_samples.items():
+        new_channel_indices = np.where(samples[:-1] != samples[1:])[0]
+        new_channel_indices = np.unique(new_channel_indices)
+        new_channel_indices = np.insert(new_channel_indices, 0, [-1])
+        new_channel_indices = np.insert(new_channel_indices, new_channel_indices.size,
+                                        [samples.shape[0] - 1])
+        pulses = []
+        for new_channel_index in range(1, new_channel_indices.size):
+            pulse = [new_channel_indices[new_channel_index] - new_channel_indices[new_channel_index - 1],
+                     samples[new_channel_indices[new_channel_index - 1] + 1].astype(np.byte)]
+            pulses.append(pulse)
+        waveform[channel_number] = pulses
+    return waveform
+
+
+def encoder_conversion(digital_samples, chunk_size=None):
+    encoder = RunLengthEncoder(sorted(digital_samples))
+    length = len(next(iter(digital_samples.values())))
+    chunk_size = length if chunk_size is None else chunk_size
+    for start in range(0, length, chunk_size):
+        encoder.encode({channel: samples[start:start + chunk_size]
+                        for channel, samples in digital_samples.items()})
+    return encoder.patterns()
+
+
+def random_pulses(length, transitions, number_of_channels=8, seed=0):
+    """ Digital samples with about the given number of transitions per channel. """
+    rng = np.random.RandomState(seed)
+    digital_samples = dict()
+    for channel in range(number_of_channels):
+        edges = np.zeros(length, dtype=bool)
+        edges[rng.randint(0, length, transitions)] = True
+        digital_samples['d_ch{0:d}'.format(channel + 1)] = np.cumsum(edges) % 2 == 1
+    return digital_samples
+
+
+def main(cases=((10**6, 10**3), (10**7, 10**4), (10**7, 10**5), (10**7, 10**6),
+                (10**8, 10**5)),
+         chunk_size=10**6):
+    print('{0:>10} {1:>12} {2:>12} {3:>12} {4:>12} {5:>8}'.format(
+        'samples', 'transitions', 'loop (s)', 'encoder (s)', 'chunked (s)', 'speedup'))
+    for length, transitions in cases:
+        digital_samples = random_pulses(length, transitions)
+
+        start = time.perf_counter()
+        reference = loop_conversion(digital_samples)
+        loop_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        patterns = encoder_conversion(digital_samples)
+        encoder_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        chunked = encoder_conversion(digital_samples, chunk_size)
+        chunked_time = time.perf_counter() - start
+
+        for channel, pulses in reference.items():
+            assert patterns[channel] == [[int(d), int(l)] for d, l in pulses]
+        assert chunked == patterns
+        print('{0:>10} {1:>12} {2:>12.3f} {3:>12.3f} {4:>12.3f} {5:>8.1f}'.format(
+            length, transitions, loop_time, encoder_time, chunked_time, loop_time / encoder_time))
+
+
+if __name__ == '__main__':
+    main()
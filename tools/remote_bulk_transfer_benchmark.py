@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+"""
+Loopback benchmark comparing array transfers through rpyc (pickle) with the bulk transfer channel
+of the qudi module server (core.bulktransfer).
+
+Run from the qudi main directory:
+    python tools/remote_bulk_transfer_benchmark.py
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import os
+import sys
+import threading
+import time
+import numpy as np
+import rpyc
+import rpyc.utils.classic
+from rpyc.utils.server import ThreadedServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+from core.bulktransfer import BulkTransferServer, BulkTransferClient
+
+
+class ArraySource:
+    """ Stands in for a shared hardware module returning (histogram, info) like a fast counter.
+    """
+    def __init__(self):
+        self._data = dict()
+
+    def get_data_trace(self, size):
+        if size not in self._data:
+            self._data[size] = np.random.poisson(10, size).astype(np.int64)
+        return self._data[size], {'elapsed_sweeps': 1000, 'elapsed_time': 1.0}
+
+
+class SharedModules:
+    def __init__(self, **modules):
+        self.storage = modules
+
+
+def main(sizes=(1000, 100000, 1000000, 10000000), repetitions=5):
+    source = ArraySource()
+
+    class Service(rpyc.Service):
+        def exposed_getModule(self, name):
+            return source
+
+    rpyc_server = ThreadedServer(Service,
+                                 hostname='localhost',
+                                 port=0,
+                                 protocol_config={'allow_all_attrs': True,
+                                                  'allow_pickle': True})
+    threading.Thread(target=rpyc_server.start, daemon=True).start()
+    bulk_server = BulkTransferServer(SharedModules(source=source), 'localhost', 0)
+    bulk_server.start()
+    time.sleep(0.5)
+
+    connection = rpyc.connect('localhost',
+                              rpyc_server.port,
+                              config={'allow_all_attrs': True, 'allow_pickle': True})
+    remote = connection.root.getModule('source')
+    client = BulkTransferClient('localhost', bulk_server.port)
+    compressing_client = BulkTransferClient('localhost', bulk_server.port, compress_level=1)
+
+    def rpyc_fetch(size):
+        data, info = remote.get_data_trace(size)
+        return rpyc.utils.classic.obtain(data)
+
+    def bulk_fetch(size):
+        return client.call('source', 'get_data_trace', size)[0]
+
+    def compressed_fetch(size):
+        return compressing_client.call('source', 'get_data_trace', size)[0]
+
+    preallocated = dict()
+
+    def preallocated_fetch(size):
+        if size not in preallocated:
+            preallocated[size] = [np.empty(size, dtype=np.int64)]
+        return client.call('source', 'get_data_trace', size, out=preallocated[size])[0]
+
+    methods = (('rpyc + pickle', rpyc_fetch),
+               ('bulk', bulk_fetch),
+               ('bulk, zlib level 1', compressed_fetch),
+               ('bulk, preallocated', preallocated_fetch))
+
+    print('{0:>10} {1:>22} {2:>12} {3:>12}'.format('samples', 'method', 'time (ms)', 'MB/s'))
+    for size in sizes:
+        reference = source.get_data_trace(size)[0]
+        for label, fetch in methods:
+            result = fetch(size)
+            assert np.array_equal(result, reference)
+            start = time.perf_counter()
+            for _ in range(repetitions):
+                fetch(size)
+            elapsed = (time.perf_counter() - start) / repetitions
+            print('{0:>10} {1:>22} {2:>12.3f} {3:>12.1f}'.format(
+                size, label, elapsed * 1e3, reference.nbytes / elapsed / 1e6))
+
+    client.close()
+    compressing_client.close()
+    connection.close()
+    bulk_server.close()
+    rpyc_server.close()
+
+
+if __name__ == '__main__':
+    main()